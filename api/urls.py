@@ -48,10 +48,16 @@ from dashboard.views import (
     SalesOverviewView,
     LatestOrdersView, 
     LowStockAlertsView,
+    VendorStockAlertsView,
+    VendorStockThresholdView,
     VendorPerformanceViewSet,
     FurnitureSalesComparisonView,
     CategorySalesView,
     TopSellProductGraphView,
+    SalesCubeView,
+    CohortRetentionView,
+    SalesTimeSeriesView,
+    StockForecastView,
 )
 
 # Orders
@@ -59,7 +65,9 @@ from orders.views import (
     OrderViewSet,
     ShippingAddressViewSet,
     CartViewSet,
+    CartStoreViewSet,
     OrderReceiptView,
+    OrderReceiptPDFView,
     OrderItemViewSet
 )
 
@@ -110,6 +118,7 @@ router.register("users", UserListView, basename="user")
 # Orders & Cart
 router.register("orders", OrderViewSet, basename="order")
 router.register("cart", CartViewSet, basename="cart")
+router.register("v2/cart", CartStoreViewSet, basename="cart-v2")
 router.register("vendor/order/list", OrderManagementViewSet, basename="order-manage")
 router.register("order-items", OrderItemViewSet, basename="order-item")
 
@@ -141,10 +150,13 @@ urlpatterns = [
     # Orders
     # path("orders/add-shipping-address/", AddShippingAddressView.as_view(), name="add-shipping-address"),
     path("receipt/<str:order_id>/", OrderReceiptView.as_view(), name="order-receipt"),
+    path("receipt/<str:order_id>/pdf/", OrderReceiptPDFView.as_view(), name="order-receipt-pdf"),
 
     # Vendor Dashboard
     path("vendor/dashboard/", VendorDashboardView.as_view(), name="vendor-dashboard"),
     path("vendor/sales-overview/", VendorSalesOverviewView.as_view(), name="vendor-sales-overview"),
+    path("vendor/alerts/low-stock/", VendorStockAlertsView.as_view(), name="vendor-low-stock-alerts"),
+    path("vendor/alerts/threshold/", VendorStockThresholdView.as_view(), name="vendor-stock-threshold"),
     path("vendor/payments-stats/", VendorPaymentsStatsView.as_view(), name="vendor-payments-stats"),
     path("vendor/sales-performance/", VendorSalesPerformanceView.as_view(), name="vendor-sales-performance"),
 
@@ -160,6 +172,9 @@ urlpatterns = [
     path("history/<int:pk>/", chat_views.ChatMessagesListView.as_view(), name="get-chat-messages"),
     path("message/<int:pk>/delete/", chat_views.MessageDeleteView.as_view(), name="delete-message"),
     path("message/<int:pk>/edit/", chat_views.MessageUpdateView.as_view(), name="edit-message"),
+    path("message/<int:pk>/attachment/", chat_views.MessageAttachmentView.as_view(), name="message-attachment"),
+    path("chat/attachments/", chat_views.ChatUploadCreateView.as_view(), name="chat-upload-create"),
+    path("chat/attachments/<uuid:pk>/", chat_views.ChatUploadView.as_view(), name="chat-upload"),
 
     path("admin/stats/", DashboardStatsView.as_view(), name="dashboard-stats"),
     path("admin/top/sell/products/", TopSellProductGraphView.as_view(), name="sell-product-graph"),
@@ -186,6 +201,10 @@ urlpatterns = [
 
 
     path("admin/category-sales/", CategorySalesView.as_view(), name="category-sales"),
+    path("admin/analytics/cube/", SalesCubeView.as_view(), name="analytics-cube"),
+    path("admin/analytics/cohorts/", CohortRetentionView.as_view(), name="analytics-cohorts"),
+    path("analytics/timeseries/", SalesTimeSeriesView.as_view(), name="analytics-timeseries"),
+    path("analytics/stock-forecast/", StockForecastView.as_view(), name="analytics-stock-forecast"),
 
     
     # Include router URLs
@@ -0,0 +1,158 @@
+# chat/attachments.py
+"""
+Chat attachments uploaded out of band instead of inline base64 in websocket frames.
+
+A client opens an upload with the file's name, type and size (`start_upload()`),
+PUTs the raw bytes in chunks of at most CHUNK_SIZE (`write_chunk()`, each at the
+offset the server has received so far, so an interrupted upload resumes from
+there), then sends a chat message carrying the upload's id. Chunks are written in
+place into a single file under CHAT_UPLOAD_DIR, so the bytes are stored once
+whatever the number of messages referencing them.
+
+Messages and history carry the attachment as a URL plus metadata (`describe()`);
+the file itself is served with range support by the message attachment endpoint.
+Uploads never completed are removed by `purge_stale_uploads()`. Inline base64
+attachments, still accepted from older clients, are read with `decode_inline()`.
+"""
+import base64
+import mimetypes
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from chat.models import ChatUpload, Message
+
+CHUNK_SIZE = 1024 * 1024
+# Uploads not completed within this long are discarded
+STALE_AFTER = timedelta(days=1)
+
+
+class OffsetMismatch(Exception):
+    """A chunk did not start where the upload left off; `expected` is where it should."""
+
+    def __init__(self, expected):
+        super().__init__(f"Chunk must start at offset {expected}.")
+        self.expected = expected
+
+
+def upload_path(upload):
+    return Path(settings.CHAT_UPLOAD_DIR) / str(upload.pk)
+
+
+def start_upload(user, name, size, mime_type=""):
+    """Open an empty upload for a file of `size` bytes; raises ValueError for invalid input."""
+    name = os.path.basename(str(name or "").strip())
+    if not name:
+        raise ValueError("name is required.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ValueError("size must be an integer.")
+    if not 0 < size <= Message.MAX_FILE_SIZE:
+        raise ValueError(f"size must be between 1 and {Message.MAX_FILE_SIZE} bytes.")
+
+    upload = ChatUpload.objects.create(uploader=user, name=name[:255], size=size, mime_type=(mime_type or "")[:300])
+    path = upload_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return upload
+
+
+def write_chunk(upload, offset, data):
+    """
+    Write `data` at `offset` and return the refreshed upload. Raises OffsetMismatch
+    when `offset` is not the received byte count and ValueError when the chunk is
+    empty, too large or runs past the declared size.
+    """
+    if not data:
+        raise ValueError("Chunk is empty.")
+    if len(data) > CHUNK_SIZE:
+        raise ValueError(f"Chunks may be at most {CHUNK_SIZE} bytes.")
+
+    with transaction.atomic():
+        # Serialises writers of the same upload so `received` only moves forward.
+        upload = ChatUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.completed_at:
+            raise ValueError("Upload is already complete.")
+        if offset != upload.received:
+            raise OffsetMismatch(upload.received)
+        if offset + len(data) > upload.size:
+            raise ValueError(f"Chunk runs past the declared size of {upload.size} bytes.")
+
+        with open(upload_path(upload), "r+b") as file:
+            file.seek(offset)
+            file.write(data)
+
+        upload.received = offset + len(data)
+        if upload.received == upload.size:
+            upload.completed_at = timezone.now()
+        upload.save(update_fields=["received", "completed_at"])
+    return upload
+
+
+def completed_upload(user, upload_id):
+    """The user's completed upload with this id, or None."""
+    try:
+        return ChatUpload.objects.get(pk=upload_id, uploader=user, completed_at__isnull=False)
+    except (ChatUpload.DoesNotExist, ValueError, TypeError):
+        return None
+
+
+def decode_inline(data, name="", mime_type=""):
+    """
+    (bytes, MIME type) of an inline base64 attachment, given as a data URL
+    ("data:image/png;base64,...") or bare base64. The type is the data URL's, else
+    `mime_type`, else guessed from `name`. Raises ValueError for invalid base64.
+    """
+    header, _, payload = data.rpartition(",")
+    declared = header.strip().removeprefix("data:").split(";", 1)[0].strip()
+    content = base64.b64decode("".join(payload.split()), validate=True)
+    return content, declared or mime_type or mimetypes.guess_type(name or "")[0] or "application/octet-stream"
+
+
+def attachment_file(message):
+    """(path, mime type, name) of the message's attachment, or None when it has none."""
+    if message.upload_id:
+        upload = message.upload
+        return str(upload_path(upload)), upload.mime_type, upload.name
+    if message.attachment:
+        return message.attachment.path, message.mime_type, message.attachment_name
+    return None
+
+
+def describe(message, request=None):
+    """The attachment as sent to clients: {url, name, mime_type, size}, or None."""
+    if message.upload_id:
+        upload = message.upload
+        size = upload.size
+    elif message.attachment:
+        try:
+            size = message.attachment.size
+        except FileNotFoundError:
+            return None
+    else:
+        return None
+
+    url = reverse("message-attachment", args=[message.pk])
+    return {
+        "url": request.build_absolute_uri(url) if request is not None else url,
+        "name": message.attachment_name,
+        "mime_type": message.mime_type,
+        "size": size,
+    }
+
+
+def purge_stale_uploads(now=None):
+    """Delete uploads left incomplete past STALE_AFTER; returns how many were removed."""
+    stale = ChatUpload.objects.filter(completed_at__isnull=True, created_at__lt=(now or timezone.now()) - STALE_AFTER)
+    removed = 0
+    for upload in stale:
+        upload_path(upload).unlink(missing_ok=True)
+        upload.delete()
+        removed += 1
+    return removed
@@ -1,4 +1,3 @@
-import base64
 import json
 import uuid
 from asgiref.sync import sync_to_async
@@ -7,7 +6,8 @@ from django.core.files.base import ContentFile
 from django.db.models import Q
 from twisted.pair.ip import MAX_SIZE
 from users.models import User as CustomUser
-from .models import Message, Chat
+from .attachments import completed_upload, decode_inline
+from .models import Message, Chat, conversation_key
 from .serializers import MessageSerializer
 from notification.models import Notification
 
@@ -21,8 +21,17 @@ def create_notification(user, sender_name, message_text, meta_data=None):
         meta_data=meta_data
     )
 
+def room_id_for(*user_ids):
+    """Channel group of the conversation between two users, derived from its conversation_key."""
+    return f"chat_{conversation_key(*user_ids)}"
+
+def inbox_group(user_id):
+    """Every chat session of a user joins this one group; messages are sent to both participants' inboxes."""
+    return f"chat_inbox_{user_id}"
+
 def filesize_from_base64(b64_str: str) -> int:
-    b64_str = "".join(b64_str.split())
+    # Payload only, without a data URL header
+    b64_str = "".join(b64_str.rpartition(",")[2].split())
     padding = b64_str.count("=")
     return (len(b64_str) * 3) // 4 - padding
 
@@ -41,34 +50,26 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         self.user = self.scope['user']
         self.first_message = True
 
-        get_user_chats = sync_to_async(lambda: list(
-            Chat.objects.filter(
-                Q(sender=self.user) | Q(receiver=self.user)
-            ).values_list('sender_id', 'receiver_id')
-        ))
-        
-        user_chats = await get_user_chats()
-
-        for sender_id, receiver_id in user_chats:
-            users = sorted([sender_id, receiver_id])
-            room_id = f"chat_{users[0]}_{users[1]}"
-            await self.channel_layer.group_add(room_id, self.channel_name)
-
-            if not hasattr(self, 'room_ids'):
-                self.room_ids = set()
-            self.room_ids.add(room_id)
+        self.inbox = inbox_group(self.user.id)
+        await self.channel_layer.group_add(self.inbox, self.channel_name)
 
         await self.send_json({
             "success": f"user {self.user.email} is subscribed for chat",
         })
 
     async def disconnect(self, close_code):
-        if hasattr(self, 'room_ids'):
-            for room_id in self.room_ids:
-                await self.channel_layer.group_discard(
-                    room_id,
-                    self.channel_name
-                )
+        if hasattr(self, 'inbox'):
+            await self.channel_layer.group_discard(self.inbox, self.channel_name)
+
+    async def send_to_participants(self, user_ids, message):
+        for user_id in set(user_ids):
+            await self.channel_layer.group_send(
+                inbox_group(user_id),
+                {
+                    "type": "send_message",
+                    "message": message,
+                }
+            )
 
     async def receive(self, text_data=None, bytes_data=None, **kwargs):
         if not text_data:
@@ -90,6 +91,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         attachment = message_dict.get("attachment_data")
         mime_type = message_dict.get("mime_type")
         file_name = message_dict.get("attachment_name")
+        attachment_id = message_dict.get("attachment_id")
         reply_to = message_dict.get("reply_to") or None
         delete_id = message_dict.get("delete_id")
 
@@ -100,20 +102,16 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             message_obj.is_deleted = True
             await message_obj.asave()
 
-            room_users = sorted([message_obj.sender.id, message_obj.receiver.id])
-            room_id = f"chat_{room_users[0]}_{room_users[1]}"
-            await self.channel_layer.group_send(
-                room_id,
+            room_id = room_id_for(message_obj.sender.id, message_obj.receiver.id)
+            await self.send_to_participants(
+                [message_obj.sender.id, message_obj.receiver.id],
                 {
-                    "type": "send_message",
-                    "message": {
-                        "event": {
-                            'name': 'delete',
-                            'delete_id': message_obj.id
-                        },
-                        'room_id': room_id 
+                    "event": {
+                        'name': 'delete',
+                        'delete_id': message_obj.id
                     },
-                }
+                    'room_id': room_id 
+                },
             )
 
             receiver = message_obj.receiver
@@ -127,7 +125,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             notification = await create_notification(
                 receiver,
                 self.user.get_full_name() or self.user.email,
-                f"A message was deleted in your chat.",
+                "A message was deleted in your chat.",
                 meta_data
             )
             await self.channel_layer.group_send(
@@ -162,12 +160,18 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         if attachment and filesize_from_base64(attachment) > self.MAX_ATTACHMENT_SIZE:
             return await self.send_json({'error': f'file size is too large > {self.MAX_ATTACHMENT_SIZE}'})
 
-        if not attachment and not message:
+        upload = None
+        if attachment_id:
+            upload = await sync_to_async(completed_upload)(self.user, attachment_id)
+            if upload is None:
+                return await self.send_json({'error': f'attachment {attachment_id} not found or not fully uploaded'})
+            file_name, mime_type = upload.name, upload.mime_type
+
+        if not attachment and not upload and not message:
             return await self.send_json({'error': 'message is required'})
 
 
-        users = sorted([self.user.id, receiver.id])
-        room_id = f"chat_{users[0]}_{users[1]}"
+        room_id = room_id_for(self.user.id, receiver.id)
 
         if self.first_message:
             try:
@@ -187,8 +191,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                 )
 
                 if reply_to_obj.sender != self.user:
-                    users = sorted([self.user.id, reply_to_obj.sender.id])
-                    reply_room_id = f"chat_{users[0]}_{users[1]}"
+                    reply_room_id = room_id_for(self.user.id, reply_to_obj.sender_id)
                     meta_data = {
                         'type': 'chat',
                         'sender_id': str(self.user.id),
@@ -229,11 +232,13 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             message_type='sent'
         )
 
+        if upload:
+            message_obj.upload = upload
+            message_obj.mime_type = mime_type
+
         if attachment:
             try:
-                mime_type, atch_data = attachment.split(',')
-                file_data = base64.b64decode(atch_data)
-                message_obj.mime_type = mime_type
+                file_data, message_obj.mime_type = decode_inline(attachment, file_name, mime_type)
                 await sync_to_async(message_obj.attachment.save)(
                     f"{str(uuid.uuid1())}_{file_name}", ContentFile(file_data))
             except Exception as e:
@@ -253,7 +258,9 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             'chatroom_id': room_id,
             'chat_type': 'direct'
         }
-        notification = await create_notification(receiver, self.user.get_full_name() or self.user.email, message, meta_data)
+        notification = await create_notification(
+            receiver, self.user.get_full_name() or self.user.email, message or f"sent {file_name}", meta_data
+        )
 
         await self.channel_layer.group_send(
             f'notifications_{receiver.id}',
@@ -269,13 +276,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
-        await self.channel_layer.group_send(
-            room_id,
-            {
-                "type": "send_message",
-                "message": message_data,
-            }
-        )
+        await self.send_to_participants([self.user.id, receiver.id], message_data)
 
     async def send_message(self, event):
         message = event["message"]
@@ -287,7 +288,6 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                 message['message_type'] = 'received'
 
             if message.get('sender') and message.get('receiver'):
-                users = sorted([int(message['sender']), int(message['receiver'])])
-                message['room_id'] = f"chat_{users[0]}_{users[1]}"
+                message['room_id'] = room_id_for(message['sender'], message['receiver'])
         
         await self.send_json({"message": message})
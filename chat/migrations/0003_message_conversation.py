@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat, Greatest, Least
+
+
+def fill_conversations(apps, schema_editor):
+    Message = apps.get_model("chat", "Message")
+    Message.objects.update(conversation=Concat(
+        Cast(Least(F("sender_id"), F("receiver_id")), CharField()),
+        Value("_"),
+        Cast(Greatest(F("sender_id"), F("receiver_id")), CharField()),
+        output_field=CharField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chat_uploads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.CharField(default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(fill_conversations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['conversation', '-id'], name='chat_conversation_idx'),
+        ),
+    ]
@@ -1,9 +1,17 @@
+import uuid
+
 from django.db import models
 from rest_framework.exceptions import ValidationError
 
 from django.conf import settings
 
 
+def conversation_key(*user_ids):
+    """Canonical key of the conversation between two users: their ids sorted, e.g. "3_17"."""
+    users = sorted(int(user_id) for user_id in user_ids)
+    return f"{users[0]}_{users[1]}"
+
+
 class Chat(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chats_sent')
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chats_received')
@@ -24,12 +32,16 @@ class Message(models.Model):
     
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_messages')
+    # Same for both directions, so a conversation is one index range (see conversation_key)
+    conversation = models.CharField(max_length=50, editable=False, default='')
     message = models.TextField(default="", null=True, blank=True)
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPES, default='sent')
     timestamp = models.DateTimeField(auto_now_add=True)
     reply_to = models.ForeignKey('chat.Message', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
 
     attachment = models.FileField(null=True, blank=True)
+    # Attachments uploaded in chunks (chat.attachments); `attachment` holds older inline uploads
+    upload = models.ForeignKey('chat.ChatUpload', on_delete=models.SET_NULL, null=True, blank=True, related_name='messages')
     attachment_url = models.URLField(max_length=500, blank=True, null=True)
     attachment_name = models.CharField(max_length=255, blank=True, null=True)
     mime_type = models.CharField(max_length=300, blank=True, null=True)
@@ -43,9 +55,42 @@ class Message(models.Model):
     deleted_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # History pages: one conversation, newest id first, deleted messages left out
+            models.Index(
+                fields=['conversation', '-id'],
+                condition=models.Q(is_deleted=False),
+                name='chat_conversation_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.conversation:
+            self.conversation = conversation_key(self.sender_id, self.receiver_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'conversation'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.attachment and self.attachment.size > self.MAX_FILE_SIZE:
             raise ValidationError(f"The file size exceeds the {self.MAX_FILE_SIZE / (1024 * 1024)} MB limit.")
         super().clean()
     def __str__(self):
         return f"{self.sender.email} -- > {self.receiver.email} -- {self.message[:20]} -- {self.timestamp}"
+
+
+
+class ChatUpload(models.Model):
+    """A chat attachment uploaded in chunks (chat.attachments), then referenced by messages."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_uploads')
+    name = models.CharField(max_length=255)
+    mime_type = models.CharField(max_length=300, blank=True)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.received}/{self.size} bytes) by {self.uploader_id}"
@@ -1,6 +1,6 @@
-import base64
 from django.core.files.base import ContentFile
 from rest_framework import serializers
+from .attachments import decode_inline, describe
 from .models import Message, Chat
 
 
@@ -22,35 +22,20 @@ class MessageSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-
-        if instance.attachment and instance.attachment.path:
-            try:
-                with open(instance.attachment.path, 'rb') as file:
-                    encoded_file = base64.b64encode(file.read()).decode('utf-8')
-                    representation['attachment'] = f"{instance.mime_type},{encoded_file}"
-            except FileNotFoundError:
-                representation['attachment'] = None
-
+        # URL and metadata only; the bytes are fetched from the attachment endpoint.
+        representation['attachment'] = describe(instance, self.context.get('request'))
         return representation
 
     def get_attachment_url(self, instance):
-        request = self.context.get('request') if hasattr(self, 'context') else None
-        if instance.attachment and hasattr(instance.attachment, 'url'):
-            if request is not None:
-                return request.build_absolute_uri(instance.attachment.url)
-            return instance.attachment.url
-        return None
+        attachment = describe(instance, self.context.get('request'))
+        return attachment['url'] if attachment else None
 
     def to_internal_value(self, data):
         if 'attachment' in data and data['attachment']:
             try:
-                file_data = data['attachment']
-
-                if ',' in file_data:
-                    mime_type, file_data = file_data.split(',', 1)
-                    data['mime_type'] = mime_type.strip()
-
-                decoded_file_data = base64.b64decode(file_data)
+                decoded_file_data, data['mime_type'] = decode_inline(
+                    data['attachment'], data.get('attachment_name'), data.get('mime_type')
+                )
 
                 attachment_name = data.get('attachment_name', 'attachment')
                 file_name = f"{attachment_name}.file"
@@ -0,0 +1,10 @@
+# chat/tasks.py
+from celery import shared_task
+
+from chat.attachments import purge_stale_uploads
+
+
+@shared_task
+def purge_stale_chat_uploads():
+    """Remove chat attachment uploads that were started but never completed."""
+    return purge_stale_uploads()
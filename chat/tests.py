@@ -1,3 +1,284 @@
-from django.test import TestCase
+import base64
+import importlib
+import shutil
+import tempfile
+from datetime import timedelta
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.apps import apps
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chat.attachments import (
+    OffsetMismatch, completed_upload, decode_inline, purge_stale_uploads, start_upload, upload_path, write_chunk,
+)
+from chat.consumers import ChatConsumer, inbox_group, room_id_for
+from chat.models import ChatUpload, Message, conversation_key
+from users.models import User
+
+BODY = bytes(range(256)) * 10
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class ChatUploadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="customer@example.com", password="pass", role="customer")
+
+    def setUp(self):
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        settings = override_settings(CHAT_UPLOAD_DIR=upload_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class UploadTests(ChatUploadTestCase):
+    def test_chunks_are_written_at_the_received_offset(self):
+        upload = start_upload(self.user, "../photo.bin", len(BODY), "application/octet-stream")
+        self.assertEqual((upload.name, upload.received), ("photo.bin", 0))
+
+        upload = write_chunk(upload, 0, BODY[:1000])
+        self.assertEqual(upload.received, 1000)
+        self.assertIsNone(upload.completed_at)
+        self.assertIsNone(completed_upload(self.user, upload.pk))
+
+        upload = write_chunk(upload, 1000, BODY[1000:])
+        self.assertEqual(upload.received, len(BODY))
+        self.assertIsNotNone(upload.completed_at)
+        self.assertEqual(upload_path(upload).read_bytes(), BODY)
+        self.assertEqual(completed_upload(self.user, upload.pk), upload)
+
+    def test_out_of_order_chunk_reports_where_to_resume(self):
+        upload = write_chunk(start_upload(self.user, "photo.bin", len(BODY)), 0, BODY[:1000])
+
+        for offset in (0, 1500):
+            with self.assertRaises(OffsetMismatch) as raised:
+                write_chunk(upload, offset, BODY[offset:offset + 100])
+            self.assertEqual(raised.exception.expected, 1000)
+
+        # Resuming from the reported offset completes the file unchanged
+        upload = write_chunk(upload, raised.exception.expected, BODY[1000:])
+        self.assertEqual(upload_path(upload).read_bytes(), BODY)
+
+    def test_invalid_chunks_are_rejected(self):
+        upload = start_upload(self.user, "photo.bin", 10)
+        with self.assertRaises(ValueError):
+            write_chunk(upload, 0, b"")
+        with self.assertRaises(ValueError):
+            write_chunk(upload, 0, b"x" * 11)
+
+        upload = write_chunk(upload, 0, b"x" * 10)
+        with self.assertRaises(ValueError):
+            write_chunk(upload, 10, b"x")
+
+    def test_invalid_uploads_are_rejected(self):
+        for name, size in (("", 10), ("photo.bin", 0), ("photo.bin", "big")):
+            with self.assertRaises(ValueError):
+                start_upload(self.user, name, size)
+
+    def test_stale_uploads_are_purged(self):
+        stale = start_upload(self.user, "stale.bin", 10)
+        done = write_chunk(start_upload(self.user, "done.bin", 1), 0, b"x")
+        ChatUpload.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(purge_stale_uploads(), 1)
+        self.assertFalse(ChatUpload.objects.filter(pk=stale.pk).exists())
+        self.assertFalse(upload_path(stale).exists())
+        self.assertTrue(upload_path(done).exists())
+
+
+class UploadViewTests(ChatUploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def put_chunk(self, url, start, end):
+        return self.client.put(
+            url, BODY[start:end], content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(BODY)}",
+        )
+
+    def test_interrupted_upload_resumes_from_received_offset(self):
+        response = self.client.post(
+            "/api/chat/attachments/", {"name": "photo.bin", "size": len(BODY)}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/chat/attachments/{response.data['id']}/"
+
+        self.assertEqual(self.put_chunk(url, 0, 1000).data["received"], 1000)
+        # The client lost track and resends the first chunk
+        response = self.put_chunk(url, 0, 1000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["received"], 1000)
+        self.assertEqual(self.client.get(url).data["received"], 1000)
+
+        response = self.put_chunk(url, 1000, len(BODY))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["complete"])
+
+    def test_uploads_are_private(self):
+        upload = start_upload(self.user, "photo.bin", len(BODY))
+        other = User.objects.create_user(email="other@example.com", password="pass", role="customer")
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f"/api/chat/attachments/{upload.pk}/").status_code, 404)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ChatConsumerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create_user(email="sender@example.com", password="pass", role="customer")
+        cls.receiver = User.objects.create_user(email="receiver@example.com", password="pass", role="vendor")
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/room/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertIn("success", await communicator.receive_json_from())
+        return communicator
+
+    async def test_sessions_join_only_their_users_inbox(self):
+        layer = get_channel_layer()
+        sessions = [await self.connect(self.sender), await self.connect(self.sender), await self.connect(self.receiver)]
+        self.assertEqual(set(layer.groups), {inbox_group(self.sender.id), inbox_group(self.receiver.id)})
+        self.assertEqual(len(layer.groups[inbox_group(self.sender.id)]), 2)
+
+        for session in sessions:
+            await session.disconnect()
+        self.assertEqual(dict(layer.groups), {})
+
+    async def test_messages_reach_every_session_of_both_participants(self):
+        first, second, receiver = [
+            await self.connect(user) for user in (self.sender, self.sender, self.receiver)
+        ]
+        await first.send_json_to({"user_id": self.receiver.id, "message": "Is the chair in stock?"})
+
+        room_id = room_id_for(self.sender.id, self.receiver.id)
+        for session, message_type in ((first, "sent"), (second, "sent"), (receiver, "received")):
+            message = (await session.receive_json_from())["message"]
+            self.assertEqual(message["message"], "Is the chair in stock?")
+            self.assertEqual((message["message_type"], message["room_id"]), (message_type, room_id))
+        self.assertTrue(await Message.objects.filter(sender=self.sender, receiver=self.receiver).aexists())
+
+        for session in (first, second, receiver):
+            self.assertTrue(await session.receive_nothing())
+            await session.disconnect()
+
+    async def test_invalid_messages_are_answered_with_an_error(self):
+        session = await self.connect(self.sender)
+        for payload in ({"message": "Hi"}, {"user_id": self.sender.id, "message": "Hi"}, {"user_id": self.receiver.id}):
+            await session.send_json_to(payload)
+            self.assertIn("error", await session.receive_json_from())
+        await session.disconnect()
+
+    async def test_inline_attachments_keep_their_mime_type(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        session = await self.connect(self.sender)
+        with override_settings(MEDIA_ROOT=media_root):
+            await session.send_json_to({
+                "user_id": self.receiver.id,
+                "attachment_name": "dot.png",
+                "attachment_data": "data:image/png;base64," + base64.b64encode(b"png bytes").decode(),
+            })
+            message = (await session.receive_json_from())["message"]
+        self.assertEqual(message["attachment"]["mime_type"], "image/png")
+        self.assertEqual(await Message.objects.values_list("mime_type", flat=True).aget(), "image/png")
+        await session.disconnect()
+
+
+class DecodeInlineTests(SimpleTestCase):
+    def test_mime_type_sources(self):
+        encoded = base64.b64encode(b"bytes").decode()
+        for args, mime_type in (
+            ((f"data:image/png;base64,{encoded}", "photo.jpg", "text/plain"), "image/png"),
+            ((f"image/gif;base64,{encoded}",), "image/gif"),
+            ((encoded, "photo.jpg", "text/plain"), "text/plain"),
+            ((encoded, "photo.jpg"), "image/jpeg"),
+            ((encoded, "photo"), "application/octet-stream"),
+        ):
+            with self.subTest(args=args):
+                self.assertEqual(decode_inline(*args), (b"bytes", mime_type))
+
+    def test_invalid_base64(self):
+        with self.assertRaises(ValueError):
+            decode_inline("data:image/png;base64,not base64!")
+
+
+class MessageHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Ids whose text order differs from their numeric order
+        cls.user = User.objects.create_user(id=9, email="nine@example.com", password="pass", role="customer")
+        cls.other = User.objects.create_user(id=10, email="ten@example.com", password="pass", role="vendor")
+        cls.third = User.objects.create_user(id=100, email="hundred@example.com", password="pass", role="vendor")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/history/{self.other.id}/"
+
+    def send(self, sender, receiver, text, **fields):
+        return Message.objects.create(sender=sender, receiver=receiver, message=text, **fields)
+
+    def conversation(self, count):
+        return [
+            self.send(*((self.user, self.other) if number % 2 else (self.other, self.user)), f"m{number}").id
+            for number in range(count)
+        ]
+
+    def test_pages_walk_back_in_chronological_order(self):
+        ids = self.conversation(7)
+        self.send(self.user, self.third, "elsewhere")
+        self.send(self.user, self.other, "deleted", is_deleted=True)
+
+        response = self.client.get(self.url, {"limit": 3})
+        self.assertEqual([message["id"] for message in response.data["results"]], ids[4:])
+        self.assertTrue(response.data["has_more"])
+        self.assertEqual(response.data["next_before"], ids[4])
+
+        # Messages arriving meanwhile do not shift the older pages
+        self.conversation(2)
+        pages = []
+        url = response.data["next"]
+        while url:
+            response = self.client.get(url)
+            pages.append([message["id"] for message in response.data["results"]])
+            url = response.data["next"]
+        self.assertEqual(pages, [ids[1:4], ids[:1]])
+        self.assertFalse(response.data["has_more"])
+        self.assertIsNone(response.data["next_before"])
+
+    def test_both_participants_read_the_same_history(self):
+        ids = self.conversation(3)
+        self.client.force_authenticate(self.other)
+        response = self.client.get(f"/api/history/{self.user.id}/")
+        self.assertEqual([message["id"] for message in response.data["results"]], ids)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {"before": "latest"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"limit": "all"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/history/999/").status_code, 404)
+
+        self.conversation(3)
+        response = self.client.get(self.url, {"limit": 0})
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_conversation_key_backfill(self):
+        forward, backward = self.send(self.user, self.other, "a"), self.send(self.other, self.user, "b")
+        far = self.send(self.third, self.user, "c")
+        Message.objects.update(conversation="")
+
+        migration = importlib.import_module("chat.migrations.0003_message_conversation")
+        migration.fill_conversations(apps, None)
+
+        conversations = dict(Message.objects.values_list("id", "conversation"))
+        self.assertEqual(conversations, {forward.id: "9_10", backward.id: "9_10", far.id: "9_100"})
+        self.assertEqual(conversations[far.id], conversation_key(self.third.id, self.user.id))
 
-# Create your tests here.
@@ -17,4 +17,7 @@ urlpatterns = [
     path('history/<int:pk>/', views.ChatMessagesListView.as_view(), name='get-chat-messages'),
     path('message/<int:pk>/delete/', views.MessageDeleteView.as_view(), name='delete-message'),
     path('message/<int:pk>/edit/', views.MessageUpdateView.as_view(), name='edit-message'),
+    path('message/<int:pk>/attachment/', views.MessageAttachmentView.as_view(), name='message-attachment'),
+    path('attachments/', views.ChatUploadCreateView.as_view(), name='chat-upload-create'),
+    path('attachments/<uuid:pk>/', views.ChatUploadView.as_view(), name='chat-upload'),
 ]
\ No newline at end of file
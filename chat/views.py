@@ -1,33 +1,113 @@
 import datetime
+import re
 from django.conf import settings
 from django.db import models
 from django.db.models import Q, Case, When, F, Value
 from django.db.models.functions import Concat
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import BasePagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from common.utils import ranged_file_response
 from users.models import User
-from .models import Message, Chat
+from .attachments import CHUNK_SIZE, OffsetMismatch, attachment_file, start_upload, write_chunk
+from .models import ChatUpload, Message, Chat, conversation_key
 from .serializers import MessageSerializer, ChatSerializer
 
 from notification.utils import send_notification_to_user
 
 
+class MessageCursorPagination(BasePagination):
+    """
+    Backward pagination by message id: the newest `limit` messages, then the ones
+    before `before` (the `next_before` of the previous page). Each page is one range
+    read of the conversation index, however long the conversation; messages within a
+    page are in chronological order.
+    """
+    default_limit = 50
+    max_limit = 200
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        return min(max(limit, 1), self.max_limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        before = request.query_params.get('before')
+        if before:
+            try:
+                queryset = queryset.filter(id__lt=int(before))
+            except ValueError:
+                raise ValidationError({"before": "Must be a message id."})
+
+        page = list(queryset.order_by('-id')[:self.limit + 1])
+        self.has_more = len(page) > self.limit
+        page = page[:self.limit]
+        self.next_before = page[-1].id if self.has_more else None
+        return page[::-1]
+
+    def get_next_link(self):
+        if self.next_before is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(replace_query_param(url, 'before', self.next_before), 'limit', self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_before': self.next_before,
+            'has_more': self.has_more,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_before': {'type': 'integer', 'nullable': True},
+                'has_more': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
+
+
+def conversation_messages(user, other_id):
+    """Non-deleted messages between the two users, read through the conversation index."""
+    return Message.objects.filter(
+        conversation=conversation_key(user.id, other_id), is_deleted=False
+    ).select_related('sender', 'receiver', 'upload')
+
+
 class ChatMessagesListView(generics.ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     @swagger_auto_schema(
         operation_summary="List chat messages with a user",
-        operation_description="Returns all non-deleted messages between the authenticated user and the user with the given ID (pk)."
+        operation_description="Returns the non-deleted messages between the authenticated user and the user with the given ID (pk), "
+                              "newest page first: pass `limit` (default 50) and `before` (the previous page's `next_before`) to load older messages.",
+        manual_parameters=[
+            openapi.Parameter('before', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Only messages with a smaller id"),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Page size (max 200)"),
+        ]
     )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', None):
             return Message.objects.none()
@@ -35,11 +115,7 @@ class ChatMessagesListView(generics.ListAPIView):
         pk = self.kwargs.get('pk')
         get_object_or_404(User, pk=pk)
 
-        return Message.objects.filter(
-            Q(sender=self.request.user, receiver_id=pk) |
-            Q(sender_id=pk, receiver=self.request.user),
-            is_deleted=False
-        ).select_related('sender', 'receiver').order_by('timestamp')
+        return conversation_messages(self.request.user, pk)
 
 
 class UserChatsListView(APIView):
@@ -185,11 +261,7 @@ class MessageListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user_id = self.kwargs.get('pk')
         get_object_or_404(User, pk=user_id)
-        return Message.objects.filter(
-            Q(sender=self.request.user, receiver_id=user_id) |
-            Q(sender_id=user_id, receiver=self.request.user),
-            is_deleted=False
-        ).select_related('sender', 'receiver').order_by('timestamp')
+        return conversation_messages(self.request.user, user_id).order_by('timestamp')
 
     @swagger_auto_schema(
         operation_summary="Send a message to a user",
@@ -199,3 +271,121 @@ class MessageListCreateView(generics.ListCreateAPIView):
         receiver_id = self.kwargs.get('pk')
         receiver = get_object_or_404(User, pk=receiver_id)
         serializer.save(sender=self.request.user, receiver=receiver)
+
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+def upload_state(upload):
+    return {
+        "id": str(upload.pk),
+        "name": upload.name,
+        "mime_type": upload.mime_type,
+        "size": upload.size,
+        "received": upload.received,
+        "complete": upload.completed_at is not None,
+        "chunk_size": CHUNK_SIZE,
+    }
+
+
+class ChatUploadCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['name', 'size'],
+            properties={
+                'name': openapi.Schema(type=openapi.TYPE_STRING),
+                'size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'mime_type': openapi.Schema(type=openapi.TYPE_STRING),
+            }
+        ),
+        operation_summary="Start a chat attachment upload",
+        operation_description="Opens an upload; send the bytes with PUT to the returned upload, then send a chat message with its id as attachment_id."
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            upload = start_upload(
+                request.user, request.data.get('name'), request.data.get('size'), request.data.get('mime_type')
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload_state(upload), status=status.HTTP_201_CREATED)
+
+
+class ChatUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        return get_object_or_404(ChatUpload, pk=self.kwargs.get('pk'), uploader=self.request.user)
+
+    @swagger_auto_schema(
+        operation_summary="Chat attachment upload status",
+        operation_description="Returns how many bytes were received, i.e. the offset an interrupted upload resumes from."
+    )
+    def get(self, request, *args, **kwargs):
+        return Response(upload_state(self.get_object()), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Upload a chunk of a chat attachment",
+        operation_description="Raw bytes in the body, placed by a 'Content-Range: bytes start-end/size' header. Chunks must be sent in order."
+    )
+    def put(self, request, *args, **kwargs):
+        upload = self.get_object()
+
+        match = CONTENT_RANGE_RE.match(request.META.get('HTTP_CONTENT_RANGE', '').strip())
+        if not match:
+            return Response(
+                {"detail": "A 'Content-Range: bytes start-end/size' header is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start, end, total = match.groups()
+        start, end = int(start), int(end)
+        if total != '*' and int(total) != upload.size:
+            return Response({"detail": f"Upload size is {upload.size} bytes."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Checked before the body is read so oversized chunks are never buffered.
+        if int(request.META.get('CONTENT_LENGTH') or 0) > CHUNK_SIZE:
+            return Response(
+                {"detail": f"Chunks may be at most {CHUNK_SIZE} bytes."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        data = request.body
+        if end - start + 1 != len(data):
+            return Response({"detail": "Content-Range does not match the body length."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            upload = write_chunk(upload, start, data)
+        except OffsetMismatch as e:
+            return Response({"detail": str(e), "received": e.expected}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload_state(upload), status=status.HTTP_200_OK)
+
+
+class MessageAttachmentView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Download a message attachment",
+        operation_description="Serves the attachment to the message's sender and receiver, honouring Range requests."
+    )
+    def get(self, request, *args, **kwargs):
+        message = get_object_or_404(
+            Message.objects.select_related('upload'),
+            Q(sender=request.user) | Q(receiver=request.user),
+            pk=self.kwargs.get('pk'),
+            is_deleted=False,
+        )
+        attachment = attachment_file(message)
+        if attachment is None:
+            return Response({"detail": "This message has no attachment."}, status=status.HTTP_404_NOT_FOUND)
+        path, mime_type, name = attachment
+        try:
+            return ranged_file_response(
+                request, path, mime_type or 'application/octet-stream',
+                etag=message.upload_id or f"message-{message.pk}", filename=name,
+            )
+        except FileNotFoundError:
+            return Response({"detail": "Attachment file is missing."}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,42 @@
+# common/annotations.py
+"""
+Per-row statistics for list endpoints as correlated subqueries.
+
+Annotating a list queryset with these keeps a page to a single statement instead of
+one query per row and statistic. Each subquery is grouped on its own, so several of
+them can sit on one queryset without the row multiplication that joining several
+reverse relations for Count/Sum would cause.
+
+    User.objects.annotate(
+        products_count=related_aggregate(Product, "vendor", Count("pk")),
+        last_payment_status=latest_related(Payment, "customer", "status", default="N/A"),
+    )
+"""
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _with_default(rows, default, output_field):
+    subquery = Subquery(rows, output_field=output_field)
+    if default is None:
+        return subquery
+    output_field = output_field or subquery.output_field
+    return Coalesce(subquery, Value(default), output_field=output_field)
+
+
+def related_aggregate(model, link, aggregate, default=0, output_field=None, **filters):
+    """`aggregate` over the `model` rows whose `link` points at the outer row, `default` when there are none."""
+    rows = (
+        model.objects.filter(**{link: OuterRef("pk")}, **filters)
+        .order_by()
+        .values(link)
+        .annotate(value=aggregate)
+        .values("value")
+    )
+    return _with_default(rows, default, output_field)
+
+
+def latest_related(model, link, field, order_by="-created_at", default=None, output_field=None, **filters):
+    """`field` of the newest `model` row whose `link` points at the outer row."""
+    rows = model.objects.filter(**{link: OuterRef("pk")}, **filters).order_by(order_by).values(field)[:1]
+    return _with_default(rows, default, output_field)
@@ -0,0 +1,150 @@
+# common/loadtest.py
+"""
+Purchase-funnel load test.
+
+Each virtual user signs up, then loops through the funnel against a running API
+that is wired to the local Stripe stand-in (payments.fake_stripe):
+
+    browse -> cart_add -> create_from_cart -> checkout -> webhook
+
+`webhook` is the time from "paying" the session on the stand-in until the order
+reads back as paid, i.e. webhook delivery plus inbox processing.
+"""
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+STEPS = ["browse", "cart_add", "create_from_cart", "checkout", "webhook"]
+# The store-backed cart (orders.views.CartStoreViewSet); "/cart/" drives the CartItem API instead.
+DEFAULT_CART_PATH = "/v2/cart/"
+
+
+class StepFailed(Exception):
+    pass
+
+
+class FunnelStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.completed = 0
+
+    def record(self, step, seconds):
+        with self.lock:
+            self.latencies[step].append(seconds)
+
+    def fail(self, step):
+        with self.lock:
+            self.errors[step] += 1
+
+    def done(self):
+        with self.lock:
+            self.completed += 1
+
+    def report(self, elapsed):
+        rows = []
+        for step in STEPS:
+            samples = sorted(self.latencies[step])
+            row = {"step": step, "count": len(samples), "errors": self.errors[step], "rps": len(samples) / elapsed}
+            if samples:
+                cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+                row.update(p50=cuts[49] * 1000, p95=cuts[94] * 1000, p99=cuts[98] * 1000, max=samples[-1] * 1000)
+            rows.append(row)
+        return {"elapsed": elapsed, "funnels": self.completed, "funnels_per_sec": self.completed / elapsed, "steps": rows}
+
+
+class VirtualUser:
+    def __init__(self, base_url, stripe_base, stats, think_time=0.0, webhook_timeout=30.0,
+                 cart_path=DEFAULT_CART_PATH):
+        self.api = base_url.rstrip("/") + "/api"
+        self.stripe_base = stripe_base.rstrip("/")
+        self.cart_path = cart_path
+        self.stats = stats
+        self.think_time = think_time
+        self.webhook_timeout = webhook_timeout
+        self.http = requests.Session()
+
+    def _call(self, step, method, path, expected=(200, 201), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, f"{self.api}{path}", timeout=30, **kwargs)
+        except requests.RequestException as exc:
+            self.stats.fail(step)
+            raise StepFailed(f"{step}: {exc}")
+        if response.status_code not in expected:
+            self.stats.fail(step)
+            raise StepFailed(f"{step}: HTTP {response.status_code} {response.text[:200]}")
+        self.stats.record(step, time.perf_counter() - started)
+        return response.json() if response.content else None
+
+    def sign_up(self):
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        response = self.http.post(f"{self.api}/signup/customer/", json={
+            "email": email, "password": uuid.uuid4().hex, "full_name": "Load Test", "agree_to_terms": True,
+        }, timeout=30)
+        response.raise_for_status()
+        self.http.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    def funnel(self):
+        products = self._call("browse", "GET", "/products/")
+        results = products.get("results", products) if isinstance(products, dict) else products
+        if not results:
+            raise StepFailed("browse: no products")
+        product = random.choice(results)
+        time.sleep(self.think_time)
+
+        self._call("cart_add", "POST", self.cart_path, json={"product_id": product["id"], "quantity": 1})
+        time.sleep(self.think_time)
+
+        orders = self._call("create_from_cart", "POST", "/orders/create-from-cart/", json={"delivery_type": "standard"})
+        order = orders[0]
+        time.sleep(self.think_time)
+
+        checkout = self._call("checkout", "POST", "/checkout/checkout/", json={"order_id": order["order_id"]})
+        session_id = checkout["checkout_url"].rstrip("/").rsplit("/", 1)[-1]
+
+        started = time.perf_counter()
+        self.http.post(f"{self.stripe_base}/_fake/checkout/sessions/{session_id}/complete", timeout=30).raise_for_status()
+        while time.perf_counter() - started < self.webhook_timeout:
+            detail = self.http.get(f"{self.api}/orders/{order['id']}/", timeout=30).json()
+            if detail.get("payment_status") == "paid":
+                self.stats.record("webhook", time.perf_counter() - started)
+                self.stats.done()
+                return
+            time.sleep(0.2)
+        self.stats.fail("webhook")
+        raise StepFailed(f"webhook: order {order['order_id']} not paid after {self.webhook_timeout}s")
+
+    def run(self, deadline, iterations=None):
+        self.sign_up()
+        done = 0
+        while time.monotonic() < deadline and (iterations is None or done < iterations):
+            try:
+                self.funnel()
+            except StepFailed:
+                pass
+            done += 1
+
+
+def run_load_test(base_url, stripe_base, users, duration, iterations=None, think_time=0.0, ramp_up=0.0,
+                  cart_path=DEFAULT_CART_PATH):
+    stats = FunnelStats()
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        futures = []
+        for index in range(users):
+            user = VirtualUser(base_url, stripe_base, stats, think_time=think_time, cart_path=cart_path)
+            futures.append(pool.submit(user.run, deadline, iterations))
+            if ramp_up:
+                time.sleep(ramp_up / users)
+        for future in futures:
+            future.result()
+    return stats.report(time.perf_counter() - started)
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from common.loadtest import DEFAULT_CART_PATH, run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the purchase funnel (browse, cart add, create-from-cart, checkout, webhook) with N concurrent "
+        "virtual users against a running server that uses the local Stripe stand-in (manage.py fake_stripe)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--stripe-base", default="http://127.0.0.1:12111")
+        parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds to run")
+        parser.add_argument("--iterations", type=int, default=None, help="Funnels per user (default: until --duration)")
+        parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between steps")
+        parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which users are started")
+        parser.add_argument("--cart-path", default=DEFAULT_CART_PATH, help="Cart endpoint under /api used for cart add")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        report = run_load_test(
+            options["base_url"],
+            options["stripe_base"],
+            users=options["users"],
+            duration=options["duration"],
+            iterations=options["iterations"],
+            think_time=options["think_time"],
+            ramp_up=options["ramp_up"],
+            cart_path=options["cart_path"],
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['funnels']} funnels in {report['elapsed']:.1f}s ({report['funnels_per_sec']:.2f}/s)"
+        )
+        self.stdout.write(f"{'step':<18}{'count':>7}{'errors':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for row in report["steps"]:
+            self.stdout.write(
+                f"{row['step']:<18}{row['count']:>7}{row['errors']:>8}{row['rps']:>8.2f}"
+                f"{row.get('p50', 0):>10.1f}{row.get('p95', 0):>10.1f}{row.get('p99', 0):>10.1f}"
+            )
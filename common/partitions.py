@@ -0,0 +1,65 @@
+# common/partitions.py
+"""
+Helpers for range-partitioned tables on PostgreSQL.
+
+Partitioned tables are only created on PostgreSQL; every helper here is a
+no-op on other backends so SQLite development databases keep working with
+plain tables.
+"""
+from datetime import date
+
+from django.db import connection
+
+
+def is_postgres(conn=None):
+    return (conn or connection).vendor == "postgresql"
+
+
+def create_partitioned_table(schema_editor, model, column):
+    """
+    Replace the table created by CreateModel with one partitioned by month on
+    `column`. The model must use a composite primary key that includes `column`.
+    Intended to run from a migration right after the CreateModel operation.
+    """
+    if not is_postgres(schema_editor.connection):
+        return
+    table = model._meta.db_table
+    schema_editor.execute(f"DROP TABLE {schema_editor.quote_name(table)}")
+    sql, params = schema_editor.table_sql(model)
+    schema_editor.execute(f"{sql} PARTITION BY RANGE ({schema_editor.quote_name(column)})", params or None)
+    schema_editor.execute(
+        f"CREATE TABLE {schema_editor.quote_name(table + '_default')} "
+        f"PARTITION OF {schema_editor.quote_name(table)} DEFAULT"
+    )
+    # Index statements queued by CreateModel target the dropped table; queue them afresh.
+    schema_editor.deferred_sql = [
+        statement for statement in schema_editor.deferred_sql
+        if not (hasattr(statement, "references_table") and statement.references_table(table))
+    ]
+    schema_editor.deferred_sql.extend(schema_editor._model_indexes_sql(model))
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return date(value.year + (value.month == 12), value.month % 12 + 1, 1)
+
+
+def ensure_monthly_partitions(model, start, end):
+    """Create the monthly partitions of `model` covering [start, end] if missing."""
+    if not is_postgres():
+        return
+    table = model._meta.db_table
+    current = month_start(start)
+    with connection.cursor() as cursor:
+        while current <= end:
+            upper = next_month(current)
+            name = f"{table}_y{current.year}m{current.month:02d}"
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [current, upper],
+            )
+            current = upper
@@ -0,0 +1,85 @@
+# common/search.py
+"""
+Substring search over a denormalised, lower-cased text column.
+
+On PostgreSQL the column gets a pg_trgm GIN index, which serves LIKE '%term%'.
+On SQLite an external-content FTS5 table with the trigram tokenizer mirrors the
+column (kept in sync by triggers). Both helpers are meant to be called from
+migrations, like the ones in common.partitions.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from common.partitions import is_postgres
+
+# The trigram tokenizer needs at least three characters to match.
+MIN_TRIGRAM_LENGTH = 3
+
+
+def is_sqlite(conn=None):
+    return (conn or connection).vendor == "sqlite"
+
+
+def fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def create_text_search_index(schema_editor, model, column):
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    qn = schema_editor.quote_name
+    if is_postgres(schema_editor.connection):
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {qn(table + '_' + column + '_trgm')} "
+            f"ON {qn(table)} USING gin ({qn(column)} gin_trgm_ops)"
+        )
+    elif is_sqlite(schema_editor.connection):
+        fts = fts_table(model)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts)} USING fts5("
+            f"{column}, content='{table}', content_rowid='{pk}', tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ai')} AFTER INSERT ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}(rowid, {column}) VALUES (new.{pk}, new.{column}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ad')} AFTER DELETE ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {column}) VALUES ('delete', old.{pk}, old.{column}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_au')} AFTER UPDATE ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {column}) VALUES ('delete', old.{pk}, old.{column}); "
+            f"INSERT INTO {qn(fts)}(rowid, {column}) VALUES (new.{pk}, new.{column}); END"
+        )
+        schema_editor.execute(f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')")
+
+
+def drop_text_search_index(schema_editor, model, column):
+    table = model._meta.db_table
+    qn = schema_editor.quote_name
+    if is_postgres(schema_editor.connection):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {qn(table + '_' + column + '_trgm')}")
+    elif is_sqlite(schema_editor.connection):
+        fts = fts_table(model)
+        for suffix in ("_ai", "_ad", "_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {qn(fts + suffix)}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {qn(fts)}")
+
+
+def text_search_filter(queryset, model, column, lookup_prefix, term):
+    """
+    Filter `queryset` to rows whose document (reached through `lookup_prefix`,
+    e.g. "search_document__") contains every whitespace-separated word of `term`.
+    """
+    for word in term.lower().split():
+        if is_sqlite() and len(word) >= MIN_TRIGRAM_LENGTH:
+            fts = fts_table(model)
+            phrase = '"' + word.replace('"', '""') + '"'
+            queryset = queryset.filter(**{
+                f"{lookup_prefix}pk__in": RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [phrase])
+            })
+        else:
+            queryset = queryset.filter(**{f"{lookup_prefix}{column}__contains": word})
+    return queryset
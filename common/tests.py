@@ -1,3 +1,198 @@
-from django.test import TestCase
+import csv
+import io
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from common.utils import ranged_file_response
+from orders.enums import OrderStatus
+from orders.exports import write_order_export
+from orders.models import Order, OrderItem
+from orders.tasks import export_orders_task
+from products.models import Product
+from users.models import User
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+SHEET_NS = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+BODY = b"0123456789"
+
+
+class RangedFileResponseTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = Path(directory) / "file.bin"
+        self.path.write_bytes(BODY)
+        self.factory = RequestFactory()
+
+    def get(self, etag="v1", **headers):
+        request = self.factory.get("/file/", **headers)
+        response = ranged_file_response(request, self.path, "application/octet-stream", etag=etag)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), BODY)
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["ETag"], '"v1"')
+
+    def test_matching_etag_is_not_modified(self):
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"v1"').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"v0"').status_code, 200)
+
+    def test_ranges(self):
+        for header, content_range, expected in (
+            ("bytes=2-5", "bytes 2-5/10", b"2345"),
+            ("bytes=7-", "bytes 7-9/10", b"789"),
+            ("bytes=-3", "bytes 7-9/10", b"789"),
+            ("bytes=8-100", "bytes 8-9/10", b"89"),
+        ):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response["Content-Range"], content_range)
+                self.assertEqual(response["Content-Length"], str(len(expected)))
+                self.assertEqual(self.body(response), expected)
+
+    def test_unsatisfiable_range(self):
+        for header in ("bytes=10-", "bytes=6-2"):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_file_names_are_escaped(self):
+        for filename, as_attachment, expected in (
+            ('say "hi".txt', True, 'attachment; filename="say \\"hi\\".txt"'),
+            ("café.txt", False, "inline; filename*=utf-8''caf%C3%A9.txt"),
+        ):
+            with self.subTest(filename=filename):
+                response = ranged_file_response(
+                    self.factory.get("/file/"), self.path, "text/plain", filename=filename, as_attachment=as_attachment
+                )
+                response.close()
+                self.assertEqual(response["Content-Disposition"], expected)
+
+    def test_unusable_range_serves_the_whole_file(self):
+        for headers in (
+            {"HTTP_RANGE": "bytes=-"},
+            {"HTTP_RANGE": "bytes=0-1,4-5"},
+            {"HTTP_RANGE": "bytes=2-5", "HTTP_IF_RANGE": '"v0"'},
+        ):
+            with self.subTest(headers=headers):
+                response = self.get(**headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), BODY)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class OrderExportTests(TestCase):
+    url = "/api/vendor/order/list/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email="admin@example.com", password="pass")
+        cls.vendor = User.objects.create_user(email="vendor@example.com", password="pass", role="vendor")
+        other_vendor = User.objects.create_user(email="other@example.com", password="pass", role="vendor")
+        customer = User.objects.create_user(email="customer@example.com", password="pass", role="customer")
+        product = Product.objects.create(vendor=cls.vendor, name="Chair", price1=Decimal("10.00"), stock_quantity=5)
+        cls.pending = Order.objects.create(customer=customer, vendor=cls.vendor)
+        OrderItem.objects.create(order=cls.pending, product=product, quantity=2, price=Decimal("9.00"))
+        cls.pending.update_totals()
+        cls.delivered = Order.objects.create(
+            customer=customer, vendor=cls.vendor, order_status=OrderStatus.DELIVERED.value
+        )
+        cls.foreign = Order.objects.create(customer=customer, vendor=other_vendor)
+
+    def setUp(self):
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, ignore_errors=True)
+        settings = override_settings(EXPORT_STORAGE_DIR=export_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(f"{self.url}export/", params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def csv_order_ids(self, body):
+        rows = list(csv.reader(io.StringIO(body.decode("utf-8-sig"))))
+        self.assertEqual(rows[0][0], "Order ID")
+        return {row[0] for row in rows[1:]}
+
+    def test_status_all_means_no_filter(self):
+        response = self.client.get(self.url, {"order_status": "all", "payment_status": "all"})
+        self.assertEqual(response.data["count"], 3)
+
+        response = self.client.get(self.url, {"order_status": OrderStatus.DELIVERED.value})
+        self.assertEqual([order["order_id"] for order in response.data["results"]], [self.delivered.order_id])
+
+    def test_csv_export_applies_the_list_filters(self):
+        self.assertEqual(
+            self.csv_order_ids(self.export(order_status="all")),
+            {self.pending.order_id, self.delivered.order_id, self.foreign.order_id},
+        )
+        self.assertEqual(
+            self.csv_order_ids(self.export(order_status=OrderStatus.DELIVERED.value)), {self.delivered.order_id}
+        )
+
+    def test_export_is_scoped_to_the_vendor(self):
+        self.client.force_authenticate(self.vendor)
+        self.assertEqual(self.csv_order_ids(self.export()), {self.pending.order_id, self.delivered.order_id})
+
+    def test_xlsx_export_opens(self):
+        body = self.export(export_format="xlsx")
+
+        with zipfile.ZipFile(io.BytesIO(body)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            self.assertIn("xl/workbook.xml", workbook.namelist())
+            sheet = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+        rows = sheet.findall("x:sheetData/x:row", SHEET_NS)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0].find("x:c/x:is/x:t", SHEET_NS).text, "Order ID")
+        order_ids = {row.find("x:c/x:is/x:t", SHEET_NS).text for row in rows[1:]}
+        self.assertIn(self.pending.order_id, order_ids)
+
+    def test_invalid_format(self):
+        response = self.client.get(f"{self.url}export/", {"export_format": "pdf"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_export_is_downloaded_by_its_token(self):
+        with mock.patch.object(export_orders_task, "delay") as delay:
+            response = self.client.get(f"{self.url}export/", {"async": "true", "order_status": "pending"})
+        self.assertEqual(response.status_code, 202)
+        token = response.data["token"]
+        delay.assert_called_once_with(self.admin.pk, {"order_status": "pending"}, "csv", token)
+
+        download_url = f"{self.url}exports/{token}/"
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+
+        write_order_export(self.admin, {"order_status": "pending"}, "csv", token)
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertEqual(
+            self.csv_order_ids(b"".join(response.streaming_content)), {self.pending.order_id, self.foreign.order_id}
+        )
+        response.close()
+
+        # Exports belong to the user who requested them
+        self.client.force_authenticate(self.vendor)
+        self.assertEqual(self.client.get(download_url).status_code, 404)
@@ -0,0 +1,92 @@
+# common/utils.py
+import os
+import re
+
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header, parse_etags
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangedFileWrapper:
+    """Iterates over a byte window of an open file in fixed-size blocks."""
+
+    def __init__(self, filelike, offset=0, length=None, block_size=8192):
+        self.filelike = filelike
+        self.filelike.seek(offset)
+        self.remaining = length
+        self.block_size = block_size
+
+    def __iter__(self):
+        while self.remaining is None or self.remaining > 0:
+            size = self.block_size if self.remaining is None else min(self.block_size, self.remaining)
+            data = self.filelike.read(size)
+            if not data:
+                break
+            if self.remaining is not None:
+                self.remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.filelike.close()
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match or not etag:
+        return False
+    return "*" in if_none_match or f'"{etag}"' in parse_etags(if_none_match)
+
+
+def ranged_file_response(request, path, content_type, etag=None, filename=None, as_attachment=False):
+    """
+    Serve a file from disk honouring If-None-Match and single `Range: bytes=` requests.
+    Multi-range requests fall back to the full body.
+    """
+    quoted_etag = f'"{etag}"' if etag else None
+
+    if etag_matches(request, etag):
+        response = HttpResponse(status=304)
+        response["ETag"] = quoted_etag
+        return response
+
+    size = os.path.getsize(path)
+    start, end = 0, size - 1
+    partial = False
+
+    range_header = request.META.get("HTTP_RANGE", "").strip()
+    if_range = request.META.get("HTTP_IF_RANGE")
+    match = RANGE_RE.match(range_header) if range_header else None
+    # "bytes=-" names no range at all and is ignored like any other malformed header
+    if match and any(match.groups()) and (not if_range or if_range == quoted_etag):
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start = max(size - int(last), 0)
+        if start > end or start >= size:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        partial = True
+
+    length = end - start + 1
+    if partial:
+        response = FileResponse(
+            RangedFileWrapper(open(path, "rb"), offset=start, length=length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    if quoted_etag:
+        response["ETag"] = quoted_etag
+    if filename:
+        # Quotes and non-ASCII names are escaped or sent as filename*
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return response
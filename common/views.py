@@ -13,20 +13,35 @@ from common.serializers import (
 )
 from products.models import Product 
 from products.enums import ProductStatus
-from orders.models import Order, OrderItem, ShippingAddress
+from orders.models import ArchivedOrder, Order, OrderItem, ShippingAddress
 from orders.serializers import OrderReceiptSerializer
 from common.serializers import OrderListSerializer
 from rest_framework.permissions import BasePermission
 from users.enums import UserRole
 from payments.enums import PaymentStatusEnum
 from rest_framework import viewsets, permissions, filters
-from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.pagination import PageNumberPagination
 from django.db.models import Q
 import logging
 from common.models import Banner
 from common.serializers import BannerSerializer
 from common.permissions import IsAdminOrReadOnly
+from common.exports import EXPORT_FORMATS, stream_export
+from common.utils import ranged_file_response
+from django.http import StreamingHttpResponse
+from orders.archive import ArchiveReadMixin
+from orders.exports import (
+    scope_orders,
+    filter_orders,
+    includes_archive,
+    order_lists,
+    export_rows,
+    export_header,
+    export_filename,
+    export_path,
+    new_export_token,
+)
+from orders.tasks import export_orders_task
 
 
 
@@ -232,71 +247,66 @@ class StandardResultsSetPagination(PageNumberPagination):
 
 
 
-class OrderManagementViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderManagementViewSet(ArchiveReadMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderListSerializer
     pagination_class = StandardResultsSetPagination
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    search_fields = [
-        'order_id',
-        'customer__first_name',
-        'customer__last_name',
-        'vendor__first_name',
-        'vendor__last_name'
-    ]
-    filterset_fields = ['payment_status', 'order_status']
-
+    # Date range, status and search filters are applied by filter_orders(), shared with the export
+    filter_backends = []
 
     def get_queryset(self):
-        user = self.request.user
+        # ?search= goes through the order search document (orders.search)
+        return filter_orders(scope_orders(self.request.user), self.request.query_params)
 
-        print("role", user.role)
-
-        # Admin sees all orders
-        if getattr(user, 'role', None) == UserRole.ADMIN.value or getattr(user, 'is_staff', False):
-            queryset = Order.objects.all()
-        # Vendor sees only orders containing their products
-        elif getattr(user, 'role', None) == UserRole.VENDOR.value:
-            queryset = Order.objects.filter(items__product__vendor=user).distinct()
-        # Customer sees only their own orders
-        elif getattr(user, 'role', None) == UserRole.CUSTOMER.value:
-            queryset = Order.objects.filter(customer=user)
-        else:
-            return Order.objects.none()
-
-        # Date range filter
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date and end_date:
-            queryset = queryset.filter(order_date__date__range=[start_date, end_date])
-
-        # Payment status filter
-        payment_status = self.request.query_params.get('payment_status')
-        if payment_status:
-            if payment_status.lower() == 'none':
-                queryset = queryset.filter(payment_status__isnull=True)
-            elif payment_status.lower() != 'all':
-                queryset = queryset.filter(payment_status__iexact=payment_status)
-
-        return queryset.order_by('-order_date')
-
-
-        # Date range filter
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date and end_date:
-            queryset = queryset.filter(order_date__date__range=[start_date, end_date])
-
-        # Payment status filter
-        payment_status = self.request.query_params.get('payment_status')
-        if payment_status:
-            if payment_status.lower() == 'none':
-                queryset = queryset.filter(payment_status__isnull=True)
-            elif payment_status.lower() != 'all':
-                queryset = queryset.filter(payment_status__iexact=payment_status)
-
-        return queryset.order_by('-order_date')
+    def get_archive_queryset(self):
+        if not includes_archive(self.request.query_params):
+            return None
+        return filter_orders(scope_orders(self.request.user, ArchivedOrder), self.request.query_params)
+
+    # ---------- Export ----------
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """
+        Stream all matching orders as CSV or XLSX (?export_format=csv|xlsx).
+        With ?async=true the file is written by a Celery task and the user is
+        notified with a download link when it is ready.
+        """
+        fmt = request.query_params.get("export_format", "csv").lower()
+        if fmt not in EXPORT_FORMATS:
+            return Response({"error": "export_format must be csv or xlsx."}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = {
+            key: request.query_params.get(key)
+            for key in ("start_date", "end_date", "payment_status", "order_status", "search")
+            if request.query_params.get(key)
+        }
+
+        if request.query_params.get("async", "").lower() in ["true", "1", "yes"]:
+            token = new_export_token()
+            export_orders_task.delay(request.user.id, params, fmt, token)
+            return Response(
+                {"detail": "Export started. You will be notified when it is ready.", "token": token},
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        response = StreamingHttpResponse(
+            stream_export(fmt, export_header(), export_rows(order_lists(request.user, params))),
+            content_type=EXPORT_FORMATS[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{export_filename(fmt)}"'
+        return response
+
+    @action(detail=False, methods=["get"], url_path=r"exports/(?P<token>[0-9a-f]{32})")
+    def export_download(self, request, token=None):
+        for fmt, content_type in EXPORT_FORMATS.items():
+            path = export_path(request.user.id, token, fmt)
+            if path.exists():
+                return ranged_file_response(
+                    request, path, content_type, etag=token,
+                    filename=export_filename(fmt), as_attachment=True,
+                )
+        return Response({"detail": "Export not found or not ready yet."}, status=status.HTTP_404_NOT_FOUND)
 
 
 
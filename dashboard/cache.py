@@ -0,0 +1,144 @@
+# dashboard/cache.py
+"""
+Response cache for the dashboard endpoints.
+
+A cached view implements `compute(user, params)` instead of `get()`. Entries are
+keyed by (view, user for per-user views, the view's `cache_params`) and record the
+version of every tag the view depends on ("orders", "sales", "products:{user}", ...).
+Writes bump tag versions after commit (dashboard.signals, dashboard.rollup), so an
+entry is fresh while its tag versions match and it is younger than
+DASHBOARD_CACHE_TTL. Otherwise it is served stale and a single background refresh
+(dashboard.tasks.refresh_dashboard_view) recomputes it; entries older than
+DASHBOARD_CACHE_MAX_STALE, or missing, are computed inline.
+
+Tags without "{user}" cover everything of that kind; a write bumps both the global
+tag and the vendor's own ("orders" and "orders:42").
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+KEY_PREFIX = "dashboard"
+# A refresh that has not finished in this long may be started again
+REFRESH_LOCK_SECONDS = 60
+
+
+def fresh_ttl():
+    return int(getattr(settings, "DASHBOARD_CACHE_TTL", 300))
+
+
+def max_stale():
+    return int(getattr(settings, "DASHBOARD_CACHE_MAX_STALE", 3600))
+
+
+def _tag_key(tag):
+    return f"{KEY_PREFIX}:tag:{tag}"
+
+
+def view_path(view_class):
+    return f"{view_class.__module__}.{view_class.__qualname__}"
+
+
+# -----------------------------
+# Invalidation
+# -----------------------------
+def bump(tags):
+    versions = time.time_ns()
+    cache.set_many({_tag_key(tag): versions for tag in tags}, timeout=None)
+
+
+def invalidate(entity, vendor_ids=()):
+    """Mark `entity` changed everywhere and for these vendors, once the current transaction commits."""
+    tags = [entity] + [f"{entity}:{vendor_id}" for vendor_id in set(vendor_ids) if vendor_id]
+    transaction.on_commit(lambda: bump(tags))
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+class CachedDashboardMixin:
+    """
+    cache_tags     tags the response depends on; "{user}" is replaced with the user id
+    cache_params   query parameters that change the response (others are ignored)
+    cache_per_user one entry per user rather than one shared by all callers
+    """
+    cache_tags = ()
+    cache_params = ()
+    cache_per_user = False
+
+    def compute(self, user, params):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        params = {name: request.query_params[name] for name in self.cache_params if name in request.query_params}
+        return cached_response(self, request.user, params)
+
+
+def entry_key(view, user, params):
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    scope = user.pk if view.cache_per_user else "all"
+    return f"{KEY_PREFIX}:{view_path(type(view))}:{scope}:{digest}"
+
+
+def entry_tags(view, user):
+    return [tag.format(user=user.pk) for tag in view.cache_tags]
+
+
+def _versions(tags, found=None):
+    found = cache.get_many([_tag_key(tag) for tag in tags]) if found is None else found
+    return {tag: found.get(_tag_key(tag)) for tag in tags}
+
+
+def partial_response(data, missing):
+    """Response listing the values that could not be computed under "partial"; such responses are not cached."""
+    if not missing:
+        return Response(data)
+    response = Response({**data, "partial": sorted(missing)})
+    response.partial = True
+    return response
+
+
+def compute_entry(view, user, params, key, versions):
+    """Run the view and store its data under the tag versions read before it ran; errors are not cached."""
+    response = view.compute(user, params)
+    if response.status_code == 200 and not getattr(response, "partial", False):
+        entry = {"data": response.data, "versions": versions, "computed_at": time.time()}
+        cache.set(key, entry, timeout=max_stale())
+    return response
+
+
+def cached_response(view, user, params):
+    from dashboard.tasks import refresh_dashboard_view
+
+    key = entry_key(view, user, params)
+    tags = entry_tags(view, user)
+    found = cache.get_many([key] + [_tag_key(tag) for tag in tags])
+    versions = _versions(tags, found)
+    entry = found.get(key)
+
+    if entry is None or time.time() - entry["computed_at"] > max_stale():
+        return compute_entry(view, user, params, key, versions)
+
+    if entry["versions"] != versions or time.time() - entry["computed_at"] > fresh_ttl():
+        if cache.add(f"{key}:refreshing", 1, timeout=REFRESH_LOCK_SECONDS):
+            refresh_dashboard_view.delay(view_path(type(view)), user.pk, params)
+    return Response(entry["data"])
+
+
+def recompute(view, user, params):
+    """Compute and store one entry now, whatever state the cached copy is in."""
+    return compute_entry(view, user, params, entry_key(view, user, params), _versions(entry_tags(view, user)))
+
+
+def refresh(view_class, user, params):
+    """Recompute one entry (the background half of stale-while-revalidate)."""
+    view = view_class()
+    try:
+        recompute(view, user, params)
+    finally:
+        cache.delete(f"{entry_key(view, user, params)}:refreshing")
@@ -0,0 +1,143 @@
+# dashboard/cohorts.py
+"""
+Monthly signup cohorts for the admin retention report (/api/admin/analytics/cohorts/).
+
+`build_cohort_report()` runs as a nightly Celery job. It reads customers, orders and
+completed payments (live and archived) once as plain value rows, places every order
+and payment at (signup cohort, months since signup) and accumulates the matrices
+with NumPy:
+
+    retention            share of the cohort ordering in each month after signup
+    active_customers     customers ordering in each month after signup
+    cumulative_revenue   completed payments by the cohort up to each month
+    repeat_rate          share of the cohort with two or more orders
+
+The last MAX_COHORTS cohorts are kept. The result is stored as a CohortReport and
+the "cohorts" dashboard cache tag is bumped, so the endpoint reads one row.
+"""
+from datetime import datetime
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.cache import invalidate
+from dashboard.models import CohortReport
+from orders.archive import order_querysets, payment_querysets
+from orders.enums import OrderStatus
+from payments.enums import PaymentStatusEnum
+from users.enums import UserRole
+from users.models import User
+
+MAX_COHORTS = 24
+NOT_PURCHASES = [OrderStatus.CANCELLED.value, OrderStatus.REFUNDED.value]
+
+
+def _month(value):
+    local = timezone.localtime(value)
+    return local.year * 12 + local.month - 1
+
+
+def _label(month):
+    return f"{month // 12:04d}-{month % 12 + 1:02d}"
+
+
+def _values(querysets, *fields):
+    for queryset in querysets:
+        yield from queryset.order_by().values_list(*fields).iterator(chunk_size=5000)
+
+
+def _percentages(part, whole):
+    return np.round(np.divide(part * 100.0, whole, out=np.zeros_like(part, dtype=np.float64), where=whole > 0), 1)
+
+
+class _Cohorts:
+    """Customers of the reported cohorts, sorted by id, with their cohort row."""
+
+    def __init__(self, first_month):
+        rows = User.objects.filter(role=UserRole.CUSTOMER.value).order_by("pk").values_list("pk", "created_at")
+        ids, months = [], []
+        for pk, created_at in rows.iterator(chunk_size=5000):
+            month = _month(created_at)
+            if month >= first_month:
+                ids.append(pk)
+                months.append(month)
+        self.first_month = first_month
+        self.ids = np.array(ids, dtype=np.int64)
+        self.rows = np.array(months, dtype=np.int64) - first_month
+
+    def locate(self, customer_ids, months):
+        """Customer positions and months since signup of the events that belong to a cohort."""
+        customer_ids = np.array(customer_ids, dtype=np.int64)
+        months = np.array(months, dtype=np.int64)
+        if not len(self.ids) or not len(customer_ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(len(customer_ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, customer_ids), len(self.ids) - 1)
+        offsets = months - self.first_month - self.rows[positions]
+        found = (self.ids[positions] == customer_ids) & (offsets >= 0)
+        return positions[found], offsets[found], found
+
+
+def compute_cohorts(now=None):
+    now = now or timezone.now()
+    current = _month(now)
+    first = current - MAX_COHORTS + 1
+    start = timezone.make_aware(datetime(first // 12, first % 12 + 1, 1))
+    cohorts = _Cohorts(first)
+    shape = (MAX_COHORTS, MAX_COHORTS)
+
+    customers, months = [], []
+    for customer_id, created_at in _values(
+        [qs.exclude(order_status__in=NOT_PURCHASES) for qs in order_querysets(start, created_at__gte=start)],
+        "customer_id", "created_at",
+    ):
+        customers.append(customer_id)
+        months.append(_month(created_at))
+    positions, offsets, _ = cohorts.locate(customers, months)
+
+    # Each customer counts once per month however many orders they placed.
+    active = np.zeros(shape, dtype=np.int64)
+    customer_months = np.unique(positions * MAX_COHORTS + offsets)
+    np.add.at(active, (cohorts.rows[customer_months // MAX_COHORTS], customer_months % MAX_COHORTS), 1)
+    orders_per_customer = np.bincount(positions, minlength=len(cohorts.ids))
+    sizes = np.bincount(cohorts.rows, minlength=MAX_COHORTS)
+    repeaters = np.bincount(cohorts.rows, weights=orders_per_customer >= 2, minlength=MAX_COHORTS)
+
+    customers, months, amounts = [], [], []
+    for customer_id, created_at, amount in _values(
+        payment_querysets(start, status=PaymentStatusEnum.COMPLETED.value, created_at__gte=start),
+        "customer_id", "created_at", "amount",
+    ):
+        customers.append(customer_id)
+        months.append(_month(created_at))
+        amounts.append(float(amount))
+    positions, offsets, found = cohorts.locate(customers, months)
+    revenue = np.zeros(shape, dtype=np.float64)
+    np.add.at(revenue, (cohorts.rows[positions], offsets), np.array(amounts, dtype=np.float64)[found])
+    revenue = np.round(np.cumsum(revenue, axis=1), 2)
+
+    retention = _percentages(active, sizes[:, None])
+    repeat_rate = _percentages(repeaters, sizes)
+    report = []
+    for row in range(MAX_COHORTS):
+        # Months since signup that have started so far
+        elapsed = MAX_COHORTS - row
+        report.append({
+            "cohort": _label(first + row),
+            "customers": int(sizes[row]),
+            "repeat_rate": float(repeat_rate[row]),
+            "retention": retention[row, :elapsed].tolist(),
+            "active_customers": active[row, :elapsed].tolist(),
+            "cumulative_revenue": revenue[row, :elapsed].tolist(),
+        })
+    return {"cohorts": report}
+
+
+def build_cohort_report(now=None):
+    """Recompute the cohort report and replace the stored one."""
+    data = compute_cohorts(now)
+    with transaction.atomic():
+        report = CohortReport.objects.create(data=data)
+        CohortReport.objects.exclude(pk=report.pk).delete()
+        invalidate("cohorts")
+    return len(data["cohorts"])
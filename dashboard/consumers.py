@@ -0,0 +1,80 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from users.enums import UserRole
+from users.models import User
+
+from .live import ADMIN_ALERTS_GROUP, group_name, session_alive, session_closed, session_opened, snapshot
+from .models import Alert
+from .serializers import AlertSerializer
+
+
+class VendorDashboardConsumer(AsyncJsonWebsocketConsumer):
+    """Pushes the vendor's dashboard KPIs when they change (dashboard.live), replacing polling."""
+
+    async def connect(self):
+        await self.accept()
+        user = self.scope['user']
+        if not isinstance(user, User) or user.role != UserRole.VENDOR.value:
+            await self.send_json({"error": self.scope.get('error', 'Unauthorized')}, close=True)
+            return
+
+        self.user = user
+        self.room_group_name = group_name(user.id)
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await database_sync_to_async(session_opened)(user.id)
+
+        await self.send_json({
+            "type": "dashboard_snapshot",
+            "data": await database_sync_to_async(snapshot)(user),
+        })
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "room_group_name"):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await database_sync_to_async(session_closed)(self.user.id)
+
+    async def receive_json(self, content, **kwargs):
+        # Any message keeps the session counted (dashboard.live.SESSION_TTL)
+        if hasattr(self, "room_group_name"):
+            await database_sync_to_async(session_alive)(self.user.id)
+            if isinstance(content, dict) and content.get("type") == "ping":
+                await self.send_json({"type": "pong"})
+
+    async def dashboard_update(self, event):
+        await self.send_json({
+            "type": "dashboard_update",
+            "event": event["event"],
+            "detail": event["detail"],
+            "changed": event["changed"],
+            "data": event["data"],
+        })
+
+
+class AdminAlertsConsumer(AsyncJsonWebsocketConsumer):
+    """Sends admins the open low-stock alerts on connect, then each alert as it opens (dashboard.stock)."""
+
+    async def connect(self):
+        await self.accept()
+        user = self.scope['user']
+        if not isinstance(user, User) or not (user.is_staff or user.role == UserRole.ADMIN.value):
+            await self.send_json({"error": self.scope.get('error', 'Unauthorized')}, close=True)
+            return
+
+        self.room_group_name = ADMIN_ALERTS_GROUP
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.send_json({
+            "type": "stock_alerts_snapshot",
+            "alerts": await database_sync_to_async(self.open_alerts)(),
+        })
+
+    def open_alerts(self):
+        alerts = Alert.objects.filter(resolved_at__isnull=True).select_related("product").order_by("stock_quantity")
+        return AlertSerializer(alerts, many=True).data
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "room_group_name"):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def stock_alerts(self, event):
+        await self.send_json({"type": "stock_alerts", "alerts": event["alerts"]})
@@ -0,0 +1,344 @@
+# dashboard/cube.py
+"""
+In-memory sales cube for ad-hoc admin analytics (/api/admin/analytics/cube/).
+
+`build_cube()` reads order lines and completed payments (live and archived) once
+and stores one fact per (day, vendor, category, product, delivery_type, status)
+coordinate in NumPy arrays:
+
+    lines   order lines
+    units   quantity sold
+    gross   line totals (price x quantity)
+    paid    completed payments, split over the order's lines by line total; payments
+            without order lines (single-product payments) are booked on their product
+
+Days are order creation days (payment days for payments without lines), and each
+product counts under its primary category (dashboard.rollup.primary_categories), so
+no sale is counted twice. The arrays and their labels are written to
+SALES_CUBE_PATH; web processes load the file once per build and answer roll-up,
+slice and drill-down queries (`SalesCube.query`) from memory without touching the
+database.
+"""
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from common.models import Category
+from dashboard.rollup import UNCATEGORISED, local_day, primary_categories
+from orders.archive import order_item_querysets, order_querysets, payment_querysets
+from orders.enums import DeliveryType, OrderStatus
+from payments.enums import PaymentStatusEnum
+from products.models import Product
+from users.models import User
+
+EPOCH = date(1970, 1, 1)
+UNKNOWN = "unknown"
+DELIVERY_TYPES = [delivery.value for delivery in DeliveryType] + [UNKNOWN]
+ORDER_STATUSES = [status.value for status in OrderStatus] + [UNKNOWN]
+
+STORED_DIMENSIONS = ["day", "vendor", "category", "product", "delivery_type", "status"]
+# Rolled up from day at query time
+DERIVED_DIMENSIONS = ["week", "month", "year"]
+DIMENSIONS = STORED_DIMENSIONS + DERIVED_DIMENSIONS
+LABELLED_DIMENSIONS = {"vendor", "category", "product"}
+CUBE_FILTERS = ["vendor", "category", "product", "delivery_type", "status"]
+MEASURES = ["lines", "units", "gross", "paid"]
+AMOUNT_MEASURES = {"gross", "paid"}
+
+
+def cube_path():
+    return Path(getattr(settings, "SALES_CUBE_PATH", settings.BASE_DIR / "private" / "analytics" / "sales_cube.npz"))
+
+
+def _day_code(value):
+    return (local_day(value) - EPOCH).days
+
+
+def _cents(amount):
+    return int(round((amount or 0) * 100))
+
+
+# -----------------------------
+# Building
+# -----------------------------
+def _orders():
+    rows = [
+        (row["id"], _day_code(row["created_at"]), row["vendor_id"],
+         DELIVERY_TYPES.index(row["delivery_type"]) if row["delivery_type"] in DELIVERY_TYPES else len(DELIVERY_TYPES) - 1,
+         ORDER_STATUSES.index(row["order_status"]) if row["order_status"] in ORDER_STATUSES else len(ORDER_STATUSES) - 1)
+        for qs in order_querysets()
+        for row in qs.values("id", "created_at", "vendor_id", "delivery_type", "order_status").iterator(chunk_size=5000)
+    ]
+    orders = np.array(rows, dtype=np.int64).reshape(-1, 5)
+    return orders[np.argsort(orders[:, 0], kind="stable")]
+
+
+def _items():
+    rows = [
+        (row["order_id"], row["product_id"], row["quantity"], _cents(row["price"] * row["quantity"]))
+        for qs in order_item_querysets()
+        for row in qs.values("order_id", "product_id", "quantity", "price").iterator(chunk_size=5000)
+    ]
+    return np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+
+def _payments():
+    rows = [
+        (row["order_id"] or -1, row["vendor_id"], row["product_id"] or 0, _cents(row["amount"]),
+         _day_code(row["created_at"]))
+        for qs in payment_querysets(status=PaymentStatusEnum.COMPLETED.value)
+        for row in qs.values("order_id", "vendor_id", "product_id", "amount", "created_at").iterator(chunk_size=5000)
+    ]
+    return np.array(rows, dtype=np.int64).reshape(-1, 5)
+
+
+def _lookup(sorted_ids, ids):
+    """Positions of `ids` in `sorted_ids` and whether they were found."""
+    positions = np.searchsorted(sorted_ids, ids)
+    positions = np.minimum(positions, max(len(sorted_ids) - 1, 0))
+    found = (sorted_ids[positions] == ids) if len(sorted_ids) else np.zeros(len(ids), dtype=bool)
+    return positions, found
+
+
+def _facts(orders, items, payments):
+    """Fact rows (coordinates, measures) before aggregation."""
+    order_pos, found = _lookup(orders[:, 0], items[:, 0])
+    items, order_pos = items[found], order_pos[found]
+
+    # Completed payments per order, split over its lines by line total (evenly when all lines are free).
+    pay_pos, pay_found = _lookup(orders[:, 0], payments[:, 0])
+    has_lines = np.zeros(len(orders), dtype=bool)
+    has_lines[order_pos] = True
+    on_lines = pay_found.copy()
+    on_lines[pay_found] = has_lines[pay_pos[pay_found]]
+    order_paid = np.bincount(pay_pos[on_lines], weights=payments[on_lines, 3], minlength=len(orders))
+    order_gross = np.bincount(order_pos, weights=items[:, 3], minlength=len(orders))
+    order_lines = np.bincount(order_pos, minlength=len(orders))
+    share = np.where(
+        order_gross[order_pos] > 0,
+        items[:, 3] / np.where(order_gross[order_pos] > 0, order_gross[order_pos], 1),
+        1 / np.maximum(order_lines[order_pos], 1),
+    )
+
+    line_coords = np.column_stack([
+        orders[order_pos, 1], orders[order_pos, 2], np.zeros(len(items), dtype=np.int64), items[:, 1],
+        orders[order_pos, 3], orders[order_pos, 4],
+    ])
+    line_measures = np.column_stack([
+        np.ones(len(items)), items[:, 2], items[:, 3], order_paid[order_pos] * share,
+    ])
+
+    # Payments with no order lines count on their own product and day, with the order's attributes when known.
+    loose = payments[~on_lines]
+    loose_pos, loose_found = _lookup(orders[:, 0], loose[:, 0])
+
+    def order_attribute(column, unknown):
+        if not len(orders):
+            return np.full(len(loose), unknown, dtype=np.int64)
+        return np.where(loose_found, orders[loose_pos, column], unknown)
+
+    loose_coords = np.column_stack([
+        loose[:, 4], loose[:, 1], np.zeros(len(loose), dtype=np.int64), loose[:, 2],
+        order_attribute(3, len(DELIVERY_TYPES) - 1), order_attribute(4, len(ORDER_STATUSES) - 1),
+    ])
+    loose_measures = np.column_stack([
+        np.zeros(len(loose)), np.zeros(len(loose)), np.zeros(len(loose)), loose[:, 3],
+    ])
+
+    coords = np.vstack([line_coords, loose_coords]).astype(np.int64)
+    measures = np.vstack([line_measures, loose_measures]).astype(np.float64)
+    categories = primary_categories(set(coords[:, 3].tolist()) - {0})
+    coords[:, 2] = np.array([categories.get(product, UNCATEGORISED) for product in coords[:, 3].tolist()], dtype=np.int64)
+    return coords, measures
+
+
+def _aggregate(coords, measures):
+    if not len(coords):
+        return coords, measures
+    keys, inverse = np.unique(coords, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    totals = np.column_stack([
+        np.bincount(inverse, weights=measures[:, column], minlength=len(keys)) for column in range(measures.shape[1])
+    ])
+    return keys, totals
+
+
+def _labels(coords):
+    vendor_ids = set(coords[:, 1].tolist())
+    category_ids = set(coords[:, 2].tolist()) - {UNCATEGORISED}
+    product_ids = set(coords[:, 3].tolist()) - {0}
+    vendors = {
+        pk: f"{first} {last}".strip() or email
+        for pk, first, last, email in User.objects.filter(pk__in=vendor_ids).values_list(
+            "pk", "first_name", "last_name", "email"
+        )
+    }
+    return {
+        "vendor": {str(pk): name for pk, name in vendors.items()},
+        "category": {str(pk): name for pk, name in Category.objects.filter(pk__in=category_ids).values_list("pk", "name")},
+        "product": {str(pk): name for pk, name in Product.objects.filter(pk__in=product_ids).values_list("pk", "name")},
+    }
+
+
+def build_cube(path=None):
+    """Rebuild the cube file from the database; returns the number of cells."""
+    coords, measures = _aggregate(*_facts(_orders(), _items(), _payments()))
+    meta = {
+        "generated_at": timezone.now().isoformat(),
+        "delivery_types": DELIVERY_TYPES,
+        "statuses": ORDER_STATUSES,
+        "labels": _labels(coords),
+    }
+    arrays = {f"dim_{name}": coords[:, column] for column, name in enumerate(STORED_DIMENSIONS)}
+    for column, name in enumerate(MEASURES):
+        values = measures[:, column]
+        arrays[f"measure_{name}"] = np.rint(values).astype(np.int64)
+
+    path = Path(path or cube_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write next to the target and swap it in, so readers never see a partial file.
+    handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".npz")
+    with os.fdopen(handle, "wb") as fh:
+        np.savez_compressed(fh, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(temp_path, path)
+    return len(coords)
+
+
+# -----------------------------
+# Querying
+# -----------------------------
+class SalesCube:
+    def __init__(self, dimensions, measures, meta):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.meta = meta
+        self.size = len(dimensions["day"])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            dimensions = {name: data[f"dim_{name}"] for name in STORED_DIMENSIONS}
+            measures = {name: data[f"measure_{name}"] for name in MEASURES}
+        return cls(dimensions, measures, meta)
+
+    def _column(self, dimension):
+        days = self.dimensions["day"]
+        if dimension == "week":
+            # Monday of the week; 1970-01-01 was a Thursday.
+            return days - (days + 3) % 7
+        if dimension == "month":
+            return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        if dimension == "year":
+            return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+        return self.dimensions[dimension]
+
+    def _code(self, dimension, value):
+        if dimension in LABELLED_DIMENSIONS:
+            return int(value)
+        if dimension == "delivery_type":
+            return self.meta["delivery_types"].index(value)
+        return self.meta["statuses"].index(value)
+
+    def _render(self, dimension, code):
+        code = int(code)
+        if dimension in ("day", "week"):
+            return (EPOCH + timedelta(days=code)).isoformat()
+        if dimension == "month":
+            return f"{1970 + code // 12:04d}-{code % 12 + 1:02d}"
+        if dimension == "year":
+            return str(1970 + code)
+        if dimension == "delivery_type":
+            return self.meta["delivery_types"][code]
+        if dimension == "status":
+            return self.meta["statuses"][code]
+        return code
+
+    def _value(self, measure, total):
+        return round(float(total) / 100, 2) if measure in AMOUNT_MEASURES else int(total)
+
+    def query(self, by=(), filters=None, start=None, end=None, measures=None, sort=None, limit=None):
+        """
+        Roll up the measures by the `by` dimensions over the cells matching `filters`
+        ({dimension: [values]}) and the [start, end] day range. Drill down by adding a
+        dimension to `by` while filtering on the parent value.
+        """
+        measures = list(measures or MEASURES)
+        for name in list(by) + list(filters or {}):
+            if name not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{name}'. Use one of: {', '.join(DIMENSIONS)}.")
+        for name in measures:
+            if name not in MEASURES:
+                raise ValueError(f"Unknown measure '{name}'. Use one of: {', '.join(MEASURES)}.")
+
+        mask = np.ones(self.size, dtype=bool)
+        for name, values in (filters or {}).items():
+            if name not in CUBE_FILTERS:
+                raise ValueError(f"Cannot filter on {name}; use start/end for dates.")
+            try:
+                codes = [self._code(name, value) for value in values]
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {name}: {', '.join(map(str, values))}.")
+            mask &= np.isin(self.dimensions[name], codes)
+        if start is not None:
+            mask &= self.dimensions["day"] >= (start - EPOCH).days
+        if end is not None:
+            mask &= self.dimensions["day"] <= (end - EPOCH).days
+
+        totals = {name: self._value(name, self.measures[name][mask].sum()) for name in measures}
+        rows = []
+        if by:
+            keys, inverse = np.unique(
+                np.column_stack([self._column(name)[mask] for name in by]), axis=0, return_inverse=True
+            )
+            inverse = inverse.ravel()
+            sums = {name: np.bincount(inverse, weights=self.measures[name][mask], minlength=len(keys)) for name in measures}
+            labels = self.meta["labels"]
+            for index, key in enumerate(keys):
+                row = {}
+                for name, code in zip(by, key):
+                    row[name] = self._render(name, code)
+                    if name in LABELLED_DIMENSIONS:
+                        row[f"{name}_name"] = labels[name].get(str(int(code)), "Uncategorised" if name == "category" else None)
+                for name in measures:
+                    row[name] = self._value(name, sums[name][index])
+                rows.append(row)
+
+        if sort:
+            descending = sort.startswith("-")
+            key = sort.lstrip("-")
+            if key not in measures and key not in by:
+                raise ValueError(f"Cannot sort by '{key}'; it is not a selected measure or dimension.")
+            rows.sort(key=lambda row: row[key], reverse=descending)
+        if limit:
+            rows = rows[:limit]
+
+        return {
+            "generated_at": self.meta["generated_at"],
+            "by": list(by),
+            "measures": measures,
+            "totals": totals,
+            "rows": rows,
+        }
+
+
+_loaded = {}
+
+
+def load_cube():
+    """The current cube, loaded once per build and kept in process memory; None until the first build."""
+    path = cube_path()
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if _loaded.get("mtime") != mtime:
+        _loaded["cube"] = SalesCube.load(path)
+        _loaded["mtime"] = mtime
+    return _loaded["cube"]
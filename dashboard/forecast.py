@@ -0,0 +1,115 @@
+# dashboard/forecast.py
+"""
+Stock depletion forecasts (/api/analytics/stock-forecast/).
+
+`build_forecasts()` runs nightly over the whole catalogue in one pass: units sold per
+product and day over the last WINDOW_DAYS full days (live and archived order lines,
+cancelled and refunded lines excluded) are summed into a products x days NumPy
+matrix, and each product's daily velocity is its exponentially weighted average
+(half-life HALF_LIFE_DAYS, so recent days count more). From velocity and current
+stock:
+
+    days_remaining     stock / velocity
+    stockout_on        today + whole days remaining (empty beyond HORIZON_DAYS)
+    reorder_quantity   units to cover LEAD_TIME_DAYS + COVER_DAYS of sales, less stock
+
+The results replace the StockForecast table, so reads are indexed lookups.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from dashboard.models import StockForecast
+from dashboard.timeseries import midnight
+from orders.archive import order_item_querysets
+from orders.enums import OrderStatus
+from products.models import Product
+
+WINDOW_DAYS = 28
+HALF_LIFE_DAYS = 7
+# Days between placing a reorder and the stock arriving
+LEAD_TIME_DAYS = 7
+# Days of sales a reorder should cover once it arrives
+COVER_DAYS = 30
+# Stockout dates further out than this are left empty
+HORIZON_DAYS = 3650
+NOT_SOLD = [OrderStatus.CANCELLED.value, OrderStatus.REFUNDED.value]
+
+
+def _daily_units(start, end):
+    """(product_id, day, units) arrays for lines sold in [start, end)."""
+    product_ids, days, units = [], [], []
+    for queryset in order_item_querysets(start, created_at__gte=start, created_at__lt=end):
+        rows = (
+            queryset.exclude(status__in=NOT_SOLD)
+            .annotate(day=TruncDate("created_at"))
+            .values_list("product_id", "day")
+            .annotate(units=Sum("quantity"))
+            .order_by()
+        )
+        for product_id, day, quantity in rows:
+            product_ids.append(product_id)
+            days.append(day)
+            units.append(quantity)
+    return (
+        np.array(product_ids, dtype=np.int64),
+        np.array(days, dtype="datetime64[D]"),
+        np.array(units, dtype=np.float64),
+    )
+
+
+def velocities(product_ids, today):
+    """Weighted units sold per day for each of the sorted `product_ids`, as of the end of yesterday."""
+    matrix = np.zeros((len(product_ids), WINDOW_DAYS), dtype=np.float64)
+    sold, days, units = _daily_units(midnight(today - timedelta(days=WINDOW_DAYS)), midnight(today))
+    if len(sold) and len(product_ids):
+        rows = np.minimum(np.searchsorted(product_ids, sold), len(product_ids) - 1)
+        # Column 0 is yesterday
+        columns = (np.datetime64(today, "D") - days).astype(np.int64) - 1
+        known = (product_ids[rows] == sold) & (columns >= 0) & (columns < WINDOW_DAYS)
+        np.add.at(matrix, (rows[known], columns[known]), units[known])
+
+    weights = 0.5 ** (np.arange(WINDOW_DAYS) / HALF_LIFE_DAYS)
+    return matrix @ weights / weights.sum()
+
+
+def build_forecasts(today=None):
+    """Recompute every stocked product's forecast; returns the number of rows written."""
+    today = today or timezone.localdate()
+    products = np.array(
+        Product.objects.filter(is_stock=True).order_by("pk").values_list("pk", "vendor_id", "stock_quantity"),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    product_ids, vendor_ids, stock = products[:, 0], products[:, 1], products[:, 2].astype(np.float64)
+
+    # Rounded as stored, so the stored velocity reproduces the other columns
+    velocity = np.round(velocities(product_ids, today), 3)
+    selling = velocity > 0
+    days_remaining = np.divide(stock, velocity, out=np.full(len(stock), np.nan), where=selling)
+    reorder = np.maximum(np.ceil(velocity * (LEAD_TIME_DAYS + COVER_DAYS) - stock), 0).astype(np.int64)
+
+    computed_at = timezone.now()
+    forecasts = [
+        StockForecast(
+            product_id=product_id,
+            vendor_id=vendor_id,
+            stock_quantity=quantity,
+            daily_velocity=rate,
+            days_remaining=None if np.isnan(days) else round(days, 1),
+            stockout_on=None if np.isnan(days) or days > HORIZON_DAYS else today + timedelta(days=int(days)),
+            reorder_quantity=reorder_quantity,
+            computed_at=computed_at,
+        )
+        for product_id, vendor_id, quantity, rate, days, reorder_quantity in zip(
+            product_ids.tolist(), vendor_ids.tolist(), stock.astype(np.int64).tolist(),
+            velocity.tolist(), days_remaining.tolist(), reorder.tolist(),
+        )
+    ]
+    with transaction.atomic():
+        StockForecast.objects.all().delete()
+        StockForecast.objects.bulk_create(forecasts, batch_size=2000)
+    return len(forecasts)
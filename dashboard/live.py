@@ -0,0 +1,117 @@
+# dashboard/live.py
+"""
+Live vendor dashboard over WebSocket (dashboard.consumers.VendorDashboardConsumer).
+
+Each vendor's open sessions join the group `vendor_dashboard_<id>`. When something
+moves a KPI (new order, payment completed, low stock) a Celery task computes the
+vendor's snapshot once, stores it in the dashboard cache so REST reads are warm too,
+and sends it to the group; the channel layer fans it out to every session. Vendors
+with no open session are skipped, so events cost nothing unless someone is watching.
+The session counter expires SESSION_TTL after the last open, close or client ping, so
+sessions lost without a disconnect (a crashed worker) stop counting eventually.
+
+Newly opened low-stock alerts (dashboard.stock) also go to every open admin alerts
+session through the ADMIN_ALERTS_GROUP group.
+"""
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from dashboard.cache import cached_response, recompute
+from dashboard.views import VendorDashboardView, VendorSalesOverviewView
+
+OVERVIEW_PARAMS = {"period": "7days"}
+# Admin sessions of dashboard.consumers.AdminAlertsConsumer
+ADMIN_ALERTS_GROUP = "admin_stock_alerts"
+# Sessions open longer than this should ping to stay counted
+SESSION_TTL = 60 * 60
+
+
+def group_name(vendor_id):
+    return f"vendor_dashboard_{vendor_id}"
+
+
+def _sessions_key(vendor_id):
+    return f"dashboard:live:sessions:{vendor_id}"
+
+
+def _last_key(vendor_id):
+    return f"dashboard:live:last:{vendor_id}"
+
+
+# -----------------------------
+# Session counting
+# -----------------------------
+def session_opened(vendor_id):
+    key = _sessions_key(vendor_id)
+    cache.add(key, 0, timeout=SESSION_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between the two calls
+        cache.add(key, 1, timeout=SESSION_TTL)
+    cache.touch(key, SESSION_TTL)
+
+
+def session_alive(vendor_id):
+    cache.touch(_sessions_key(vendor_id), SESSION_TTL)
+
+
+def session_closed(vendor_id):
+    key = _sessions_key(vendor_id)
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+        else:
+            cache.touch(key, SESSION_TTL)
+    except ValueError:
+        pass
+
+
+def is_watched(vendor_id):
+    return bool(cache.get(_sessions_key(vendor_id)))
+
+
+# -----------------------------
+# Snapshots
+# -----------------------------
+def _view_data(view, user, params, fresh):
+    return (recompute if fresh else cached_response)(view, user, params).data
+
+
+def snapshot(user, fresh=False):
+    """The vendor's KPIs and 7-day sales, JSON-safe; `fresh` recomputes instead of reading the cache."""
+    data = {
+        "kpis": _view_data(VendorDashboardView(), user, {}, fresh),
+        "sales_overview": _view_data(VendorSalesOverviewView(), user, OVERVIEW_PARAMS, fresh)["sales_overview"],
+    }
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def push(user, event, detail=None):
+    """Compute the vendor's snapshot once and send it to all of their open sessions."""
+    data = snapshot(user, fresh=True)
+    last = cache.get(_last_key(user.pk)) or {}
+    changed = [key for key, value in data["kpis"].items() if last.get(key) != value]
+    cache.set(_last_key(user.pk), data["kpis"], timeout=None)
+    async_to_sync(get_channel_layer().group_send)(
+        group_name(user.pk),
+        {
+            "type": "dashboard_update",
+            "event": event,
+            "detail": detail or {},
+            "changed": changed,
+            "data": data,
+        },
+    )
+
+
+def push_admin_alerts(alerts):
+    """Send newly opened stock alerts to every open admin alerts session."""
+    async_to_sync(get_channel_layer().group_send)(
+        ADMIN_ALERTS_GROUP,
+        {"type": "stock_alerts", "alerts": alerts},
+    )
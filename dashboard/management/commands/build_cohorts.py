@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.cohorts import build_cohort_report
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin signup cohort and retention report from customers, orders and payments."
+
+    def handle(self, *args, **options):
+        cohorts = build_cohort_report()
+        self.stdout.write(self.style.SUCCESS(f"Built cohort report with {cohorts} cohorts."))
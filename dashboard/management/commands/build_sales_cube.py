@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.cube import build_cube, cube_path
+
+
+class Command(BaseCommand):
+    help = "Rebuild the in-memory analytics sales cube file from orders and payments (live and archived)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="Write the cube here instead of SALES_CUBE_PATH")
+
+    def handle(self, *args, **options):
+        path = options["path"] or cube_path()
+        cells = build_cube(path)
+        self.stdout.write(self.style.SUCCESS(f"Built sales cube with {cells} cells at {path}."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.forecast import build_forecasts
+
+
+class Command(BaseCommand):
+    help = "Recompute stock depletion forecasts for every stocked product from recent order lines."
+
+    def handle(self, *args, **options):
+        rows = build_forecasts()
+        self.stdout.write(self.style.SUCCESS(f"Built {rows} stock forecasts."))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from dashboard.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailySales rollup for a date range from orders and payments (live and archived)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", default=None, help="First day (YYYY-MM-DD; default: --days before --end)")
+        parser.add_argument("--end", default=None, help="Last day (YYYY-MM-DD; default: today)")
+        parser.add_argument("--days", type=int, default=30, help="Range length when --start is not given")
+        parser.add_argument("--vendor", type=int, action="append", default=None, help="Only this vendor id (repeatable)")
+
+    def _parse(self, value, name):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"--{name} must be a date (YYYY-MM-DD)")
+        return day
+
+    def handle(self, *args, **options):
+        end = self._parse(options["end"], "end") if options["end"] else timezone.localdate()
+        start = self._parse(options["start"], "start") if options["start"] else end - timedelta(days=options["days"] - 1)
+        if start > end:
+            raise CommandError("--start must not be after --end")
+
+        rows = rebuild(start, end, options["vendor"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt daily sales {start} - {end}: {rows} rows."))
@@ -0,0 +1,203 @@
+# dashboard/metrics.py
+"""
+Declarative dashboard KPIs.
+
+Each Metric names its model, aggregate, filter and the window it is measured
+over, plus an optional comparison window. `evaluate()` compiles every metric on
+the same model into a single `aggregate()` of `Sum/Count(filter=Q(...))` terms
+covering both windows, so a dashboard costs one query per table it reads, runs
+those queries concurrently (dashboard.parallel), and works out the percentage
+changes the same way everywhere.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.db import models
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from dashboard.models import Alert, DailySales, PayoutRequest
+from dashboard.parallel import run_queries
+from dashboard.enums import PayoutStatusEnum
+from orders.enums import OrderStatus
+from orders.models import Order
+from products.models import Product, ReturnProduct
+from users.enums import UserRole
+from users.models import User
+
+
+# -----------------------------
+# Windows: now -> (start, end), half-open; None means unbounded
+# -----------------------------
+def _start_of_day(value):
+    return timezone.make_aware(datetime.combine(timezone.localdate(value), time.min))
+
+
+def _start_of_month(value):
+    return _start_of_day(value).replace(day=1)
+
+
+def all_time(now):
+    return None, None
+
+
+def month_to_date(now):
+    return _start_of_month(now), None
+
+
+def previous_month(now):
+    start = _start_of_month(now)
+    return _start_of_month(start - timedelta(days=1)), start
+
+
+def last_days(days):
+    def window(now):
+        return _start_of_day(now) - timedelta(days=days - 1), None
+    return window
+
+
+def previous_days(days):
+    def window(now):
+        end = _start_of_day(now) - timedelta(days=days - 1)
+        return end - timedelta(days=days), end
+    return window
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+class Metric:
+    def __init__(self, key, model, aggregate=Count, field="pk", filter=None, date_field="created_at",
+                 window=all_time, compare=None):
+        self.key = key
+        self.model = model
+        self.aggregate = aggregate
+        self.field = field
+        self.filter = filter or Q()
+        self.date_field = date_field
+        self.window = window
+        self.compare = compare
+
+    def _bound(self, value):
+        field = self.model._meta.get_field(self.date_field)
+        if isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField):
+            return timezone.localdate(value)
+        return value
+
+    def expression(self, window, now):
+        start, end = window(now)
+        condition = self.filter
+        if start is not None:
+            condition &= Q(**{f"{self.date_field}__gte": self._bound(start)})
+        if end is not None:
+            condition &= Q(**{f"{self.date_field}__lt": self._bound(end)})
+        return self.aggregate(self.field, filter=condition or None)
+
+
+class Reading:
+    def __init__(self, value, previous=None):
+        self.value = value
+        self.previous = previous
+        self.change = percentage_change(value, previous) if previous is not None else None
+
+
+class Readings(dict):
+    """{key: Reading}; `missing` holds the keys whose query timed out or failed (value None)."""
+
+    def __init__(self):
+        super().__init__()
+        self.missing = []
+
+
+def percentage_change(current, previous):
+    if not previous:
+        return 0
+    return round(float((current - previous) / previous * 100), 1)
+
+
+def format_change(reading):
+    """Change as a signed percentage string, "+0%" when there is nothing to compare with."""
+    if reading.value is None:
+        return None
+    if not reading.previous:
+        return "+0%"
+    return f"{'+' if reading.change >= 0 else ''}{reading.change:.1f}%"
+
+
+def format_value(reading, pattern="{:,}"):
+    """The reading's value formatted with `pattern`, None when it could not be computed."""
+    return None if reading.value is None else pattern.format(reading.value)
+
+
+def evaluate(metrics, scope=None, now=None):
+    """
+    Evaluate metrics with one query per model, run concurrently (dashboard.parallel);
+    `scope` filters are applied to every model (e.g. {"vendor": user}). Returns
+    Readings; metrics whose query did not finish in time read None.
+    """
+    now = now or timezone.now()
+    by_model = defaultdict(list)
+    for metric in metrics:
+        by_model[metric.model].append(metric)
+
+    queries = {}
+    for model, group in by_model.items():
+        aggregates = {}
+        for metric in group:
+            aggregates[f"{metric.key}__value"] = metric.expression(metric.window, now)
+            if metric.compare:
+                aggregates[f"{metric.key}__previous"] = metric.expression(metric.compare, now)
+        queryset = model.objects.filter(**(scope or {}))
+        queries[model._meta.label] = partial(queryset.aggregate, **aggregates)
+    rows, _ = run_queries(queries)
+
+    readings = Readings()
+    for model, group in by_model.items():
+        row = rows.get(model._meta.label)
+        for metric in group:
+            if row is None:
+                readings[metric.key] = Reading(None)
+                readings.missing.append(metric.key)
+                continue
+            previous = (row[f"{metric.key}__previous"] or 0) if metric.compare else None
+            readings[metric.key] = Reading(row[f"{metric.key}__value"] or 0, previous)
+    return readings
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+VENDOR_DASHBOARD_METRICS = [
+    Metric("total_products", Product, compare=previous_month),
+    Metric("sales_this_month", DailySales, Sum, "delivered_units", date_field="day", window=month_to_date),
+    Metric("sales_week", DailySales, Sum, "delivered_units", date_field="day",
+           window=last_days(7), compare=previous_days(7)),
+    Metric("earnings_this_month", DailySales, Sum, "delivered_total", date_field="day",
+           window=month_to_date, compare=previous_month),
+    Metric("pending_orders", Order, filter=Q(order_status=OrderStatus.PENDING.value), compare=previous_days(7)),
+]
+
+VENDOR_PAYMENTS_METRICS = [
+    Metric("sales_last_month", DailySales, Sum, "payments", date_field="day", window=previous_month),
+    # Completed payments (not payouts), counted on the day they were made, as before the registry
+    Metric("paid_out", DailySales, Sum, "payment_count", date_field="day"),
+    Metric("paid_out_week", DailySales, Sum, "payment_count", date_field="day",
+           window=last_days(7), compare=previous_days(7)),
+    Metric("total_orders", DailySales, Sum, "orders", date_field="day"),
+    Metric("orders_week", DailySales, Sum, "orders", date_field="day",
+           window=last_days(7), compare=previous_days(7)),
+    Metric("pending_payout", PayoutRequest, filter=Q(status=PayoutStatusEnum.PENDING.value), compare=previous_days(7)),
+]
+
+ADMIN_DASHBOARD_METRICS = [
+    Metric("total_revenue", DailySales, Sum, "payments", date_field="day", compare=previous_month),
+    Metric("total_orders", DailySales, Sum, "orders", date_field="day", compare=previous_month),
+    Metric("new_customers", User, window=month_to_date, compare=previous_month),
+    Metric("total_sellers", User, filter=Q(role=UserRole.VENDOR.value)),
+    # All active vendors, compared with the active vendors last updated during the previous month
+    Metric("active_sellers", User, filter=Q(role=UserRole.VENDOR.value, is_active=True),
+           date_field="updated_at", compare=previous_month),
+    Metric("low_stock", Alert, filter=Q(resolved_at__isnull=True), compare=previous_month),
+    Metric("pending_returns", ReturnProduct, filter=Q(status="pending"), compare=previous_month),
+]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_alert'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category_id', models.BigIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivery', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivered_orders', models.PositiveIntegerField(default=0)),
+                ('delivered_units', models.PositiveIntegerField(default=0)),
+                ('delivered_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('payments', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['vendor', 'day'], name='dashboard_d_vendor__942e76_idx'), models.Index(fields=['category_id', 'day'], name='dashboard_d_categor_0e561a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'vendor', 'category_id'), name='unique_daily_sales_slice')],
+            },
+        ),
+    ]
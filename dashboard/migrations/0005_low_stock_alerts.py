@@ -0,0 +1,95 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# dashboard.stock.DEFAULT_THRESHOLD; no vendor has a threshold of their own yet
+DEFAULT_THRESHOLD = 10
+
+
+def resolve_legacy_alerts(apps, schema_editor):
+    """
+    Alerts from before this migration carry no vendor, stock or threshold and would all
+    count as open (and break the one-open-alert-per-product constraint); close them.
+    """
+    Alert = apps.get_model("dashboard", "Alert")
+    Alert.objects.filter(resolved_at__isnull=True).update(resolved_at=timezone.now())
+
+
+def open_stock_alerts(apps, schema_editor):
+    """Open an alert for every product already at or below the default threshold (as dashboard.stock.check_stock)."""
+    Alert = apps.get_model("dashboard", "Alert")
+    Product = apps.get_model("products", "Product")
+    products = Product.objects.filter(is_stock=True, stock_quantity__lte=DEFAULT_THRESHOLD)
+    Alert.objects.bulk_create(
+        [
+            Alert(
+                product_id=pk, vendor_id=vendor_id,
+                message=f"Low stock: {name} (Only {stock_quantity} left)",
+                stock_quantity=stock_quantity, threshold=DEFAULT_THRESHOLD,
+            )
+            for pk, vendor_id, name, stock_quantity in products.values_list("pk", "vendor_id", "name", "stock_quantity")
+        ],
+        batch_size=1000,
+    )
+
+
+def unopen_stock_alerts(apps, schema_editor):
+    apps.get_model("dashboard", "Alert").objects.filter(resolved_at__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_daily_sales'),
+        ('products', '0010_productspecifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockThreshold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='stock_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='threshold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(resolve_legacy_alerts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('resolved_at__isnull', True)), fields=['vendor', 'stock_quantity'], name='open_stock_alerts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='alert',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('product',), name='unique_open_stock_alert'),
+        ),
+        migrations.AddField(
+            model_name='stockthreshold',
+            name='vendor',
+            field=models.OneToOneField(limit_choices_to={'role': 'vendor'}, on_delete=django.db.models.deletion.CASCADE, related_name='stock_threshold', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(open_stock_alerts, unopen_stock_alerts),
+    ]
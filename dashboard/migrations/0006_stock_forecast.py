@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_low_stock_alerts'),
+        ('products', '0011_low_stock_alerts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_forecast', serialize=False, to='products.product')),
+                ('stock_quantity', models.PositiveIntegerField()),
+                ('daily_velocity', models.FloatField(default=0)),
+                ('days_remaining', models.FloatField(blank=True, null=True)),
+                ('stockout_on', models.DateField(blank=True, null=True)),
+                ('reorder_quantity', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_forecasts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'days_remaining'], name='dashboard_s_vendor__a74ad9_idx'), models.Index(fields=['days_remaining'], name='dashboard_s_days_re_cf204a_idx')],
+            },
+        ),
+    ]
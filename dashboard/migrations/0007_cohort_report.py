@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_stock_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
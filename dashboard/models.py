@@ -33,14 +33,153 @@ class PayoutRequest(BaseModel):
 
 
 class Alert(BaseModel):
+    """
+    A product at or below its vendor's low-stock threshold, raised and resolved by
+    dashboard.stock when stock is written. At most one alert per product is open.
+    """
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
         related_name="alerts",
         null=True, blank=True 
     )
+    vendor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="stock_alerts",
+        null=True, blank=True
+    )
     message = models.CharField(max_length=255)
+    stock_quantity = models.PositiveIntegerField(default=0)
+    threshold = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(default=now)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product"], condition=models.Q(resolved_at__isnull=True), name="unique_open_stock_alert"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["vendor", "stock_quantity"], condition=models.Q(resolved_at__isnull=True),
+                name="open_stock_alerts_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.message
+
+
+class StockThreshold(models.Model):
+    """A vendor's own low-stock threshold; vendors without one use dashboard.stock.DEFAULT_THRESHOLD."""
+    vendor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="stock_threshold",
+        limit_choices_to={"role": "vendor"}
+    )
+    threshold = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Low stock threshold {self.threshold} for vendor {self.vendor_id}"
+
+
+class DailySales(models.Model):
+    """
+    Daily sales rollup per vendor and category, maintained by dashboard.rollup.
+
+    Orders count on the day they were created, payments on the day they were made.
+    Order-level amounts (tax, delivery, total, payment) are split over categories in
+    proportion to the order's line totals, and order/payment counts are booked under
+    the order's largest category, so summing any column over categories gives the
+    vendor total.
+    """
+    day = models.DateField()
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_sales")
+    # A product's lowest category id; 0 for uncategorised products.
+    category_id = models.BigIntegerField(default=0)
+
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivery = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivered_orders = models.PositiveIntegerField(default=0)
+    delivered_units = models.PositiveIntegerField(default=0)
+    delivered_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveIntegerField(default=0)
+    payments = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["day"]
+        constraints = [
+            models.UniqueConstraint(fields=["day", "vendor", "category_id"], name="unique_daily_sales_slice"),
+        ]
+        indexes = [
+            models.Index(fields=["vendor", "day"]),
+            models.Index(fields=["category_id", "day"]),
+        ]
+
+    def __str__(self):
+        return f"Sales {self.day} vendor {self.vendor_id} category {self.category_id}"
+
+
+class DailySalesRefresh(models.Model):
+    """
+    A (day, vendor) slice of DailySales waiting to be rebuilt. Order and payment writes
+    mark slices here in their own transaction and dashboard.rollup.refresh_dirty_slices()
+    rebuilds each marked slice once, however many writes touched it in between.
+    """
+    day = models.DateField()
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    # Live dashboard event (dashboard.live) to push once the slice is rebuilt
+    event = models.CharField(max_length=50, blank=True, default="")
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "vendor"], name="unique_daily_sales_refresh"),
+        ]
+
+    def __str__(self):
+        return f"Refresh sales {self.day} vendor {self.vendor_id}"
+
+
+class StockForecast(models.Model):
+    """
+    Nightly stock depletion forecast for each stocked product, written by dashboard.forecast.
+
+    `daily_velocity` is units sold per day, weighted towards recent days; products with
+    no recent sales have no `days_remaining` or `stockout_on`.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="stock_forecast")
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="stock_forecasts")
+    stock_quantity = models.PositiveIntegerField()
+    daily_velocity = models.FloatField(default=0)
+    days_remaining = models.FloatField(null=True, blank=True)
+    stockout_on = models.DateField(null=True, blank=True)
+    reorder_quantity = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["vendor", "days_remaining"]),
+            models.Index(fields=["days_remaining"]),
+        ]
+
+    def __str__(self):
+        return f"Forecast for product {self.product_id}: {self.days_remaining} days left"
+
+
+class CohortReport(models.Model):
+    """Latest monthly signup cohort matrix, written by dashboard.cohorts (one row is kept)."""
+    data = models.JSONField()
+    computed_at = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"Cohort report {self.computed_at:%Y-%m-%d %H:%M}"
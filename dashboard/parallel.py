@@ -0,0 +1,78 @@
+# dashboard/parallel.py
+"""
+Independent dashboard queries run concurrently.
+
+`run_queries()` runs each callable in a worker thread, so each has its own database
+connection, from one asyncio loop. At most DASHBOARD_QUERY_CONCURRENCY run at once
+and each gets DASHBOARD_QUERY_TIMEOUT seconds; on PostgreSQL the same limit is set
+as the statement_timeout so the database abandons the query too. A dashboard then
+takes about as long as its slowest query. Queries that time out or fail are left out
+of the results and returned as `missing`, so views can answer with what they have.
+
+Inside a transaction the queries run one after another on the caller's connection,
+since other connections would not see its uncommitted writes.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def concurrency():
+    return int(getattr(settings, "DASHBOARD_QUERY_CONCURRENCY", 4))
+
+
+def query_timeout():
+    return float(getattr(settings, "DASHBOARD_QUERY_TIMEOUT", 5))
+
+
+def _run_in_worker(call, timeout):
+    postgres = connection.vendor == "postgresql"
+    try:
+        if postgres:
+            with connection.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", [int(timeout * 1000)])
+        return call()
+    finally:
+        if postgres:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("RESET statement_timeout")
+            except DatabaseError:
+                pass
+        close_old_connections()
+
+
+async def _gather(calls, limit, timeout):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(key, call):
+        async with semaphore:
+            try:
+                worker = sync_to_async(_run_in_worker, thread_sensitive=False)
+                return key, await asyncio.wait_for(worker(call, timeout), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Dashboard query %s timed out after %ss", key, timeout)
+            except Exception:
+                logger.exception("Dashboard query %s failed", key)
+            return key, _MISSING
+
+    return await asyncio.gather(*(run(key, call) for key, call in calls.items()))
+
+
+def run_queries(calls, limit=None, timeout=None):
+    """Run {key: callable} concurrently; returns ({key: result}, [keys that timed out or failed])."""
+    limit = concurrency() if limit is None else limit
+    timeout = query_timeout() if timeout is None else timeout
+    if limit <= 1 or len(calls) <= 1 or connection.in_atomic_block:
+        return {key: call() for key, call in calls.items()}, []
+
+    outcomes = async_to_sync(_gather)(calls, limit, timeout)
+    results = {key: value for key, value in outcomes if value is not _MISSING}
+    return results, [key for key, value in outcomes if value is _MISSING]
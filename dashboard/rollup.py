@@ -0,0 +1,276 @@
+# dashboard/rollup.py
+"""
+Daily sales rollup (DailySales) behind the sales dashboards.
+
+Rows are rebuilt a (day, vendor) slice at a time from the raw orders, items and
+completed payments, live and archived, so a refresh is idempotent and any date
+range can be rebuilt with `manage.py rebuild_daily_sales`. Order and payment
+changes mark the slices they touch as dirty (dashboard.signals, `queue_refresh()`)
+and a periodic task rebuilds each dirty slice once (`refresh_dirty_slices()`), so a
+burst of writes to one vendor's day costs one rebuild rather than one per write.
+The dashboards then read a handful of pre-aggregated rows instead of scanning orders.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+from dashboard.cache import invalidate
+from dashboard.models import DailySales, DailySalesRefresh
+from orders.archive import order_item_querysets, order_querysets, payment_querysets
+from orders.enums import OrderStatus
+from orders.models import Order
+from payments.enums import PaymentStatusEnum
+from payments.models import Payment
+from products.models import Product
+
+CENT = Decimal("0.01")
+UNCATEGORISED = 0
+MEASURES = [
+    "orders", "units", "gross", "tax", "delivery", "total",
+    "delivered_orders", "delivered_units", "delivered_total", "payment_count", "payments",
+]
+AMOUNT_MEASURES = {"gross", "tax", "delivery", "total", "delivered_total", "payments"}
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def local_day(value):
+    return timezone.localtime(value).date()
+
+
+def primary_categories(product_ids):
+    """Each product's lowest category id, the category its sales are booked under."""
+    through = Product.categories.through
+    return dict(
+        through.objects.filter(product_id__in=product_ids)
+        .values("product_id")
+        .annotate(category=Min("category_id"))
+        .values_list("product_id", "category")
+    )
+
+
+def allocate(amount, weights):
+    """Split `amount` over the keys of `weights` proportionally, to the cent; the largest share absorbs rounding."""
+    amount = Decimal(amount or 0)
+    total = sum(weights.values())
+    if not total:
+        return {next(iter(weights), UNCATEGORISED): amount}
+    shares = {key: (amount * weight / total).quantize(CENT, rounding=ROUND_HALF_UP) for key, weight in weights.items()}
+    largest = max(weights, key=weights.get)
+    shares[largest] += amount - sum(shares.values())
+    return shares
+
+
+def _empty_row():
+    return {measure: Decimal(0) if measure in AMOUNT_MEASURES else 0 for measure in MEASURES}
+
+
+def _values(querysets, *fields):
+    return [row for qs in querysets for row in qs.values(*fields)]
+
+
+# -----------------------------
+# Building
+# -----------------------------
+def compute_day(day, vendor_ids=None):
+    """Rollup rows for one day as {(vendor_id, category_id): {measure: value}}."""
+    start, end = day_bounds(day)
+    filters = {"vendor_id__in": vendor_ids} if vendor_ids is not None else {}
+    orders = _values(
+        order_querysets(start, created_at__gte=start, created_at__lt=end, **filters),
+        "id", "vendor_id", "order_status", "tax_amount", "delivery_fee", "total_amount",
+    )
+    payments = _values(
+        payment_querysets(
+            start, status=PaymentStatusEnum.COMPLETED.value, created_at__gte=start, created_at__lt=end, **filters
+        ),
+        "vendor_id", "order_id", "product_id", "amount",
+    )
+
+    order_ids = {order["id"] for order in orders} | {p["order_id"] for p in payments if p["order_id"]}
+    items = _values(order_item_querysets(start, order_id__in=order_ids), "order_id", "product_id", "quantity", "price")
+    categories = primary_categories(
+        {item["product_id"] for item in items} | {p["product_id"] for p in payments if p["product_id"]}
+    )
+
+    line_totals = defaultdict(lambda: defaultdict(Decimal))
+    line_units = defaultdict(lambda: defaultdict(int))
+    for item in items:
+        category = categories.get(item["product_id"], UNCATEGORISED)
+        line_totals[item["order_id"]][category] += item["price"] * item["quantity"]
+        line_units[item["order_id"]][category] += item["quantity"]
+
+    rows = defaultdict(_empty_row)
+    for order in orders:
+        weights = line_totals.get(order["id"]) or {UNCATEGORISED: Decimal(0)}
+        units = line_units.get(order["id"], {})
+        tax = allocate(order["tax_amount"], weights)
+        delivery = allocate(order["delivery_fee"], weights)
+        total = allocate(order["total_amount"], weights)
+        delivered = order["order_status"] == OrderStatus.DELIVERED.value
+        main_category = max(weights, key=weights.get)
+        for category, gross in weights.items():
+            row = rows[(order["vendor_id"], category)]
+            row["orders"] += category == main_category
+            row["units"] += units.get(category, 0)
+            row["gross"] += gross
+            row["tax"] += tax[category]
+            row["delivery"] += delivery[category]
+            row["total"] += total[category]
+            if delivered:
+                row["delivered_orders"] += category == main_category
+                row["delivered_units"] += units.get(category, 0)
+                row["delivered_total"] += total[category]
+
+    for payment in payments:
+        weights = line_totals.get(payment["order_id"]) or {
+            categories.get(payment["product_id"], UNCATEGORISED): Decimal(1)
+        }
+        main_category = max(weights, key=weights.get)
+        for category, amount in allocate(payment["amount"], weights).items():
+            row = rows[(payment["vendor_id"], category)]
+            row["payment_count"] += category == main_category
+            row["payments"] += amount
+    return rows
+
+
+def rebuild(start_day, end_day=None, vendor_ids=None):
+    """Recompute DailySales for every day in [start_day, end_day], optionally only for some vendors."""
+    end_day = end_day or start_day
+    now = timezone.now()
+    written = 0
+    touched = set()
+    day = start_day
+    while day <= end_day:
+        rows = compute_day(day, vendor_ids)
+        with transaction.atomic():
+            existing = DailySales.objects.filter(day=day)
+            if vendor_ids is not None:
+                existing = existing.filter(vendor_id__in=vendor_ids)
+            existing = list(existing.values_list("pk", "vendor_id", "category_id"))
+            DailySales.objects.filter(pk__in=[
+                pk for pk, vendor_id, category in existing if (vendor_id, category) not in rows
+            ]).delete()
+            # Upsert so two refreshes of the same slice racing each other both succeed.
+            DailySales.objects.bulk_create(
+                [
+                    DailySales(day=day, vendor_id=vendor_id, category_id=category, updated_at=now, **measures)
+                    for (vendor_id, category), measures in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["day", "vendor", "category_id"],
+                update_fields=MEASURES + ["updated_at"],
+            )
+        written += len(rows)
+        touched.update(vendor_id for _, vendor_id, _ in existing)
+        touched.update(vendor_id for vendor_id, _ in rows)
+        day += timedelta(days=1)
+    invalidate("sales", touched)
+    return written
+
+
+def refresh_slices(slices):
+    """Rebuild the given (day, vendor_id) slices; days may be dates or ISO strings (as queued by Celery)."""
+    by_day = defaultdict(set)
+    for day, vendor_id in slices:
+        by_day[datetime.fromisoformat(day).date() if isinstance(day, str) else day].add(vendor_id)
+    for day, vendor_ids in by_day.items():
+        rebuild(day, day, sorted(vendor_ids))
+    return len(by_day)
+
+
+def queue_refresh(slices, event=None):
+    """
+    Mark the slices dirty in the current transaction; with an `event`, the vendors'
+    live dashboards (dashboard.live) are pushed once the slices are rebuilt.
+    """
+    refreshes = [
+        DailySalesRefresh(day=day, vendor_id=vendor_id, event=event or "")
+        for day, vendor_id in {(day, vendor_id) for day, vendor_id in slices if vendor_id}
+    ]
+    if not refreshes:
+        return
+    if event:
+        DailySalesRefresh.objects.bulk_create(
+            refreshes, update_conflicts=True, unique_fields=["day", "vendor"], update_fields=["event"]
+        )
+    else:
+        # Keep the event of a slice that is already marked
+        DailySalesRefresh.objects.bulk_create(refreshes, ignore_conflicts=True)
+
+
+def pop_dirty_slices(count):
+    """Claim up to `count` dirty slices; a write marking one again afterwards marks it anew."""
+    with transaction.atomic():
+        refreshes = list(DailySalesRefresh.objects.select_for_update(skip_locked=True).order_by("pk")[:count])
+        DailySalesRefresh.objects.filter(pk__in=[refresh.pk for refresh in refreshes]).delete()
+    return refreshes
+
+
+def refresh_dirty_slices(batch_size=500):
+    """
+    Rebuild the dirty slices and return {vendor_id: event} for the vendors whose
+    live dashboards should be pushed. Slices whose rebuild fails are marked again.
+    """
+    events = {}
+    while True:
+        refreshes = pop_dirty_slices(batch_size)
+        if not refreshes:
+            break
+        slices = [(refresh.day, refresh.vendor_id) for refresh in refreshes]
+        try:
+            refresh_slices(slices)
+        except Exception:
+            for refresh in refreshes:
+                queue_refresh([(refresh.day, refresh.vendor_id)], refresh.event)
+            raise
+        for refresh in refreshes:
+            if refresh.event:
+                events.setdefault(refresh.vendor_id, refresh.event)
+        if len(refreshes) < batch_size:
+            break
+    return events
+
+
+def order_slices(order_ids):
+    """Slices affected by changes to these orders: their creation day and the days they were paid."""
+    slices = {(local_day(created), vendor_id) for created, vendor_id in
+              Order.objects.filter(pk__in=order_ids).values_list("created_at", "vendor_id")}
+    slices |= {(local_day(created), vendor_id) for created, vendor_id in
+               Payment.objects.filter(order_id__in=order_ids).values_list("created_at", "vendor_id")}
+    return slices
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def sales_rows(start_day=None, end_day=None, **filters):
+    queryset = DailySales.objects.filter(**filters)
+    if start_day:
+        queryset = queryset.filter(day__gte=start_day)
+    if end_day:
+        queryset = queryset.filter(day__lte=end_day)
+    return queryset
+
+
+def sales_total(measure, start_day=None, end_day=None, **filters):
+    return sales_rows(start_day, end_day, **filters).aggregate(total=Sum(measure))["total"] or 0
+
+
+def sales_by_day(measure, start_day, end_day=None, **filters):
+    rows = sales_rows(start_day, end_day, **filters).values("day").annotate(total=Sum(measure))
+    return {row["day"]: row["total"] for row in rows}
+
+
+def sales_by_month(measure, start_day, end_day=None, **filters):
+    monthly = defaultdict(Decimal)
+    for day, total in sales_by_day(measure, start_day, end_day, **filters).items():
+        monthly[day.replace(day=1)] += total
+    return dict(monthly)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .consumers import AdminAlertsConsumer, VendorDashboardConsumer
+
+websocket_urlpatterns = [
+    path('ws/vendor/dashboard/', VendorDashboardConsumer.as_asgi()),
+    path('ws/admin/alerts/', AdminAlertsConsumer.as_asgi()),
+]
@@ -4,10 +4,13 @@ from payments.models import Payment
 from payments.enums import PaymentStatusEnum
 from django.db import models
 from orders.models import Order
-from dashboard.models import Alert
+from dashboard.models import Alert, StockForecast
 from users.models import User
 from orders.models import OrderItem
 from django.db.models import Sum
+from django.db import transaction
+from payments.ledger import InsufficientBalance, get_balance, reserve_payout
+from common.annotations import related_aggregate
 
 
 class PayoutRequestSerializer(serializers.ModelSerializer):
@@ -16,22 +19,30 @@ class PayoutRequestSerializer(serializers.ModelSerializer):
         fields = ["id", "vendor", "amount", "payment_method", "note", "status", "created_at"]
         read_only_fields = ["id", "vendor", "status", "created_at"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The amount is reserved (and later posted) when the payout is created; it can't change afterwards.
+        if isinstance(self.instance, PayoutRequest):
+            self.fields["amount"].read_only = True
+
     def validate_amount(self, value):
         user = self.context["request"].user
-        total_earnings = Payment.objects.filter(
-            vendor=user,
-            status=PaymentStatusEnum.COMPLETED.value
-        ).aggregate(total=models.Sum("amount"))["total"] or 0
-
         if value <= 0:
             raise serializers.ValidationError("Amount must be greater than 0.")
-        if value > total_earnings:
-            raise serializers.ValidationError("Amount exceeds your total earnings.")
+        # Quick check for a friendly error; the authoritative one runs under lock in create().
+        if value > get_balance(user).available:
+            raise serializers.ValidationError("Amount exceeds your available balance.")
         return value
 
     def create(self, validated_data):
         validated_data["vendor"] = self.context["request"].user
-        return super().create(validated_data)
+        with transaction.atomic():
+            payout = super().create(validated_data)
+            try:
+                reserve_payout(payout)
+            except InsufficientBalance:
+                raise serializers.ValidationError({"amount": ["Amount exceeds your available balance."]})
+        return payout
 
 
 
@@ -63,7 +74,7 @@ class AlertSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Alert
-        fields = ["id", "product", "product_name", "stock_quantity", "message", "created_at"]
+        fields = ["id", "product", "product_name", "stock_quantity", "threshold", "message", "created_at"]
 
 
 
@@ -85,16 +96,29 @@ class VendorPerformanceSerializer(serializers.ModelSerializer):
         fields = ["id", "first_name", "last_name", "email", "products_sold", "revenue", "status"]
 
     def get_products_sold(self, obj):
-        return OrderItem.objects.filter(
-            order__vendor=obj,
-            status="completed"  # or use your OrderStatusEnum.COMPLETED.value
-        ).aggregate(total=Sum("quantity"))["total"] or 0
+        return obj.products_sold
 
     def get_revenue(self, obj):
-        return Payment.objects.filter(
-            vendor=obj,
-            status=PaymentStatusEnum.COMPLETED.value
-        ).aggregate(total=Sum("amount"))["total"] or 0
+        return obj.revenue
+
+    @staticmethod
+    def annotate(queryset):
+        """Units sold and completed revenue per vendor, computed in the list query (common.annotations)."""
+        return queryset.annotate(
+            products_sold=related_aggregate(OrderItem, "order__vendor", Sum("quantity"), status="completed"),
+            revenue=related_aggregate(Payment, "vendor", Sum("amount"), status=PaymentStatusEnum.COMPLETED.value),
+        )
 
     def get_status(self, obj):
         return "Active" if obj.is_active else "Inactive"
+
+
+class StockForecastSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+
+    class Meta:
+        model = StockForecast
+        fields = [
+            "product", "product_name", "vendor", "stock_quantity", "daily_velocity",
+            "days_remaining", "stockout_on", "reorder_quantity", "computed_at",
+        ]
@@ -0,0 +1,135 @@
+# dashboard/signals.py
+"""
+Mark the DailySales slices (day, vendor) an order or payment change touches for a
+refresh (dashboard.rollup), invalidate the dashboard response cache (dashboard.cache) on writes, and
+push KPI events to live vendor dashboards (dashboard.live), and keep low-stock alerts
+in step with stock writes (dashboard.stock).
+
+Before an order or payment is saved, the values the rollup reads are looked up
+once (saves whose update_fields name none of them skip the lookup), so only saves
+that change them (a new order, a status or amount change, a payment completed or
+undone) mark slices.
+
+Orders and payments get no post_delete receivers: they are only deleted in bulk by
+archiving, which leaves the rollup unchanged, and a receiver would disable fast deletes.
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from dashboard.cache import invalidate
+from dashboard.models import PayoutRequest
+from dashboard.rollup import local_day, queue_refresh
+from dashboard.stock import check_stock
+from orders.models import Order
+from payments.enums import PaymentStatusEnum
+from payments.models import Payment
+from products.models import STOCK_FIELDS, Product, ReturnProduct
+from products.signals import stock_changed
+
+# User attributes the admin stats read besides the signup date (new customers, active sellers)
+USER_STATS_FIELDS = {"role", "is_active"}
+# Attributes dashboard.rollup reads from orders and payments
+ORDER_ROLLUP_FIELDS = ("vendor_id", "created_at", "order_status", "tax_amount", "delivery_fee", "total_amount", "item_count")
+PAYMENT_ROLLUP_FIELDS = ("vendor_id", "created_at", "status", "amount", "order_id", "product_id")
+
+
+def _stored_state(sender, instance, fields, update_fields):
+    """The rollup values of the row as stored before this save; None for a new row."""
+    if instance._state.adding or instance.pk is None:
+        return None
+    if update_fields is not None and not {sender._meta.get_field(field).name for field in fields} & set(update_fields):
+        return _rollup_state(instance, fields)
+    row = sender._default_manager.filter(pk=instance.pk).values_list(*fields).first()
+    return tuple(row) if row else None
+
+
+def _rollup_state(instance, fields, stored=None):
+    # __dict__ so that deferred fields are not loaded; they keep their stored value
+    return tuple(
+        instance.__dict__[field] if field in instance.__dict__ else (stored[index] if stored else None)
+        for index, field in enumerate(fields)
+    )
+
+
+def _slices(*states):
+    return {(local_day(state[1]), state[0]) for state in states if state[0] and state[1]}
+
+
+@receiver(pre_save, sender=Order, dispatch_uid="dashboard_daily_sales_order_saving")
+def order_saving(sender, instance, update_fields=None, **kwargs):
+    instance._rollup_state = _stored_state(sender, instance, ORDER_ROLLUP_FIELDS, update_fields)
+
+
+@receiver(pre_save, sender=Payment, dispatch_uid="dashboard_daily_sales_payment_saving")
+def payment_saving(sender, instance, update_fields=None, **kwargs):
+    instance._rollup_state = _stored_state(sender, instance, PAYMENT_ROLLUP_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Order, dispatch_uid="dashboard_daily_sales_order")
+def order_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, "_rollup_state", None)
+    new = _rollup_state(instance, ORDER_ROLLUP_FIELDS, old)
+    if created or old is None:
+        queue_refresh(_slices(new), event="order_created" if created else None)
+    elif old != new:
+        queue_refresh(_slices(old, new))
+    invalidate("orders", [instance.vendor_id])
+
+
+@receiver(post_save, sender=Payment, dispatch_uid="dashboard_daily_sales_payment")
+def payment_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, "_rollup_state", None)
+    new = _rollup_state(instance, PAYMENT_ROLLUP_FIELDS, old)
+    # Only completed payments are counted, so other changes leave the rollup as it is.
+    was_completed = old is not None and old[2] == PaymentStatusEnum.COMPLETED.value
+    completed = new[2] == PaymentStatusEnum.COMPLETED.value
+    if (was_completed or completed) and (old is None or old != new):
+        queue_refresh(
+            _slices(new) if old is None else _slices(old, new),
+            # Pushed once, when the payment becomes completed, not on later saves
+            event="payment_completed" if completed and not was_completed else None,
+        )
+    invalidate("payments", [instance.vendor_id])
+
+
+@receiver(post_save, sender=Product, dispatch_uid="dashboard_cache_product_saved")
+@receiver(post_delete, sender=Product, dispatch_uid="dashboard_cache_product_deleted")
+def product_changed(sender, instance, **kwargs):
+    invalidate("products", [instance.vendor_id])
+
+
+@receiver(post_save, sender=Product, dispatch_uid="dashboard_stock_alerts_saved")
+def product_stock_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not STOCK_FIELDS & set(update_fields):
+        return
+    check_stock(product_ids=[instance.pk])
+
+
+@receiver(stock_changed, sender=Product, dispatch_uid="dashboard_stock_alerts_bulk")
+def product_stock_changed(sender, product_ids, **kwargs):
+    check_stock(product_ids=product_ids)
+
+
+@receiver(post_save, sender=PayoutRequest, dispatch_uid="dashboard_cache_payout_saved")
+@receiver(post_delete, sender=PayoutRequest, dispatch_uid="dashboard_cache_payout_deleted")
+def payout_changed(sender, instance, **kwargs):
+    invalidate("payouts", [instance.vendor_id])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="dashboard_cache_user_saved")
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only write last_login and leave the stats as they are
+    if created or update_fields is None or USER_STATS_FIELDS & set(update_fields):
+        invalidate("users")
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid="dashboard_cache_user_deleted")
+def user_deleted(sender, instance, **kwargs):
+    invalidate("users")
+
+
+@receiver(post_save, sender=ReturnProduct, dispatch_uid="dashboard_cache_return_saved")
+@receiver(post_delete, sender=ReturnProduct, dispatch_uid="dashboard_cache_return_deleted")
+def return_changed(sender, instance, **kwargs):
+    invalidate("returns")
@@ -0,0 +1,108 @@
+# dashboard/stock.py
+"""
+Low-stock alerts, raised when stock is written rather than scanned for on reads.
+
+`check_stock()` compares products with their vendor's threshold (StockThreshold,
+DEFAULT_THRESHOLD when unset) and keeps one open Alert per low product: new low
+products open an alert, restocked ones resolve theirs, and open alerts follow the
+current stock. It runs on Product saves and bulk stock updates (dashboard.signals),
+when a vendor changes their threshold, and nightly for writes made without either.
+
+Candidates are read through the partial index on products at or below
+LOW_STOCK_CEILING, and newly opened alerts are pushed to the vendor's live dashboard
+and to admins (dashboard.live) once the transaction commits.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.cache import invalidate
+from dashboard.models import Alert, StockThreshold
+from products.models import LOW_STOCK_CEILING, Product
+
+# Threshold for vendors who have not set their own (same as the admin stats before alerts were stored)
+DEFAULT_THRESHOLD = 10
+
+
+def message(name, stock_quantity):
+    return f"Low stock: {name} (Only {stock_quantity} left)"
+
+
+def thresholds(vendor_ids):
+    limits = dict(StockThreshold.objects.filter(vendor_id__in=vendor_ids).values_list("vendor_id", "threshold"))
+    return {vendor_id: limits.get(vendor_id, DEFAULT_THRESHOLD) for vendor_id in vendor_ids}
+
+
+def set_threshold(vendor, threshold):
+    """Store the vendor's threshold and re-check their products against it."""
+    if not 0 <= threshold <= LOW_STOCK_CEILING:
+        raise ValueError(f"Threshold must be between 0 and {LOW_STOCK_CEILING}.")
+    StockThreshold.objects.update_or_create(vendor=vendor, defaults={"threshold": threshold})
+    return check_stock(vendor_ids=[vendor.pk])
+
+
+def check_stock(product_ids=None, vendor_ids=None):
+    """
+    Open, update and resolve the alerts of these products (or these vendors' products,
+    or every product when neither is given). Returns the number of alerts opened.
+    """
+    products = Product.objects.filter(is_stock=True, stock_quantity__lte=LOW_STOCK_CEILING)
+    alerts = Alert.objects.filter(resolved_at__isnull=True)
+    if product_ids is not None:
+        products, alerts = products.filter(pk__in=product_ids), alerts.filter(product_id__in=product_ids)
+    if vendor_ids is not None:
+        products, alerts = products.filter(vendor_id__in=vendor_ids), alerts.filter(vendor_id__in=vendor_ids)
+
+    candidates = list(products.values_list("pk", "vendor_id", "name", "stock_quantity"))
+    limits = thresholds({vendor_id for _, vendor_id, _, _ in candidates})
+    low = {
+        pk: (vendor_id, name, stock_quantity, limits[vendor_id])
+        for pk, vendor_id, name, stock_quantity in candidates
+        if stock_quantity <= limits[vendor_id]
+    }
+
+    open_alerts = {alert.product_id: alert for alert in alerts}
+    opened = [
+        Alert(
+            product_id=pk, vendor_id=vendor_id, message=message(name, stock_quantity),
+            stock_quantity=stock_quantity, threshold=threshold,
+        )
+        for pk, (vendor_id, name, stock_quantity, threshold) in low.items()
+        if pk not in open_alerts
+    ]
+    moved = []
+    for pk, alert in open_alerts.items():
+        if pk in low:
+            vendor_id, name, stock_quantity, threshold = low[pk]
+            if (alert.stock_quantity, alert.threshold) != (stock_quantity, threshold):
+                alert.stock_quantity, alert.threshold = stock_quantity, threshold
+                alert.message, alert.updated_at = message(name, stock_quantity), timezone.now()
+                moved.append(alert)
+    resolved = [alert for pk, alert in open_alerts.items() if pk not in low]
+
+    # The open-alert constraint drops duplicates raised by a concurrent check.
+    Alert.objects.bulk_create(opened, ignore_conflicts=True)
+    Alert.objects.bulk_update(moved, ["stock_quantity", "threshold", "message", "updated_at"])
+    Alert.objects.filter(pk__in=[alert.pk for alert in resolved]).update(resolved_at=timezone.now())
+
+    changed_vendors = {alert.vendor_id for alert in opened + moved + resolved}
+    if changed_vendors:
+        invalidate("alerts", changed_vendors)
+    if opened:
+        _push(opened)
+    return len(opened)
+
+
+def _push(alerts):
+    from dashboard.tasks import push_stock_alerts
+
+    details = [
+        {
+            "product_id": alert.product_id,
+            "vendor_id": alert.vendor_id,
+            "message": alert.message,
+            "stock_quantity": alert.stock_quantity,
+            "threshold": alert.threshold,
+        }
+        for alert in alerts
+    ]
+    transaction.on_commit(lambda: push_stock_alerts.delay(details))
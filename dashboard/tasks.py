@@ -0,0 +1,83 @@
+# dashboard/tasks.py
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from dashboard.cache import refresh
+from dashboard.cohorts import build_cohort_report
+from dashboard.cube import build_cube
+from dashboard.forecast import build_forecasts
+from dashboard.live import is_watched, push, push_admin_alerts
+from dashboard.rollup import rebuild, refresh_dirty_slices
+from dashboard.stock import check_stock
+from users.models import User
+
+
+@shared_task
+def refresh_daily_sales():
+    """Rebuild the DailySales slices marked dirty since the last run, then push their events to live dashboards."""
+    events = refresh_dirty_slices()
+    for vendor_id, event in events.items():
+        push_vendor_dashboard(vendor_id, event)
+    return len(events)
+
+
+@shared_task
+def rebuild_recent_daily_sales(days=3):
+    """Nightly safety net for changes made without signals (bulk updates, raw SQL)."""
+    today = timezone.localdate()
+    return rebuild(today - timedelta(days=days - 1), today)
+
+
+@shared_task
+def refresh_dashboard_view(view_path, user_id, params):
+    """Recompute a stale dashboard cache entry (dashboard.cache)."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        refresh(import_string(view_path), user, params)
+
+
+@shared_task
+def push_vendor_dashboard(vendor_id, event, detail=None):
+    """Send a fresh KPI snapshot to the vendor's open dashboards, if any (dashboard.live)."""
+    if not is_watched(vendor_id):
+        return False
+    user = User.objects.filter(pk=vendor_id).first()
+    if user is None:
+        return False
+    push(user, event, detail)
+    return True
+
+
+@shared_task
+def push_stock_alerts(alerts):
+    """Send newly opened low-stock alerts to admins and to each vendor's live dashboard."""
+    push_admin_alerts(alerts)
+    for alert in alerts:
+        push_vendor_dashboard(alert["vendor_id"], "low_stock", alert)
+
+
+@shared_task
+def sweep_stock_alerts():
+    """Nightly safety net for stock written without signals (raw SQL, imports)."""
+    return check_stock()
+
+
+@shared_task
+def build_sales_cube():
+    """Rebuild the analytics sales cube file (dashboard.cube)."""
+    return build_cube()
+
+
+@shared_task
+def build_stock_forecasts():
+    """Recompute stock depletion forecasts for the whole catalogue (dashboard.forecast)."""
+    return build_forecasts()
+
+
+@shared_task
+def build_cohorts():
+    """Recompute the admin signup cohort and retention report (dashboard.cohorts)."""
+    return build_cohort_report()
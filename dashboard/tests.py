@@ -1,3 +1,729 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from decimal import Decimal
+from unittest import mock
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dashboard import cache as dashboard_cache
+from dashboard import live
+from dashboard.cohorts import MAX_COHORTS, build_cohort_report, compute_cohorts
+from dashboard.consumers import VendorDashboardConsumer
+from dashboard.cube import SalesCube, build_cube
+from dashboard.forecast import COVER_DAYS, HALF_LIFE_DAYS, LEAD_TIME_DAYS, WINDOW_DAYS, build_forecasts
+from dashboard.metrics import VENDOR_PAYMENTS_METRICS, evaluate, month_to_date
+from dashboard.models import Alert, CohortReport, DailySales, DailySalesRefresh, StockForecast
+from dashboard.parallel import run_queries
+from dashboard.rollup import local_day, queue_refresh, rebuild, refresh_dirty_slices
+from dashboard.stock import check_stock, set_threshold
+from dashboard.tasks import push_stock_alerts, push_vendor_dashboard, refresh_dashboard_view
+from dashboard.timeseries import apply_transform, get_timezone, midnight, time_series
+from dashboard.views import DashboardStatsView
+from orders.enums import OrderStatus
+from orders.models import Order, OrderItem
+from payments.enums import PaymentStatusEnum
+from payments.models import Payment
+from products.models import Product, ReturnProduct
+from users.models import User
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class DashboardTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email="vendor@example.com", password="pass", role="vendor")
+        cls.customer = User.objects.create_user(email="customer@example.com", password="pass", role="customer")
+        cls.product = Product.objects.create(
+            vendor=cls.vendor, name="Chair", price1=Decimal("10.00"), stock_quantity=5, status="approved",
+        )
+
+    def create_order(self, quantity=2, price="10.00", **fields):
+        order = Order.objects.create(customer=self.customer, vendor=self.vendor, **fields)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=Decimal(price))
+        return order.update_totals(tax_rate=0, delivery_fee_override=Decimal("0.00"))
+
+    def pay(self, order, status=PaymentStatusEnum.COMPLETED.value):
+        return Payment.objects.create(
+            order=order, customer=self.customer, vendor=self.vendor, amount=order.total_amount,
+            payment_method="stripe", status=status,
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def today(self):
+        return local_day(timezone.now())
+
+    def sales(self):
+        return DailySales.objects.filter(vendor=self.vendor, day=self.today()).values(
+            "orders", "units", "total", "delivered_orders", "payment_count", "payments"
+        ).first()
+
+
+class RollupTests(DashboardTestCase):
+    def test_writes_are_rolled_up_by_the_refresh(self):
+        order = self.create_order()
+        self.pay(order)
+        self.assertFalse(DailySales.objects.exists())
+
+        # One push per vendor, with the latest event
+        self.assertEqual(refresh_dirty_slices(), {self.vendor.pk: "payment_completed"})
+        self.assertEqual(self.sales(), {
+            "orders": 1, "units": 2, "total": Decimal("20.00"), "delivered_orders": 0,
+            "payment_count": 1, "payments": Decimal("20.00"),
+        })
+
+        order.order_status = OrderStatus.DELIVERED.value
+        order.save()
+        self.assertEqual(refresh_dirty_slices(), {})
+        self.assertEqual(self.sales()["delivered_orders"], 1)
+
+    def test_writes_to_one_slice_are_coalesced(self):
+        for _ in range(3):
+            self.create_order()
+        self.assertEqual(DailySalesRefresh.objects.count(), 1)
+        self.assertEqual(DailySalesRefresh.objects.get().event, "order_created")
+
+        # A later plain mark keeps the pending event
+        queue_refresh([(self.today(), self.vendor.pk)])
+        self.assertEqual(DailySalesRefresh.objects.get().event, "order_created")
+
+        refresh_dirty_slices()
+        self.assertFalse(DailySalesRefresh.objects.exists())
+        self.assertEqual(self.sales()["orders"], 3)
+
+    def test_saves_that_leave_the_rollup_alone_mark_nothing(self):
+        order = self.create_order()
+        payment = self.pay(order, status=PaymentStatusEnum.PENDING.value)
+        refresh_dirty_slices()
+
+        order.notes = "Leave at the door"
+        order.save()
+        order.save(update_fields=["notes"])
+        payment.payment_method = "card"
+        payment.save()
+        self.assertFalse(DailySalesRefresh.objects.exists())
+
+        # Loaded without the rollup fields: saving does not mistake them for changes
+        Order.objects.only("id", "notes").get(pk=order.pk).save()
+        self.assertFalse(DailySalesRefresh.objects.exists())
+
+    def test_payment_completed_event_is_queued_once(self):
+        payment = self.pay(self.create_order(), status=PaymentStatusEnum.PENDING.value)
+        refresh_dirty_slices()
+
+        payment.status = PaymentStatusEnum.COMPLETED.value
+        payment.save()
+        self.assertEqual(refresh_dirty_slices(), {self.vendor.pk: "payment_completed"})
+        self.assertEqual(self.sales()["payment_count"], 1)
+
+        payment.amount = Decimal("5.00")
+        payment.save()
+        self.assertEqual(refresh_dirty_slices(), {})
+        self.assertEqual(self.sales()["payments"], Decimal("5.00"))
+
+
+class MetricsTests(DashboardTestCase):
+    def test_vendor_payment_stats(self):
+        completed, pending = PaymentStatusEnum.COMPLETED.value, PaymentStatusEnum.PENDING.value
+        for status in (completed, completed, pending):
+            self.pay(self.create_order(), status=status)
+        refresh_dirty_slices()
+
+        with self.assertNumQueries(2):
+            metrics = evaluate(VENDOR_PAYMENTS_METRICS, scope={"vendor": self.vendor})
+        self.assertEqual(metrics["sales_last_month"].value, 0)
+
+        data = self.client_for(self.vendor).get("/api/vendor/payments-stats/").data
+        # paid_out counts completed payments
+        self.assertEqual(data["paid_out"]["count"], 2)
+        self.assertEqual(data["total_orders"]["count"], 3)
+        self.assertEqual(data["total_sales"]["amount"], Decimal("40.00"))
+        self.assertEqual(data["pending_payout"]["count"], 0)
+
+    def test_admin_stats(self):
+        admin = User.objects.create_superuser(email="admin@example.com", password="pass")
+        seller = User.objects.create_user(email="seller@example.com", password="pass", role="vendor")
+        User.objects.create_user(email="gone@example.com", password="pass", role="vendor", is_active=False)
+        last_month = month_to_date(timezone.now())[0] - timedelta(days=1)
+        # Active sellers last month: the ones updated then
+        User.objects.filter(pk=seller.pk).update(updated_at=last_month, created_at=last_month)
+        self.pay(self.create_order())
+        refresh_dirty_slices()
+
+        data = self.client_for(admin).get("/api/admin/stats/").data
+        self.assertEqual(data["active_sellers"], {
+            "value": "66.67%", "change": "+100.0%", "note": "Percentage of active sellers",
+        })
+        self.assertEqual(data["new_customers"]["value"], "4")
+        self.assertEqual(data["new_customers"]["change"], "+300.0%")
+        self.assertEqual(data["total_orders"]["value"], "1")
+        self.assertEqual(data["total_revenue"]["value"], "$20.00")
+
+
+class DashboardCacheTests(DashboardTestCase):
+    url = "/api/admin/stats/"
+
+    def setUp(self):
+        # Entries and refresh locks outlive a test in the local cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_superuser(email="admin@example.com", password="pass")
+        self.client = self.client_for(self.admin)
+        compute = mock.patch.object(
+            DashboardStatsView, "compute", autospec=True, side_effect=DashboardStatsView.compute
+        )
+        self.compute = compute.start()
+        self.addCleanup(compute.stop)
+        delay = mock.patch.object(refresh_dashboard_view, "delay")
+        self.delay = delay.start()
+        self.addCleanup(delay.stop)
+
+    def new_customers(self):
+        return self.client.get(self.url).data["new_customers"]["value"]
+
+    def test_fresh_entry_is_served_from_the_cache(self):
+        self.assertEqual(self.new_customers(), "3")
+        self.assertEqual(self.new_customers(), "3")
+        self.assertEqual(self.compute.call_count, 1)
+        self.delay.assert_not_called()
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        self.new_customers()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(email="new@example.com", password="pass", role="customer")
+
+        self.assertEqual(self.new_customers(), "3")
+        self.assertEqual(self.new_customers(), "3")
+        self.delay.assert_called_once_with("dashboard.views.DashboardStatsView", self.admin.pk, {})
+
+        refresh_dashboard_view(*self.delay.call_args.args)
+        self.assertEqual(self.new_customers(), "4")
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_expired_entry_is_computed_inline(self):
+        self.new_customers()
+        with override_settings(DASHBOARD_CACHE_MAX_STALE=-1):
+            self.new_customers()
+        self.assertEqual(self.compute.call_count, 2)
+        self.delay.assert_not_called()
+
+    def test_returns_and_signups_invalidate_but_logins_do_not(self):
+        self.new_customers()
+        tags = dashboard_cache.entry_tags(DashboardStatsView(), self.admin)
+        versions = dashboard_cache._versions(tags)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.last_login = timezone.now()
+            self.customer.save(update_fields=["last_login"])
+        self.assertEqual(dashboard_cache._versions(tags), versions)
+
+        order = self.create_order()
+        with self.captureOnCommitCallbacks(execute=True):
+            ReturnProduct.objects.create(
+                product=self.product, order_item=order.items.get(), reason="Broken", requested_by=self.customer,
+            )
+        self.assertNotEqual(dashboard_cache._versions(tags)["returns"], versions["returns"])
+        self.assertEqual(self.client.get(self.url).data["pending_returns"]["value"], "0")
+        self.delay.assert_called_once()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class LiveDashboardTests(DashboardTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(VendorDashboardConsumer.as_asgi(), "/ws/vendor/dashboard/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_updates_reach_every_open_session(self):
+        sessions = [await self.connect(self.vendor) for _ in range(2)]
+        for session in sessions:
+            message = await session.receive_json_from()
+            self.assertEqual(message["type"], "dashboard_snapshot")
+            self.assertIn("sales_overview", message["data"])
+        self.assertTrue(live.is_watched(self.vendor.pk))
+
+        await database_sync_to_async(self.create_order)()
+        await database_sync_to_async(refresh_dirty_slices)()
+        self.assertTrue(await database_sync_to_async(push_vendor_dashboard)(self.vendor.pk, "order_created"))
+        for session in sessions:
+            message = await session.receive_json_from()
+            self.assertEqual(message["type"], "dashboard_update")
+            self.assertEqual(message["event"], "order_created")
+            self.assertTrue(message["changed"])
+
+        # Closing one session leaves the other counted
+        await sessions[0].disconnect()
+        self.assertTrue(live.is_watched(self.vendor.pk))
+        await sessions[1].disconnect()
+        self.assertFalse(live.is_watched(self.vendor.pk))
+        self.assertFalse(await database_sync_to_async(push_vendor_dashboard)(self.vendor.pk, "order_created"))
+
+    async def test_ping_keeps_the_session_counted(self):
+        session = await self.connect(self.vendor)
+        await session.receive_json_from()
+        await session.send_json_to({"type": "ping"})
+        self.assertEqual(await session.receive_json_from(), {"type": "pong"})
+        await session.disconnect()
+
+    async def test_non_vendors_are_refused(self):
+        session = await self.connect(self.customer)
+        self.assertIn("error", await session.receive_json_from())
+        self.assertFalse(live.is_watched(self.customer.pk))
+        await session.disconnect()
+
+    def test_sessions_lost_without_a_disconnect_expire(self):
+        live.session_opened(self.vendor.pk)
+        live.session_opened(self.vendor.pk)
+        live.session_closed(self.vendor.pk)
+        self.assertTrue(live.is_watched(self.vendor.pk))
+
+        later = time.time() + live.SESSION_TTL + 1
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=later):
+            self.assertFalse(live.is_watched(self.vendor.pk))
+
+
+class SalesCubeTests(DashboardTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = Path(directory) / "cube.npz"
+        settings = override_settings(SALES_CUBE_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.table = Product.objects.create(vendor=self.vendor, name="Table", price1=Decimal("30.00"), stock_quantity=5)
+        january = self.create_order()
+        OrderItem.objects.create(order=january, product=self.table, quantity=1, price=Decimal("30.00"))
+        self.backdate(Order, january, datetime(2026, 1, 30, 12))
+        # Split over the lines by line total: 16 on the chairs, 24 on the table
+        self.backdate(Payment, self.pay(january, status=PaymentStatusEnum.COMPLETED.value), datetime(2026, 1, 31))
+        self.pay(january, status=PaymentStatusEnum.PENDING.value)
+        self.backdate(Order, self.create_order(quantity=1), datetime(2026, 2, 2, 9))
+        # A single-product payment is booked on its product and day
+        loose = Payment.objects.create(
+            product=self.table, customer=self.customer, vendor=self.vendor, amount=Decimal("5.00"),
+            payment_method="stripe", status=PaymentStatusEnum.COMPLETED.value,
+        )
+        self.backdate(Payment, loose, datetime(2026, 2, 3))
+
+    def backdate(self, model, instance, moment):
+        model.objects.filter(pk=instance.pk).update(created_at=timezone.make_aware(moment))
+
+    def pay(self, order, status):
+        payment = super().pay(order, status=status)
+        payment.amount = Decimal("40.00")
+        payment.save()
+        return payment
+
+    def cube(self):
+        self.assertEqual(build_cube(), 4)
+        return SalesCube.load(self.path)
+
+    def test_roll_up_by_month_and_week(self):
+        cube = self.cube()
+        result = cube.query(by=["month"])
+        self.assertEqual(result["totals"], {"lines": 3, "units": 4, "gross": 60.0, "paid": 45.0})
+        self.assertEqual(result["rows"], [
+            {"month": "2026-01", "lines": 2, "units": 3, "gross": 50.0, "paid": 40.0},
+            {"month": "2026-02", "lines": 1, "units": 1, "gross": 10.0, "paid": 5.0},
+        ])
+        # Weeks start on Monday
+        weeks = cube.query(by=["week"], measures=["units"])["rows"]
+        self.assertEqual(weeks, [{"week": "2026-01-26", "units": 3}, {"week": "2026-02-02", "units": 1}])
+
+    def test_drill_down_and_slice(self):
+        cube = self.cube()
+        rows = cube.query(by=["product"], measures=["gross", "paid"], sort="-paid")["rows"]
+        self.assertEqual([(row["product_name"], row["gross"], row["paid"]) for row in rows], [
+            ("Table", 30.0, 29.0), ("Chair", 30.0, 16.0),
+        ])
+
+        result = cube.query(by=["day"], filters={"product": [str(self.product.pk)]}, start=date(2026, 2, 1))
+        self.assertEqual(result["rows"], [{"day": "2026-02-02", "lines": 1, "units": 1, "gross": 10.0, "paid": 0.0}])
+        self.assertEqual(cube.query(by=["category"])["rows"][0]["category_name"], "Uncategorised")
+
+        for kwargs in ({"by": ["colour"]}, {"measures": ["margin"]}, {"filters": {"day": ["1"]}}, {"sort": "units"}):
+            with self.subTest(kwargs=kwargs), self.assertRaises(ValueError):
+                cube.query(**{"measures": ["gross"], **kwargs})
+
+    def test_view(self):
+        client = self.client_for(User.objects.create_superuser(email="admin@example.com", password="pass"))
+        self.assertEqual(client.get("/api/admin/analytics/cube/").status_code, 503)
+
+        self.cube()
+        response = client.get("/api/admin/analytics/cube/", {"by": "vendor", "measures": "units"})
+        self.assertEqual(response.data["rows"], [
+            {"vendor": self.vendor.pk, "vendor_name": "vendor@example.com", "units": 4},
+        ])
+        self.assertEqual(client.get("/api/admin/analytics/cube/", {"by": "colour"}).status_code, 400)
+
+
+class TimeSeriesTests(DashboardTestCase):
+    def setUp(self):
+        self.dhaka = get_timezone("Asia/Dhaka")
+        # 02:30 on the 31st in Dhaka (UTC+6)
+        self.backdate(self.create_order(), datetime(2026, 1, 30, 20, 30))
+        self.backdate(self.create_order(quantity=1), datetime(2026, 2, 2, 9))
+        rebuild(date(2026, 1, 29), date(2026, 2, 3))
+
+    def backdate(self, order, moment):
+        moment = timezone.make_aware(moment)
+        Order.objects.filter(pk=order.pk).update(created_at=moment)
+        OrderItem.objects.filter(order=order).update(created_at=moment)
+
+    def series(self, granularity, start, end, tz, **kwargs):
+        return time_series(["orders", "units"], granularity, midnight(start, tz), midnight(end, tz), tz=tz, **kwargs)
+
+    def test_days_follow_the_requested_timezone(self):
+        utc = timezone.get_default_timezone()
+        dhaka = self.series("day", date(2026, 1, 29), date(2026, 2, 3), self.dhaka)
+        self.assertEqual(dhaka["series"], {"orders": [0, 0, 1, 0, 1], "units": [0, 0, 2, 0, 1]})
+        self.assertEqual(dhaka["buckets"][0], midnight(date(2026, 1, 29), self.dhaka))
+
+        # Server-timezone whole days read the rollup and agree with SQL bucketing in the same zone
+        with mock.patch("dashboard.timeseries._from_sql") as from_sql:
+            rolled_up = self.series("day", date(2026, 1, 29), date(2026, 2, 3), utc)
+        from_sql.assert_not_called()
+        self.assertEqual(rolled_up["series"], {"orders": [0, 1, 0, 0, 1], "units": [0, 2, 0, 0, 1]})
+        self.assertEqual(self.series("day", date(2026, 1, 29), date(2026, 2, 3), get_timezone("Etc/UTC")), {
+            "buckets": [midnight(date(2026, 1, 29) + timedelta(days=day), get_timezone("Etc/UTC")) for day in range(5)],
+            "series": rolled_up["series"],
+        })
+
+    def test_weeks_months_and_hours(self):
+        utc = timezone.get_default_timezone()
+        weeks = self.series("week", date(2026, 1, 28), date(2026, 2, 9), utc)
+        # Weeks start on Monday, before the requested start
+        self.assertEqual(weeks["buckets"], [midnight(date(2026, 1, 26)), midnight(date(2026, 2, 2))])
+        self.assertEqual(weeks["series"]["orders"], [1, 1])
+
+        months = self.series("month", date(2026, 1, 1), date(2026, 3, 1), self.dhaka)
+        self.assertEqual(months["series"]["units"], [2, 1])
+
+        hours = self.series("hour", date(2026, 2, 2), date(2026, 2, 3), utc)
+        self.assertEqual(len(hours["buckets"]), 24)
+        self.assertEqual(hours["series"]["orders"][9], 1)
+        self.assertEqual(sum(hours["series"]["orders"]), 1)
+
+    def test_transforms(self):
+        values = [1.0, 2.0, 3.0, 4.0]
+        self.assertEqual(apply_transform(values, "cumulative").tolist(), [1, 3, 6, 10])
+        self.assertEqual(apply_transform(values, "moving_average", window=2).tolist(), [1, 1.5, 2.5, 3.5])
+        cumulative = self.series("day", date(2026, 1, 29), date(2026, 2, 3), self.dhaka, transform="cumulative")
+        self.assertEqual(cumulative["series"]["orders"], [0, 0, 1, 1, 2])
+
+    def test_invalid_requests(self):
+        utc = timezone.get_default_timezone()
+        for args, kwargs in (
+            (("fortnight", date(2026, 1, 1), date(2026, 2, 1), utc), {}),
+            (("day", date(2026, 2, 1), date(2026, 2, 1), utc), {}),
+            (("hour", date(2025, 1, 1), date(2026, 1, 1), utc), {}),
+            (("day", date(2026, 1, 1), date(2026, 2, 1), utc), {"transform": "median"}),
+        ):
+            with self.subTest(args=args, kwargs=kwargs), self.assertRaises(ValueError):
+                self.series(*args, **kwargs)
+        with self.assertRaises(ValueError):
+            get_timezone("Mars/Olympus")
+
+    def test_view_scopes_vendors_to_their_own_sales(self):
+        other = User.objects.create_user(email="other@example.com", password="pass", role="vendor")
+        params = {"series": "orders", "start": "2026-01-29", "end": "2026-02-03", "tz": "Asia/Dhaka"}
+
+        response = self.client_for(self.vendor).get("/api/analytics/timeseries/", params)
+        self.assertEqual(response.data["series"]["orders"], [0, 0, 1, 0, 1])
+        response = self.client_for(other).get("/api/analytics/timeseries/", {**params, "vendor": self.vendor.pk})
+        self.assertEqual(response.data["series"]["orders"], [0, 0, 0, 0, 0])
+        self.assertEqual(self.client_for(other).get("/api/analytics/timeseries/", {"tz": "Mars"}).status_code, 400)
+
+
+class StockAlertTests(DashboardTestCase):
+    def setUp(self):
+        delay = mock.patch.object(push_stock_alerts, "delay")
+        self.delay = delay.start()
+        self.addCleanup(delay.stop)
+
+    def set_stock(self, stock_quantity, **fields):
+        self.product.stock_quantity = stock_quantity
+        for name, value in fields.items():
+            setattr(self.product, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+    def open_alert(self):
+        return Alert.objects.filter(product=self.product, resolved_at__isnull=True).values(
+            "stock_quantity", "threshold", "message"
+        ).first()
+
+    def test_alert_follows_the_stock(self):
+        # The product was created at 5, under the default threshold of 10
+        self.assertEqual(self.open_alert(), {
+            "stock_quantity": 5, "threshold": 10, "message": "Low stock: Chair (Only 5 left)",
+        })
+
+        self.set_stock(3)
+        self.assertEqual(self.open_alert()["stock_quantity"], 3)
+        self.assertEqual(Alert.objects.count(), 1)
+        self.delay.assert_not_called()
+
+        self.set_stock(20)
+        self.assertIsNone(self.open_alert())
+
+        self.set_stock(2)
+        self.assertEqual(Alert.objects.count(), 2)
+        self.delay.assert_called_once_with([{
+            "product_id": self.product.pk, "vendor_id": self.vendor.pk,
+            "message": "Low stock: Chair (Only 2 left)", "stock_quantity": 2, "threshold": 10,
+        }])
+
+        # Untracked stock raises nothing
+        self.set_stock(2, is_stock=False)
+        self.assertIsNone(self.open_alert())
+
+    def test_saves_without_stock_fields_do_not_check(self):
+        Product.objects.filter(pk=self.product.pk).update(name="Armchair")
+        with self.assertNumQueries(1):
+            self.product.save(update_fields=["name"])
+
+    def test_bulk_stock_writes_are_checked(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=30)
+        self.assertIsNone(self.open_alert())
+
+        self.product.stock_quantity = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.bulk_update([self.product], ["stock_quantity"])
+        self.assertEqual(self.open_alert()["stock_quantity"], 1)
+        self.delay.assert_called_once()
+
+    def test_vendor_threshold(self):
+        self.set_stock(20)
+        self.assertEqual(set_threshold(self.vendor, 25), 1)
+        self.assertEqual(self.open_alert()["threshold"], 25)
+
+        set_threshold(self.vendor, 15)
+        self.assertIsNone(self.open_alert())
+        with self.assertRaises(ValueError):
+            set_threshold(self.vendor, 51)
+
+    def test_sweep_is_idempotent(self):
+        Alert.objects.all().delete()
+        self.assertEqual(check_stock(), 1)
+        self.assertEqual(check_stock(), 0)
+        self.assertEqual(Alert.objects.count(), 1)
+
+
+class ForecastTests(DashboardTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(customer=self.customer, vendor=self.vendor)
+        self.table, self.lamp = (
+            Product.objects.create(vendor=self.vendor, name=name, price1=Decimal("5.00"), stock_quantity=90)
+            for name in ("Table", "Lamp")
+        )
+
+    def sell(self, product, quantity, days_ago, status=OrderStatus.PENDING.value):
+        item = OrderItem.objects.create(
+            order=self.order, product=product, quantity=quantity, price=product.price1, status=status
+        )
+        moment = midnight(self.today() - timedelta(days=days_ago)) + timedelta(hours=12)
+        OrderItem.objects.filter(pk=item.pk).update(created_at=moment)
+
+    def forecast(self, product):
+        return StockForecast.objects.values(
+            "daily_velocity", "days_remaining", "stockout_on", "reorder_quantity"
+        ).get(product=product)
+
+    def test_steady_seller(self):
+        for days_ago in range(1, WINDOW_DAYS + 1):
+            self.sell(self.product, 2, days_ago)
+        # Outside the window: today's partial day, cancelled lines and older sales
+        self.sell(self.product, 50, 0)
+        self.sell(self.product, 50, 3, status=OrderStatus.CANCELLED.value)
+        self.sell(self.product, 50, WINDOW_DAYS + 1)
+
+        self.assertEqual(build_forecasts(), 3)
+        self.assertEqual(self.forecast(self.product), {
+            "daily_velocity": 2.0,
+            "days_remaining": 2.5,
+            "stockout_on": self.today() + timedelta(days=2),
+            "reorder_quantity": 2 * (LEAD_TIME_DAYS + COVER_DAYS) - 5,
+        })
+
+    def test_recent_days_weigh_more(self):
+        self.sell(self.table, 7, 1)
+        self.sell(self.lamp, 7, 1 + HALF_LIFE_DAYS)
+        build_forecasts()
+        table, lamp = self.forecast(self.table), self.forecast(self.lamp)
+        self.assertAlmostEqual(table["daily_velocity"], 2 * lamp["daily_velocity"], places=2)
+        self.assertLess(table["days_remaining"], lamp["days_remaining"])
+
+    def test_products_without_sales_and_rebuilds(self):
+        self.sell(self.table, 7, 1)
+        build_forecasts()
+        self.assertEqual(self.forecast(self.lamp), {
+            "daily_velocity": 0.0, "days_remaining": None, "stockout_on": None, "reorder_quantity": 0,
+        })
+
+        # Rebuilds replace the table; untracked stock gets no forecast
+        Product.objects.filter(pk=self.table.pk).update(is_stock=False)
+        self.assertEqual(build_forecasts(), 2)
+        self.assertFalse(StockForecast.objects.filter(product=self.table).exists())
+
+    def test_view(self):
+        other = User.objects.create_user(email="other@example.com", password="pass", role="vendor")
+        Product.objects.create(vendor=other, name="Stool", price1=Decimal("5.00"), stock_quantity=1)
+        self.sell(self.product, 1, 1)
+        self.sell(self.table, 300, 1)
+        build_forecasts()
+
+        response = self.client_for(self.vendor).get("/api/analytics/stock-forecast/")
+        rows = response.data["results"] if isinstance(response.data, dict) else response.data
+        # Soonest stockout first, products without sales last
+        self.assertEqual([row["product"] for row in rows], [self.table.pk, self.product.pk, self.lamp.pk])
+
+        response = self.client_for(self.vendor).get("/api/analytics/stock-forecast/", {"sort": "-colour"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CohortTests(DashboardTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        first, second = self.month_start(2), self.month_start(1)
+        self.first_label, self.second_label = f"{first:%Y-%m}", f"{second:%Y-%m}"
+
+        repeater = self.signup("repeater@example.com", first + timedelta(days=1))
+        for moment in (first + timedelta(days=5), first + timedelta(days=6), self.month_start(0)):
+            self.place(repeater, moment)
+        for amount, moment, status in (
+            ("20.00", first + timedelta(days=5), PaymentStatusEnum.COMPLETED.value),
+            ("30.00", second + timedelta(days=1), PaymentStatusEnum.COMPLETED.value),
+            ("99.00", second + timedelta(days=1), PaymentStatusEnum.PENDING.value),
+        ):
+            payment = Payment.objects.create(
+                customer=repeater, vendor=self.vendor, amount=Decimal(amount), payment_method="stripe", status=status,
+            )
+            Payment.objects.filter(pk=payment.pk).update(created_at=moment)
+
+        late_starter = self.signup("late@example.com", first + timedelta(days=10))
+        self.place(late_starter, first + timedelta(days=11), order_status=OrderStatus.CANCELLED.value)
+        self.place(late_starter, second + timedelta(days=2))
+        self.signup("browser@example.com", second + timedelta(days=3))
+
+    def month_start(self, months_ago):
+        today = timezone.localdate()
+        month = today.year * 12 + today.month - 1 - months_ago
+        return timezone.make_aware(datetime(month // 12, month % 12 + 1, 1))
+
+    def signup(self, email, moment):
+        user = User.objects.create_user(email=email, password="pass", role="customer")
+        User.objects.filter(pk=user.pk).update(created_at=moment)
+        return user
+
+    def place(self, customer, moment, **fields):
+        order = Order.objects.create(customer=customer, vendor=self.vendor, **fields)
+        Order.objects.filter(pk=order.pk).update(created_at=moment)
+
+    def cohorts(self, data):
+        return {row["cohort"]: row for row in data["cohorts"]}
+
+    def test_retention_matrix(self):
+        report = compute_cohorts()
+        self.assertEqual(len(report["cohorts"]), MAX_COHORTS)
+        cohorts = self.cohorts(report)
+
+        # Cancelled orders are not purchases; each customer counts once a month
+        self.assertEqual(cohorts[self.first_label], {
+            "cohort": self.first_label, "customers": 2, "repeat_rate": 50.0,
+            "retention": [50.0, 50.0, 50.0], "active_customers": [1, 1, 1],
+            "cumulative_revenue": [20.0, 50.0, 50.0],
+        })
+        self.assertEqual(cohorts[self.second_label], {
+            "cohort": self.second_label, "customers": 1, "repeat_rate": 0.0,
+            "retention": [0.0, 0.0], "active_customers": [0, 0], "cumulative_revenue": [0.0, 0.0],
+        })
+        # This month's cohort holds the fixture customer; vendors are not customers
+        self.assertEqual(report["cohorts"][-1]["customers"], 1)
+        self.assertEqual(report["cohorts"][0]["retention"], [0.0] * MAX_COHORTS)
+
+    def test_report_is_stored_and_served(self):
+        client = self.client_for(User.objects.create_superuser(email="admin@example.com", password="pass"))
+        self.assertEqual(client.get("/api/admin/analytics/cohorts/").status_code, 503)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(build_cohort_report(), MAX_COHORTS)
+            build_cohort_report()
+        self.assertEqual(CohortReport.objects.count(), 1)
+
+        response = client.get("/api/admin/analytics/cohorts/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cohorts(response.data)[self.first_label]["customers"], 2)
+
+
+class RunQueriesTests(SimpleTestCase):
+    def test_calls_run_concurrently(self):
+        # Each call waits for the others, so this only finishes if all three run at once
+        barrier = threading.Barrier(3, timeout=5)
+        calls = {key: (lambda key=key: (barrier.wait(), key)[1]) for key in "abc"}
+        self.assertEqual(run_queries(calls, limit=3), ({"a": "a", "b": "b", "c": "c"}, []))
+
+    def test_concurrency_is_limited(self):
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def call():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return True
+
+        results, missing = run_queries({key: call for key in range(6)}, limit=2)
+        self.assertEqual((len(results), missing), (6, []))
+        self.assertEqual(peak[0], 2)
+
+    def test_failures_and_timeouts_are_missing(self):
+        def fail():
+            raise ValueError("boom")
+
+        calls = {"ok": lambda: 1, "failed": fail, "slow": lambda: time.sleep(1)}
+        with self.assertLogs("dashboard.parallel", "WARNING") as logs:
+            results, missing = run_queries(calls, limit=3, timeout=0.1)
+        self.assertEqual(results, {"ok": 1})
+        self.assertEqual(sorted(missing), ["failed", "slow"])
+        self.assertEqual(len(logs.records), 2)
+
+
+class RunQueriesInTransactionTests(DashboardTestCase):
+    def test_queries_run_in_order_on_the_callers_connection(self):
+        # Uncommitted rows are visible because nothing leaves this connection
+        calls = {"vendors": lambda: User.objects.filter(role="vendor").count(), "products": Product.objects.count}
+        self.assertEqual(run_queries(calls, limit=4), ({"vendors": 1, "products": 1}, []))
+
+    def test_errors_propagate(self):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            run_queries({"ok": lambda: 1, "failed": fail}, limit=4)
 
-# Create your tests here.
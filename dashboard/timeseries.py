@@ -0,0 +1,191 @@
+# dashboard/timeseries.py
+"""
+Sales time series for any range, granularity (hour, day, week, month) and timezone.
+
+Buckets are formed in SQL (Trunc* with the request's tzinfo) on the live and archived
+tables, or read from the DailySales rollup when the request is whole days in the
+server timezone at day granularity or coarser. Gap filling and the cumulative and
+moving-average transforms run on NumPy arrays over wall-clock bucket starts.
+
+    revenue             completed payments, by payment time
+    orders              orders placed
+    units               units ordered
+    delivered_revenue   order totals of delivered orders, by order time
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from dashboard.rollup import sales_rows
+from orders.archive import combined_grouped, order_item_querysets, order_querysets, payment_querysets
+from orders.enums import OrderStatus
+from orders.models import ArchivedOrder
+from payments.enums import PaymentStatusEnum
+
+GRANULARITIES = ["hour", "day", "week", "month"]
+TRANSFORMS = ["cumulative", "moving_average"]
+STEPS = {"hour": np.timedelta64(1, "h"), "day": np.timedelta64(1, "D"), "week": np.timedelta64(7, "D")}
+# Largest number of buckets a single request may ask for
+MAX_BUCKETS = 5000
+
+
+def _payments(start, end, filters):
+    return payment_querysets(
+        start, status=PaymentStatusEnum.COMPLETED.value, created_at__gte=start, created_at__lt=end, **filters
+    )
+
+
+def _orders(start, end, filters, **extra):
+    return order_querysets(start, created_at__gte=start, created_at__lt=end, **filters, **extra)
+
+
+def _items(start, end, filters):
+    live, *archived = order_item_querysets(start, created_at__gte=start, created_at__lt=end)
+    if "vendor" in filters:
+        # Archived items have no order relation; their vendor comes from the archived orders.
+        live = live.filter(order__vendor=filters["vendor"])
+        vendor_orders = ArchivedOrder.objects.filter(vendor=filters["vendor"]).values("id")
+        archived = [qs.filter(order_id__in=vendor_orders) for qs in archived]
+    return [live, *archived]
+
+
+def _delivered_orders(start, end, filters):
+    return _orders(start, end, filters, order_status=OrderStatus.DELIVERED.value)
+
+
+# name: (querysets(start, end, filters), aggregate, rollup measure)
+SERIES = {
+    "revenue": (_payments, Sum("amount"), "payments"),
+    "orders": (_orders, Count("pk"), "orders"),
+    "units": (_items, Sum("quantity"), "units"),
+    "delivered_revenue": (_delivered_orders, Sum("total_amount"), "delivered_total"),
+}
+AMOUNT_SERIES = {"revenue", "delivered_revenue"}
+
+
+def get_timezone(name=None):
+    """ZoneInfo for `name` (the server timezone when empty); raises ValueError for unknown names."""
+    if not name:
+        return timezone.get_default_timezone()
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{name}'.")
+
+
+def midnight(day, tz=None):
+    """Start of `day` in `tz` (the server timezone by default)."""
+    return timezone.make_aware(datetime.combine(day, time.min), tz or timezone.get_default_timezone())
+
+
+def _wall_clock(value, tz):
+    return np.datetime64(timezone.localtime(value, tz).replace(tzinfo=None), "s")
+
+
+def _bucket_starts(start, end, granularity, tz):
+    """Wall-clock starts of every bucket overlapping [start, end)."""
+    first, last = _wall_clock(start, tz), _wall_clock(end - timedelta(microseconds=1), tz)
+    if granularity == "month":
+        return np.arange(first.astype("datetime64[M]"), last.astype("datetime64[M]") + 1).astype("datetime64[s]")
+    if granularity == "week":
+        days = first.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday; weeks start on Monday like TruncWeek.
+        first = (days - (days.astype(np.int64) + 3) % 7).astype("datetime64[s]")
+    else:
+        first = first.astype(f"datetime64[{'h' if granularity == 'hour' else 'D'}]").astype("datetime64[s]")
+    return np.arange(first, last + np.timedelta64(1, "s"), STEPS[granularity])
+
+
+def _positions(bucket_values, starts, granularity):
+    if granularity == "month":
+        return (bucket_values.astype("datetime64[M]") - starts[0].astype("datetime64[M]")).astype(np.int64)
+    return ((bucket_values - starts[0]) // STEPS[granularity]).astype(np.int64)
+
+
+def _is_whole_days(start, end, tz):
+    return all(timezone.localtime(value, tz).time() == time.min for value in (start, end))
+
+
+def _from_rollup(name, start, end, granularity, tz, filters):
+    start_day, end_day = timezone.localtime(start, tz).date(), timezone.localtime(end, tz).date()
+    rows = sales_rows(start_day, end_day - timedelta(days=1), **filters).values("day").annotate(value=Sum(SERIES[name][2]))
+    days = np.array([row["day"] for row in rows], dtype="datetime64[D]")
+    values = np.array([row["value"] or 0 for row in rows], dtype=np.float64)
+    if granularity == "week":
+        days = days - (days.astype(np.int64) + 3) % 7
+    return days.astype("datetime64[s]"), values
+
+
+def _from_sql(name, start, end, granularity, tz, filters):
+    querysets, aggregate, _ = SERIES[name]
+    merged = combined_grouped(
+        querysets(start, end, filters),
+        lambda qs: qs.annotate(bucket=Trunc("created_at", granularity, tzinfo=tz)).values("bucket").annotate(
+            total=aggregate
+        ),
+        key="bucket",
+    )
+    buckets = np.array([_wall_clock(bucket, tz) for bucket in merged], dtype="datetime64[s]")
+    values = np.array([float(total) for total in merged.values()], dtype=np.float64)
+    return buckets, values
+
+
+def apply_transform(values, transform=None, window=7):
+    if transform == "cumulative":
+        return np.cumsum(values)
+    if transform == "moving_average":
+        # Trailing mean; the first points average over what is available.
+        window = max(int(window), 1)
+        totals = np.concatenate([[0.0], np.cumsum(values)])
+        counts = np.minimum(np.arange(1, len(values) + 1), window)
+        return (totals[1:] - totals[np.maximum(np.arange(1, len(values) + 1) - window, 0)]) / counts
+    return values
+
+
+def time_series(series, granularity, start, end, tz=None, transform=None, window=7, **filters):
+    """
+    Every requested series over [start, end) as {"buckets": [aware bucket starts],
+    "series": {name: [values]}}, empty buckets filled with zero. `filters` narrow the
+    data (e.g. vendor=user).
+    """
+    tz = tz or timezone.get_default_timezone()
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}.")
+    if transform and transform not in TRANSFORMS:
+        raise ValueError(f"Unknown transform '{transform}'. Use one of: {', '.join(TRANSFORMS)}.")
+    for name in series:
+        if name not in SERIES:
+            raise ValueError(f"Unknown series '{name}'. Use one of: {', '.join(SERIES)}.")
+    if start >= end:
+        raise ValueError("start must be before end.")
+
+    starts = _bucket_starts(start, end, granularity, tz)
+    if len(starts) > MAX_BUCKETS:
+        raise ValueError(f"Too many buckets ({len(starts)}); use a coarser granularity or a shorter range.")
+
+    use_rollup = (
+        granularity != "hour"
+        and str(tz) == str(timezone.get_default_timezone())
+        and _is_whole_days(start, end, tz)
+    )
+    result = {}
+    for name in series:
+        bucket_values, totals = (_from_rollup if use_rollup else _from_sql)(name, start, end, granularity, tz, filters)
+        filled = np.zeros(len(starts), dtype=np.float64)
+        positions = _positions(bucket_values, starts, granularity)
+        inside = (positions >= 0) & (positions < len(starts))
+        np.add.at(filled, positions[inside], totals[inside])
+        filled = apply_transform(filled, transform, window)
+        if name in AMOUNT_SERIES or transform == "moving_average":
+            result[name] = np.round(filled, 2).tolist()
+        else:
+            result[name] = filled.astype(np.int64).tolist()
+
+    return {
+        "buckets": [timezone.make_aware(value, tz) for value in starts.tolist()],
+        "series": result,
+    }
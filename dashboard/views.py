@@ -8,15 +8,18 @@ from products.models import Product
 from orders.models import Order
 from orders.enums import OrderStatus
 from django.db.models.functions import TruncDate, TruncMonth
-from rest_framework import viewsets, permissions, status
+from rest_framework import generics, viewsets, permissions, status
 from rest_framework.response import Response
 from django.db.models import Sum
 from payments.models import Payment
 from payments.enums import PaymentStatusEnum
 from .models import PayoutRequest, PayoutStatusEnum
 from .serializers import PayoutRequestSerializer
+from payments.ledger import InsufficientBalance, change_payout_status, get_balance, release_payout
+from django.db import transaction
 from users.enums import UserRole
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 import calendar
 from datetime import timedelta
 from django.db.models import Sum, Count, Q, F
@@ -32,13 +35,28 @@ from products.models import Product, ReturnProduct
 from payments.models import Payment
 from payments.enums import PaymentStatusEnum
 from dashboard.models import Alert
-from dashboard.serializers import LatestOrderSerializer, AlertSerializer
+from dashboard.serializers import LatestOrderSerializer, AlertSerializer, StockForecastSerializer
 from django.utils.timezone import now
 from dashboard.serializers import VendorPerformanceSerializer
-from django.db.models.functions import Coalesce
-from django.db.models import DecimalField
 from calendar import month_name
 from products.views import IsVendorOrAdmin
+from common.models import Category
+from dashboard.models import CohortReport, DailySales, StockForecast
+from dashboard.rollup import UNCATEGORISED, sales_by_month
+from dashboard.cache import CachedDashboardMixin, partial_response
+from dashboard.cube import CUBE_FILTERS, load_cube
+from dashboard.timeseries import get_timezone, midnight, time_series
+from dashboard.stock import set_threshold, thresholds
+from django.utils.dateparse import parse_date, parse_datetime
+from dashboard.metrics import (
+    ADMIN_DASHBOARD_METRICS,
+    VENDOR_DASHBOARD_METRICS,
+    VENDOR_PAYMENTS_METRICS,
+    evaluate,
+    format_change,
+    format_value,
+    percentage_change,
+)
 
 
 
@@ -49,112 +67,33 @@ from products.views import IsVendorOrAdmin
 
 
 
-class VendorDashboardView(APIView):
+class VendorDashboardView(CachedDashboardMixin, APIView):
     permission_classes = [IsAuthenticated]
+    cache_tags = ("products:{user}", "sales:{user}", "orders:{user}")
+    cache_per_user = True
 
-    def get_percentage_change(self, current, previous):
-        if previous == 0:
-            return 0
-        return round(((current - previous) / previous) * 100, 1)
+    def compute(self, user, params):
+        # One query each on products, the daily rollup and orders (dashboard.metrics)
+        metrics = evaluate(VENDOR_DASHBOARD_METRICS, scope={"vendor": user})
 
-    def get(self, request):
-        user = request.user
-        now = timezone.now()
-
-        # === PRODUCTS ===
-        products_qs = Product.objects.filter(vendor=user)
-        total_products = products_qs.count()
-
-        # Last month product count
-        start_last_month = (now.replace(day=1) - timedelta(days=1)).replace(day=1)
-        end_last_month = now.replace(day=1) - timedelta(days=1)
-        last_month_products = Product.objects.filter(
-            vendor=user,
-            created_at__gte=start_last_month,
-            created_at__lte=end_last_month
-        ).count()
-
-        products_change = self.get_percentage_change(total_products, last_month_products)
-
-        # === SALES THIS MONTH ===
-        start_month = now.replace(day=1)
-        start_last_week = now - timedelta(days=7)
-        start_prev_week = start_last_week - timedelta(days=7)
-        end_prev_week = start_last_week
-
-        sales_this_month = Order.objects.filter(
-            vendor=user,
-            created_at__gte=start_month,
-            created_at__lte=now,
-            order_status=OrderStatus.DELIVERED.value
-        ).aggregate(total_sales=Sum('items__quantity'))['total_sales'] or 0
-
-        sales_this_week = Order.objects.filter(
-            vendor=user,
-            created_at__gte=start_last_week,
-            created_at__lte=now,
-            order_status=OrderStatus.DELIVERED.value
-        ).aggregate(total_sales=Sum('items__quantity'))['total_sales'] or 0
-
-        sales_prev_week = Order.objects.filter(
-            vendor=user,
-            created_at__gte=start_prev_week,
-            created_at__lte=end_prev_week,
-            order_status=OrderStatus.DELIVERED.value
-        ).aggregate(total_sales=Sum('items__quantity'))['total_sales'] or 0
-
-        sales_week_change = self.get_percentage_change(sales_this_week, sales_prev_week)
-
-        # === PENDING ORDERS ===
-        pending_orders = Order.objects.filter(
-            vendor=user,
-            order_status=OrderStatus.PENDING.value
-        ).count()
-
-        pending_last_week = Order.objects.filter(
-            vendor=user,
-            order_status=OrderStatus.PENDING.value,
-            created_at__gte=start_prev_week,
-            created_at__lte=end_prev_week
-        ).count()
-
-        pending_change = self.get_percentage_change(pending_orders, pending_last_week)
-
-        # === EARNINGS THIS MONTH ===
-        earnings_this_month = Order.objects.filter(
-            vendor=user,
-            created_at__gte=start_month,
-            created_at__lte=now,
-            order_status=OrderStatus.DELIVERED.value
-        ).aggregate(total_earnings=Sum('total_amount'))['total_earnings'] or 0
-
-        earnings_last_month = Order.objects.filter(
-            vendor=user,
-            created_at__gte=start_last_month,
-            created_at__lte=end_last_month,
-            order_status=OrderStatus.DELIVERED.value
-        ).aggregate(total_earnings=Sum('total_amount'))['total_earnings'] or 0
-
-        earnings_change = self.get_percentage_change(earnings_this_month, earnings_last_month)
-
-        return Response({
+        return partial_response({
             "total_products": {
-                "count": total_products,
-                "change": products_change
+                "count": metrics["total_products"].value,
+                "change": metrics["total_products"].change
             },
             "sales_this_month": {
-                "count": sales_this_month,
-                "week_change": sales_week_change
+                "count": metrics["sales_this_month"].value,
+                "week_change": metrics["sales_week"].change
             },
             "pending_orders": {
-                "count": pending_orders,
-                "change": pending_change
+                "count": metrics["pending_orders"].value,
+                "change": metrics["pending_orders"].change
             },
             "earnings_this_month": {
-                "amount": earnings_this_month,
-                "change": earnings_change
+                "amount": metrics["earnings_this_month"].value,
+                "change": metrics["earnings_this_month"].change
             }
-        })
+        }, metrics.missing)
 
 
 
@@ -171,85 +110,33 @@ class VendorDashboardView(APIView):
 
 
 
-class VendorSalesOverviewView(APIView):
+class VendorSalesOverviewView(CachedDashboardMixin, APIView):
     permission_classes = [IsAuthenticated]
+    cache_tags = ("sales:{user}",)
+    cache_params = ("period",)
+    cache_per_user = True
 
-    def get(self, request):
-        user = request.user
-        now = timezone.now()
-        period = request.query_params.get("period", "7days") 
-
-        data = []
+    def compute(self, user, params):
+        today = timezone.localdate()
+        period = params.get("period", "7days")
 
         if period == "7days":
-            start_date = now - timedelta(days=6)
-            date_range = [start_date + timedelta(days=i) for i in range(7)]
-
-            sales = (
-                Order.objects.filter(
-                    vendor=user,
-                    created_at__date__gte=start_date.date(),
-                    created_at__date__lte=now.date(),
-                    order_status=OrderStatus.DELIVERED.value
-                )
-                .annotate(date=TruncDate("created_at"))
-                .values("date")
-                .annotate(total=Sum("total_amount"))
-            )
-            sales_dict = {s["date"]: float(s["total"] or 0) for s in sales}
-
-            data = [
-                {"date": d.strftime("%a"), "value": sales_dict.get(d.date(), 0.0)}
-                for d in date_range
-            ]
-
+            start, granularity, label = today - timedelta(days=6), "day", "%a"
         elif period == "30days":
-            start_date = now - timedelta(days=29)
-            date_range = [start_date + timedelta(days=i) for i in range(30)]
-
-            sales = (
-                Order.objects.filter(
-                    vendor=user,
-                    created_at__date__gte=start_date.date(),
-                    created_at__date__lte=now.date(),
-                    order_status=OrderStatus.DELIVERED.value
-                )
-                .annotate(date=TruncDate("created_at"))
-                .values("date")
-                .annotate(total=Sum("total_amount"))
-            )
-            sales_dict = {s["date"]: float(s["total"] or 0) for s in sales}
-
-            data = [
-                {"date": d.strftime("%d %b"), "value": sales_dict.get(d.date(), 0.0)}
-                for d in date_range
-            ]
-
+            start, granularity, label = today - timedelta(days=29), "day", "%d %b"
         elif period == "year":
-            start_date = now.replace(month=1, day=1)
-            months = [start_date.replace(month=m) for m in range(1, now.month + 1)]
-
-            sales = (
-                Order.objects.filter(
-                    vendor=user,
-                    created_at__date__gte=start_date.date(),
-                    created_at__date__lte=now.date(),
-                    order_status=OrderStatus.DELIVERED.value
-                )
-                .annotate(month=TruncMonth("created_at"))
-                .values("month")
-                .annotate(total=Sum("total_amount"))
-            )
-            sales_dict = {s["month"].date(): float(s["total"] or 0) for s in sales}
-
-            data = [
-                {"date": m.strftime("%b"), "value": sales_dict.get(m.date(), 0.0)}
-                for m in months
-            ]
-
+            start, granularity, label = today.replace(month=1, day=1), "month", "%b"
         else:
             return Response({"error": "Invalid period"}, status=400)
 
+        sales = time_series(
+            ["delivered_revenue"], granularity, midnight(start), midnight(today + timedelta(days=1)), vendor=user
+        )
+        data = [
+            {"date": bucket.strftime(label), "value": value}
+            for bucket, value in zip(sales["buckets"], sales["series"]["delivered_revenue"])
+        ]
+
         return Response({"sales_overview": data})
 
 
@@ -298,6 +185,15 @@ class PayoutRequestViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsAdmin()]
         return [permissions.IsAuthenticated()]
 
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return PayoutRequest.objects.none()
+        # Vendors only ever see and edit their own payouts
+        queryset = PayoutRequest.objects.order_by("-created_at", "-id")
+        if IsAdmin().has_permission(self.request, self):
+            return queryset
+        return queryset.filter(vendor=self.request.user)
+
     # Vendor: My payouts
     @action(detail=False, methods=["get"])
     def my_payouts(self, request):
@@ -326,12 +222,13 @@ class PayoutRequestViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk=None):
         payout = self.get_object()
 
-        if payout.status == PayoutStatusEnum.APPROVED.value:
+        try:
+            changed = change_payout_status(payout, PayoutStatusEnum.APPROVED.value)
+        except InsufficientBalance as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not changed:
             return Response({"detail": "Payout already approved."}, status=status.HTTP_400_BAD_REQUEST)
 
-        payout.status = PayoutStatusEnum.APPROVED.value
-        payout.save()
-
         return Response({"detail": "Payout approved successfully."}, status=status.HTTP_200_OK)
 
     # Admin: Reject payout
@@ -339,22 +236,27 @@ class PayoutRequestViewSet(viewsets.ModelViewSet):
     def reject(self, request, pk=None):
         payout = self.get_object()
 
-        if payout.status == PayoutStatusEnum.REJECTED.value:
+        if not change_payout_status(payout, PayoutStatusEnum.REJECTED.value):
             return Response({"detail": "Payout already rejected."}, status=status.HTTP_400_BAD_REQUEST)
 
-        payout.status = PayoutStatusEnum.REJECTED.value
-        payout.save()
-
         return Response({"detail": "Payout rejected successfully."}, status=status.HTTP_200_OK)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.status == PayoutStatusEnum.PENDING.value:
+                release_payout(instance)
+            instance.delete()
+
     # Vendor: Total earnings
     @action(detail=False, methods=["get"])
     def total_earnings(self, request):
-        total = Payment.objects.filter(
-            vendor=request.user,
-            status=PaymentStatusEnum.COMPLETED.value
-        ).aggregate(total=Sum("amount"))["total"] or 0
-        return Response({"total_earnings": total})
+        balance = get_balance(request.user)
+        return Response({
+            "total_earnings": balance.total_earned,
+            "available_balance": balance.available,
+            "pending_payouts": balance.reserved,
+            "total_paid_out": balance.total_paid_out,
+        })
 
 
 
@@ -373,116 +275,34 @@ class PayoutRequestViewSet(viewsets.ModelViewSet):
 
 
 
-class VendorPaymentsStatsView(APIView):
+class VendorPaymentsStatsView(CachedDashboardMixin, APIView):
     permission_classes = [IsAuthenticated]
+    cache_tags = ("sales:{user}", "payments:{user}", "payouts:{user}")
+    cache_per_user = True
 
-    def get_percentage_change(self, current, previous):
-        if previous == 0:
-            return 0
-        return round(((current - previous) / previous) * 100, 1)
-
-    def get(self, request):
-        user = request.user
-        now = timezone.now()
+    def compute(self, user, params):
+        total_sales = get_balance(user).total_earned
+        # One query each on the daily rollup and payout requests (dashboard.metrics)
+        metrics = evaluate(VENDOR_PAYMENTS_METRICS, scope={"vendor": user})
 
-        # --- DATES ---
-        start_month = now.replace(day=1)
-        start_last_month = (start_month - timedelta(days=1)).replace(day=1)
-        end_last_month = start_month - timedelta(days=1)
-
-        start_week = now - timedelta(days=7)
-        prev_week_start = start_week - timedelta(days=7)
-        prev_week_end = start_week
-
-        # --- TOTAL SALES ---
-        total_sales = Payment.objects.filter(
-            vendor=user,
-            status=PaymentStatusEnum.COMPLETED.value
-        ).aggregate(total=Sum("amount"))["total"] or 0
-
-        last_month_sales = Payment.objects.filter(
-            vendor=user,
-            status=PaymentStatusEnum.COMPLETED.value,
-            created_at__gte=start_last_month,
-            created_at__lte=end_last_month
-        ).aggregate(total=Sum("amount"))["total"] or 0
-
-        sales_change = self.get_percentage_change(total_sales, last_month_sales)
-
-        # --- PAID OUT ---
-        paid_out = Payment.objects.filter(
-            vendor=user,
-            status=PaymentStatusEnum.COMPLETED.value
-        ).count()
-
-        paid_out_last_week = Payment.objects.filter(
-            vendor=user,
-            status=PaymentStatusEnum.COMPLETED.value,
-            created_at__gte=prev_week_start,
-            created_at__lte=prev_week_end
-        ).count()
-
-        paid_out_this_week = Payment.objects.filter(
-            vendor=user,
-            status=PaymentStatusEnum.COMPLETED.value,
-            created_at__gte=start_week,
-            created_at__lte=now
-        ).count()
-
-        paid_out_week_change = self.get_percentage_change(paid_out_this_week, paid_out_last_week)
-
-        # --- PENDING PAYOUT ---
-        pending_payout = PayoutRequest.objects.filter(
-            vendor=user,
-            status=PayoutStatusEnum.PENDING.value
-        ).count()
-
-        pending_last_week = PayoutRequest.objects.filter(
-            vendor=user,
-            status=PayoutStatusEnum.PENDING.value,
-            created_at__gte=prev_week_start,
-            created_at__lte=prev_week_end
-        ).count()
-
-        pending_change = self.get_percentage_change(pending_payout, pending_last_week)
-
-        # --- TOTAL ORDERS ---
-        total_orders = Order.objects.filter(
-            vendor=user
-        ).count()
-
-        last_week_orders = Order.objects.filter(
-            vendor=user,
-            created_at__gte=prev_week_start,
-            created_at__lte=prev_week_end
-        ).count()
-
-        this_week_orders = Order.objects.filter(
-            vendor=user,
-            created_at__gte=start_week,
-            created_at__lte=now
-        ).count()
-
-        orders_change = self.get_percentage_change(this_week_orders, last_week_orders)
-
-        return Response({
+        return partial_response({
             "total_sales": {
                 "amount": total_sales,
-                "change": sales_change
+                "change": percentage_change(total_sales, metrics["sales_last_month"].value)
             },
             "paid_out": {
-                "count": paid_out,
-                "week_change": paid_out_week_change
+                "count": metrics["paid_out"].value,
+                "week_change": metrics["paid_out_week"].change
             },
             "pending_payout": {
-                "count": pending_payout,
-                "change": pending_change
+                "count": metrics["pending_payout"].value,
+                "change": metrics["pending_payout"].change
             },
             "total_orders": {
-                "count": total_orders,
-                "change": orders_change
+                "count": metrics["total_orders"].value,
+                "change": metrics["orders_week"].change
             }
-        })
+        }, metrics.missing)
 
 
 
@@ -505,27 +325,17 @@ class VendorPaymentsStatsView(APIView):
 
 
 
-class VendorSalesPerformanceView(APIView):
+class VendorSalesPerformanceView(CachedDashboardMixin, APIView):
     permission_classes = [IsAuthenticated]
+    cache_tags = ("sales:{user}",)
+    cache_per_user = True
 
-    def get(self, request):
-        user = request.user
+    def compute(self, user, params):
         now = timezone.now()
         start_of_year = now.replace(month=1, day=1)
 
         # Get total sales per month
-        monthly_sales = (
-            Payment.objects.filter(
-                vendor=user,
-                status=PaymentStatusEnum.COMPLETED.value,
-                created_at__gte=start_of_year,
-                created_at__lte=now
-            )
-            .annotate(month=TruncMonth("created_at"))
-            .values("month")
-            .annotate(total=Sum("amount"))
-            .order_by("month")
-        )
+        monthly_sales = sales_by_month("payments", start_of_year.date(), now.date(), vendor=user)
 
         # Prepare all months Jan–Dec with 0 as default
         sales_data = [
@@ -533,9 +343,8 @@ class VendorSalesPerformanceView(APIView):
         ]
 
         # Fill in sales values
-        for entry in monthly_sales:
-            month_num = entry["month"].month
-            sales_data[month_num - 1]["value"] = float(entry["total"] or 0)
+        for month, total in monthly_sales.items():
+            sales_data[month.month - 1]["value"] = float(total)
 
         return Response({"sales_performance": sales_data})
 
@@ -561,110 +370,55 @@ class VendorSalesPerformanceView(APIView):
 
 
 
-class DashboardStatsView(APIView):
+class DashboardStatsView(CachedDashboardMixin, APIView):
     permission_classes = [IsAdminUser]
-
-    def get(self, request):
-        today = timezone.now().date()
-        start_of_month = today.replace(day=1)
-        prev_month_end = start_of_month - timedelta(days=1)
-        prev_month_start = prev_month_end.replace(day=1)
-
-        # ------- Total Revenue (completed payments only) -------
-        total_revenue = (
-            Payment.objects.filter(status=PaymentStatusEnum.COMPLETED.value)
-            .aggregate(total=Sum("amount"))["total"] or 0
-        )
-        prev_revenue = (
-            Payment.objects.filter(
-                status=PaymentStatusEnum.COMPLETED.value,
-                created_at__date__range=[prev_month_start, prev_month_end],
-            ).aggregate(total=Sum("amount"))["total"] or 0
-        )
-        revenue_change = self._calculate_change(total_revenue, prev_revenue)
-
-        # ------- Total Orders -------
-        total_orders = Order.objects.count()
-        prev_orders = Order.objects.filter(
-            order_date__date__range=[prev_month_start, prev_month_end]
-        ).count()
-        orders_change = self._calculate_change(total_orders, prev_orders)
-
-        # ------- New Customers (this month vs last month) -------
-        new_customers = User.objects.filter(created_at__gte=start_of_month).count()
-        prev_customers = User.objects.filter(
-            created_at__date__range=[prev_month_start, prev_month_end]
-        ).count()
-        customers_change = self._calculate_change(new_customers, prev_customers)
-
-        # ------- Active Sellers -------
-        total_sellers = User.objects.filter(role="vendor").count()
-        active_sellers = User.objects.filter(role="vendor", is_active=True).count()
-        active_sellers_percent = (active_sellers / total_sellers * 100) if total_sellers else 0
-        # month-over-month seller activity
-        prev_active_sellers = User.objects.filter(
-            role="vendor", is_active=True, updated_at__range=[prev_month_start, prev_month_end]
-        ).count()
-        sellers_change = self._calculate_change(active_sellers, prev_active_sellers)
-
-        # ------- Low Stock (threshold <=10) -------
-        low_stock = Product.objects.filter(is_stock=True, stock_quantity__lte=10).count()
-        prev_low_stock = Product.objects.filter(
-            is_stock=True, stock_quantity__lte=10, updated_at__range=[prev_month_start, prev_month_end]
-        ).count()
-        low_stock_change = self._calculate_change(low_stock, prev_low_stock)
-
-        # ------- Pending Returns -------
-        pending_returns = ReturnProduct.objects.filter(status="pending").count()
-        prev_pending_returns = ReturnProduct.objects.filter(
-            status="pending", created_at__range=[prev_month_start, prev_month_end]
-        ).count()
-        pending_returns_change = self._calculate_change(pending_returns, prev_pending_returns)
+    cache_tags = ("sales", "products", "alerts", "users", "returns")
+
+    def compute(self, user, params):
+        # One query each on the daily rollup, users, products and returns (dashboard.metrics)
+        metrics = evaluate(ADMIN_DASHBOARD_METRICS)
+        total_sellers = metrics["total_sellers"].value
+        if total_sellers is None:
+            active_sellers_percent = None
+        else:
+            active_sellers_percent = (metrics["active_sellers"].value / total_sellers * 100) if total_sellers else 0
 
         # Final Response
         data = {
             "total_revenue": {
-                "value": f"${total_revenue:,.2f}",
-                "change": revenue_change,
+                "value": format_value(metrics["total_revenue"], "${:,.2f}"),
+                "change": format_change(metrics["total_revenue"]),
                 "note": "Sales revenue compared to last month",
             },
             "total_orders": {
-                "value": f"{total_orders:,}",
-                "change": orders_change,
+                "value": format_value(metrics["total_orders"]),
+                "change": format_change(metrics["total_orders"]),
                 "note": "Order volume compared to last month",
             },
             "new_customers": {
-                "value": f"{new_customers:,}",
-                "change": customers_change,
+                "value": format_value(metrics["new_customers"]),
+                "change": format_change(metrics["new_customers"]),
                 "note": "New customer growth",
             },
             "active_sellers": {
-                "value": f"{active_sellers_percent:.2f}%",
-                "change": sellers_change,
+                "value": None if active_sellers_percent is None else f"{active_sellers_percent:.2f}%",
+                "change": format_change(metrics["active_sellers"]),
                 "note": "Percentage of active sellers",
             },
             "low_stock": {
-                "value": f"{low_stock:,}",
-                "change": low_stock_change,
+                "value": format_value(metrics["low_stock"]),
+                "change": format_change(metrics["low_stock"]),
                 "note": "Products running low",
             },
             "pending_returns": {
-                "value": f"{pending_returns:,}",
-                "change": pending_returns_change,
+                "value": format_value(metrics["pending_returns"]),
+                "change": format_change(metrics["pending_returns"]),
                 "note": "Returns awaiting action",
             },
         }
 
-        return Response(data)
+        return partial_response(data, metrics.missing)
 
-    def _calculate_change(self, current, previous):
-        """Calculate % change vs previous period"""
-        if previous == 0:
-            return "+0%"
-        diff = current - previous
-        percent = (diff / previous) * 100
-        sign = "+" if percent >= 0 else ""
-        return f"{sign}{percent:.1f}%"
 
 
 
@@ -677,77 +431,36 @@ class DashboardStatsView(APIView):
 
 
 
+class SalesOverviewView(CachedDashboardMixin, APIView):
+    permission_classes = [IsAdminUser]
+    cache_tags = ("sales",)
+    cache_params = ("range",)
 
-class SalesOverviewView(APIView):
-    permission_classes = [IsAdminUser]  
-
-    def get(self, request, *args, **kwargs):
+    def compute(self, user, params):
 
-        range_param = request.query_params.get("range", "7d")  
-        today = now().date()
+        range_param = params.get("range", "7d")  
+        today = timezone.localdate()
+        end = today + timedelta(days=1)
 
         if range_param == "7d":
-            start_date = today - timedelta(days=6)
-            qs = (
-                Payment.objects.filter(
-                    status=PaymentStatusEnum.COMPLETED.value,
-                    created_at__date__gte=start_date,
-                )
-                .values("created_at__date")
-                .annotate(total=Sum("amount"))
-                .order_by("created_at__date")
-            )
-            labels = [(start_date + timedelta(days=i)) for i in range(7)]
-            data = {str(item["created_at__date"]): float(item["total"] or 0) for item in qs}
-            result = [
-                {"label": d.strftime("%a"), "sales": data.get(str(d), 0.0)}
-                for d in labels
-            ]
-
+            start, granularity, label = today - timedelta(days=6), "day", "%a"
         elif range_param == "30d":
-            start_date = today - timedelta(days=29)
-            qs = (
-                Payment.objects.filter(
-                    status=PaymentStatusEnum.COMPLETED.value,
-                    created_at__date__gte=start_date,
-                )
-                .values("created_at__date")
-                .annotate(total=Sum("amount"))
-                .order_by("created_at__date")
-            )
-            labels = [(start_date + timedelta(days=i)) for i in range(30)]
-            data = {str(item["created_at__date"]): float(item["total"] or 0) for item in qs}
-            result = [
-                {"label": d.strftime("%d %b"), "sales": data.get(str(d), 0.0)}
-                for d in labels
-            ]
-
+            start, granularity, label = today - timedelta(days=29), "day", "%d %b"
         elif range_param == "1y":
-            qs = (
-                Payment.objects.filter(
-                    status=PaymentStatusEnum.COMPLETED.value,
-                    created_at__year=today.year,
-                )
-                .values("created_at__month")
-                .annotate(total=Sum("amount"))
-                .order_by("created_at__month")
-            )
-            month_map = {
-                i: now().replace(month=i, day=1).strftime("%b")
-                for i in range(1, 13)
-            }
-            data = {item["created_at__month"]: float(item["total"] or 0) for item in qs}
-            result = [
-                {"label": month_map[m], "sales": data.get(m, 0.0)}
-                for m in range(1, 13)
-            ]
-
+            start, granularity, label = today.replace(month=1, day=1), "month", "%b"
+            end = start.replace(year=start.year + 1)
         else:
             return Response(
                 {"detail": "Invalid range. Use 7d, 30d, or 1y."},
                 status=400
             )
 
+        sales = time_series(["revenue"], granularity, midnight(start), midnight(end))
+        result = [
+            {"label": bucket.strftime(label), "sales": value}
+            for bucket, value in zip(sales["buckets"], sales["series"]["revenue"])
+        ]
+
         return Response({"range": range_param, "results": result})
 
 
@@ -760,11 +473,13 @@ class SalesOverviewView(APIView):
 
 
 
-class LatestOrdersView(APIView):
-    permission_classes = [IsAdminUser]  
+class LatestOrdersView(CachedDashboardMixin, APIView):
+    permission_classes = [IsAdminUser]
+    cache_tags = ("orders",)
+    cache_params = ("limit",)
 
-    def get(self, request, *args, **kwargs):
-        limit = int(request.query_params.get("limit", 5))  
+    def compute(self, user, params):
+        limit = int(params.get("limit", 5))  
         orders = Order.objects.order_by("-order_date")[:limit]
         serializer = LatestOrderSerializer(orders, many=True)
         return Response(serializer.data)
@@ -784,29 +499,59 @@ class LatestOrdersView(APIView):
 
 
 
-class LowStockAlertsView(APIView):
+class LowStockAlertsView(CachedDashboardMixin, APIView):
+    """Open low-stock alerts (dashboard.stock); ?threshold=N narrows to products with at most N left."""
     permission_classes = [IsAdminUser]
+    cache_tags = ("alerts",)
+    cache_params = ("threshold",)
 
-    def get(self, request, *args, **kwargs):
-        threshold = int(request.query_params.get("threshold", 5))
-
-        low_stock_products = Product.objects.filter(
-            is_stock=True, stock_quantity__lte=threshold
-        ).order_by("stock_quantity")
-
-        alerts = [
-            Alert(
-                product=p,
-                message=f"Low stock: {p.name} (Only {p.stock_quantity} left)",
-                created_at=now()
-            )
-            for p in low_stock_products
-        ]
+    def compute(self, user, params):
+        alerts = Alert.objects.filter(resolved_at__isnull=True).select_related("product").order_by("stock_quantity")
+        if params.get("threshold"):
+            alerts = alerts.filter(stock_quantity__lte=int(params["threshold"]))
 
         serializer = AlertSerializer(alerts, many=True)
         return Response(serializer.data)
 
 
+class VendorStockAlertsView(CachedDashboardMixin, APIView):
+    permission_classes = [IsAuthenticated, IsVendor]
+    cache_tags = ("alerts:{user}",)
+    cache_per_user = True
+
+    def compute(self, user, params):
+        alerts = (
+            Alert.objects.filter(vendor=user, resolved_at__isnull=True)
+            .select_related("product")
+            .order_by("stock_quantity")
+        )
+        return Response({
+            "threshold": thresholds([user.pk])[user.pk],
+            "alerts": AlertSerializer(alerts, many=True).data,
+        })
+
+
+class VendorStockThresholdView(APIView):
+    """GET or PUT {"threshold": N}: the stock level at or below which the vendor's products raise alerts."""
+    permission_classes = [IsAuthenticated, IsVendor]
+
+    def get(self, request):
+        return Response({"threshold": thresholds([request.user.pk])[request.user.pk]})
+
+    def put(self, request):
+        try:
+            threshold = int(request.data.get("threshold"))
+        except (TypeError, ValueError):
+            return Response({"detail": "threshold must be an integer."}, status=400)
+        try:
+            with transaction.atomic():
+                opened = set_threshold(request.user, threshold)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+        return Response({"threshold": threshold, "opened": opened})
+
+
+
 
 
 
@@ -816,21 +561,9 @@ class VendorPerformanceViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAdminUser]
 
     def get_queryset(self):
-        return (
+        return VendorPerformanceSerializer.annotate(
             User.objects.filter(role=UserRole.VENDOR.value)
-            .annotate(
-                total_revenue=Coalesce(
-                    Sum(
-                        "vendor_payments__amount",
-                        filter=Q(vendor_payments__status=PaymentStatusEnum.COMPLETED.value),
-                        output_field=DecimalField(max_digits=12, decimal_places=2),  # ✅ force decimal
-                    ),
-                    0,
-                    output_field=DecimalField(max_digits=12, decimal_places=2),  # ✅ force decimal
-                )
-            )
-            .order_by("-total_revenue")[:3]  
-        )
+        ).order_by("-revenue")[:3]
 
 
 
@@ -838,31 +571,22 @@ class VendorPerformanceViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 
-class FurnitureSalesComparisonView(APIView):
+class FurnitureSalesComparisonView(CachedDashboardMixin, APIView):
     permission_classes = [IsAdminUser]
+    cache_tags = ("sales",)
+    cache_params = ("year",)
 
-    def get(self, request):
-        year = request.query_params.get("year", now().year)
-
-        sales_data = (
-            Payment.objects.filter(
-                status=PaymentStatusEnum.COMPLETED.value,
-                created_at__year=year
-            )
-            .annotate(month=TruncMonth("created_at"))
-            .values("month")
-            .annotate(total_sales=Sum("amount"))
-            .order_by("month")
-        )
+    def compute(self, user, params):
+        year = int(params.get("year", now().year))
 
-        monthly_dict = {entry["month"].month: float(entry["total_sales"] or 0) for entry in sales_data}
+        sales = time_series(["revenue"], "month", midnight(date(year, 1, 1)), midnight(date(year + 1, 1, 1)))
 
         result = [
             {
-                "month": month_name[m],
-                "sales": monthly_dict.get(m, 0)
+                "month": month_name[bucket.month],
+                "sales": value
             }
-            for m in range(1, 13)
+            for bucket, value in zip(sales["buckets"], sales["series"]["revenue"])
         ]
 
         return Response(result)
@@ -877,24 +601,26 @@ class FurnitureSalesComparisonView(APIView):
 
 
 
-class CategorySalesView(APIView):
+class CategorySalesView(CachedDashboardMixin, APIView):
     permission_classes = [IsAdminUser]
-
-    def get(self, request):
-        sales_data = (
-            Payment.objects.filter(status=PaymentStatusEnum.COMPLETED.value)
-            .values(category_name=F("product__categories__name"))  # Category join
-            .annotate(total_sales=Sum("amount"))
-            .order_by("-total_sales")
+    cache_tags = ("sales",)
+
+    def compute(self, user, params):
+        sales_data = dict(
+            DailySales.objects.exclude(category_id=UNCATEGORISED)
+            .values("category_id")
+            .annotate(total_sales=Sum("payments"))
+            .values_list("category_id", "total_sales")
         )
+        names = dict(Category.objects.filter(id__in=sales_data).values_list("id", "name"))
 
         result = [
             {
-                "category": entry["category_name"],
-                "sales": float(entry["total_sales"] or 0),
+                "category": names[category_id],
+                "sales": float(total),
             }
-            for entry in sales_data
-            if entry["category_name"]  
+            for category_id, total in sorted(sales_data.items(), key=lambda entry: entry[1], reverse=True)
+            if category_id in names and total
         ]
 
         return Response(result)
@@ -903,11 +629,12 @@ class CategorySalesView(APIView):
 
 
 
-class TopSellProductGraphView(APIView):
+class TopSellProductGraphView(CachedDashboardMixin, APIView):
     permission_classes = [IsAdminUser]
+    cache_tags = ("orders",)
+    cache_per_user = True
 
-    def get(self, request):
-        user = request.user
+    def compute(self, user, params):
         today = date.today()
         start_of_month = today.replace(day=1)
 
@@ -954,3 +681,142 @@ class TopSellProductGraphView(APIView):
 
 
 
+
+
+
+def _csv(value):
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+class SalesCubeView(APIView):
+    """
+    Ad-hoc sales breakdowns from the in-memory cube (dashboard.cube), e.g.
+    ?by=category,month&measures=gross,paid&vendor=3&start=2025-01-01&sort=-gross&limit=10
+    Drill down by adding a dimension to `by` and filtering on the parent value.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        cube = load_cube()
+        if cube is None:
+            return Response({"detail": "The sales cube has not been built yet."}, status=503)
+
+        params = request.query_params
+        try:
+            start = parse_date(params["start"]) if params.get("start") else None
+            end = parse_date(params["end"]) if params.get("end") else None
+            limit = int(params["limit"]) if params.get("limit") else None
+            result = cube.query(
+                by=_csv(params.get("by", "")),
+                filters={name: _csv(params[name]) for name in CUBE_FILTERS if params.get(name)},
+                start=start,
+                end=end,
+                measures=_csv(params.get("measures", "")),
+                sort=params.get("sort"),
+                limit=limit,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+        return Response(result)
+
+
+class CohortRetentionView(CachedDashboardMixin, APIView):
+    """Monthly signup cohorts with retention and cumulative revenue, built nightly by dashboard.cohorts."""
+    permission_classes = [IsAdminUser]
+    cache_tags = ("cohorts",)
+
+    def compute(self, user, params):
+        report = CohortReport.objects.order_by("-computed_at").first()
+        if report is None:
+            return Response({"detail": "The cohort report has not been built yet."}, status=503)
+        return Response({"computed_at": report.computed_at, **report.data})
+
+
+class SalesTimeSeriesView(APIView):
+    """
+    Sales series for any range, granularity and timezone (dashboard.timeseries), e.g.
+    ?series=revenue,orders&granularity=week&start=2025-01-01&end=2025-07-01&tz=Asia/Dhaka&transform=cumulative
+    Vendors always get their own data; admins may narrow to one vendor with ?vendor=<id>.
+    """
+    permission_classes = [IsVendorOrAdmin | IsAdminUser]
+
+    def _bound(self, value, tz):
+        moment = parse_datetime(value)
+        if moment is not None:
+            return moment if timezone.is_aware(moment) else timezone.make_aware(moment, tz)
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date '{value}'; use YYYY-MM-DD or an ISO datetime.")
+        return midnight(day, tz)
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            tz = get_timezone(params.get("tz"))
+            today = timezone.localdate(timezone=tz)
+            end = self._bound(params["end"], tz) if params.get("end") else midnight(today + timedelta(days=1), tz)
+            start = self._bound(params["start"], tz) if params.get("start") else end - timedelta(days=30)
+            filters = {}
+            if request.user.role == UserRole.VENDOR.value:
+                filters["vendor"] = request.user
+            elif params.get("vendor"):
+                filters["vendor"] = int(params["vendor"])
+            result = time_series(
+                _csv(params.get("series", "revenue")),
+                params.get("granularity", "day"),
+                start,
+                end,
+                tz=tz,
+                transform=params.get("transform"),
+                window=int(params.get("window", 7)),
+                **filters,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+        return Response({
+            "granularity": params.get("granularity", "day"),
+            "timezone": str(tz),
+            "start": start,
+            "end": end,
+            "buckets": result["buckets"],
+            "series": result["series"],
+        })
+
+
+class StockForecastView(generics.ListAPIView):
+    """
+    Nightly stock depletion forecasts (dashboard.forecast), soonest stockout first, e.g.
+    ?sort=-reorder_quantity&within=14&reorder=1
+    Vendors see their own products; admins may narrow to one vendor with ?vendor=<id>.
+    """
+    permission_classes = [IsVendorOrAdmin | IsAdminUser]
+    serializer_class = StockForecastSerializer
+    filter_backends = []
+    sort_fields = ["days_remaining", "stockout_on", "reorder_quantity", "daily_velocity", "stock_quantity"]
+
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            vendor_id = int(params["vendor"]) if params.get("vendor") else None
+            within = float(params["within"]) if params.get("within") else None
+        except ValueError:
+            raise ValidationError({"detail": "vendor and within must be numbers."})
+
+        forecasts = StockForecast.objects.select_related("product")
+        if self.request.user.role == UserRole.VENDOR.value:
+            forecasts = forecasts.filter(vendor=self.request.user)
+        elif vendor_id is not None:
+            forecasts = forecasts.filter(vendor_id=vendor_id)
+        if within is not None:
+            forecasts = forecasts.filter(days_remaining__lte=within)
+        if params.get("reorder"):
+            forecasts = forecasts.filter(reorder_quantity__gt=0)
+
+        sort = params.get("sort", "days_remaining")
+        if sort.lstrip("-") not in self.sort_fields:
+            raise ValidationError({"sort": f"Use one of: {', '.join(self.sort_fields)} (prefix - for descending)."})
+        # Products without recent sales have no forecast and go last either way.
+        field = F(sort.lstrip("-"))
+        ordering = field.desc(nulls_last=True) if sort.startswith("-") else field.asc(nulls_last=True)
+        return forecasts.order_by(ordering, "product_id")
@@ -43,6 +43,7 @@ from chat.middleware import JWTAuthMiddleware
  
 from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
 from notification.routing import websocket_urlpatterns as notification_websocket_urlpatterns
+from dashboard.routing import websocket_urlpatterns as dashboard_websocket_urlpatterns
  
  
 application = ProtocolTypeRouter(
@@ -53,6 +54,7 @@ application = ProtocolTypeRouter(
                 # websocket_urlpatterns
                  chat_websocket_urlpatterns
                 + notification_websocket_urlpatterns
+                + dashboard_websocket_urlpatterns
                 ))
         ),
     },
@@ -39,6 +39,53 @@ app.autodiscover_tasks()
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://redis:6379/0")
 CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default="redis://redis:6379/0")
 
+CELERY_BEAT_SCHEDULE = {
+    "archive-closed-orders": {
+        "task": "orders.tasks.archive_closed_orders_task",
+        "schedule": timedelta(hours=24),
+    },
+    "flush-dirty-carts": {
+        "task": "orders.tasks.flush_carts_task",
+        "schedule": timedelta(seconds=30),
+    },
+    "sweep-stripe-webhook-inbox": {
+        "task": "payments.tasks.sweep_webhook_inbox",
+        "schedule": timedelta(minutes=1),
+    },
+    "refresh-daily-sales": {
+        "task": "dashboard.tasks.refresh_daily_sales",
+        "schedule": timedelta(seconds=30),
+    },
+    "rebuild-recent-daily-sales": {
+        "task": "dashboard.tasks.rebuild_recent_daily_sales",
+        "schedule": timedelta(hours=24),
+    },
+    "reconcile-stripe-payments": {
+        "task": "payments.tasks.reconcile_stripe_payments",
+        "schedule": timedelta(hours=1),
+    },
+    "build-sales-cube": {
+        "task": "dashboard.tasks.build_sales_cube",
+        "schedule": timedelta(hours=1),
+    },
+    "sweep-stock-alerts": {
+        "task": "dashboard.tasks.sweep_stock_alerts",
+        "schedule": timedelta(hours=24),
+    },
+    "build-stock-forecasts": {
+        "task": "dashboard.tasks.build_stock_forecasts",
+        "schedule": timedelta(hours=24),
+    },
+    "build-cohorts": {
+        "task": "dashboard.tasks.build_cohorts",
+        "schedule": timedelta(hours=24),
+    },
+    "purge-stale-chat-uploads": {
+        "task": "chat.tasks.purge_stale_chat_uploads",
+        "schedule": timedelta(hours=6),
+    },
+}
+
 
 ALLOWED_HOSTS = [
     host.strip()
@@ -53,7 +100,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = False
-CORS_ALLOW_HEADERS = list(default_headers)
+CORS_ALLOW_HEADERS = list(default_headers) + ["x-cart-token"]
+CORS_EXPOSE_HEADERS = ["X-Cart-Token"]
 
 # CORS_ALLOW_ALL_ORIGINS = True
 
@@ -75,13 +123,54 @@ STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET")
 # print("jsutcheck", STRIPE_WEBHOOK_SECRET)
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY')
+# Webhook inbox events are dead-lettered after this many failed attempts
+STRIPE_WEBHOOK_MAX_ATTEMPTS = 5
+# Set to the local stand-in (manage.py fake_stripe, e.g. http://127.0.0.1:12111) for load tests
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+# Hourly reconciliation looks back this far (overlapping runs are harmless) and matches this many sessions per query
+STRIPE_RECONCILE_WINDOW_HOURS = 25
+STRIPE_RECONCILE_BATCH_SIZE = 2000
 
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Rendered PDF receipts (served through the API, not MEDIA_URL)
+RECEIPT_STORAGE_DIR = BASE_DIR / 'private' / 'receipts'
+# Asynchronously generated order exports
+EXPORT_STORAGE_DIR = BASE_DIR / 'private' / 'exports'
+# Sales cube behind /api/admin/analytics/cube/, rebuilt by dashboard.tasks.build_sales_cube
+SALES_CUBE_PATH = BASE_DIR / 'private' / 'analytics' / 'sales_cube.npz'
+# Chat attachments uploaded in chunks (served through the API, not MEDIA_URL)
+CHAT_UPLOAD_DIR = BASE_DIR / 'private' / 'chat'
+
+# Carts live in Redis and are written behind into CartItem by flush_carts_task
+CART_STORE_BACKEND = config("CART_STORE_BACKEND", default="orders.cart_store.RedisCartStore")
+CART_REDIS_URL = config("CART_REDIS_URL", default="redis://redis:6379/1")
+CART_USER_TTL = 60 * 60 * 24 * 7
+CART_GUEST_TTL = 60 * 60 * 24 * 30
+
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.redis.RedisCache"),
+        "LOCATION": config("CACHE_URL", default="redis://redis:6379/2"),
+    }
+}
+
+# Dashboard responses (dashboard.cache) are fresh this long unless a write invalidates
+# them, then served stale for up to DASHBOARD_CACHE_MAX_STALE while one refresh runs
+DASHBOARD_CACHE_TTL = config("DASHBOARD_CACHE_TTL", default=300, cast=int)
+DASHBOARD_CACHE_MAX_STALE = config("DASHBOARD_CACHE_MAX_STALE", default=3600, cast=int)
+# Dashboard aggregates run this many at a time per request, each for at most
+# DASHBOARD_QUERY_TIMEOUT seconds (dashboard.parallel)
+DASHBOARD_QUERY_CONCURRENCY = config("DASHBOARD_QUERY_CONCURRENCY", default=4, cast=int)
+DASHBOARD_QUERY_TIMEOUT = config("DASHBOARD_QUERY_TIMEOUT", default=5.0, cast=float)
+
 
 DEFAULT_TAX_RATE = 0.05  # 5%
 
+# Closed orders older than this move to the archive tables (orders.archive)
+ORDER_ARCHIVE_AFTER_DAYS = config('ORDER_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+
 DELIVERY_FEES = {
     "standard": Decimal("50.00"),
     "express": Decimal("150.00"),
@@ -0,0 +1,267 @@
+# orders/archive.py
+"""
+Hot/archive split for Order, OrderItem and Payment.
+
+Closed orders older than ORDER_ARCHIVE_AFTER_DAYS are moved into the Archived*
+tables. Read paths ask for the querysets covering a date range; the archive
+tables are only included when the range reaches past the archive cutoff.
+
+Order lists, order details and receipts read both tables through
+ArchiveReadMixin / CombinedQuerySet; archived orders are read-only.
+"""
+import heapq
+import itertools
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.response import Response
+
+from common.partitions import ensure_monthly_partitions
+from orders.enums import OrderStatus
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, ShippingAddress
+from payments.models import ArchivedPayment, Payment
+
+logger = logging.getLogger(__name__)
+
+CLOSED_ORDER_STATUSES = [
+    OrderStatus.DELIVERED.value,
+    OrderStatus.CANCELLED.value,
+    OrderStatus.REFUNDED.value,
+]
+
+
+def archive_after_days():
+    return int(getattr(settings, "ORDER_ARCHIVE_AFTER_DAYS", 90))
+
+
+def archive_cutoff():
+    return timezone.now() - timedelta(days=archive_after_days())
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value if timezone.is_aware(value) else timezone.make_aware(value)
+    if isinstance(value, date):
+        return timezone.make_aware(datetime.combine(value, time.min))
+    return value
+
+
+def spans_archive(start=None):
+    """True when a range starting at `start` (None = all history) may hold archived rows."""
+    if start is None:
+        return True
+    # Leave a day of slack for orders archived while the range was computed.
+    return _as_datetime(start) < archive_cutoff() + timedelta(days=1)
+
+
+def order_querysets(start=None, **filters):
+    querysets = [Order.objects.filter(**filters)]
+    if spans_archive(start):
+        querysets.append(ArchivedOrder.objects.filter(**filters))
+    return querysets
+
+
+def payment_querysets(start=None, **filters):
+    querysets = [Payment.objects.filter(**filters)]
+    if spans_archive(start):
+        querysets.append(ArchivedPayment.objects.filter(**filters))
+    return querysets
+
+
+def order_item_querysets(start=None, **filters):
+    querysets = [OrderItem.objects.filter(**filters)]
+    if spans_archive(start):
+        querysets.append(ArchivedOrderItem.objects.filter(**filters))
+    return querysets
+
+
+def combined_aggregate(querysets, **aggregates):
+    """Run the same additive aggregate (Sum/Count) on each queryset and add the results."""
+    totals = {key: 0 for key in aggregates}
+    for qs in querysets:
+        for key, value in qs.aggregate(**aggregates).items():
+            totals[key] += value or 0
+    return totals
+
+
+def combined_count(querysets):
+    return sum(qs.count() for qs in querysets)
+
+
+def combined_grouped(querysets, build, key, value="total"):
+    """
+    Merge grouped rows from several querysets. `build(qs)` must return rows with
+    `key` and an additive `value` column, e.g. a TruncDate/values/Sum chain.
+    """
+    merged = defaultdict(int)
+    for qs in querysets:
+        for row in build(qs):
+            merged[row[key]] += row[value] or 0
+    return dict(merged)
+
+
+class CombinedQuerySet:
+    """
+    Read-only list over several querysets merged newest first on `key`, e.g. the live
+    and archived orders of one order list. It supports what Paginator needs (count()
+    and slicing); a slice reads at most `stop` rows from each queryset.
+    """
+    ordered = True
+
+    def __init__(self, querysets, key):
+        self.querysets = [qs.order_by(f"-{key}", "-id") for qs in querysets]
+        self.key = key
+
+    def count(self):
+        return combined_count(self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        stop = index.stop
+        parts = [qs if stop is None else qs[:stop] for qs in self.querysets]
+        merged = heapq.merge(*parts, key=lambda obj: getattr(obj, self.key), reverse=True)
+        return list(itertools.islice(merged, index.start, stop))
+
+
+def attach_archived_items(orders):
+    """Set `archived_items` (what `items` is on live orders) on the archived orders in `orders`, in one query."""
+    archived = {order.id: order for order in orders if isinstance(order, ArchivedOrder)}
+    for order in archived.values():
+        order.archived_items = []
+    if archived:
+        items = ArchivedOrderItem.objects.filter(order_id__in=archived).select_related("product").order_by("id")
+        for item in items:
+            archived[item.order_id].archived_items.append(item)
+    return orders
+
+
+class ArchiveReadMixin:
+    """
+    List and retrieve for Order viewsets that also cover archived orders.
+    `get_archive_queryset()` is the ArchivedOrder counterpart of `get_queryset()`
+    (None to leave the archive out); archived rows are rendered with
+    `archive_serializer_class` and cannot be changed.
+    """
+    archive_serializer_class = None
+    # Set when the serializer renders order items
+    archive_items = False
+
+    def get_archive_queryset(self):
+        return None
+
+    def serialize_order(self, order):
+        if isinstance(order, ArchivedOrder):
+            serializer_class = self.archive_serializer_class or self.get_serializer_class()
+            return serializer_class(order, context=self.get_serializer_context()).data
+        return self.get_serializer(order).data
+
+    def _prepare(self, orders):
+        return attach_archived_items(orders) if self.archive_items else orders
+
+    def list(self, request, *args, **kwargs):
+        archived = self.get_archive_queryset()
+        if archived is None:
+            return super().list(request, *args, **kwargs)
+
+        orders = CombinedQuerySet(
+            [self.filter_queryset(self.get_queryset()), self.filter_queryset(archived)], "order_date"
+        )
+        page = self.paginate_queryset(orders)
+        data = [self.serialize_order(order) for order in self._prepare(list(orders) if page is None else page)]
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = self.get_archive_queryset()
+            lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            if archived is None or not str(lookup).isdigit():
+                raise
+            order = archived.filter(id=int(lookup)).first()
+            if order is None:
+                raise
+            return Response(self.serialize_order(self._prepare([order])[0]))
+
+
+# -----------------------------
+# Archiving job
+# -----------------------------
+def _archivable_order_ids(cutoff, batch_size):
+    return list(
+        Order.objects.filter(order_date__lt=cutoff, order_status__in=CLOSED_ORDER_STATUSES)
+        .exclude(items__return_requests__isnull=False)
+        .exclude(chats__isnull=False)
+        .order_by("order_date")
+        .values_list("id", flat=True)
+        .distinct()[:batch_size]
+    )
+
+
+def archive_order_batch(order_ids):
+    orders = list(Order.objects.filter(id__in=order_ids).values(
+        *[f.attname for f in ArchivedOrder._meta.concrete_fields if f.attname != "archived_at"]
+    ))
+    if not orders:
+        return 0
+    order_dates = {row["id"]: row["order_date"] for row in orders}
+
+    items = list(OrderItem.objects.filter(order_id__in=order_ids).values(
+        *[f.attname for f in ArchivedOrderItem._meta.concrete_fields if f.attname != "order_date"]
+    ))
+    payments = list(Payment.objects.filter(order_id__in=order_ids).values(
+        *[f.attname for f in ArchivedPayment._meta.concrete_fields]
+    ))
+
+    oldest = min(order_dates.values())
+    newest = max(order_dates.values())
+    ensure_monthly_partitions(ArchivedOrder, oldest, newest)
+    ensure_monthly_partitions(ArchivedOrderItem, oldest, newest)
+    if payments:
+        ensure_monthly_partitions(
+            ArchivedPayment, min(p["created_at"] for p in payments), max(p["created_at"] for p in payments)
+        )
+
+    with transaction.atomic():
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**row) for row in orders], ignore_conflicts=True)
+        ArchivedOrderItem.objects.bulk_create(
+            [ArchivedOrderItem(order_date=order_dates[row["order_id"]], **row) for row in items],
+            ignore_conflicts=True,
+        )
+        ArchivedPayment.objects.bulk_create([ArchivedPayment(**row) for row in payments], ignore_conflicts=True)
+
+        # Addresses outlive the order they were first attached to.
+        ShippingAddress.objects.filter(order_id__in=order_ids).update(order=None)
+        Payment.objects.filter(order_id__in=order_ids).delete()
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
+
+    return len(orders)
+
+
+def archive_closed_orders(days=None, batch_size=1000, max_batches=None):
+    """Move closed orders older than `days` into the archive tables, in batches."""
+    cutoff = timezone.now() - timedelta(days=days if days is not None else archive_after_days())
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        order_ids = _archivable_order_ids(cutoff, batch_size)
+        if not order_ids:
+            break
+        moved += archive_order_batch(order_ids)
+        batches += 1
+
+    logger.info(f"Archived {moved} orders older than {cutoff:%Y-%m-%d}")
+    return moved
@@ -0,0 +1,341 @@
+# orders/cart.py
+"""
+Cart service on top of the cart store.
+
+User carts are hydrated from CartItem on first access and written back by
+flush_carts_task (write-behind); checkout, login and /api/cart/ writes flush
+synchronously.
+Guest carts only live in the store, keyed by the X-Cart-Token header, until
+they are merged into the user's cart at login.
+"""
+import logging
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from orders.cart_store import get_cart_store
+from orders.enums import DeliveryType
+from orders.models import CartItem
+from orders.pricing import line_totals, price_totals, promoted_prices
+from products.enums import ProductStatus
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+CART_TOKEN_HEADER = "X-Cart-Token"
+
+
+def user_cart_key(user_id):
+    return f"user:{user_id}"
+
+
+def guest_cart_key(token):
+    return f"guest:{token}"
+
+
+def new_guest_token():
+    return uuid.uuid4().hex
+
+
+def valid_guest_token(token):
+    try:
+        return uuid.UUID(str(token)).hex == str(token)
+    except (TypeError, ValueError):
+        return False
+
+
+SUMMARY_TTL = 60 * 10
+
+
+def _ttl(user_id):
+    if user_id is None:
+        return getattr(settings, "CART_GUEST_TTL", 60 * 60 * 24 * 30)
+    return getattr(settings, "CART_USER_TTL", 60 * 60 * 24 * 7)
+
+
+def stock_limit(product):
+    """Upper bound enforced on increment; None when the product does not track stock."""
+    if getattr(product, "is_stock", False) and product.stock_quantity:
+        return product.stock_quantity
+    return None
+
+
+def cart_products():
+    return Product.objects.filter(status=ProductStatus.APPROVED.value, is_active=True)
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def _db_lines(user_id):
+    rows = (
+        CartItem.objects.filter(user_id=user_id, saved_for_later=False)
+        .values_list("product_id", "quantity", "price_snapshot", "product__is_stock", "product__stock_quantity")
+    )
+    return {
+        product_id: {
+            "quantity": quantity,
+            "price": price,
+            "stock": stock_quantity if is_stock and stock_quantity else None,
+        }
+        for product_id, quantity, price, is_stock, stock_quantity in rows
+    }
+
+
+def load_cart(key, user_id=None):
+    """Cart lines for `key`; a user's cart is hydrated from CartItem when it is not in the store."""
+    store = get_cart_store()
+    if user_id is not None and not store.exists(key):
+        lines = _db_lines(user_id)
+        store.replace(key, lines, ttl=_ttl(user_id))
+        return lines
+    return store.get_lines(key)
+
+
+def _ensure_loaded(key, user_id):
+    if user_id is not None and not get_cart_store().exists(key):
+        load_cart(key, user_id)
+
+
+# -----------------------------
+# Writes
+# -----------------------------
+def _changed(user_id):
+    if user_id is not None:
+        get_cart_store().mark_dirty(user_id)
+
+
+def add_line(key, product, quantity, user_id=None):
+    """Set the quantity of `product` in the cart, snapshotting its current price."""
+    _ensure_loaded(key, user_id)
+    line = {"quantity": quantity, "price": product.price1, "stock": stock_limit(product)}
+    get_cart_store().set_line(key, product.id, quantity, line["price"], line["stock"], ttl=_ttl(user_id))
+    _changed(user_id)
+    return line
+
+
+def change_quantity(key, product_id, delta, user_id=None):
+    """
+    Add `delta` to a line's quantity. Returns the line, or None when it is not in
+    the cart. Quantities stay within [1, stock]; decrements never touch the DB,
+    increments check the product's current stock rather than the snapshot taken
+    when the line was added.
+    """
+    store = get_cart_store()
+    _ensure_loaded(key, user_id)
+    line = store.get_lines(key).get(product_id)
+    if line is None:
+        return None
+
+    limit = line["stock"]
+    if delta > 0:
+        product = Product.objects.filter(pk=product_id).only("is_stock", "stock_quantity").first()
+        limit = stock_limit(product) if product is not None else limit
+        line["stock"] = limit
+
+    ttl = _ttl(user_id)
+    quantity = store.incr(key, product_id, delta, ttl=ttl)
+    if quantity is None:
+        return None
+    if quantity < 1 or (limit is not None and quantity > limit):
+        store.incr(key, product_id, -delta, ttl=ttl)
+        line["quantity"] = quantity - delta
+        line["rejected"] = True
+        return line
+
+    line["quantity"] = quantity
+    _changed(user_id)
+    return line
+
+
+def set_quantity(key, product_id, quantity, user_id=None):
+    line = load_cart(key, user_id).get(product_id)
+    if line is None:
+        return None
+    return change_quantity(key, product_id, quantity - line["quantity"], user_id=user_id)
+
+
+def remove_line(key, product_id, user_id=None):
+    _ensure_loaded(key, user_id)
+    get_cart_store().remove_line(key, product_id, ttl=_ttl(user_id))
+    _changed(user_id)
+
+
+def clear_user_cart(user_id):
+    """Drop the cached cart after checkout has deleted the CartItem rows."""
+    get_cart_store().delete(user_cart_key(user_id))
+
+
+# -----------------------------
+# Pricing summary
+# -----------------------------
+def _build_summary(lines, version):
+    names = dict(Product.objects.filter(id__in=lines.keys()).values_list("id", "name"))
+    promoted = promoted_prices({product_id: line["price"] for product_id, line in lines.items() if product_id in names})
+    summary_lines = []
+    subtotal = discount = Decimal("0.00")
+    item_count = 0
+    for product_id, line in lines.items():
+        totals = line_totals(line["price"], line["quantity"], promoted.get(product_id))
+        available = product_id in names
+        if available:
+            subtotal += totals["subtotal"]
+            discount += totals["discount"]
+            item_count += line["quantity"]
+        summary_lines.append({
+            "product_id": product_id,
+            "name": names.get(product_id),
+            "quantity": line["quantity"],
+            "unit_price": str(line["price"]),
+            **{k: str(v) for k, v in totals.items()},
+            "available": available,
+        })
+    return {
+        "version": version,
+        "lines": summary_lines,
+        "item_count": item_count,
+        "subtotal": str(subtotal),
+        "discount": str(discount),
+    }
+
+
+def cart_summary(key, user_id=None):
+    """
+    Per-line and overall totals for every delivery type, with the discounts of running
+    promotions. The line part is cached next to the cart for its current version, so
+    unchanged carts cost no query; a promotion starting or ending shows up once that
+    cache expires (SUMMARY_TTL) or the cart changes. Line taxes are rounded per line,
+    the overall tax once on the cart like Order.update_totals.
+    """
+    store = get_cart_store()
+    summary = None
+    version = 0
+    if key is not None:
+        _ensure_loaded(key, user_id)
+        version = store.version(key)
+        summary = store.get_summary(key)
+    if summary is None or summary.get("version") != version:
+        summary = _build_summary(store.get_lines(key) if key else {}, version)
+        if version:
+            store.set_summary(key, summary, ttl=SUMMARY_TTL)
+
+    subtotal, discount = Decimal(summary["subtotal"]), Decimal(summary.get("discount", "0.00"))
+    summary["totals"] = {
+        delivery_type.value: {
+            k: str(v) for k, v in price_totals(subtotal, discount, delivery_type=delivery_type.value).items()
+        }
+        for delivery_type in DeliveryType
+    }
+    return summary
+
+
+# -----------------------------
+# Write-behind
+# -----------------------------
+def persist_cart(user_id, lines):
+    """Make the user's active CartItem rows match `lines` with one bulk upsert."""
+    existing = set(Product.objects.filter(id__in=lines.keys()).values_list("id", flat=True))
+    items = [
+        CartItem(
+            user_id=user_id,
+            product_id=product_id,
+            quantity=line["quantity"],
+            price_snapshot=line["price"],
+            saved_for_later=False,
+        )
+        for product_id, line in lines.items()
+        if product_id in existing
+    ]
+    with transaction.atomic():
+        CartItem.objects.filter(user_id=user_id, saved_for_later=False).exclude(product_id__in=existing).delete()
+        if items:
+            CartItem.objects.bulk_create(
+                items,
+                update_conflicts=True,
+                unique_fields=["product", "user"],
+                update_fields=["quantity", "price_snapshot", "saved_for_later", "updated_at"],
+            )
+
+
+def _flush(user_id):
+    key = user_cart_key(user_id)
+    if get_cart_store().exists(key):
+        persist_cart(user_id, get_cart_store().get_lines(key))
+
+
+def flush_user_cart(user_id):
+    """
+    Write the user's cart back to CartItem now if it has unflushed changes. The mark is
+    taken before the lines are read, so a change made meanwhile marks the cart again
+    and is picked up by the next flush.
+    """
+    store = get_cart_store()
+    if not store.take_dirty(user_id):
+        return False
+    try:
+        _flush(user_id)
+    except Exception:
+        store.mark_dirty(user_id)
+        raise
+    return True
+
+
+def flush_dirty_carts(batch_size=500):
+    store = get_cart_store()
+    flushed = 0
+    while True:
+        user_ids = store.pop_dirty(batch_size)
+        if not user_ids:
+            break
+        for user_id in user_ids:
+            try:
+                _flush(user_id)
+                flushed += 1
+            except Exception:
+                logger.exception(f"Failed to flush cart for user {user_id}")
+                store.mark_dirty(user_id)
+        if len(user_ids) < batch_size:
+            break
+    return flushed
+
+
+# -----------------------------
+# Guest carts
+# -----------------------------
+def merge_guest_cart(token, user):
+    """Fold a guest cart into the user's cart (quantities add up, capped at stock) and persist it."""
+    if not valid_guest_token(token):
+        return 0
+    store = get_cart_store()
+    guest_key = guest_cart_key(token)
+    guest_lines = store.get_lines(guest_key)
+    if not guest_lines:
+        return 0
+
+    key = user_cart_key(user.id)
+    lines = load_cart(key, user.id)
+    for product_id, guest_line in guest_lines.items():
+        line = lines.get(product_id)
+        if line is None:
+            lines[product_id] = guest_line
+            continue
+        quantity = line["quantity"] + guest_line["quantity"]
+        limit = guest_line["stock"] if guest_line["stock"] is not None else line["stock"]
+        line["quantity"] = min(quantity, limit) if limit is not None else quantity
+
+    store.replace(key, lines, ttl=_ttl(user.id))
+    persist_cart(user.id, lines)
+    store.delete(guest_key)
+    logger.info(f"Merged {len(guest_lines)} guest cart lines into cart of user {user.id}")
+    return len(guest_lines)
+
+
+def merge_guest_cart_at_login(token, user):
+    """merge_guest_cart for login and signup: a cart store failure is logged and never fails the login."""
+    try:
+        return merge_guest_cart(token, user)
+    except Exception:
+        logger.exception(f"Failed to merge guest cart into cart of user {user.id}")
+        return 0
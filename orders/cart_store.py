@@ -0,0 +1,299 @@
+# orders/cart_store.py
+"""
+Key/value storage for carts.
+
+A cart is a hash keyed by cart key ("user:<id>" or "guest:<token>") holding,
+per product, the quantity (`q:<id>`), the price snapshot (`p:<id>`) and the
+stock limit seen when the line was added (`s:<id>`, empty when untracked).
+Every mutation, including replacing the whole cart, bumps `__version`; derived
+data such as the pricing summary is cached next to the hash and is only valid
+for the version it was built from.
+RedisCartStore is used in deployments; LocalCartStore is an in-process
+stand-in with the same behaviour for tests and local development.
+"""
+import json
+import threading
+import time
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+LOADED_FIELD = "__loaded"
+VERSION_FIELD = "__version"
+DIRTY_SET = "cart:dirty"
+
+# KEYS: cart hash, summary. ARGV: ttl, then field/value pairs. Returns the new version.
+REPLACE_SCRIPT = """
+local version = tonumber(redis.call('HGET', KEYS[1], '__version') or '0') + 1
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('HSET', KEYS[1], '__version', version, unpack(ARGV, 2))
+if tonumber(ARGV[1]) > 0 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end
+return version
+"""
+
+# KEYS: cart hash. ARGV: quantity field, delta, ttl. Returns the new quantity, nil when the line is absent.
+INCR_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then return false end
+local quantity = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[1], '__version', 1)
+if tonumber(ARGV[3]) > 0 then redis.call('EXPIRE', KEYS[1], ARGV[3]) end
+return quantity
+"""
+
+
+def _line_fields(product_id):
+    return f"q:{product_id}", f"p:{product_id}", f"s:{product_id}"
+
+
+def decode_lines(raw):
+    """{field: value} hash -> {product_id: {"quantity", "price", "stock"}}"""
+    lines = {}
+    for field, value in raw.items():
+        if field.startswith("__") or ":" not in field:
+            continue
+        kind, product_id = field.split(":", 1)
+        line = lines.setdefault(int(product_id), {"quantity": 0, "price": Decimal("0.00"), "stock": None})
+        if kind == "q":
+            line["quantity"] = int(value)
+        elif kind == "p":
+            line["price"] = Decimal(value)
+        elif kind == "s":
+            line["stock"] = int(value) if value not in ("", None) else None
+    return {pid: line for pid, line in lines.items() if line["quantity"] > 0}
+
+
+class BaseCartStore:
+    def exists(self, key):
+        raise NotImplementedError
+
+    def get_lines(self, key):
+        raise NotImplementedError
+
+    def replace(self, key, lines, ttl=None):
+        """Overwrite the whole cart with `lines` ({product_id: {"quantity", "price", "stock"}})."""
+        raise NotImplementedError
+
+    def set_line(self, key, product_id, quantity, price, stock=None, ttl=None):
+        raise NotImplementedError
+
+    def incr(self, key, product_id, delta, ttl=None):
+        """Atomically add `delta` to the quantity; returns the new quantity (None if the line is absent)."""
+        raise NotImplementedError
+
+    def remove_line(self, key, product_id, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def version(self, key):
+        raise NotImplementedError
+
+    def get_summary(self, key):
+        """Cached summary dict for the cart, or None."""
+        raise NotImplementedError
+
+    def set_summary(self, key, summary, ttl=None):
+        raise NotImplementedError
+
+    def mark_dirty(self, user_id):
+        raise NotImplementedError
+
+    def pop_dirty(self, count):
+        raise NotImplementedError
+
+    def take_dirty(self, user_id):
+        """Unmark the user's cart; True when it had unflushed changes."""
+        raise NotImplementedError
+
+
+class RedisCartStore(BaseCartStore):
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        # Check-and-write steps run as scripts so concurrent writers cannot interleave.
+        self.replace_script = self.client.register_script(REPLACE_SCRIPT)
+        self.incr_script = self.client.register_script(INCR_SCRIPT)
+
+    def _key(self, key):
+        return f"cart:{key}"
+
+    def _summary_key(self, key):
+        return f"cart:{key}:summary"
+
+    def _touch(self, pipe, key, ttl):
+        if ttl:
+            pipe.expire(self._key(key), ttl)
+
+    def exists(self, key):
+        return bool(self.client.exists(self._key(key)))
+
+    def get_lines(self, key):
+        return decode_lines(self.client.hgetall(self._key(key)))
+
+    def replace(self, key, lines, ttl=None):
+        args = [ttl or 0, LOADED_FIELD, 1]
+        for product_id, line in lines.items():
+            q, p, s = _line_fields(product_id)
+            args += [q, line["quantity"], p, str(line["price"]), s, "" if line.get("stock") is None else line["stock"]]
+        self.replace_script(keys=[self._key(key), self._summary_key(key)], args=args)
+
+    def set_line(self, key, product_id, quantity, price, stock=None, ttl=None):
+        q, p, s = _line_fields(product_id)
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(key), mapping={q: quantity, p: str(price), s: "" if stock is None else stock, LOADED_FIELD: 1})
+        pipe.hincrby(self._key(key), VERSION_FIELD, 1)
+        self._touch(pipe, key, ttl)
+        pipe.execute()
+
+    def incr(self, key, product_id, delta, ttl=None):
+        q, _, _ = _line_fields(product_id)
+        quantity = self.incr_script(keys=[self._key(key)], args=[q, delta, ttl or 0])
+        return None if quantity is None else int(quantity)
+
+    def remove_line(self, key, product_id, ttl=None):
+        pipe = self.client.pipeline()
+        pipe.hdel(self._key(key), *_line_fields(product_id))
+        pipe.hincrby(self._key(key), VERSION_FIELD, 1)
+        self._touch(pipe, key, ttl)
+        pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(self._key(key), self._summary_key(key))
+
+    def version(self, key):
+        return int(self.client.hget(self._key(key), VERSION_FIELD) or 0)
+
+    def get_summary(self, key):
+        raw = self.client.get(self._summary_key(key))
+        return json.loads(raw) if raw else None
+
+    def set_summary(self, key, summary, ttl=None):
+        self.client.set(self._summary_key(key), json.dumps(summary), ex=ttl)
+
+    def mark_dirty(self, user_id):
+        self.client.sadd(DIRTY_SET, user_id)
+
+    def pop_dirty(self, count):
+        return [int(user_id) for user_id in (self.client.spop(DIRTY_SET, count) or [])]
+
+    def take_dirty(self, user_id):
+        return bool(self.client.srem(DIRTY_SET, user_id))
+
+
+class LocalCartStore(BaseCartStore):
+    """In-memory stand-in for RedisCartStore (single process only)."""
+
+    def __init__(self, url=None):
+        self.lock = threading.Lock()
+        self.hashes = {}
+        self.expiry = {}
+        self.summaries = {}
+        self.dirty = set()
+
+    def _hash(self, key, create=False):
+        deadline = self.expiry.get(key)
+        if deadline is not None and deadline < time.monotonic():
+            self.hashes.pop(key, None)
+            self.expiry.pop(key, None)
+        if create:
+            return self.hashes.setdefault(key, {})
+        return self.hashes.get(key)
+
+    def _touch(self, key, ttl):
+        if ttl:
+            self.expiry[key] = time.monotonic() + ttl
+
+    def exists(self, key):
+        with self.lock:
+            return self._hash(key) is not None
+
+    def get_lines(self, key):
+        with self.lock:
+            return decode_lines(dict(self._hash(key) or {}))
+
+    def replace(self, key, lines, ttl=None):
+        with self.lock:
+            data = {LOADED_FIELD: 1, VERSION_FIELD: (self._hash(key) or {}).get(VERSION_FIELD, 0) + 1}
+            for product_id, line in lines.items():
+                q, p, s = _line_fields(product_id)
+                data.update({q: line["quantity"], p: str(line["price"]), s: line.get("stock")})
+            self.hashes[key] = data
+            self.summaries.pop(key, None)
+            self._touch(key, ttl)
+
+    def set_line(self, key, product_id, quantity, price, stock=None, ttl=None):
+        with self.lock:
+            q, p, s = _line_fields(product_id)
+            data = self._hash(key, create=True)
+            data.update({q: quantity, p: str(price), s: stock, LOADED_FIELD: 1})
+            data[VERSION_FIELD] = data.get(VERSION_FIELD, 0) + 1
+            self._touch(key, ttl)
+
+    def incr(self, key, product_id, delta, ttl=None):
+        with self.lock:
+            data = self._hash(key)
+            q, _, _ = _line_fields(product_id)
+            if not data or q not in data:
+                return None
+            data[q] = int(data[q]) + delta
+            data[VERSION_FIELD] = data.get(VERSION_FIELD, 0) + 1
+            self._touch(key, ttl)
+            return data[q]
+
+    def remove_line(self, key, product_id, ttl=None):
+        with self.lock:
+            data = self._hash(key, create=True)
+            for field in _line_fields(product_id):
+                data.pop(field, None)
+            data[VERSION_FIELD] = data.get(VERSION_FIELD, 0) + 1
+            self._touch(key, ttl)
+
+    def delete(self, key):
+        with self.lock:
+            self.hashes.pop(key, None)
+            self.expiry.pop(key, None)
+            self.summaries.pop(key, None)
+
+    def version(self, key):
+        with self.lock:
+            return (self._hash(key) or {}).get(VERSION_FIELD, 0)
+
+    def get_summary(self, key):
+        with self.lock:
+            return self.summaries.get(key)
+
+    def set_summary(self, key, summary, ttl=None):
+        with self.lock:
+            self.summaries[key] = json.loads(json.dumps(summary))
+
+    def mark_dirty(self, user_id):
+        with self.lock:
+            self.dirty.add(int(user_id))
+
+    def pop_dirty(self, count):
+        with self.lock:
+            popped = [self.dirty.pop() for _ in range(min(count, len(self.dirty)))]
+            return popped
+
+    def take_dirty(self, user_id):
+        with self.lock:
+            if int(user_id) not in self.dirty:
+                return False
+            self.dirty.discard(int(user_id))
+            return True
+
+
+@lru_cache(maxsize=None)
+def _load_store(backend, url):
+    return import_string(backend)(url)
+
+
+def get_cart_store():
+    return _load_store(
+        getattr(settings, "CART_STORE_BACKEND", "orders.cart_store.RedisCartStore"),
+        getattr(settings, "CART_REDIS_URL", "redis://redis:6379/1"),
+    )
@@ -0,0 +1,138 @@
+# orders/exports.py
+import heapq
+import logging
+import os
+import uuid
+from operator import itemgetter
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from common.exports import stream_export
+from orders.archive import spans_archive
+from orders.models import ArchivedOrder, Order
+from orders.search import search_archived_orders, search_orders
+from users.enums import UserRole
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (header, values() lookup)
+ORDER_EXPORT_COLUMNS = [
+    ("Order ID", "order_id"),
+    ("Order Date", "order_date"),
+    ("Customer Email", "customer__email"),
+    ("Customer First Name", "customer__first_name"),
+    ("Customer Last Name", "customer__last_name"),
+    ("Vendor Email", "vendor__email"),
+    ("Vendor First Name", "vendor__first_name"),
+    ("Vendor Last Name", "vendor__last_name"),
+    ("Order Status", "order_status"),
+    ("Payment Status", "payment_status"),
+    ("Payment Method", "payment_method"),
+    ("Delivery Type", "delivery_type"),
+    ("Items", "item_count"),
+    ("Subtotal", "subtotal"),
+    ("Discount", "discount_amount"),
+    ("Tax", "tax_amount"),
+    ("Delivery Fee", "delivery_fee"),
+    ("Total", "total_amount"),
+]
+
+def scope_orders(user, model=Order):
+    """Orders (or archived orders, with model=ArchivedOrder) visible to `user` in the order management list."""
+    role = getattr(user, "role", None)
+    if role == UserRole.ADMIN.value or getattr(user, "is_staff", False):
+        return model.objects.all()
+    if role == UserRole.VENDOR.value:
+        return model.objects.filter(vendor=user)
+    if role == UserRole.CUSTOMER.value:
+        return model.objects.filter(customer=user)
+    return model.objects.none()
+
+
+def includes_archive(params):
+    """False when the requested date range lies entirely after the archive cutoff."""
+    start_date = parse_date(params.get("start_date") or "")
+    return not (start_date and params.get("end_date")) or spans_archive(start_date)
+
+
+def order_lists(user, params, search=True):
+    """The live and (when the range reaches it) archived orders matching `params`, each newest first."""
+    models = [Order, ArchivedOrder] if includes_archive(params) else [Order]
+    return [filter_orders(scope_orders(user, model), params, search=search) for model in models]
+
+
+def filter_orders(queryset, params, search=True):
+    """Date range, payment/order status and search filters shared by the list and export endpoints."""
+    start_date = params.get("start_date")
+    end_date = params.get("end_date")
+    if start_date and end_date:
+        queryset = queryset.filter(order_date__date__range=[start_date, end_date])
+
+    payment_status = params.get("payment_status")
+    if payment_status:
+        if payment_status.lower() == "none":
+            queryset = queryset.filter(payment_status__isnull=True)
+        elif payment_status.lower() != "all":
+            queryset = queryset.filter(payment_status__iexact=payment_status)
+
+    order_status = params.get("order_status")
+    if order_status and order_status.lower() != "all":
+        queryset = queryset.filter(order_status__iexact=order_status)
+
+    term = params.get("search") if search else None
+    if term:
+        matching = search_archived_orders if queryset.model is ArchivedOrder else search_orders
+        queryset = matching(queryset, term)
+
+    return queryset.order_by("-order_date")
+
+
+def export_rows(querysets):
+    """
+    Flat tuples straight from the DB, newest first across the live and archived
+    querysets; iterator() uses a server-side cursor on PostgreSQL.
+    """
+    lookups = [lookup for _, lookup in ORDER_EXPORT_COLUMNS]
+    return heapq.merge(
+        *[qs.values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE) for qs in querysets],
+        key=itemgetter(lookups.index("order_date")),
+        reverse=True,
+    )
+
+
+def export_header():
+    return [header for header, _ in ORDER_EXPORT_COLUMNS]
+
+
+def export_filename(fmt):
+    return f"orders-export.{fmt}"
+
+
+def export_storage_dir(user_id):
+    root = Path(getattr(settings, "EXPORT_STORAGE_DIR", settings.BASE_DIR / "private" / "exports"))
+    return root / str(user_id)
+
+
+def export_path(user_id, token, fmt):
+    return export_storage_dir(user_id) / f"{token}.{fmt}"
+
+
+def new_export_token():
+    return uuid.uuid4().hex
+
+
+def write_order_export(user, params, fmt, token):
+    """Write the export to disk chunk by chunk; returns the final path."""
+    querysets = order_lists(user, params)
+    path = export_path(user.id, token, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".part")
+    with open(tmp_path, "wb") as fh:
+        for chunk in stream_export(fmt, export_header(), export_rows(querysets)):
+            fh.write(chunk)
+    os.replace(tmp_path, path)
+    logger.info(f"Order export {token} written for user {user.id}")
+    return path
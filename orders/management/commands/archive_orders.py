@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_closed_orders, archive_after_days
+
+
+class Command(BaseCommand):
+    help = "Move closed orders (with their items and payments) older than N days into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Age in days (default: ORDER_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **options):
+        days = options["days"] if options["days"] is not None else archive_after_days()
+        moved = archive_closed_orders(
+            days=days,
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders older than {days} days."))
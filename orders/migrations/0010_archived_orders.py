@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+from common.partitions import create_partitioned_table
+
+
+def partition_archive_tables(apps, schema_editor):
+    create_partitioned_table(schema_editor, apps.get_model("orders", "ArchivedOrder"), "order_date")
+    create_partitioned_table(schema_editor, apps.get_model("orders", "ArchivedOrderItem"), "order_date")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_selected_shipping_address'),
+        ('products', '0010_productspecifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('pk', models.CompositePrimaryKey('id', 'order_date', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('id', models.BigIntegerField()),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('order_date', models.DateTimeField()),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('paid', 'Paid'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('pk', models.CompositePrimaryKey('id', 'order_date', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('id', models.BigIntegerField()),
+                ('order_id', models.CharField(db_index=True, max_length=64)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('promo_code', models.CharField(blank=True, max_length=64, null=True)),
+                ('delivery_type', models.CharField(choices=[('standard', 'Standard'), ('express', 'Express'), ('pickup', 'Pickup')], max_length=20)),
+                ('delivery_instructions', models.TextField(blank=True, null=True)),
+                ('delivery_fee', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('payment_method', models.CharField(blank=True, choices=[('cash', 'Cash'), ('online', 'Online')], max_length=20, null=True)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('paid', 'Paid'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('order_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('paid', 'Paid'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('estimated_delivery', models.DateTimeField(blank=True, null=True)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('order_date', models.DateTimeField()),
+                ('delivery_date', models.DateTimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('selected_shipping_address', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='orders.shippingaddress')),
+                ('vendor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'order_date'], name='orders_arch_vendor__cac5c6_idx'), models.Index(fields=['created_at'], name='orders_arch_created_91566f_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive_tables, migrations.RunPython.noop),
+    ]
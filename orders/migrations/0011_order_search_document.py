@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from common.search import create_text_search_index, drop_text_search_index
+
+# Frozen copy of orders.search at the time of this migration
+BATCH_SIZE = 1000
+DOCUMENT_LOOKUPS = [
+    "order_id",
+    "customer__first_name",
+    "customer__last_name",
+    "customer__email",
+    "vendor__first_name",
+    "vendor__last_name",
+    "phone",
+    "city",
+]
+
+
+def build_documents(Order, ShippingAddress, OrderSearchDocument):
+    attached = ShippingAddress.objects.filter(order_id=OuterRef("pk")).order_by("id")
+    order_ids = list(Order.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        rows = (
+            Order.objects.filter(id__in=order_ids[start:start + BATCH_SIZE])
+            .annotate(
+                phone=Coalesce(
+                    F("selected_shipping_address__phone_number"), Subquery(attached.values("phone_number")[:1])
+                ),
+                city=Coalesce(F("selected_shipping_address__city"), Subquery(attached.values("city")[:1])),
+            )
+            .values_list("id", *DOCUMENT_LOOKUPS)
+        )
+        OrderSearchDocument.objects.bulk_create(
+            [
+                OrderSearchDocument(order_id=row[0], document=" ".join(str(v) for v in row[1:] if v).lower())
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=["order"],
+            update_fields=["document", "updated_at"],
+        )
+
+
+def index_search_documents(apps, schema_editor):
+    OrderSearchDocument = apps.get_model("orders", "OrderSearchDocument")
+    create_text_search_index(schema_editor, OrderSearchDocument, "document")
+    build_documents(
+        apps.get_model("orders", "Order"),
+        apps.get_model("orders", "ShippingAddress"),
+        OrderSearchDocument,
+    )
+
+
+def unindex_search_documents(apps, schema_editor):
+    drop_text_search_index(schema_editor, apps.get_model("orders", "OrderSearchDocument"), "document")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_archived_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchDocument',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='orders.order')),
+                ('document', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(index_search_documents, unindex_search_documents),
+    ]
@@ -10,6 +10,7 @@ from django.core.exceptions import ValidationError
 from users.models import BaseModel
 from products.models import Product
 from orders.enums import OrderStatus, DeliveryType, PaymentMethod
+from orders.pricing import price_totals
 
 User = settings.AUTH_USER_MODEL
 
@@ -97,29 +98,18 @@ class Order(BaseModel):
         subtotal = sum((item.price or Decimal("0.00")) * item.quantity for item in self.items.all())
         item_count = sum(item.quantity for item in self.items.all())
 
-        discount = self.discount_amount or Decimal("0.00")
-
-        if tax_rate is None:
-            tax_rate = Decimal(getattr(settings, "DEFAULT_TAX_RATE", 0))  # e.g., 0.05 for 5%
-
-        if delivery_fee_override is not None:
-            delivery_fee = Decimal(delivery_fee_override)
-        else:
-            fees_map = getattr(
-                settings, "DELIVERY_FEES",
-                {"standard": Decimal("0.00"), "express": Decimal("0.00"), "pickup": Decimal("0.00")}
-            )
-            delivery_fee = Decimal(fees_map.get(self.delivery_type, 0))
-
-        taxable_amount = max(subtotal - discount, Decimal("0.00"))
-        tax_amount = (Decimal(tax_rate) * taxable_amount).quantize(Decimal("0.01"))
-
-        total = (taxable_amount + tax_amount + delivery_fee).quantize(Decimal("0.01"))
-
-        self.subtotal = subtotal.quantize(Decimal("0.01"))
-        self.tax_amount = tax_amount
-        self.delivery_fee = delivery_fee
-        self.total_amount = total
+        totals = price_totals(
+            subtotal,
+            discount=self.discount_amount,
+            delivery_type=self.delivery_type,
+            tax_rate=tax_rate,
+            delivery_fee_override=delivery_fee_override,
+        )
+
+        self.subtotal = totals["subtotal"]
+        self.tax_amount = totals["tax_amount"]
+        self.delivery_fee = totals["delivery_fee"]
+        self.total_amount = totals["total"]
         self.item_count = item_count
         self.save(update_fields=["subtotal", "tax_amount", "delivery_fee", "total_amount", "item_count"])
         return self
@@ -144,6 +134,86 @@ class OrderItem(BaseModel):
 
 
 
+# -----------------------------
+# Order Search Document
+# -----------------------------
+# Lower-cased order id, customer name/email, vendor name and shipping phone/city,
+# rebuilt by orders.signals whenever one of those changes. Indexed for substring
+# search with pg_trgm (PostgreSQL) or an FTS5 trigram table (SQLite); see
+# common.search.
+class OrderSearchDocument(models.Model):
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    document = models.TextField(default="", blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for order {self.order_id}"
+
+
+# -----------------------------
+# Archived Orders
+# -----------------------------
+# Closed orders older than ORDER_ARCHIVE_AFTER_DAYS are moved here by
+# orders.archive.archive_closed_orders. Column names mirror Order/OrderItem so the
+# same filters work on both; on PostgreSQL the tables are range-partitioned by
+# month, which is why the date column is part of the primary key.
+class ArchivedOrder(models.Model):
+    pk = models.CompositePrimaryKey("id", "order_date")
+    id = models.BigIntegerField()
+    order_id = models.CharField(max_length=64, db_index=True)
+    customer = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    vendor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    selected_shipping_address = models.ForeignKey(
+        "ShippingAddress", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+"
+    )
+
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    promo_code = models.CharField(max_length=64, blank=True, null=True)
+    delivery_type = models.CharField(max_length=20, choices=DeliveryType.choices())
+    delivery_instructions = models.TextField(blank=True, null=True)
+    delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    payment_method = models.CharField(max_length=20, choices=PaymentMethod.choices(), blank=True, null=True)
+    payment_status = models.CharField(max_length=20, choices=OrderStatus.choices())
+    order_status = models.CharField(max_length=20, choices=OrderStatus.choices())
+    estimated_delivery = models.DateTimeField(blank=True, null=True)
+    item_count = models.PositiveIntegerField(default=0)
+    order_date = models.DateTimeField()
+    delivery_date = models.DateTimeField(blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["vendor", "order_date"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
+
+
+class ArchivedOrderItem(models.Model):
+    pk = models.CompositePrimaryKey("id", "order_date")
+    id = models.BigIntegerField()
+    order_id = models.BigIntegerField(db_index=True)
+    order_date = models.DateTimeField()
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=OrderStatus.choices())
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} (archived order {self.order_id})"
+
+
+
 # -----------------------------
 # Cart Item
 # -----------------------------
@@ -0,0 +1,86 @@
+# orders/pricing.py
+"""Tax / delivery fee arithmetic shared by Order.update_totals and the cart summary."""
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from orders.enums import DeliveryType
+from products.models import Promotion
+
+CENT = Decimal("0.01")
+
+
+def default_tax_rate():
+    return Decimal(str(getattr(settings, "DEFAULT_TAX_RATE", 0)))  # e.g., 0.05 for 5%
+
+
+def delivery_fee(delivery_type):
+    fees_map = getattr(
+        settings, "DELIVERY_FEES",
+        {"standard": Decimal("0.00"), "express": Decimal("0.00"), "pickup": Decimal("0.00")}
+    )
+    return Decimal(fees_map.get(delivery_type, 0))
+
+
+def price_totals(subtotal, discount=None, delivery_type=DeliveryType.STANDARD.value,
+                 tax_rate=None, delivery_fee_override=None):
+    discount = Decimal(discount or 0)
+    if tax_rate is None:
+        tax_rate = default_tax_rate()
+    fee = Decimal(delivery_fee_override) if delivery_fee_override is not None else delivery_fee(delivery_type)
+
+    taxable_amount = max(subtotal - discount, Decimal("0.00"))
+    tax_amount = (Decimal(tax_rate) * taxable_amount).quantize(CENT)
+    total = (taxable_amount + tax_amount + fee).quantize(CENT)
+    return {
+        "subtotal": Decimal(subtotal).quantize(CENT),
+        "discount": discount.quantize(CENT),
+        "tax_amount": tax_amount,
+        "delivery_fee": fee,
+        "total": total,
+    }
+
+
+def line_totals(unit_price, quantity, promoted_price=None, tax_rate=None):
+    """
+    Subtotal, discount, tax and total of one cart line (delivery fees are per order).
+    `promoted_price` is the unit price after promotions; the discount is the difference.
+    """
+    if tax_rate is None:
+        tax_rate = default_tax_rate()
+    subtotal = (unit_price * quantity).quantize(CENT)
+    discount = Decimal("0.00")
+    if promoted_price is not None and promoted_price < unit_price:
+        discount = ((unit_price - promoted_price) * quantity).quantize(CENT)
+    tax_amount = (Decimal(tax_rate) * (subtotal - discount)).quantize(CENT)
+    return {
+        "subtotal": subtotal,
+        "discount": discount,
+        "tax_amount": tax_amount,
+        "total": subtotal - discount + tax_amount,
+    }
+
+
+def promoted_prices(prices, at=None):
+    """
+    {product_id: unit price after the best promotion running at `at`} for the
+    products in `prices` ({product_id: unit price}) that have one, in one query.
+    """
+    at = at or timezone.now()
+    running = (
+        Promotion.products.through.objects
+        .filter(
+            product_id__in=prices.keys(),
+            promotion__is_active=True,
+            promotion__start_datetime__lte=at,
+            promotion__end_datetime__gt=at,
+        )
+        .select_related("promotion")
+    )
+    best = {}
+    for link in running:
+        price = link.promotion.calculate_discounted_price(prices[link.product_id])
+        if link.product_id not in best or price < best[link.product_id]:
+            best[link.product_id] = price
+    return best
@@ -0,0 +1,147 @@
+# orders/receipts.py
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import fitz
+from django.conf import settings
+
+from orders.archive import attach_archived_items
+from orders.models import ArchivedOrder, Order
+from orders.serializers import ArchivedOrderReceiptSerializer, OrderReceiptSerializer
+
+logger = logging.getLogger(__name__)
+
+# Bump when the PDF layout changes so previously rendered files are not reused.
+RECEIPT_LAYOUT_VERSION = 1
+
+PAGE_WIDTH, PAGE_HEIGHT = fitz.paper_size("a4")
+MARGIN = 50
+LINE_HEIGHT = 16
+
+
+def receipt_queryset():
+    return Order.objects.select_related(
+        "customer", "vendor", "selected_shipping_address"
+    ).prefetch_related("items__product")
+
+
+def archived_receipt_queryset():
+    return ArchivedOrder.objects.select_related("customer", "vendor", "selected_shipping_address")
+
+
+def receipt_order(order_id, **scope):
+    """The live or archived order `order_id` narrowed by `scope` (e.g. customer=user), or None."""
+    order = receipt_queryset().filter(order_id=order_id, **scope).first()
+    if order is None:
+        order = archived_receipt_queryset().filter(order_id=order_id, **scope).first()
+        if order is not None:
+            attach_archived_items([order])
+    return order
+
+
+def receipt_data(order):
+    if isinstance(order, ArchivedOrder):
+        return ArchivedOrderReceiptSerializer(order).data
+    return OrderReceiptSerializer(order).data
+
+
+def receipt_version(data):
+    """Content hash of the receipt payload; used as file key and ETag."""
+    payload = json.dumps(
+        {"layout": RECEIPT_LAYOUT_VERSION, "receipt": data},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def receipt_path(order_id, version):
+    root = Path(getattr(settings, "RECEIPT_STORAGE_DIR", settings.BASE_DIR / "private" / "receipts"))
+    return root / order_id / f"{version}.pdf"
+
+
+def render_receipt_pdf(data):
+    doc = fitz.open()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    y = MARGIN
+
+    def line(text, x=MARGIN, size=10, bold=False):
+        nonlocal page, y
+        if y > PAGE_HEIGHT - MARGIN:
+            page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            y = MARGIN
+        page.insert_text((x, y), str(text), fontsize=size, fontname="hebo" if bold else "helv")
+
+    line("Order Receipt", size=18, bold=True)
+    y += LINE_HEIGHT * 2
+    for label, key in (
+        ("Order", "order_id"),
+        ("Date", "order_date"),
+        ("Customer", "customer_name"),
+        ("Vendor", "vendor_name"),
+        ("Payment", "payment_status_display"),
+        ("Status", "order_status_display"),
+        ("Delivery", "delivery_type_display"),
+    ):
+        line(f"{label}:", bold=True)
+        line(data.get(key) or "-", x=MARGIN + 90)
+        y += LINE_HEIGHT
+
+    address = data.get("shipping_address")
+    if address:
+        y += LINE_HEIGHT / 2
+        line("Ship to:", bold=True)
+        parts = [address.get("full_name"), address.get("street_address"), address.get("city"), address.get("zip_code")]
+        line(", ".join(p for p in parts if p), x=MARGIN + 90)
+        y += LINE_HEIGHT
+
+    y += LINE_HEIGHT
+    line("Item", bold=True)
+    line("Qty", x=PAGE_WIDTH - 220, bold=True)
+    line("Price", x=PAGE_WIDTH - 150, bold=True)
+    y += LINE_HEIGHT
+    for item in data.get("items", []):
+        line(item["product_name"][:60])
+        line(item["quantity"], x=PAGE_WIDTH - 220)
+        line(item["price"], x=PAGE_WIDTH - 150)
+        y += LINE_HEIGHT
+
+    y += LINE_HEIGHT
+    for label, key in (
+        ("Subtotal", "subtotal"),
+        ("Discount", "discount_amount"),
+        ("Tax", "tax_amount"),
+        ("Delivery fee", "delivery_fee"),
+        ("Total", "total_amount"),
+    ):
+        line(label, x=PAGE_WIDTH - 220, bold=key == "total_amount")
+        line(data.get(key), x=PAGE_WIDTH - 150, bold=key == "total_amount")
+        y += LINE_HEIGHT
+
+    doc.set_metadata({"title": f"Receipt {data.get('order_id')}", "creationDate": "", "modDate": ""})
+    pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return pdf_bytes
+
+
+def store_receipt(order):
+    """Render the receipt for `order` unless this exact version is already on disk."""
+    data = receipt_data(order)
+    version = receipt_version(data)
+    path = receipt_path(order.order_id, version)
+    if path.exists():
+        return path, version
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pdf_bytes = render_receipt_pdf(data)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(pdf_bytes)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Rendered receipt {order.order_id} version {version}")
+    return path, version
@@ -0,0 +1,84 @@
+# orders/search.py
+"""
+Order search document: one lower-cased text row per order, so order search is a
+single indexed lookup instead of icontains across the customer and vendor joins.
+"""
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from common.search import text_search_filter
+from orders.models import Order, OrderSearchDocument, ShippingAddress
+
+DOCUMENT_BATCH_SIZE = 1000
+
+DOCUMENT_LOOKUPS = [
+    "order_id",
+    "customer__first_name",
+    "customer__last_name",
+    "customer__email",
+    "vendor__first_name",
+    "vendor__last_name",
+    "phone",
+    "city",
+]
+# Archived orders have no search document; the same fields are matched directly. Archiving
+# detaches the addresses attached to an order, so only the selected address is left.
+ARCHIVE_SEARCH_LOOKUPS = [
+    {"phone": "selected_shipping_address__phone_number", "city": "selected_shipping_address__city"}.get(lookup, lookup)
+    for lookup in DOCUMENT_LOOKUPS
+]
+
+
+def _document_rows(order_model, shipping_model, order_ids):
+    # Prefer the selected address; fall back to the first address attached to the order.
+    attached = shipping_model.objects.filter(order_id=OuterRef("pk")).order_by("id")
+    return (
+        order_model.objects.filter(id__in=order_ids)
+        .annotate(
+            phone=Coalesce(
+                F("selected_shipping_address__phone_number"), Subquery(attached.values("phone_number")[:1])
+            ),
+            city=Coalesce(F("selected_shipping_address__city"), Subquery(attached.values("city")[:1])),
+        )
+        .values_list("id", *DOCUMENT_LOOKUPS)
+    )
+
+
+def build_documents(order_model, shipping_model, document_model, order_ids):
+    """Upsert search documents for `order_ids`, DOCUMENT_BATCH_SIZE orders per statement."""
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), DOCUMENT_BATCH_SIZE):
+        batch = order_ids[start:start + DOCUMENT_BATCH_SIZE]
+        documents = [
+            document_model(order_id=row[0], document=" ".join(str(v) for v in row[1:] if v).lower())
+            for row in _document_rows(order_model, shipping_model, batch)
+        ]
+        document_model.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=["order"],
+            update_fields=["document", "updated_at"],
+        )
+
+
+def refresh_search_documents(order_ids):
+    build_documents(Order, ShippingAddress, OrderSearchDocument, order_ids)
+
+
+def refresh_user_documents(user_id):
+    """Rebuild the documents of every order the user is customer or vendor of; returns how many."""
+    order_ids = list(Order.objects.filter(Q(customer_id=user_id) | Q(vendor_id=user_id)).values_list("id", flat=True))
+    refresh_search_documents(order_ids)
+    return len(order_ids)
+
+
+def search_orders(queryset, term):
+    """Orders whose search document contains every word of `term`."""
+    return text_search_filter(queryset, OrderSearchDocument, "document", "search_document__", term)
+
+
+def search_archived_orders(queryset, term):
+    """Archived orders matching every word of `term` in the ARCHIVE_SEARCH_LOOKUPS fields."""
+    for word in term.split():
+        queryset = queryset.filter(Q(*[(f"{lookup}__icontains", word) for lookup in ARCHIVE_SEARCH_LOOKUPS], _connector=Q.OR))
+    return queryset
@@ -3,7 +3,7 @@ from rest_framework import serializers
 from decimal import Decimal
 from products.models import Product
 from products.serializers import ProductSerializer
-from .models import Order, OrderItem, ShippingAddress, CartItem
+from .models import ArchivedOrder, Order, OrderItem, ShippingAddress, CartItem
 from orders.enums import DeliveryType
 from products.enums import ProductStatus
 from users.serializers import UserSerializer
@@ -150,6 +150,14 @@ class OrderSerializer(serializers.ModelSerializer):
             )
 
 
+class ArchivedOrderSerializer(OrderSerializer):
+    """OrderSerializer for archived orders (orders.archive); items are the attached `archived_items`."""
+    items = OrderItemSerializer(source="archived_items", many=True, read_only=True)
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
 
 
 
@@ -184,10 +192,23 @@ class CartItemSerializer(serializers.ModelSerializer):
         return instance
 
 
+class CartLineSerializer(serializers.Serializer):
+    """A cart line held in the cart store; `id` is the product id."""
+    id = serializers.IntegerField(source="product_id")
+    product = ProductSerializer(read_only=True, required=False)
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField()
+    price_snapshot = serializers.DecimalField(source="price", max_digits=12, decimal_places=2)
+    subtotal = serializers.SerializerMethodField()
+
+    def get_subtotal(self, obj):
+        return str((obj["price"] or Decimal("0.00")) * Decimal(obj["quantity"]))
+
+
 # -------- Receipt --------
 class ReceiptOrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.name")
-    price = serializers.DecimalField(source="product.price1", max_digits=10, decimal_places=2)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
@@ -214,5 +235,8 @@ class OrderReceiptSerializer(serializers.ModelSerializer):
         ]
 
 
+class ArchivedOrderReceiptSerializer(OrderReceiptSerializer):
+    items = ReceiptOrderItemSerializer(source="archived_items", many=True, read_only=True)
 
-
+    class Meta(OrderReceiptSerializer.Meta):
+        model = ArchivedOrder
@@ -0,0 +1,78 @@
+# orders/signals.py
+"""Keep OrderSearchDocument in step with the orders, users and addresses it is built from."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from orders.models import Order, ShippingAddress
+from orders.search import refresh_search_documents
+
+ORDER_DOCUMENT_FIELDS = {"order_id", "customer", "vendor", "selected_shipping_address"}
+USER_DOCUMENT_FIELDS = {"first_name", "last_name", "email"}
+ADDRESS_DOCUMENT_FIELDS = {"phone_number", "city", "order"}
+
+
+def _touches(update_fields, watched):
+    return update_fields is None or bool(watched & set(update_fields))
+
+
+def _note_document_change(sender, instance, update_fields, watched):
+    """
+    Record on `instance` whether this save changes one of the `watched` fields. Saves
+    naming only other fields cost nothing; full saves cost one lookup of the old values.
+    """
+    changed = True
+    if not instance._state.adding and instance.pk is not None:
+        changed = False
+        if _touches(update_fields, watched):
+            columns = [sender._meta.get_field(name).attname for name in watched]
+            old = sender._default_manager.filter(pk=instance.pk).values(*columns).first()
+            changed = old is None or any(old[column] != getattr(instance, column) for column in columns)
+    instance._search_document_changed = changed
+
+
+def _document_changed(instance):
+    return getattr(instance, "_search_document_changed", True)
+
+
+@receiver(pre_save, sender=Order, dispatch_uid="orders_search_document_order_changes")
+def order_saving(sender, instance, update_fields=None, **kwargs):
+    _note_document_change(sender, instance, update_fields, ORDER_DOCUMENT_FIELDS)
+
+
+@receiver(post_save, sender=Order, dispatch_uid="orders_search_document_order")
+def order_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or _document_changed(instance):
+        refresh_search_documents([instance.pk])
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="orders_search_document_user_changes")
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    _note_document_change(sender, instance, update_fields, USER_DOCUMENT_FIELDS)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="orders_search_document_user")
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or not _document_changed(instance):
+        return
+    # A user may have a very large number of orders; rebuild them outside the request.
+    from orders.tasks import refresh_user_search_documents
+
+    user_id = instance.pk
+    transaction.on_commit(lambda: refresh_user_search_documents.delay(user_id))
+
+
+@receiver(pre_save, sender=ShippingAddress, dispatch_uid="orders_search_document_address_changes")
+def address_saving(sender, instance, update_fields=None, **kwargs):
+    _note_document_change(sender, instance, update_fields, ADDRESS_DOCUMENT_FIELDS)
+
+
+@receiver(post_save, sender=ShippingAddress, dispatch_uid="orders_search_document_address")
+def address_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not _document_changed(instance):
+        return
+    order_ids = set(Order.objects.filter(selected_shipping_address=instance).values_list("id", flat=True))
+    if instance.order_id:
+        order_ids.add(instance.order_id)
+    refresh_search_documents(order_ids)
@@ -0,0 +1,67 @@
+# orders/tasks.py
+import logging
+
+from celery import shared_task
+
+from django.urls import reverse
+
+from notification.utils import send_notification_to_user
+from orders.archive import archive_closed_orders, attach_archived_items
+from orders.cart import flush_dirty_carts
+from orders.exports import write_order_export
+from orders.receipts import archived_receipt_queryset, receipt_queryset, store_receipt
+from orders.search import refresh_user_documents
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def render_order_receipt(self, order_pk, archived=False):
+    if archived:
+        order = archived_receipt_queryset().filter(id=order_pk).first()
+        if order is not None:
+            attach_archived_items([order])
+    else:
+        order = receipt_queryset().filter(pk=order_pk).first()
+    if order is None:
+        logger.warning(f"Receipt requested for missing order pk={order_pk}")
+        return None
+
+    try:
+        path, version = store_receipt(order)
+    except OSError as exc:
+        raise self.retry(exc=exc)
+    return version
+
+
+@shared_task
+def archive_closed_orders_task(batch_size=1000):
+    return archive_closed_orders(batch_size=batch_size)
+
+
+@shared_task
+def refresh_user_search_documents(user_id):
+    return refresh_user_documents(user_id)
+
+
+@shared_task
+def flush_carts_task(batch_size=500):
+    return flush_dirty_carts(batch_size=batch_size)
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=30)
+def export_orders_task(self, user_id, params, fmt, token):
+    user = User.objects.get(pk=user_id)
+    try:
+        write_order_export(user, params, fmt, token)
+    except OSError as exc:
+        raise self.retry(exc=exc)
+
+    download_url = reverse("order-manage-export-download", kwargs={"token": token})
+    send_notification_to_user(
+        user=user,
+        message="Your order export is ready to download.",
+        meta_data={"type": "export", "token": token, "format": fmt, "download_url": download_url},
+    )
+    return token
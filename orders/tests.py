@@ -1,3 +1,445 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.archive import archive_closed_orders
+from orders.cart import (
+    add_line, cart_summary, change_quantity, flush_dirty_carts, flush_user_cart, guest_cart_key, load_cart,
+    merge_guest_cart, new_guest_token, user_cart_key,
+)
+from orders.cart_store import _load_store, get_cart_store
+from orders.enums import OrderStatus
+from orders.models import (
+    ArchivedOrder, ArchivedOrderItem, CartItem, Order, OrderItem, OrderSearchDocument, ShippingAddress,
+)
+from orders.receipts import receipt_data, receipt_path, receipt_version, store_receipt
+from orders.tasks import refresh_user_search_documents, render_order_receipt
+from payments.models import ArchivedPayment, Payment
+from products.enums import DiscountType
+from products.models import Product, Promotion
+from users.models import User
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class OrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email="vendor@example.com", password="pass", role="vendor")
+        cls.customer = User.objects.create_user(email="customer@example.com", password="pass", role="customer")
+        cls.product = Product.objects.create(
+            vendor=cls.vendor, name="Chair", price1=Decimal("10.00"), stock_quantity=5, status="approved",
+        )
+
+    def create_order(self, quantity=2, price="9.00"):
+        order = Order.objects.create(customer=self.customer, vendor=self.vendor)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=Decimal(price))
+        return order.update_totals()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ReceiptTests(OrderTestCase):
+    def setUp(self):
+        receipt_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, receipt_dir, ignore_errors=True)
+        settings = override_settings(RECEIPT_STORAGE_DIR=receipt_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.order = self.create_order()
+
+    def pdf_url(self):
+        return f"/api/receipt/{self.order.order_id}/pdf/"
+
+    def test_receipt_uses_the_stored_item_price(self):
+        Product.objects.filter(pk=self.product.pk).update(price1=Decimal("99.00"))
+        data = receipt_data(Order.objects.get(pk=self.order.pk))
+        self.assertEqual(data["items"], [{"product_name": "Chair", "quantity": 2, "price": "9.00"}])
+        self.assertEqual(data["subtotal"], "18.00")
+
+    def test_version_follows_the_receipt_content(self):
+        version = receipt_version(receipt_data(self.order))
+        self.assertEqual(receipt_version(receipt_data(Order.objects.get(pk=self.order.pk))), version)
+
+        OrderItem.objects.filter(order=self.order).update(quantity=3)
+        self.assertNotEqual(receipt_version(receipt_data(Order.objects.get(pk=self.order.pk))), version)
+
+    def test_rendered_once_per_version(self):
+        path, version = store_receipt(self.order)
+        self.assertEqual(path, receipt_path(self.order.order_id, version))
+        self.assertTrue(path.read_bytes().startswith(b"%PDF"))
+
+        with mock.patch("orders.receipts.render_receipt_pdf") as render:
+            self.assertEqual(store_receipt(self.order), (path, version))
+        render.assert_not_called()
+
+    def test_json_receipt_is_scoped_to_the_order_parties(self):
+        url = f"/api/receipt/{self.order.order_id}/"
+        self.assertEqual(self.client_for(self.customer).get(url).status_code, 200)
+        self.assertEqual(self.client_for(self.vendor).get(url).status_code, 200)
+
+        stranger = User.objects.create_user(email="stranger@example.com", password="pass", role="customer")
+        self.assertEqual(self.client_for(stranger).get(url).status_code, 404)
+
+    def test_missing_pdf_is_rendered_in_the_background(self):
+        with mock.patch.object(render_order_receipt, "delay") as delay:
+            response = self.client_for(self.customer).get(self.pdf_url())
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Retry-After"], "2")
+        delay.assert_called_once_with(self.order.pk, archived=False)
+
+    def test_stored_pdf_is_served_with_etag_and_ranges(self):
+        path, version = store_receipt(self.order)
+        client = self.client_for(self.customer)
+
+        response = client.get(self.pdf_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["ETag"], f'"{version}"')
+        self.assertEqual(b"".join(response.streaming_content), path.read_bytes())
+
+        self.assertEqual(client.get(self.pdf_url(), HTTP_IF_NONE_MATCH=f'"{version}"').status_code, 304)
+
+        response = client.get(self.pdf_url(), HTTP_RANGE="bytes=0-3")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF")
+        response.close()
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ArchiveTests(OrderTestCase):
+    def setUp(self):
+        self.old = self.create_order()
+        Payment.objects.create(
+            order=self.old, customer=self.customer, vendor=self.vendor, amount=self.old.total_amount,
+            payment_method="stripe", status="completed",
+        )
+        Order.objects.filter(pk=self.old.pk).update(
+            order_status=OrderStatus.DELIVERED.value, order_date=timezone.now() - timedelta(days=200)
+        )
+        self.new = Order.objects.create(customer=self.customer, vendor=self.vendor)
+        self.client = self.client_for(self.customer)
+
+    def test_closed_orders_move_with_their_items_and_payments(self):
+        self.assertEqual(archive_closed_orders(), 1)
+
+        self.assertFalse(Order.objects.filter(pk=self.old.pk).exists())
+        archived = ArchivedOrder.objects.get(id=self.old.pk)
+        self.assertEqual((archived.order_id, archived.total_amount), (self.old.order_id, self.old.total_amount))
+        self.assertEqual(ArchivedOrderItem.objects.get(order_id=self.old.pk).quantity, 2)
+        self.assertTrue(ArchivedPayment.objects.filter(order_id=self.old.pk).exists())
+        self.assertTrue(Order.objects.filter(pk=self.new.pk).exists())
+        # Running again moves nothing
+        self.assertEqual(archive_closed_orders(), 0)
+
+    def test_archived_orders_are_listed_and_retrieved(self):
+        archive_closed_orders()
+
+        response = self.client.get("/api/orders/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([order["id"] for order in response.data["results"]], [self.new.pk, self.old.pk])
+        self.assertEqual(response.data["results"][1]["items"][0]["quantity"], 2)
+
+        response = self.client.get(f"/api/orders/{self.old.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["order_id"], self.old.order_id)
+
+    def test_archived_orders_are_read_only(self):
+        archive_closed_orders()
+        response = self.client.patch(f"/api/orders/{self.old.pk}/", {"notes": "x"}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_archived_receipt(self):
+        archive_closed_orders()
+
+        response = self.client.get(f"/api/receipt/{self.old.order_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["items"][0]["product_name"], "Chair")
+
+        stranger = User.objects.create_user(email="stranger@example.com", password="pass", role="customer")
+        client = self.client_for(stranger)
+        self.assertEqual(client.get(f"/api/orders/{self.old.pk}/").status_code, 404)
+        self.assertEqual(client.get(f"/api/receipt/{self.old.order_id}/").status_code, 404)
+
+    def test_admin_order_list_pages_across_both_tables(self):
+        archive_closed_orders()
+        admin = User.objects.create_superuser(email="admin@example.com", password="pass")
+        client = self.client_for(admin)
+
+        response = client.get("/api/vendor/order/list/", {"page_size": 1, "page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["results"][0]["order_id"], self.old.order_id)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CART_STORE_BACKEND="orders.cart_store.LocalCartStore")
+class CartStoreTests(OrderTestCase):
+    def setUp(self):
+        _load_store.cache_clear()
+        self.addCleanup(_load_store.cache_clear)
+        self.store = get_cart_store()
+        self.key = user_cart_key(self.customer.pk)
+
+    def test_cart_is_hydrated_from_cart_items(self):
+        CartItem.objects.create(user=self.customer, product=self.product, quantity=3, price_snapshot=Decimal("10.00"))
+        lines = load_cart(self.key, self.customer.pk)
+        self.assertEqual(lines[self.product.pk]["quantity"], 3)
+
+    def test_every_write_bumps_the_version(self):
+        add_line(self.key, self.product, 1, user_id=self.customer.pk)
+        version = self.store.version(self.key)
+
+        change_quantity(self.key, self.product.pk, 1, user_id=self.customer.pk)
+        self.assertEqual(self.store.version(self.key), version + 1)
+
+        self.store.replace(self.key, load_cart(self.key, self.customer.pk))
+        self.assertEqual(self.store.version(self.key), version + 2)
+
+    def test_quantities_stay_within_stock(self):
+        add_line(self.key, self.product, 5, user_id=self.customer.pk)
+        line = change_quantity(self.key, self.product.pk, 1, user_id=self.customer.pk)
+        self.assertTrue(line["rejected"])
+        self.assertEqual(load_cart(self.key, self.customer.pk)[self.product.pk]["quantity"], 5)
+
+    def test_changes_are_written_behind(self):
+        add_line(self.key, self.product, 2, user_id=self.customer.pk)
+        self.assertFalse(CartItem.objects.exists())
+
+        self.assertEqual(flush_dirty_carts(), 1)
+        self.assertEqual(CartItem.objects.get(user=self.customer).quantity, 2)
+        self.assertEqual(flush_dirty_carts(), 0)
+
+    def test_guest_cart_merges_into_user_cart(self):
+        other = Product.objects.create(
+            vendor=self.vendor, name="Table", price1=Decimal("30.00"), stock_quantity=5, status="approved",
+        )
+        CartItem.objects.create(user=self.customer, product=self.product, quantity=4, price_snapshot=Decimal("10.00"))
+        token = new_guest_token()
+        add_line(guest_cart_key(token), self.product, 3)
+        add_line(guest_cart_key(token), other, 1)
+
+        self.assertEqual(merge_guest_cart(token, self.customer), 2)
+
+        quantities = dict(CartItem.objects.filter(user=self.customer).values_list("product_id", "quantity"))
+        # 4 + 3 is capped at the 5 in stock
+        self.assertEqual(quantities, {self.product.pk: 5, other.pk: 1})
+        self.assertEqual(load_cart(self.key, self.customer.pk)[self.product.pk]["quantity"], 5)
+        self.assertFalse(self.store.exists(guest_cart_key(token)))
+        self.assertEqual(merge_guest_cart(token, self.customer), 0)
+
+    def test_invalid_guest_token_is_ignored(self):
+        self.assertEqual(merge_guest_cart("not-a-token", self.customer), 0)
+
+    def test_increments_check_current_stock(self):
+        add_line(self.key, self.product, 5, user_id=self.customer.pk)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=10)
+        self.assertEqual(change_quantity(self.key, self.product.pk, 1, user_id=self.customer.pk)["quantity"], 6)
+
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=6)
+        self.assertTrue(change_quantity(self.key, self.product.pk, 1, user_id=self.customer.pk)["rejected"])
+        with self.assertNumQueries(0):
+            self.assertEqual(change_quantity(self.key, self.product.pk, -1, user_id=self.customer.pk)["quantity"], 5)
+
+    def test_only_dirty_carts_are_flushed(self):
+        load_cart(self.key, self.customer.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(flush_user_cart(self.customer.pk))
+
+        add_line(self.key, self.product, 2, user_id=self.customer.pk)
+        self.assertTrue(flush_user_cart(self.customer.pk))
+        self.assertEqual(CartItem.objects.get(user=self.customer).quantity, 2)
+        self.assertEqual(flush_dirty_carts(), 0)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CART_STORE_BACKEND="orders.cart_store.LocalCartStore")
+class CartViewTests(OrderTestCase):
+    url = "/api/cart/"
+
+    def setUp(self):
+        _load_store.cache_clear()
+        self.addCleanup(_load_store.cache_clear)
+        self.client = self.client_for(self.customer)
+
+    def test_writes_go_through_the_store(self):
+        response = self.client.post(self.url, {"product_id": self.product.pk, "quantity": 2}, format="json")
+        self.assertEqual(response.status_code, 201)
+        item = CartItem.objects.get(user=self.customer)
+        self.assertEqual((response.data["id"], response.data["quantity"]), (item.pk, 2))
+
+        response = self.client.post(f"{self.url}{item.pk}/increment/")
+        self.assertEqual(response.data["quantity"], 3)
+        self.client.post(f"{self.url}{item.pk}/decrement/")
+        self.client.patch(f"{self.url}{item.pk}/", {"quantity": 4}, format="json")
+
+        self.assertEqual(load_cart(user_cart_key(self.customer.pk), self.customer.pk)[self.product.pk]["quantity"], 4)
+        self.assertEqual(CartItem.objects.get(pk=item.pk).quantity, 4)
+        self.assertEqual(self.client.get(f"{self.url}summary/").data["item_count"], 4)
+
+        self.assertEqual(self.client.delete(f"{self.url}{item.pk}/").status_code, 204)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(load_cart(user_cart_key(self.customer.pk), self.customer.pk), {})
+
+    def test_stock_and_unknown_products_are_rejected(self):
+        response = self.client.post(self.url, {"product_id": 999999}, format="json")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(self.url, {"product_id": self.product.pk, "quantity": 6}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_reads_do_not_flush(self):
+        add_line(user_cart_key(self.customer.pk), self.product, 2, user_id=self.customer.pk)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(flush_dirty_carts(), 1)
+
+
+@override_settings(
+    CACHES=LOCAL_CACHE,
+    CART_STORE_BACKEND="orders.cart_store.LocalCartStore",
+    DEFAULT_TAX_RATE=0.10,
+    DELIVERY_FEES={"standard": Decimal("5.00"), "express": Decimal("12.00"), "pickup": Decimal("0.00")},
+)
+class CartSummaryTests(OrderTestCase):
+    def setUp(self):
+        _load_store.cache_clear()
+        self.addCleanup(_load_store.cache_clear)
+        self.key = user_cart_key(self.customer.pk)
+        self.table = Product.objects.create(
+            vendor=self.vendor, name="Table", price1=Decimal("30.00"), stock_quantity=5, status="approved",
+        )
+        add_line(self.key, self.product, 2, user_id=self.customer.pk)
+        add_line(self.key, self.table, 1, user_id=self.customer.pk)
+
+    def promote(self, product, discount_type, value, **window):
+        now = timezone.now()
+        promotion = Promotion.objects.create(
+            name="Sale", discount_type=discount_type, discount_value=Decimal(value),
+            start_datetime=window.get("start", now - timedelta(days=1)),
+            end_datetime=window.get("end", now + timedelta(days=1)),
+        )
+        promotion.products.add(product)
+
+    def test_line_and_overall_totals(self):
+        self.promote(self.product, DiscountType.PERCENTAGE, "25")
+        self.promote(self.product, DiscountType.FLAT, "1.00")
+        # Not running
+        self.promote(self.table, DiscountType.FLAT, "10.00", start=timezone.now() + timedelta(days=1))
+
+        summary = cart_summary(self.key, self.customer.pk)
+        lines = {line["product_id"]: line for line in summary["lines"]}
+        # The best promotion wins: 25% off 10.00 on 2 chairs
+        self.assertEqual(
+            {k: lines[self.product.pk][k] for k in ("subtotal", "discount", "tax_amount", "total")},
+            {"subtotal": "20.00", "discount": "5.00", "tax_amount": "1.50", "total": "16.50"},
+        )
+        self.assertEqual(lines[self.table.pk]["discount"], "0.00")
+        self.assertEqual((summary["subtotal"], summary["discount"], summary["item_count"]), ("50.00", "5.00", 3))
+        self.assertEqual(summary["totals"]["standard"], {
+            "subtotal": "50.00", "discount": "5.00", "tax_amount": "4.50", "delivery_fee": "5.00", "total": "54.50",
+        })
+        self.assertEqual(summary["totals"]["express"]["total"], "61.50")
+
+    def test_summary_is_cached_per_cart_version(self):
+        first = cart_summary(self.key, self.customer.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_summary(self.key, self.customer.pk), first)
+
+        change_quantity(self.key, self.table.pk, 1, user_id=self.customer.pk)
+        summary = cart_summary(self.key, self.customer.pk)
+        self.assertEqual(summary["version"], first["version"] + 1)
+        self.assertEqual(summary["subtotal"], "80.00")
+
+    def test_summary_endpoint(self):
+        response = self.client_for(self.customer).get("/api/v2/cart/summary/", {"discount": "50"})
+        self.assertEqual(response.status_code, 200)
+        # The client cannot set a discount
+        self.assertEqual(response.data["discount"], "0.00")
+        self.assertEqual(response.data["totals"]["pickup"]["total"], "55.00")
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class OrderSearchTests(OrderTestCase):
+    url = "/api/vendor/order/list/"
+
+    def setUp(self):
+        self.order = self.create_order()
+        self.address = ShippingAddress.objects.create(
+            user=self.customer, order=self.order, full_name="Ada Lovelace", phone_number="5550100",
+            street_address="1 Main St", city="Springfield", zip_code="12345",
+        )
+
+    def document(self, order=None):
+        return OrderSearchDocument.objects.get(order=order or self.order).document
+
+    def test_document_covers_order_customer_vendor_and_address(self):
+        document = self.document()
+        for text in (self.order.order_id.lower(), "customer@example.com", "5550100", "springfield"):
+            self.assertIn(text, document)
+
+    def test_document_is_rebuilt_only_when_a_searched_field_changes(self):
+        with mock.patch("orders.signals.refresh_search_documents") as refresh:
+            self.order.notes = "Leave at the door"
+            self.order.save()
+            self.address.street_address = "2 Main St"
+            self.address.save()
+        refresh.assert_not_called()
+
+        self.address.city = "Shelbyville"
+        self.address.save()
+        self.assertIn("shelbyville", self.document())
+
+        other = User.objects.create_user(email="other@example.com", password="pass", role="customer")
+        self.order.customer = other
+        self.order.save()
+        self.assertIn("other@example.com", self.document())
+
+    def test_renamed_user_refreshes_in_the_background(self):
+        with mock.patch.object(refresh_user_search_documents, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.customer.save()
+            delay.assert_not_called()
+
+            self.customer.first_name = "Grace"
+            with self.captureOnCommitCallbacks(execute=True):
+                self.customer.save()
+        delay.assert_called_once_with(self.customer.pk)
+
+    def test_search_is_scoped_to_the_vendor(self):
+        other_vendor = User.objects.create_user(email="rival@example.com", password="pass", role="vendor")
+        rival_order = Order.objects.create(customer=self.customer, vendor=other_vendor)
+
+        admin = User.objects.create_superuser(email="admin@example.com", password="pass")
+        response = self.client_for(admin).get(self.url, {"search": "customer@example"})
+        self.assertEqual({order["order_id"] for order in response.data["results"]},
+                         {self.order.order_id, rival_order.order_id})
+
+        response = self.client_for(self.vendor).get(self.url, {"search": "customer@example"})
+        self.assertEqual([order["order_id"] for order in response.data["results"]], [self.order.order_id])
+        response = self.client_for(self.vendor).get(self.url, {"search": rival_order.order_id})
+        self.assertEqual(response.data["count"], 0)
+
+    def test_archived_orders_match_the_same_fields(self):
+        Order.objects.filter(pk=self.order.pk).update(
+            selected_shipping_address=self.address,
+            order_status=OrderStatus.DELIVERED.value, order_date=timezone.now() - timedelta(days=200),
+        )
+        archive_closed_orders()
+        client = self.client_for(self.vendor)
+
+        for term in ("springfield", "5550100", "customer@example", self.order.order_id):
+            with self.subTest(term=term):
+                response = client.get(self.url, {"search": term})
+                self.assertEqual([order["order_id"] for order in response.data["results"]], [self.order.order_id])
 
-# Create your tests here.
@@ -4,6 +4,7 @@ from decimal import Decimal
 from django.db import transaction
 from orders.models import Order, OrderItem, CartItem
 from orders.enums import OrderStatus, DeliveryType
+from orders.cart import clear_user_cart, flush_user_cart
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,8 @@ def create_order_from_cart(
     Create an order from user's cart.
     NOTE: No ShippingAddress is created here. It can be added later via API.
     """
+    # The cart store is written behind; make CartItem current before reading it.
+    flush_user_cart(user.id)
     cart_qs = (
         CartItem.objects
         .filter(user=user, saved_for_later=False)
@@ -73,6 +76,7 @@ def create_order_from_cart(
 
         # Clear cart
         cart_qs.delete()
+        transaction.on_commit(lambda: clear_user_cart(user.id))
 
     logger.info(f"Order {order.order_id} created from cart for user {user.id}")
     return order
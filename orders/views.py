@@ -2,22 +2,46 @@
 import logging
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponse
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, NotFound
 from notification.utils import send_notification_to_user
-from orders.models import Order, CartItem
+from orders.archive import ArchiveReadMixin
+from orders.exports import includes_archive
+from orders.models import ArchivedOrder, CartItem, Order
 from orders.serializers import (
+    ArchivedOrderSerializer,
     ShippingAddressAttachSerializer,
     ShippingAddressInlineSerializer,
     OrderSerializer,
     CartItemSerializer,
+    CartLineSerializer,
     OrderReceiptSerializer,
     ShippingAddressSerializer
 )
 from orders.enums import OrderStatus, DeliveryType
 from orders.utils import create_order_from_cart, create_order_for_single_product
+from orders.cart import (
+    CART_TOKEN_HEADER,
+    add_line,
+    cart_products,
+    cart_summary,
+    change_quantity,
+    flush_user_cart,
+    guest_cart_key,
+    load_cart,
+    new_guest_token,
+    remove_line,
+    set_quantity,
+    stock_limit,
+    user_cart_key,
+    valid_guest_token,
+)
+from orders.receipts import receipt_order, receipt_data, receipt_version, receipt_path
+from orders.tasks import render_order_receipt
+from common.utils import etag_matches, ranged_file_response
 from products.models import Product
 from users.enums import UserRole
 from orders.models import ShippingAddress
@@ -51,20 +75,22 @@ class IsVendorOrAdminOrCustomer(permissions.BasePermission):
 # order/views.py
 from notification.utils import send_notification_to_user
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ArchiveReadMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    archive_serializer_class = ArchivedOrderSerializer
+    archive_items = True
     permission_classes = [IsVendorOrAdminOrCustomer]
 
-    def get_queryset(self):
+    def _scoped(self, model):
         user = self.request.user
         if getattr(user, 'role', None) == UserRole.ADMIN.value or getattr(user, 'is_staff', False):
-            queryset = Order.objects.all()
+            queryset = model.objects.all()
         elif getattr(user, 'role', None) == UserRole.VENDOR.value:
-            queryset = Order.objects.filter(items__product__vendor=user).distinct()
+            queryset = model.objects.filter(vendor=user)
         elif getattr(user, 'role', None) == UserRole.CUSTOMER.value:
-            queryset = Order.objects.filter(customer=user)
+            queryset = model.objects.filter(customer=user)
         else:
-            return Order.objects.none()
+            return model.objects.none()
         # Filters
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
@@ -80,6 +106,14 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return queryset.order_by('-order_date')
 
+    def get_queryset(self):
+        return self._scoped(Order)
+
+    def get_archive_queryset(self):
+        if not includes_archive(self.request.query_params):
+            return None
+        return self._scoped(ArchivedOrder)
+
     def perform_create(self, serializer):
         if getattr(self.request.user, "role", None) != UserRole.VENDOR.value:
             raise PermissionDenied("Only vendors can manually create orders.")
@@ -241,15 +275,48 @@ class ShippingAddressViewSet(viewsets.ModelViewSet):
 
 
 # -------- Cart ViewSet --------
+def summary_response(request, key, user_id, token=None):
+    # Discounts come from running promotions (orders.pricing.promoted_prices), never from the client.
+    response = Response(cart_summary(key, user_id))
+    if token:
+        response[CART_TOKEN_HEADER] = token
+    return response
+
+
+def cart_product(product_id):
+    """The product a cart line may be added for, or None when it does not exist or is not for sale."""
+    try:
+        return (
+            cart_products()
+            .only("id", "price1", "is_stock", "stock_quantity")
+            .filter(pk=int(product_id))
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+
+
 class CartViewSet(viewsets.ModelViewSet):
+    """
+    The original cart API (/api/cart/): lines are CartItem rows addressed by their id.
+    Writes go through the cart store like CartStoreViewSet and are flushed to CartItem
+    before responding, so the returned rows are current; reads list CartItem and may
+    lag /api/v2/cart/ writes until the next write-behind flush.
+    """
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user).select_related("product")
 
+    def _item_response(self, product_id, status_code=status.HTTP_200_OK):
+        flush_user_cart(self.request.user.id)
+        cart_item = self.get_queryset().filter(product_id=product_id, saved_for_later=False).first()
+        if cart_item is None:
+            raise NotFound("Cart item not found.")
+        return Response(self.get_serializer(cart_item).data, status=status_code)
+
     def create(self, request, *args, **kwargs):
-        from products.models import Product
         product_id = request.data.get("product_id")
         quantity = request.data.get("quantity", 1)
 
@@ -262,30 +329,200 @@ class CartViewSet(viewsets.ModelViewSet):
         except (ValueError, TypeError):
             return Response({"error": "Quantity must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item, created = CartItem.objects.update_or_create(
-            user=request.user,
-            product_id=product_id,
-            defaults={"quantity": quantity, "price_snapshot": Product.objects.get(pk=product_id).price1},
-        )
-        return Response(self.get_serializer(cart_item).data,
-                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        product = cart_product(product_id)
+        if product is None:
+            return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+        limit = stock_limit(product)
+        if limit is not None and quantity > limit:
+            return Response({"error": "Cannot exceed available stock."}, status=status.HTTP_400_BAD_REQUEST)
+
+        key, user_id = user_cart_key(request.user.id), request.user.id
+        created = product.id not in load_cart(key, user_id)
+        add_line(key, product, quantity, user_id=user_id)
+        return self._item_response(product.id, status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def partial_update(self, request, *args, **kwargs):
+        cart_item = self.get_object()
+        try:
+            quantity = int(request.data.get("quantity"))
+            if quantity < 1:
+                return Response({"error": "Quantity must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError):
+            return Response({"error": "Quantity must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        line = set_quantity(user_cart_key(request.user.id), cart_item.product_id, quantity, user_id=request.user.id)
+        if line is None:
+            raise NotFound("Cart item not found.")
+        if line.get("rejected"):
+            return Response({"error": "Cannot exceed available stock."}, status=status.HTTP_400_BAD_REQUEST)
+        return self._item_response(cart_item.product_id)
+
+    update = partial_update
+
+    def destroy(self, request, *args, **kwargs):
+        cart_item = self.get_object()
+        remove_line(user_cart_key(request.user.id), cart_item.product_id, user_id=request.user.id)
+        flush_user_cart(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=["post"])
     def increment(self, request, pk=None):
         cart_item = self.get_object()
-        if getattr(cart_item.product, "stock_quantity", None) and cart_item.quantity + 1 > cart_item.product.stock_quantity:
+        line = change_quantity(user_cart_key(request.user.id), cart_item.product_id, 1, user_id=request.user.id)
+        if line is None:
+            raise NotFound("Cart item not found.")
+        if line.get("rejected"):
             return Response({"error": "Cannot exceed available stock."}, status=status.HTTP_400_BAD_REQUEST)
-        cart_item.quantity += 1
-        cart_item.save(update_fields=["quantity"])
-        return Response(self.get_serializer(cart_item).data)
+        return self._item_response(cart_item.product_id)
 
     @action(detail=True, methods=["post"])
     def decrement(self, request, pk=None):
         cart_item = self.get_object()
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.save(update_fields=["quantity"])
-        return Response(self.get_serializer(cart_item).data)
+        line = change_quantity(user_cart_key(request.user.id), cart_item.product_id, -1, user_id=request.user.id)
+        if line is None:
+            raise NotFound("Cart item not found.")
+        return self._item_response(cart_item.product_id)
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        return summary_response(request, user_cart_key(request.user.id), request.user.id)
+
+
+class CartStoreViewSet(viewsets.ViewSet):
+    """
+    Cart backed by the cart store (/api/v2/cart/). Authenticated users get their own
+    cart (written behind into CartItem); anonymous clients get a guest cart identified
+    by the X-Cart-Token header, which is issued on the first add and merged at login.
+    Lines are addressed by product id.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def _cart(self, request, create=False):
+        """(cart key, user id, guest token) for the request."""
+        if request.user.is_authenticated:
+            return user_cart_key(request.user.id), request.user.id, None
+        token = request.headers.get(CART_TOKEN_HEADER)
+        if valid_guest_token(token):
+            return guest_cart_key(token), None, token
+        if create:
+            token = new_guest_token()
+            return guest_cart_key(token), None, token
+        return None, None, None
+
+    def _respond(self, data, token, status_code=status.HTTP_200_OK):
+        response = Response(data, status=status_code)
+        if token:
+            response[CART_TOKEN_HEADER] = token
+        return response
+
+    def _line_data(self, product_id, line, product=None):
+        return CartLineSerializer(
+            {"product_id": product_id, "product": product, **line}, context={"request": self.request}
+        ).data
+
+    def _pk(self, pk):
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Cart item not found.")
+
+    def list(self, request):
+        key, user_id, token = self._cart(request)
+        lines = load_cart(key, user_id) if key else {}
+        products = Product.objects.in_bulk(lines.keys())
+        data = [
+            self._line_data(product_id, line, products[product_id])
+            for product_id, line in lines.items()
+            if product_id in products
+        ]
+        return self._respond(data, token)
+
+    def retrieve(self, request, pk=None):
+        key, user_id, token = self._cart(request)
+        product_id = self._pk(pk)
+        line = load_cart(key, user_id).get(product_id) if key else None
+        product = Product.objects.filter(pk=product_id).first() if line else None
+        if product is None:
+            raise NotFound("Cart item not found.")
+        return self._respond(self._line_data(product_id, line, product), token)
+
+    def create(self, request):
+        product_id = request.data.get("product_id")
+        quantity = request.data.get("quantity", 1)
+
+        if not product_id:
+            return Response({"error": "product_id is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quantity = int(quantity)
+            if quantity < 1:
+                return Response({"error": "Quantity must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError):
+            return Response({"error": "Quantity must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        product = cart_product(product_id)
+        if product is None:
+            return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+        limit = stock_limit(product)
+        if limit is not None and quantity > limit:
+            return Response({"error": "Cannot exceed available stock."}, status=status.HTTP_400_BAD_REQUEST)
+
+        key, user_id, token = self._cart(request, create=True)
+        created = product.id not in load_cart(key, user_id)
+        line = add_line(key, product, quantity, user_id=user_id)
+        return self._respond(
+            self._line_data(product.id, line), token,
+            status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def partial_update(self, request, pk=None):
+        key, user_id, token = self._cart(request)
+        try:
+            quantity = int(request.data.get("quantity"))
+            if quantity < 1:
+                return Response({"error": "Quantity must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError):
+            return Response({"error": "Quantity must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        product_id = self._pk(pk)
+        line = set_quantity(key, product_id, quantity, user_id=user_id) if key else None
+        if line is None:
+            raise NotFound("Cart item not found.")
+        if line.get("rejected"):
+            return Response({"error": "Cannot exceed available stock."}, status=status.HTTP_400_BAD_REQUEST)
+        return self._respond(self._line_data(product_id, line), token)
+
+    update = partial_update
+
+    def destroy(self, request, pk=None):
+        key, user_id, token = self._cart(request)
+        if key:
+            remove_line(key, self._pk(pk), user_id=user_id)
+        return self._respond(None, token, status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        key, user_id, token = self._cart(request)
+        return summary_response(request, key, user_id, token)
+
+    @action(detail=True, methods=["post"])
+    def increment(self, request, pk=None):
+        key, user_id, token = self._cart(request)
+        product_id = self._pk(pk)
+        line = change_quantity(key, product_id, 1, user_id=user_id) if key else None
+        if line is None:
+            raise NotFound("Cart item not found.")
+        if line.get("rejected"):
+            return Response({"error": "Cannot exceed available stock."}, status=status.HTTP_400_BAD_REQUEST)
+        return self._respond(self._line_data(product_id, line), token)
+
+    @action(detail=True, methods=["post"])
+    def decrement(self, request, pk=None):
+        key, user_id, token = self._cart(request)
+        product_id = self._pk(pk)
+        line = change_quantity(key, product_id, -1, user_id=user_id) if key else None
+        if line is None:
+            raise NotFound("Cart item not found.")
+        return self._respond(self._line_data(product_id, line), token)
 
 
 # -------- Order Receipt --------
@@ -293,28 +530,64 @@ class OrderReceiptView(generics.RetrieveAPIView):
     serializer_class = OrderReceiptSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
+    def get_scope(self):
+        """Lookup filters limiting receipts to the user's own orders; None when they may see none."""
         user = self.request.user
         role = getattr(user, "role", None)
         if role == UserRole.ADMIN.value:
-            return Order.objects.all()
+            return {}
         if role == UserRole.VENDOR.value:
-            return Order.objects.filter(vendor=user)
+            return {"vendor": user}
         if role == UserRole.CUSTOMER.value:
-            return Order.objects.filter(customer=user)
-        return Order.objects.none()
+            return {"customer": user}
+        return None
 
     def get_object(self):
-        order_id = self.kwargs.get("order_id")
-        try:
-            return self.get_queryset().get(order_id=order_id)
-        except Order.DoesNotExist:
+        scope = self.get_scope()
+        # Archived orders keep their receipts (orders.receipts.receipt_order).
+        order = receipt_order(self.kwargs.get("order_id"), **scope) if scope is not None else None
+        if order is None:
             raise NotFound("Receipt not found for this order.")
+        return order
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(receipt_data(self.get_object()))
 
 
 
 
 
+class OrderReceiptPDFView(OrderReceiptView):
+    """
+    Serves the pre-rendered PDF receipt. Files are keyed by the content hash of the
+    receipt, so the hash doubles as the ETag. Missing versions are rendered by Celery
+    and the client is asked to retry.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        order = self.get_object()
+        version = receipt_version(receipt_data(order))
+
+        if etag_matches(request, version):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = f'"{version}"'
+            return response
+
+        path = receipt_path(order.order_id, version)
+        if not path.exists():
+            render_order_receipt.delay(order.id, archived=isinstance(order, ArchivedOrder))
+            response = Response(
+                {"detail": "Receipt is being generated. Please retry shortly."},
+                status=status.HTTP_202_ACCEPTED,
+            )
+            response["Retry-After"] = "2"
+            return response
+
+        return ranged_file_response(
+            request, path, "application/pdf", etag=version, filename=f"receipt-{order.order_id}.pdf"
+        )
+
+
 from orders.serializers import OrderItemSerializer
 from orders.models import OrderItem
 from rest_framework import viewsets, permissions
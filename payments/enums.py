@@ -12,3 +12,17 @@ class PaymentMethodEnum(str, Enum):
     STRIPE = "stripe"
     CARD = "card"
 
+
+
+class WebhookEventStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSED = "processed"
+    FAILED = "failed"
+    DEAD = "dead"
+
+
+class LedgerEntryType(str, Enum):
+    CREDIT = "credit"
+    PAYOUT = "payout"
+    PAYOUT_REVERSAL = "payout_reversal"
+    REFUND = "refund"
@@ -0,0 +1,237 @@
+# payments/fake_stripe.py
+"""
+Local stand-in for the parts of the Stripe API this project uses.
+
+Point the app at it with STRIPE_API_BASE (see payments.stripe_utils) and run it
+with `manage.py fake_stripe`. It implements:
+
+    POST /v1/checkout/sessions               create a session
+    GET  /v1/checkout/sessions[/<id>]        list (created[gte|lte], starting_after, limit) / retrieve
+    GET  /v1/events                          list delivered events (type, created[gte|lte], ...)
+    POST /_fake/checkout/sessions/<id>/complete
+                                             "pay" a session: marks it paid and delivers a
+                                             signed checkout.session.completed webhook
+
+Webhook deliveries honour a configurable latency and failure rate and are
+retried with a short backoff, like Stripe does. Everything is kept in memory.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = 24 * 60 * 60
+
+
+def parse_form(body):
+    """Decode Stripe's bracketed form encoding (a[b][0][c]=v) into nested dicts/lists."""
+    result = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        node = result
+        for part, following in zip(parts, parts[1:]):
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return _listify(result)
+
+
+def _listify(node):
+    if not isinstance(node, dict):
+        return node
+    node = {key: _listify(value) for key, value in node.items()}
+    if node and all(key.isdigit() for key in node):
+        return [node[key] for key in sorted(node, key=int)]
+    return node
+
+
+def sign_payload(payload, secret, timestamp=None):
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode("utf-8"), f"{timestamp}.{payload}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def _page(items, query):
+    """Stripe-style list page: newest first, `created[gte|lte]`, `starting_after`, `limit`."""
+    items = sorted(items, key=lambda obj: (obj["created"], obj["id"]), reverse=True)
+    if "created[gte]" in query:
+        items = [obj for obj in items if obj["created"] >= int(query["created[gte]"])]
+    if "created[lte]" in query:
+        items = [obj for obj in items if obj["created"] <= int(query["created[lte]"])]
+    if "type" in query:
+        items = [obj for obj in items if obj.get("type") == query["type"]]
+    if "starting_after" in query:
+        ids = [obj["id"] for obj in items]
+        if query["starting_after"] in ids:
+            items = items[ids.index(query["starting_after"]) + 1:]
+    limit = min(int(query.get("limit", 10)), 100)
+    return {"object": "list", "data": items[:limit], "has_more": len(items) > limit, "url": ""}
+
+
+class FakeStripe:
+    def __init__(self, webhook_url, webhook_secret, base_url, api_latency=0.0, webhook_latency=0.0,
+                 failure_rate=0.0, max_deliveries=5, retry_delay=1.0):
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.base_url = base_url.rstrip("/")
+        self.api_latency = api_latency
+        self.webhook_latency = webhook_latency
+        self.failure_rate = failure_rate
+        self.max_deliveries = max_deliveries
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.events = {}
+        # Idempotency-Key -> session id, replayed like Stripe does
+        self.idempotent = {}
+        self.http = requests.Session()
+
+    # --- API ---
+    def create_session(self, params, idempotency_key=None):
+        now = int(time.time())
+        amount_total = sum(
+            int(item["price_data"]["unit_amount"]) * int(item.get("quantity", 1))
+            for item in params.get("line_items", [])
+        )
+        # The lookup and the insert share the lock so concurrent requests with the same
+        # Idempotency-Key get the same session, as they would from Stripe.
+        with self.lock:
+            replayed = self.sessions.get(self.idempotent.get(idempotency_key)) if idempotency_key else None
+            if replayed:
+                return replayed
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            session = {
+                "id": session_id,
+                "object": "checkout.session",
+                "created": now,
+                "expires_at": now + SESSION_TTL,
+                "amount_total": amount_total,
+                "currency": "usd",
+                "customer_email": params.get("customer_email"),
+                "metadata": params.get("metadata", {}),
+                "mode": params.get("mode", "payment"),
+                "payment_status": "unpaid",
+                "status": "open",
+                "success_url": params.get("success_url"),
+                "cancel_url": params.get("cancel_url"),
+                "url": f"{self.base_url}/pay/{session_id}",
+            }
+            self.sessions[session_id] = session
+            if idempotency_key:
+                self.idempotent[idempotency_key] = session_id
+        return session
+
+    def list_objects(self, kind):
+        with self.lock:
+            return list(getattr(self, kind).values())
+
+    def complete_session(self, session_id, deliver=True):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.update(payment_status="paid", status="complete")
+            event = {
+                "id": f"evt_{uuid.uuid4().hex}",
+                "object": "event",
+                "type": "checkout.session.completed",
+                "created": int(time.time()),
+                "data": {"object": dict(session)},
+            }
+            self.events[event["id"]] = event
+        if deliver:
+            threading.Thread(target=self.deliver, args=(event,), daemon=True).start()
+        return event
+
+    # --- Webhooks ---
+    def deliver(self, event):
+        payload = json.dumps(event)
+        for attempt in range(1, self.max_deliveries + 1):
+            time.sleep(self.webhook_latency)
+            if random.random() >= self.failure_rate:
+                try:
+                    response = self.http.post(
+                        self.webhook_url,
+                        data=payload,
+                        headers={
+                            "Content-Type": "application/json",
+                            "Stripe-Signature": sign_payload(payload, self.webhook_secret),
+                        },
+                        timeout=10,
+                    )
+                    if response.status_code < 300:
+                        return True
+                    logger.warning(f"Webhook {event['id']} got HTTP {response.status_code} (attempt {attempt})")
+                except requests.RequestException as exc:
+                    logger.warning(f"Webhook {event['id']} failed: {exc} (attempt {attempt})")
+            else:
+                logger.info(f"Webhook {event['id']} dropped by failure injection (attempt {attempt})")
+            time.sleep(self.retry_delay * attempt)
+        logger.error(f"Webhook {event['id']} gave up after {self.max_deliveries} attempts")
+        return False
+
+    # --- HTTP ---
+    def handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                logger.debug(fmt % args)
+
+            def _send(self, status_code, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _not_found(self):
+                self._send(404, {"error": {"type": "invalid_request_error", "message": "No such resource"}})
+
+            def do_GET(self):
+                time.sleep(fake.api_latency)
+                parts = urlsplit(self.path)
+                query = dict(parse_qsl(parts.query))
+                if parts.path == "/v1/checkout/sessions":
+                    return self._send(200, _page(fake.list_objects("sessions"), query))
+                match = re.fullmatch(r"/v1/checkout/sessions/([\w]+)", parts.path)
+                if match:
+                    session = fake.sessions.get(match.group(1))
+                    return self._send(200, session) if session else self._not_found()
+                if parts.path == "/v1/events":
+                    return self._send(200, _page(fake.list_objects("events"), query))
+                return self._not_found()
+
+            def do_POST(self):
+                time.sleep(fake.api_latency)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8")
+                path = urlsplit(self.path).path
+                if path == "/v1/checkout/sessions":
+                    session = fake.create_session(parse_form(body), self.headers.get("Idempotency-Key"))
+                    return self._send(200, session)
+                match = re.fullmatch(r"/_fake/checkout/sessions/([\w]+)/complete", path)
+                if match:
+                    event = fake.complete_session(match.group(1))
+                    return self._send(200, event) if event else self._not_found()
+                return self._not_found()
+
+        return Handler
+
+    def serve(self, host, port):
+        server = ThreadingHTTPServer((host, port), self.handler_class())
+        server.daemon_threads = True
+        return server
@@ -0,0 +1,178 @@
+# payments/ledger.py
+"""
+Vendor balance ledger.
+
+Every change to what a vendor is owed is an append-only VendorLedgerEntry:
+
+    credit           payment completed                 +amount
+    refund           completed payment refunded        -amount
+    payout           payout request approved           -amount
+    payout_reversal  approved payout rejected again    +amount
+
+VendorBalance keeps the running totals and is updated in the same transaction as
+the entries, with the balance row locked, so reads are a single row and payout
+checks cannot race. Pending payout requests are held in `reserved`.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.cache import invalidate
+from dashboard.enums import PayoutStatusEnum
+from dashboard.models import PayoutRequest
+from payments.enums import LedgerEntryType, PaymentStatusEnum
+from payments.models import Payment, VendorBalance, VendorLedgerEntry
+
+ZERO = Decimal("0.00")
+EARNING_ENTRY_TYPES = {LedgerEntryType.CREDIT.value, LedgerEntryType.REFUND.value}
+
+
+class InsufficientBalance(Exception):
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f"Amount exceeds your available balance ({available}).")
+
+
+def get_balance(vendor):
+    """Balance row for reads; an unsaved zero row for vendors without one yet."""
+    vendor_id = getattr(vendor, "pk", vendor)
+    return VendorBalance.objects.filter(vendor_id=vendor_id).first() or VendorBalance(vendor_id=vendor_id)
+
+
+def _lock_balances(vendor_ids):
+    """Create missing balance rows and lock all of them (in id order, so concurrent writers never deadlock)."""
+    vendor_ids = sorted(set(vendor_ids))
+    VendorBalance.objects.bulk_create(
+        [VendorBalance(vendor_id=vendor_id) for vendor_id in vendor_ids], ignore_conflicts=True
+    )
+    return {
+        balance.vendor_id: balance
+        for balance in VendorBalance.objects.select_for_update().filter(vendor_id__in=vendor_ids).order_by("vendor_id")
+    }
+
+
+def _post(entries, balances):
+    """Append entries and fold them into the locked balance rows."""
+    for entry in entries:
+        balance = balances[entry.vendor_id]
+        balance.balance += entry.amount
+        if entry.entry_type in EARNING_ENTRY_TYPES:
+            balance.total_earned += entry.amount
+        else:
+            balance.total_paid_out -= entry.amount
+    now = timezone.now()
+    for balance in balances.values():
+        balance.updated_at = now
+    VendorLedgerEntry.objects.bulk_create(entries)
+    VendorBalance.objects.bulk_update(
+        list(balances.values()), ["balance", "reserved", "total_earned", "total_paid_out", "updated_at"]
+    )
+    invalidate("payments", balances)
+
+
+# -----------------------------
+# Payments
+# -----------------------------
+def sync_payment_entries(payment_ids):
+    """
+    Bring the ledger in line with the current status of these payments: a credit once
+    a payment is completed, a refund debit once it is refunded. Safe to call repeatedly.
+    """
+    payment_ids = list(payment_ids)
+    if not payment_ids:
+        return 0
+    rows = list(
+        Payment.objects.filter(
+            pk__in=payment_ids,
+            status__in=[PaymentStatusEnum.COMPLETED.value, PaymentStatusEnum.REFUNDED.value],
+        ).values("id", "vendor_id", "amount", "status")
+    )
+    if not rows:
+        return 0
+
+    with transaction.atomic():
+        balances = _lock_balances(row["vendor_id"] for row in rows)
+        existing = set(
+            VendorLedgerEntry.objects.filter(payment_id__in=[row["id"] for row in rows])
+            .values_list("payment_id", "entry_type")
+        )
+        entries = []
+        for row in rows:
+            if (row["id"], LedgerEntryType.CREDIT.value) not in existing:
+                entries.append(VendorLedgerEntry(
+                    vendor_id=row["vendor_id"], entry_type=LedgerEntryType.CREDIT.value,
+                    amount=row["amount"], payment_id=row["id"],
+                ))
+            if row["status"] == PaymentStatusEnum.REFUNDED.value and (row["id"], LedgerEntryType.REFUND.value) not in existing:
+                entries.append(VendorLedgerEntry(
+                    vendor_id=row["vendor_id"], entry_type=LedgerEntryType.REFUND.value,
+                    amount=-row["amount"], payment_id=row["id"],
+                ))
+        if entries:
+            _post(entries, balances)
+    return len(entries)
+
+
+# -----------------------------
+# Payouts
+# -----------------------------
+def reserve_payout(payout):
+    """Hold a new pending payout against the available balance; raises InsufficientBalance."""
+    with transaction.atomic():
+        balance = _lock_balances([payout.vendor_id])[payout.vendor_id]
+        if payout.amount > balance.available:
+            raise InsufficientBalance(balance.available)
+        balance.reserved += payout.amount
+        balance.save(update_fields=["reserved", "updated_at"])
+
+
+def release_payout(payout):
+    """Drop the reservation of a pending payout that goes away without being approved."""
+    with transaction.atomic():
+        balance = _lock_balances([payout.vendor_id])[payout.vendor_id]
+        balance.reserved = max(balance.reserved - payout.amount, ZERO)
+        balance.save(update_fields=["reserved", "updated_at"])
+
+
+def change_payout_status(payout, new_status):
+    """
+    Move a payout to `new_status` and post the matching ledger entries, with the payout
+    and balance rows locked. Returns False when the payout already had that status;
+    raises InsufficientBalance when a rejected payout is approved, or moved back to
+    pending, without enough balance.
+    """
+    with transaction.atomic():
+        locked = PayoutRequest.objects.select_for_update().get(pk=payout.pk)
+        old_status = locked.status
+        if old_status == new_status:
+            return False
+        balance = _lock_balances([locked.vendor_id])[locked.vendor_id]
+        entries = []
+
+        if old_status == PayoutStatusEnum.PENDING.value:
+            balance.reserved = max(balance.reserved - locked.amount, ZERO)
+        if new_status == PayoutStatusEnum.APPROVED.value:
+            if old_status != PayoutStatusEnum.PENDING.value and locked.amount > balance.available:
+                raise InsufficientBalance(balance.available)
+            entries.append(VendorLedgerEntry(
+                vendor_id=locked.vendor_id, entry_type=LedgerEntryType.PAYOUT.value,
+                amount=-locked.amount, payout=locked,
+            ))
+        elif old_status == PayoutStatusEnum.APPROVED.value:
+            entries.append(VendorLedgerEntry(
+                vendor_id=locked.vendor_id, entry_type=LedgerEntryType.PAYOUT_REVERSAL.value,
+                amount=locked.amount, payout=locked,
+            ))
+        if new_status == PayoutStatusEnum.PENDING.value:
+            # Pending payouts hold their amount; an approved one is reversed above first.
+            available = balance.available + sum((entry.amount for entry in entries), ZERO)
+            if locked.amount > available:
+                raise InsufficientBalance(available)
+            balance.reserved += locked.amount
+
+        _post(entries, {locked.vendor_id: balance})
+        locked.status = new_status
+        locked.save(update_fields=["status", "updated_at"])
+    payout.status = new_status
+    return True
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.fake_stripe import FakeStripe
+
+
+class Command(BaseCommand):
+    help = "Run the local Stripe stand-in (set STRIPE_API_BASE to its URL to use it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument(
+            "--webhook-url", default="http://127.0.0.1:8000/api/stripe/webhook/",
+            help="Where signed webhook events are delivered",
+        )
+        parser.add_argument("--api-latency-ms", type=int, default=0, help="Delay added to every API call")
+        parser.add_argument("--webhook-latency-ms", type=int, default=0, help="Delay before each webhook attempt")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of webhook attempts dropped (0-1)")
+        parser.add_argument("--max-deliveries", type=int, default=5)
+
+    def handle(self, *args, **options):
+        fake = FakeStripe(
+            webhook_url=options["webhook_url"],
+            webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+            base_url=f"http://{options['host']}:{options['port']}",
+            api_latency=options["api_latency_ms"] / 1000,
+            webhook_latency=options["webhook_latency_ms"] / 1000,
+            failure_rate=options["failure_rate"],
+            max_deliveries=options["max_deliveries"],
+        )
+        server = fake.serve(options["host"], options["port"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Stripe listening on http://{options['host']}:{options['port']} "
+            f"(webhooks -> {options['webhook_url']})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
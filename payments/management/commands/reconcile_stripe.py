@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from payments.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = "Compare Stripe checkout sessions/events for a window with Payment/Order and repair discrepancies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", default=None, help="Window start (ISO datetime; default: --hours before --until)")
+        parser.add_argument("--until", default=None, help="Window end (ISO datetime; default: 15 minutes ago)")
+        parser.add_argument("--hours", type=int, default=None, help="Window length when --since is not given")
+        parser.add_argument("--batch-size", type=int, default=None, help="Sessions matched per database round trip")
+        parser.add_argument("--dry-run", action="store_true", help="Report discrepancies without repairing them")
+        parser.add_argument("--json", action="store_true", help="Print the full audit report as JSON")
+
+    def _parse(self, value, name):
+        if value is None:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"--{name} must be an ISO datetime")
+        return parsed
+
+    def handle(self, *args, **options):
+        run = reconcile(
+            self._parse(options["since"], "since"),
+            self._parse(options["until"], "until"),
+            hours=options["hours"],
+            dry_run=options["dry_run"],
+            size=options["batch_size"],
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(run.report, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {run.sessions_scanned} sessions and {run.events_scanned} events "
+            f"({run.window_start:%Y-%m-%d %H:%M} - {run.window_end:%Y-%m-%d %H:%M}): "
+            f"{run.discrepancies} discrepancies, {run.repaired} repaired"
+            + (" (dry run)" if run.dry_run else "")
+        ))
+        for kind, count in run.report.get("counts", {}).items():
+            self.stdout.write(f"  {kind}: {count}")
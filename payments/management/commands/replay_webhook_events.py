@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from payments.enums import WebhookEventStatus
+from payments.models import StripeWebhookEvent
+from payments.tasks import process_webhook_events
+from payments.webhooks import replay_events
+
+
+class Command(BaseCommand):
+    help = "Reopen Stripe webhook inbox events (dead ones by default) and queue them for processing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event-id", action="append", default=[], help="Replay this event id (repeatable)")
+        parser.add_argument(
+            "--status", default=WebhookEventStatus.DEAD.value,
+            choices=[tag.value for tag in WebhookEventStatus],
+        )
+        parser.add_argument("--type", dest="event_type", default=None, help="Only events of this Stripe type")
+        parser.add_argument("--since", default=None, help="Only events received at or after this ISO datetime")
+        parser.add_argument("--sync", action="store_true", help="Process in this process instead of Celery")
+
+    def handle(self, *args, **options):
+        if options["event_id"]:
+            queryset = StripeWebhookEvent.objects.filter(event_id__in=options["event_id"])
+        else:
+            queryset = StripeWebhookEvent.objects.filter(status=options["status"])
+        if options["event_type"]:
+            queryset = queryset.filter(event_type=options["event_type"])
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO datetime")
+            queryset = queryset.filter(received_at__gte=since)
+
+        count = queryset.count()
+        object_ids = replay_events(queryset)
+        for object_id in object_ids:
+            if options["sync"]:
+                process_webhook_events.apply(args=[object_id])
+            else:
+                process_webhook_events.delay(object_id)
+        self.stdout.write(self.style.SUCCESS(f"Replayed {count} events across {len(object_ids)} objects."))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from common.partitions import create_partitioned_table
+
+
+def partition_archive_table(apps, schema_editor):
+    create_partitioned_table(schema_editor, apps.get_model("payments", "ArchivedPayment"), "created_at")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_alter_payment_product'),
+        ('products', '0010_productspecifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('pk', models.CompositePrimaryKey('id', 'created_at', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('id', models.BigIntegerField()),
+                ('order_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_method', models.CharField(choices=[('stripe', 'stripe'), ('card', 'card')], max_length=20)),
+                ('transaction_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('completed', 'completed'), ('failed', 'failed'), ('refunded', 'refunded')], max_length=20)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='products.product')),
+                ('vendor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'status', 'created_at'], name='payments_ar_vendor__410442_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive_table, migrations.RunPython.noop),
+    ]
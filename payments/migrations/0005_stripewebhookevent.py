@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_archivedpayment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('object_id', models.CharField(blank=True, default='', max_length=255)),
+                ('stripe_created', models.DateTimeField()),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('processed', 'processed'), ('failed', 'failed'), ('dead', 'dead')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['stripe_created', 'id'],
+                'indexes': [models.Index(fields=['object_id', 'stripe_created'], name='payments_st_object__62a2a8_idx'), models.Index(fields=['status', 'received_at'], name='payments_st_status_194758_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_search_document'),
+        ('payments', '0005_stripewebhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stripe_session_id', models.CharField(max_length=255, unique=True)),
+                ('url', models.URLField(max_length=2048)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkout_sessions', to='orders.order')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['order', 'content_hash', 'expires_at'], name='payments_ch_order_i_bbe9ae_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_checkoutsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('dry_run', models.BooleanField(default=False)),
+                ('sessions_scanned', models.PositiveIntegerField(default=0)),
+                ('events_scanned', models.PositiveIntegerField(default=0)),
+                ('discrepancies', models.PositiveIntegerField(default=0)),
+                ('repaired', models.PositiveIntegerField(default=0)),
+                ('report', models.JSONField(default=dict)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """Open the ledger with one entry per completed/refunded payment (live and archived) and approved payout."""
+    VendorLedgerEntry = apps.get_model("payments", "VendorLedgerEntry")
+    VendorBalance = apps.get_model("payments", "VendorBalance")
+    PayoutRequest = apps.get_model("dashboard", "PayoutRequest")
+    statuses = ["completed", "refunded"]
+
+    entries = []
+    payment_ids = set()
+    for model_name in ("Payment", "ArchivedPayment"):
+        rows = apps.get_model("payments", model_name).objects.filter(status__in=statuses)
+        for row in rows.values("id", "vendor_id", "amount", "status", "created_at").iterator():
+            if row["id"] in payment_ids:
+                continue
+            payment_ids.add(row["id"])
+            entries.append(VendorLedgerEntry(
+                vendor_id=row["vendor_id"], entry_type="credit", amount=row["amount"],
+                payment_id=row["id"], created_at=row["created_at"],
+            ))
+            if row["status"] == "refunded":
+                entries.append(VendorLedgerEntry(
+                    vendor_id=row["vendor_id"], entry_type="refund", amount=-row["amount"],
+                    payment_id=row["id"], created_at=row["created_at"],
+                ))
+    for row in PayoutRequest.objects.filter(status="approved").values("id", "vendor_id", "amount", "updated_at"):
+        entries.append(VendorLedgerEntry(
+            vendor_id=row["vendor_id"], entry_type="payout", amount=-row["amount"],
+            payout_id=row["id"], created_at=row["updated_at"],
+        ))
+    VendorLedgerEntry.objects.bulk_create(entries, batch_size=2000)
+
+    totals = defaultdict(lambda: dict(balance=Decimal("0"), reserved=Decimal("0"),
+                                      total_earned=Decimal("0"), total_paid_out=Decimal("0")))
+    for entry in entries:
+        row = totals[entry.vendor_id]
+        row["balance"] += entry.amount
+        if entry.entry_type == "payout":
+            row["total_paid_out"] -= entry.amount
+        else:
+            row["total_earned"] += entry.amount
+    for vendor_id, amount in PayoutRequest.objects.filter(status="pending").values_list("vendor_id", "amount"):
+        totals[vendor_id]["reserved"] += amount
+    VendorBalance.objects.bulk_create(
+        [VendorBalance(vendor_id=vendor_id, **row) for vendor_id, row in totals.items()], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_alert'),
+        ('payments', '0007_reconciliationrun'),
+        ('users', '0002_alter_sellerapplication_business_localization_plan_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorBalance',
+            fields=[
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('reserved', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_earned', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_paid_out', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VendorLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('credit', 'credit'), ('payout', 'payout'), ('payout_reversal', 'payout_reversal'), ('refund', 'refund')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('payment_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('payout', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='dashboard.payoutrequest')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['vendor', 'created_at'], name='payments_ve_vendor__01020a_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('payment_id__isnull', False)), fields=('payment_id', 'entry_type'), name='unique_ledger_entry_per_payment')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,8 @@
 from django.db import models
 from django.conf import settings
-from django.db.models import Sum
+from django.db.models import Q, Sum
 from django.utils.timezone import now
-from payments.enums import PaymentStatusEnum, PaymentMethodEnum
+from payments.enums import PaymentStatusEnum, PaymentMethodEnum, WebhookEventStatus, LedgerEntryType
 from users.models import BaseModel
 
 
@@ -122,3 +122,151 @@ class Payment(BaseModel):
 
         result = qs.aggregate(total=Sum('amount'))
         return result['total'] or 0
+
+
+
+class ArchivedPayment(models.Model):
+    """Payments of archived orders; see orders.archive. Partitioned by month on PostgreSQL."""
+    pk = models.CompositePrimaryKey("id", "created_at")
+    id = models.BigIntegerField()
+    order_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    product = models.ForeignKey(
+        "products.Product", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+"
+    )
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=20, choices=[(tag.value, tag.value) for tag in PaymentMethodEnum])
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=[(tag.value, tag.value) for tag in PaymentStatusEnum])
+    note = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["vendor", "status", "created_at"])]
+
+    def __str__(self):
+        return f"Archived payment #{self.id} - {self.status}"
+
+
+class StripeWebhookEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events, keyed by Stripe's event id so retried
+    deliveries are stored once. Rows are processed by payments.tasks in Stripe
+    `created` order per object (e.g. per checkout session).
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=255, blank=True, default="")
+    stripe_created = models.DateTimeField()
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=20,
+        choices=[(tag.value, tag.value) for tag in WebhookEventStatus],
+        default=WebhookEventStatus.PENDING.value
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(default=now)
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["stripe_created", "id"]
+        indexes = [
+            models.Index(fields=["object_id", "stripe_created"]),
+            models.Index(fields=["status", "received_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} - {self.status}"
+
+
+class CheckoutSession(models.Model):
+    """Stripe checkout sessions created for an order; reused while unexpired and the order content is unchanged."""
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='checkout_sessions')
+    stripe_session_id = models.CharField(max_length=255, unique=True)
+    url = models.URLField(max_length=2048)
+    content_hash = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["order", "content_hash", "expires_at"])]
+
+    def __str__(self):
+        return f"Checkout session {self.stripe_session_id} for order {self.order_id}"
+
+
+class ReconciliationRun(models.Model):
+    """Audit record of one Stripe reconciliation pass (see payments.reconciliation)."""
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    dry_run = models.BooleanField(default=False)
+    sessions_scanned = models.PositiveIntegerField(default=0)
+    events_scanned = models.PositiveIntegerField(default=0)
+    discrepancies = models.PositiveIntegerField(default=0)
+    repaired = models.PositiveIntegerField(default=0)
+    report = models.JSONField(default=dict)
+    started_at = models.DateTimeField(default=now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Reconciliation {self.window_start:%Y-%m-%d %H:%M} - {self.window_end:%Y-%m-%d %H:%M}"
+
+
+class VendorLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a vendor's balance (see payments.ledger).
+    `amount` is signed: credits are positive, payouts and refunds negative.
+    """
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="ledger_entries")
+    entry_type = models.CharField(max_length=20, choices=[(tag.value, tag.value) for tag in LedgerEntryType])
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Plain id: payments outlive their row when the order is archived (see orders.archive).
+    payment_id = models.BigIntegerField(blank=True, null=True)
+    payout = models.ForeignKey(
+        "dashboard.PayoutRequest", on_delete=models.SET_NULL, null=True, blank=True, related_name="ledger_entries"
+    )
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [models.Index(fields=["vendor", "created_at"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["payment_id", "entry_type"],
+                condition=Q(payment_id__isnull=False),
+                name="unique_ledger_entry_per_payment",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} for vendor {self.vendor_id}"
+
+
+class VendorBalance(models.Model):
+    """
+    Running totals of a vendor's ledger, updated in the same transaction as each entry.
+    `reserved` holds pending payout requests so they cannot be requested twice.
+    """
+    vendor = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="balance"
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    reserved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_earned = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid_out = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Balance of vendor {self.vendor_id}: {self.balance}"
+
+    @property
+    def available(self):
+        return self.balance - self.reserved
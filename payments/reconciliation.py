@@ -0,0 +1,266 @@
+# payments/reconciliation.py
+"""
+Stripe reconciliation.
+
+Pages through the checkout sessions and checkout.session.completed events Stripe
+has for a time window and compares them with Payment/Order in batches, using one
+set-based lookup per table per batch. Discrepancies are repaired in bulk and the
+pass is recorded as a ReconciliationRun:
+
+    missing_payment      paid session, order exists, no Payment row      -> Payment created
+    payment_incomplete   Payment still pending/failed                    -> Payment completed (amount kept)
+    order_unpaid         paid session, Order.payment_status pending      -> Order flipped to paid
+    missing_event        event never reached the webhook inbox           -> recorded as processed
+    amount_mismatch      Payment amount differs from the session total   -> reported only
+    duplicate_session    order already paid through another session      -> reported only
+    unknown_order        session metadata points at no order             -> reported only
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+import payments.stripe_utils  # noqa: F401  (configures the stripe client)
+from dashboard.cache import invalidate
+from dashboard.rollup import order_slices, queue_refresh
+from orders.archive import spans_archive
+from orders.enums import OrderStatus
+from orders.models import ArchivedOrder, Order
+from orders.tasks import render_order_receipt
+from payments.enums import PaymentMethodEnum, PaymentStatusEnum, WebhookEventStatus
+from payments.ledger import sync_payment_entries
+from payments.models import Payment, ReconciliationRun, StripeWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_EVENT = "checkout.session.completed"
+PAGE_SIZE = 100
+# A refunded Payment is a later state, not a lost webhook, and is left alone.
+REPAIRABLE_PAYMENT_STATUSES = [PaymentStatusEnum.PENDING.value, PaymentStatusEnum.FAILED.value]
+# Entries kept per discrepancy kind in the stored report; counts are always complete.
+REPORT_SAMPLE_SIZE = 200
+# The window stops this far in the past so webhooks still being delivered are not raced.
+SETTLE_TIME = timedelta(minutes=15)
+
+
+def batch_size():
+    return int(getattr(settings, "STRIPE_RECONCILE_BATCH_SIZE", 2000))
+
+
+def window_hours():
+    return int(getattr(settings, "STRIPE_RECONCILE_WINDOW_HOURS", 25))
+
+
+def _timestamp(value):
+    return int(value.timestamp())
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _session_amount(session):
+    return Decimal(session.get("amount_total") or 0) / 100
+
+
+class Report:
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.samples = defaultdict(list)
+        self.sessions_scanned = 0
+        self.events_scanned = 0
+        self.repaired = 0
+
+    def add(self, kind, **details):
+        self.counts[kind] += 1
+        if len(self.samples[kind]) < REPORT_SAMPLE_SIZE:
+            self.samples[kind].append(details)
+
+    def as_dict(self):
+        return {"counts": dict(self.counts), "samples": dict(self.samples)}
+
+
+# -----------------------------
+# Stripe paging
+# -----------------------------
+def list_sessions(window_start, window_end):
+    created = {"gte": _timestamp(window_start), "lte": _timestamp(window_end)}
+    return stripe.checkout.Session.list(created=created, limit=PAGE_SIZE).auto_paging_iter()
+
+
+def list_completed_events(window_start, window_end):
+    created = {"gte": _timestamp(window_start), "lte": _timestamp(window_end)}
+    return stripe.Event.list(type=COMPLETED_EVENT, created=created, limit=PAGE_SIZE).auto_paging_iter()
+
+
+# -----------------------------
+# Matching and repair
+# -----------------------------
+def reconcile_sessions(sessions, report, dry_run=False, check_archive=False):
+    """Compare one batch of Stripe sessions with Order/Payment and repair what is missing."""
+    paid = {}
+    for session in sessions:
+        if session.get("payment_status") == "paid" and (session.get("metadata") or {}).get("order_id"):
+            paid[session["id"]] = session
+    if not paid:
+        return
+
+    order_ids = {session["metadata"]["order_id"] for session in paid.values()}
+    orders = {
+        order.order_id: order
+        for order in Order.objects.filter(order_id__in=order_ids).only(
+            "id", "order_id", "customer_id", "vendor_id", "payment_status", "order_status"
+        )
+    }
+    archived = set()
+    if check_archive and len(orders) < len(order_ids):
+        archived = set(
+            ArchivedOrder.objects.filter(order_id__in=order_ids - orders.keys()).values_list("order_id", flat=True)
+        )
+    payments = {
+        payment.order_id: payment
+        for payment in Payment.objects.filter(order_id__in=[order.pk for order in orders.values()]).only(
+            "id", "order_id", "amount", "status", "transaction_id"
+        )
+    }
+
+    new_payments, changed_payments, unpaid_orders = [], [], []
+    for session_id, session in paid.items():
+        order_id = session["metadata"]["order_id"]
+        order = orders.get(order_id)
+        if order is None:
+            if order_id not in archived:
+                report.add("unknown_order", session_id=session_id, order_id=order_id)
+            continue
+
+        amount = _session_amount(session)
+        payment = payments.get(order.pk)
+        # Compared against the stored amount before any repair touches the row
+        mismatch = payment is not None and payment.amount != amount
+        if payment is None:
+            report.add("missing_payment", session_id=session_id, order_id=order_id, amount=str(amount))
+            metadata = session["metadata"]
+            new_payments.append(Payment(
+                order_id=order.pk,
+                customer_id=metadata.get("customer_id") or order.customer_id,
+                vendor_id=metadata.get("vendor_id") or order.vendor_id,
+                amount=amount,
+                payment_method=PaymentMethodEnum.STRIPE.value,
+                transaction_id=session_id,
+                status=PaymentStatusEnum.COMPLETED.value,
+                note="Created by Stripe reconciliation",
+            ))
+        elif payment.status in REPAIRABLE_PAYMENT_STATUSES:
+            report.add("payment_incomplete", session_id=session_id, order_id=order_id, status=payment.status)
+            payment.status = PaymentStatusEnum.COMPLETED.value
+            payment.transaction_id = session_id
+            payment.updated_at = timezone.now()
+            changed_payments.append(payment)
+        elif payment.transaction_id and payment.transaction_id != session_id:
+            report.add("duplicate_session", session_id=session_id, order_id=order_id,
+                       transaction_id=payment.transaction_id)
+            continue
+        if mismatch:
+            report.add("amount_mismatch", session_id=session_id, order_id=order_id,
+                       payment_amount=str(payment.amount), session_amount=str(amount))
+
+        if order.payment_status == OrderStatus.PENDING.value:
+            report.add("order_unpaid", session_id=session_id, order_id=order_id)
+            unpaid_orders.append(order.pk)
+
+    if dry_run:
+        return
+
+    with transaction.atomic():
+        Payment.objects.bulk_create(new_payments, batch_size=1000)
+        Payment.objects.bulk_update(changed_payments, ["status", "transaction_id", "updated_at"], batch_size=1000)
+        sync_payment_entries([payment.pk for payment in new_payments + changed_payments])
+        queue_refresh(
+            order_slices([payment.order_id for payment in new_payments + changed_payments] + unpaid_orders),
+            event="payment_completed",
+        )
+        if unpaid_orders:
+            Order.objects.filter(pk__in=unpaid_orders, payment_status=OrderStatus.PENDING.value).update(
+                payment_status=OrderStatus.PAID.value
+            )
+            Order.objects.filter(pk__in=unpaid_orders, order_status=OrderStatus.PENDING.value).update(
+                order_status=OrderStatus.PROCESSING.value
+            )
+            invalidate("orders", [order.vendor_id for order in orders.values() if order.pk in unpaid_orders])
+            transaction.on_commit(lambda: [render_order_receipt.delay(pk) for pk in unpaid_orders])
+    report.repaired += len(new_payments) + len(changed_payments) + len(unpaid_orders)
+
+
+def record_missing_events(events, report, dry_run=False):
+    """Add events that never reached the webhook inbox, already marked processed (the sessions pass repairs them)."""
+    known = set(
+        StripeWebhookEvent.objects.filter(event_id__in=[event["id"] for event in events])
+        .values_list("event_id", flat=True)
+    )
+    missing = [event for event in events if event["id"] not in known]
+    now = timezone.now()
+    rows = []
+    for event in missing:
+        data_object = event["data"]["object"]
+        report.add("missing_event", event_id=event["id"], session_id=data_object.get("id"))
+        rows.append(StripeWebhookEvent(
+            event_id=event["id"],
+            event_type=event["type"],
+            object_id=data_object.get("id") or "",
+            stripe_created=datetime.fromtimestamp(event.get("created") or 0, tz=dt_timezone.utc),
+            payload=event.to_dict() if hasattr(event, "to_dict") else event,
+            status=WebhookEventStatus.PROCESSED.value,
+            last_error="Recorded by Stripe reconciliation",
+            processed_at=now,
+        ))
+    if rows and not dry_run:
+        StripeWebhookEvent.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def reconcile(window_start=None, window_end=None, hours=None, dry_run=False, size=None):
+    window_end = window_end or timezone.now() - SETTLE_TIME
+    window_start = window_start or window_end - timedelta(hours=hours or window_hours())
+    size = size or batch_size()
+    check_archive = spans_archive(window_start)
+    run = ReconciliationRun.objects.create(window_start=window_start, window_end=window_end, dry_run=dry_run)
+    report = Report()
+
+    seen = set()
+    for batch in _batches(list_sessions(window_start, window_end), size):
+        report.sessions_scanned += len(batch)
+        seen.update(session["id"] for session in batch)
+        reconcile_sessions(batch, report, dry_run=dry_run, check_archive=check_archive)
+
+    # Events catch sessions created before the window but paid inside it.
+    for batch in _batches(list_completed_events(window_start, window_end), size):
+        report.events_scanned += len(batch)
+        record_missing_events(batch, report, dry_run=dry_run)
+        unseen = [event["data"]["object"] for event in batch if event["data"]["object"]["id"] not in seen]
+        seen.update(session["id"] for session in unseen)
+        reconcile_sessions(unseen, report, dry_run=dry_run, check_archive=True)
+
+    run.sessions_scanned = report.sessions_scanned
+    run.events_scanned = report.events_scanned
+    run.discrepancies = sum(report.counts.values())
+    run.repaired = report.repaired
+    run.report = report.as_dict()
+    run.finished_at = timezone.now()
+    run.save()
+    if run.discrepancies:
+        logger.warning(f"Stripe reconciliation found {run.discrepancies} discrepancies: {dict(report.counts)}")
+    return run
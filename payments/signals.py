@@ -0,0 +1,16 @@
+# payments/signals.py
+"""Post vendor ledger entries when a payment is completed or refunded (see payments.ledger)."""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from payments.enums import PaymentStatusEnum
+from payments.ledger import sync_payment_entries
+from payments.models import Payment
+
+LEDGER_STATUSES = {PaymentStatusEnum.COMPLETED.value, PaymentStatusEnum.REFUNDED.value}
+
+
+@receiver(post_save, sender=Payment, dispatch_uid="payments_vendor_ledger")
+def payment_saved(sender, instance, **kwargs):
+    if instance.status in LEDGER_STATUSES:
+        sync_payment_entries([instance.pk])
@@ -1,7 +1,44 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import requests
 import stripe
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from orders.models import Order
+from payments.models import CheckoutSession
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+if getattr(settings, "STRIPE_API_BASE", ""):
+    stripe.api_base = settings.STRIPE_API_BASE
+
+# Sessions this close to expiry are not handed out again.
+SESSION_REUSE_MARGIN = timedelta(minutes=5)
+
+
+def build_http_client():
+    """Keep-alive connection pool shared by all Stripe calls in this process, with bounded timeouts."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, "STRIPE_POOL_CONNECTIONS", 10),
+        pool_maxsize=getattr(settings, "STRIPE_POOL_MAXSIZE", 20),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    timeout = (
+        getattr(settings, "STRIPE_CONNECT_TIMEOUT", 3.05),
+        getattr(settings, "STRIPE_READ_TIMEOUT", 20),
+    )
+    return stripe.RequestsClient(timeout=timeout, session=session)
+
+
+stripe.default_http_client = build_http_client()
+stripe.max_network_retries = getattr(settings, "STRIPE_MAX_NETWORK_RETRIES", 2)
 
 
 def create_checkout_session(product, customer, success_url, cancel_url):
@@ -13,7 +50,7 @@ def create_checkout_session(product, customer, success_url, cancel_url):
             "price_data": {
                 "currency": "usd",
                 "product_data": {"name": product.name},
-                "unit_amount": int(price_to_use * 100), 
+                "unit_amount": int(price_to_use * 100),
             },
             "quantity": 1,
         }],
@@ -29,3 +66,96 @@ def create_checkout_session(product, customer, success_url, cancel_url):
         },
     )
     return session
+
+
+# -----------------------------
+# Order checkout sessions
+# -----------------------------
+def order_line_items(items):
+    """Stripe line items for already-fetched order items (with their products)."""
+    return [
+        {
+            "price_data": {
+                "currency": "usd",
+                "product_data": {"name": item.product.name},
+                "unit_amount": int(Decimal(item.price) * 100),
+            },
+            "quantity": item.quantity,
+        }
+        for item in items
+    ]
+
+
+def checkout_content_hash(order, line_items, customer_email, success_url, cancel_url):
+    content = {
+        "order_id": order.order_id,
+        "total_amount": str(order.total_amount),
+        "line_items": line_items,
+        "customer_email": customer_email,
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _reusable_session(order, content_hash):
+    return (
+        CheckoutSession.objects.filter(
+            order=order, content_hash=content_hash, expires_at__gt=timezone.now() + SESSION_REUSE_MARGIN
+        )
+        .order_by("-created_at")
+        .first()
+    )
+
+
+def checkout_idempotency_key(order, content_hash, now=None):
+    """
+    Same key for the same order content within the hour, so concurrent clicks on "Pay"
+    get the same Stripe session back; a new hour allows a fresh session once the old
+    one is no longer reusable.
+    """
+    hour = int((now or timezone.now()).timestamp() // 3600)
+    return f"checkout-{order.order_id}-{content_hash[:32]}-{hour}"
+
+
+def get_or_create_order_session(order, user, items, success_url, cancel_url):
+    """
+    Reuse the newest unexpired session with the same content hash, otherwise create one.
+    Stripe is called without holding any lock; its idempotency key makes concurrent
+    requests receive the same session, and the order row is only locked for the
+    re-check and insert.
+    """
+    line_items = order_line_items(items)
+    content_hash = checkout_content_hash(order, line_items, user.email, success_url, cancel_url)
+
+    existing = _reusable_session(order, content_hash)
+    if existing:
+        return existing
+
+    session = stripe.checkout.Session.create(
+        payment_method_types=["card"],
+        line_items=line_items,
+        mode="payment",
+        customer_email=user.email,
+        success_url=success_url,
+        cancel_url=cancel_url,
+        metadata={
+            "order_id": order.order_id,
+            "customer_id": str(user.id),
+            "vendor_id": str(order.vendor_id),
+        },
+        idempotency_key=checkout_idempotency_key(order, content_hash),
+    )
+
+    with transaction.atomic():
+        Order.objects.select_for_update().only("id").get(pk=order.pk)
+        existing = _reusable_session(order, content_hash)
+        if existing:
+            return existing
+        return CheckoutSession.objects.create(
+            order=order,
+            stripe_session_id=session.id,
+            url=session.url,
+            content_hash=content_hash,
+            expires_at=datetime.fromtimestamp(session.expires_at, tz=dt_timezone.utc),
+        )
@@ -0,0 +1,33 @@
+# payments/tasks.py
+import logging
+
+from celery import shared_task
+
+from payments.reconciliation import reconcile
+from payments.webhooks import process_object_events, stale_object_ids
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=20)
+def process_webhook_events(self, object_id):
+    """Drain the inbox for one Stripe object; re-scheduled while an event is waiting to be retried."""
+    delay = process_object_events(object_id)
+    if delay is not None:
+        raise self.retry(countdown=max(int(delay), 1))
+
+
+@shared_task
+def sweep_webhook_inbox():
+    """Backstop for events whose task was never enqueued or whose retry was lost."""
+    object_ids = stale_object_ids()
+    for object_id in object_ids:
+        process_webhook_events.delay(object_id)
+    return len(object_ids)
+
+
+@shared_task
+def reconcile_stripe_payments():
+    """Repair payments whose webhook was lost; see payments.reconciliation."""
+    run = reconcile()
+    return {"run": run.pk, "discrepancies": run.discrepancies, "repaired": run.repaired}
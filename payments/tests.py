@@ -1,3 +1,466 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import itertools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dashboard.enums import PayoutStatusEnum
+from dashboard.models import PayoutRequest
+from orders.enums import OrderStatus
+from orders.models import Order, OrderItem
+from payments import stripe_utils, webhooks
+from payments.enums import LedgerEntryType, PaymentStatusEnum, WebhookEventStatus
+from payments.fake_stripe import FakeStripe, parse_form
+from payments.ledger import InsufficientBalance, change_payout_status, release_payout, reserve_payout
+from payments.models import CheckoutSession, Payment, StripeWebhookEvent, VendorBalance, VendorLedgerEntry
+from payments.reconciliation import Report, reconcile_sessions, record_missing_events
+from payments.tasks import process_webhook_events
+from products.models import Product
+from users.models import User
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class PaymentTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email="vendor@example.com", password="pass", role="vendor")
+        cls.customer = User.objects.create_user(email="customer@example.com", password="pass", role="customer")
+
+    def create_order(self):
+        return Order.objects.create(customer=self.customer, vendor=self.vendor)
+
+    def create_payment(self, amount="100.00", status=PaymentStatusEnum.COMPLETED.value, order=None):
+        return Payment.objects.create(
+            order=order or self.create_order(), customer=self.customer, vendor=self.vendor,
+            amount=Decimal(amount), payment_method="stripe", status=status,
+        )
+
+    def balance(self):
+        return VendorBalance.objects.get(vendor=self.vendor)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LedgerTests(PaymentTestCase):
+    def assertBalanceMatchesLedger(self):
+        balance = self.balance()
+        entries = VendorLedgerEntry.objects.filter(vendor=self.vendor).aggregate(total=Sum("amount"))["total"]
+        self.assertEqual(balance.balance, entries or 0)
+        self.assertGreaterEqual(balance.available, 0)
+
+    def test_completed_payment_is_credited_once(self):
+        payment = self.create_payment(status=PaymentStatusEnum.PENDING.value)
+        self.assertFalse(VendorLedgerEntry.objects.exists())
+
+        payment.status = PaymentStatusEnum.COMPLETED.value
+        payment.save()
+        payment.save()
+
+        self.assertEqual(VendorLedgerEntry.objects.filter(entry_type=LedgerEntryType.CREDIT.value).count(), 1)
+        self.assertEqual(self.balance().balance, Decimal("100.00"))
+        self.assertEqual(self.balance().total_earned, Decimal("100.00"))
+        self.assertBalanceMatchesLedger()
+
+    def test_refund_reverses_the_credit(self):
+        payment = self.create_payment()
+        payment.status = PaymentStatusEnum.REFUNDED.value
+        payment.save()
+
+        balance = self.balance()
+        self.assertEqual((balance.balance, balance.total_earned), (0, 0))
+        self.assertBalanceMatchesLedger()
+
+    def test_pending_payout_reserves_the_amount(self):
+        self.create_payment()
+        payout = PayoutRequest.objects.create(vendor=self.vendor, amount=Decimal("60.00"), payment_method="stripe")
+        reserve_payout(payout)
+
+        balance = self.balance()
+        self.assertEqual((balance.balance, balance.reserved, balance.available), (100, 60, 40))
+
+        second = PayoutRequest.objects.create(vendor=self.vendor, amount=Decimal("60.00"), payment_method="stripe")
+        with self.assertRaises(InsufficientBalance):
+            reserve_payout(second)
+        self.assertEqual(self.balance().reserved, 60)
+
+        release_payout(payout)
+        self.assertEqual(self.balance().reserved, 0)
+
+    def test_payout_status_changes_keep_balance_and_reserved_in_step(self):
+        self.create_payment()
+        payout = PayoutRequest.objects.create(vendor=self.vendor, amount=Decimal("60.00"), payment_method="stripe")
+        reserve_payout(payout)
+
+        self.assertTrue(change_payout_status(payout, PayoutStatusEnum.APPROVED.value))
+        self.assertFalse(change_payout_status(payout, PayoutStatusEnum.APPROVED.value))
+        balance = self.balance()
+        self.assertEqual((balance.balance, balance.reserved, balance.total_paid_out), (40, 0, 60))
+        self.assertBalanceMatchesLedger()
+
+        change_payout_status(payout, PayoutStatusEnum.REJECTED.value)
+        balance = self.balance()
+        self.assertEqual((balance.balance, balance.reserved, balance.total_paid_out), (100, 0, 0))
+        self.assertBalanceMatchesLedger()
+
+        change_payout_status(payout, PayoutStatusEnum.PENDING.value)
+        self.assertEqual(self.balance().reserved, 60)
+
+        change_payout_status(payout, PayoutStatusEnum.APPROVED.value)
+        change_payout_status(payout, PayoutStatusEnum.PENDING.value)
+        balance = self.balance()
+        self.assertEqual((balance.balance, balance.reserved), (100, 60))
+        self.assertBalanceMatchesLedger()
+
+    def test_rejected_payout_is_not_approved_without_balance(self):
+        payment = self.create_payment()
+        payout = PayoutRequest.objects.create(vendor=self.vendor, amount=Decimal("60.00"), payment_method="stripe")
+        reserve_payout(payout)
+        change_payout_status(payout, PayoutStatusEnum.REJECTED.value)
+        payment.status = PaymentStatusEnum.REFUNDED.value
+        payment.save()
+
+        with self.assertRaises(InsufficientBalance):
+            change_payout_status(payout, PayoutStatusEnum.APPROVED.value)
+        with self.assertRaises(InsufficientBalance):
+            change_payout_status(payout, PayoutStatusEnum.PENDING.value)
+        payout.refresh_from_db()
+        self.assertEqual(payout.status, PayoutStatusEnum.REJECTED.value)
+        self.assertEqual((self.balance().balance, self.balance().reserved), (0, 0))
+
+    def test_payout_api_reserves_and_keeps_the_amount(self):
+        self.create_payment()
+        client = APIClient()
+        client.force_authenticate(self.vendor)
+        response = client.post("/api/payouts/", {"amount": "60.00", "payment_method": "stripe"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.balance().reserved, 60)
+
+        payout_url = f"/api/payouts/{response.data['id']}/"
+        client.patch(payout_url, {"amount": "1.00", "note": "weekly"}, format="json")
+        payout = PayoutRequest.objects.get()
+        self.assertEqual((payout.amount, payout.note), (Decimal("60.00"), "weekly"))
+
+        other = User.objects.create_user(email="other@example.com", password="pass", role="vendor")
+        client.force_authenticate(other)
+        self.assertEqual(client.get(payout_url).status_code, 404)
+        self.assertEqual(client.get("/api/payouts/").data["count"], 0)
+
+
+
+def stripe_event(event_id, object_id, created, event_type="test.event", data=None):
+    return {
+        "id": event_id,
+        "type": event_type,
+        "created": created,
+        "data": {"object": {"id": object_id, **(data or {})}},
+    }
+
+
+@override_settings(CACHES=LOCAL_CACHE, STRIPE_WEBHOOK_MAX_ATTEMPTS=2)
+class WebhookInboxTests(PaymentTestCase):
+    def setUp(self):
+        self.handled = []
+        handlers = mock.patch.dict(webhooks.EVENT_HANDLERS, {"test.event": self.handle})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def handle(self, data_object):
+        self.handled.append(data_object["step"])
+        if data_object.get("error") == "permanent":
+            raise webhooks.WebhookEventError("bad event")
+        if data_object.get("error") == "transient":
+            raise ConnectionError("try again")
+
+    def test_duplicate_deliveries_are_recorded_once(self):
+        event = stripe_event("evt_1", "cs_1", 100, data={"step": 1})
+        self.assertEqual(webhooks.record_event(event), "cs_1")
+        webhooks.record_event(event)
+
+        self.assertEqual(StripeWebhookEvent.objects.count(), 1)
+        webhooks.process_object_events("cs_1")
+        webhooks.process_object_events("cs_1")
+        self.assertEqual(self.handled, [1])
+
+    def test_events_of_an_object_run_in_stripe_order(self):
+        webhooks.record_event(stripe_event("evt_2", "cs_1", 200, data={"step": 2}))
+        webhooks.record_event(stripe_event("evt_1", "cs_1", 100, data={"step": 1}))
+        webhooks.record_event(stripe_event("evt_3", "cs_2", 50, data={"step": 3}))
+
+        self.assertIsNone(webhooks.process_object_events("cs_1"))
+        self.assertEqual(self.handled, [1, 2])
+        self.assertEqual(
+            StripeWebhookEvent.objects.get(event_id="evt_3").status, WebhookEventStatus.PENDING.value
+        )
+
+    def test_failure_holds_back_later_events_until_retried(self):
+        webhooks.record_event(stripe_event("evt_1", "cs_1", 100, data={"step": 1, "error": "transient"}))
+        webhooks.record_event(stripe_event("evt_2", "cs_1", 200, data={"step": 2}))
+
+        delay = webhooks.process_object_events("cs_1")
+        self.assertEqual(delay, webhooks.retry_delay(1))
+        failed = StripeWebhookEvent.objects.get(event_id="evt_1")
+        self.assertEqual((failed.status, failed.attempts), (WebhookEventStatus.FAILED.value, 1))
+        self.assertEqual(StripeWebhookEvent.objects.get(event_id="evt_2").status, WebhookEventStatus.PENDING.value)
+
+        # Not due yet: nothing runs
+        self.assertIsNotNone(webhooks.process_object_events("cs_1"))
+        self.assertEqual(self.handled, [1])
+
+        StripeWebhookEvent.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        webhooks.process_object_events("cs_1")
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (WebhookEventStatus.DEAD.value, 2))
+        # Dead-lettered after the last attempt, so the next event runs
+        self.assertEqual(self.handled, [1, 1, 2])
+
+    def test_dead_letter_and_replay(self):
+        webhooks.record_event(stripe_event("evt_1", "cs_1", 100, data={"step": 1, "error": "permanent"}))
+        webhooks.record_event(stripe_event("evt_2", "cs_1", 200, data={"step": 2}))
+
+        webhooks.process_object_events("cs_1")
+        dead = StripeWebhookEvent.objects.get(event_id="evt_1")
+        self.assertEqual((dead.status, dead.attempts, dead.last_error), (WebhookEventStatus.DEAD.value, 1, "bad event"))
+        # A dead event no longer blocks the ones after it
+        self.assertEqual(self.handled, [1, 2])
+
+        self.assertEqual(webhooks.replay_events(StripeWebhookEvent.objects.filter(pk=dead.pk)), {"cs_1"})
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.attempts), (WebhookEventStatus.PENDING.value, 0))
+
+    def test_stale_object_ids_lists_due_open_events(self):
+        webhooks.record_event(stripe_event("evt_1", "cs_1", 100, data={"step": 1}))
+        self.assertEqual(webhooks.stale_object_ids(), [])
+        StripeWebhookEvent.objects.update(received_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(webhooks.stale_object_ids(), ["cs_1"])
+
+    def test_checkout_completed_pays_the_order(self):
+        order = self.create_order()
+        webhooks.record_event(stripe_event(
+            "evt_1", "cs_1", 100, event_type="checkout.session.completed",
+            data={
+                "amount_total": 2500,
+                "metadata": {
+                    "order_id": order.order_id, "customer_id": str(self.customer.pk), "vendor_id": str(self.vendor.pk),
+                },
+            },
+        ))
+        webhooks.process_object_events("cs_1")
+
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, OrderStatus.PAID.value)
+        payment = Payment.objects.get(order=order)
+        self.assertEqual((payment.amount, payment.status, payment.transaction_id), (Decimal("25.00"), "completed", "cs_1"))
+        self.assertEqual(StripeWebhookEvent.objects.get().status, WebhookEventStatus.PROCESSED.value)
+
+
+@override_settings(CACHES=LOCAL_CACHE, STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookViewTests(PaymentTestCase):
+    url = "/api/stripe/webhook/"
+
+    def post(self, payload, secret="whsec_test"):
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+        return APIClient().generic(
+            "POST", self.url, payload, content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def test_verified_event_is_recorded_and_queued(self):
+        payload = json.dumps({"object": "event", **stripe_event("evt_1", "cs_1", 100, data={"step": 1})})
+        with mock.patch.object(process_webhook_events, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post(payload)
+
+        self.assertEqual(response.status_code, 200)
+        delay.assert_called_once_with("cs_1")
+        event = StripeWebhookEvent.objects.get()
+        self.assertEqual((event.event_id, event.object_id), ("evt_1", "cs_1"))
+        self.assertEqual(event.payload["data"]["object"]["step"], 1)
+
+    def test_bad_signature_is_rejected(self):
+        payload = json.dumps(stripe_event("evt_1", "cs_1", 100))
+        self.assertEqual(self.post(payload, secret="whsec_other").status_code, 400)
+        self.assertFalse(StripeWebhookEvent.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CheckoutSessionTests(PaymentTestCase):
+    url = "/api/checkout/checkout/"
+
+    def setUp(self):
+        self.session_ids = itertools.count(1)
+        create = mock.patch.object(stripe.checkout.Session, "create", side_effect=self.stripe_session)
+        self.create = create.start()
+        self.addCleanup(create.stop)
+        self.order = self.create_order()
+        self.add_items(1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def stripe_session(self, **params):
+        session_id = f"cs_{next(self.session_ids)}"
+        expires_at = int((timezone.now() + timedelta(hours=24)).timestamp())
+        return mock.Mock(id=session_id, url=f"https://stripe.test/{session_id}", expires_at=expires_at)
+
+    def add_items(self, count):
+        for n in range(count):
+            product = Product.objects.create(
+                vendor=self.vendor, name=f"Product {n}", price1=Decimal("10.00"), stock_quantity=5, status="approved",
+            )
+            OrderItem.objects.create(order=self.order, product=product, quantity=1, price=Decimal("10.00"))
+        self.order.update_totals()
+
+    def checkout(self):
+        response = self.client.post(self.url, {"order_id": self.order.order_id}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_unexpired_session_is_reused(self):
+        first = self.checkout()
+        self.assertEqual(self.checkout()["checkout_url"], first["checkout_url"])
+        self.assertEqual(self.create.call_count, 1)
+        self.assertEqual(CheckoutSession.objects.filter(order=self.order).count(), 1)
+
+    def test_new_session_when_content_changes_or_session_expires(self):
+        first = self.checkout()["checkout_url"]
+
+        self.add_items(1)
+        second = self.checkout()["checkout_url"]
+        self.assertNotEqual(second, first)
+
+        CheckoutSession.objects.update(expires_at=timezone.now() + stripe_utils.SESSION_REUSE_MARGIN / 2)
+        self.assertNotIn(self.checkout()["checkout_url"], {first, second})
+        self.assertEqual(self.create.call_count, 3)
+
+    def test_idempotency_key_is_stable_within_the_hour(self):
+        self.checkout()
+        key = self.create.call_args.kwargs["idempotency_key"]
+        content_hash = CheckoutSession.objects.get().content_hash
+        now = timezone.now()
+        self.assertEqual(stripe_utils.checkout_idempotency_key(self.order, content_hash, now=now), key)
+        self.assertNotEqual(
+            stripe_utils.checkout_idempotency_key(self.order, content_hash, now=now + timedelta(hours=1)), key
+        )
+
+    def test_queries_do_not_grow_with_items(self):
+        self.checkout()
+        with CaptureQueriesContext(connection) as one_item:
+            self.checkout()
+        self.add_items(3)
+        self.checkout()
+        with CaptureQueriesContext(connection) as four_items:
+            self.assertEqual(self.checkout()["item_count"], 4)
+        self.assertEqual(len(four_items), len(one_item))
+
+
+@override_settings(STRIPE_POOL_MAXSIZE=7, STRIPE_CONNECT_TIMEOUT=1, STRIPE_READ_TIMEOUT=5)
+class StripeHttpClientTests(TestCase):
+    def test_calls_share_a_pooled_session_with_timeouts(self):
+        self.assertIsInstance(stripe.default_http_client, stripe.RequestsClient)
+
+        client = stripe_utils.build_http_client()
+        self.assertEqual(client._timeout, (1, 5))
+        adapter = client._session.get_adapter("https://api.stripe.com")
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertIs(client._session.get_adapter("http://localhost"), adapter)
+
+
+class FakeStripeTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeStripe("http://127.0.0.1:1/webhook/", "whsec_test", "http://127.0.0.1:12111")
+        self.params = parse_form(
+            "line_items[0][price_data][unit_amount]=1500&line_items[0][quantity]=2&customer_email=a%40example.com"
+        )
+
+    def test_concurrent_requests_with_one_idempotency_key_share_a_session(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sessions = list(pool.map(lambda _: self.fake.create_session(self.params, "key-1"), range(32)))
+
+        self.assertEqual({session["id"] for session in sessions}, {sessions[0]["id"]})
+        self.assertEqual(sessions[0]["amount_total"], 3000)
+        self.assertEqual(len(self.fake.list_objects("sessions")), 1)
+        self.assertNotEqual(self.fake.create_session(self.params, "key-2")["id"], sessions[0]["id"])
+
+
+def paid_session(session_id, order, amount_total):
+    return {
+        "id": session_id,
+        "payment_status": "paid",
+        "amount_total": amount_total,
+        "metadata": {"order_id": order.order_id, "customer_id": order.customer_id, "vendor_id": order.vendor_id},
+    }
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ReconciliationTests(PaymentTestCase):
+    def test_missing_payment_is_created_and_order_paid(self):
+        order = self.create_order()
+        report = Report()
+        reconcile_sessions([paid_session("cs_1", order, 1800)], report)
+
+        payment = Payment.objects.get(order=order)
+        self.assertEqual((payment.amount, payment.status, payment.transaction_id), (Decimal("18.00"), "completed", "cs_1"))
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, OrderStatus.PAID.value)
+        self.assertEqual(report.counts["missing_payment"], 1)
+        self.assertEqual(report.counts["order_unpaid"], 1)
+        self.assertEqual(report.repaired, 2)
+        self.assertEqual(self.balance().balance, Decimal("18.00"))
+
+    def test_incomplete_payment_is_completed_and_amount_kept(self):
+        order = self.create_order()
+        payment = self.create_payment(amount="1.00", status=PaymentStatusEnum.PENDING.value, order=order)
+        report = Report()
+        reconcile_sessions([paid_session("cs_1", order, 1800)], report)
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.amount, payment.status), (Decimal("1.00"), "completed"))
+        self.assertEqual(report.counts["payment_incomplete"], 1)
+        mismatch = report.samples["amount_mismatch"][0]
+        self.assertEqual(Decimal(mismatch["payment_amount"]), Decimal("1.00"))
+        self.assertEqual(Decimal(mismatch["session_amount"]), Decimal("18.00"))
+
+    def test_unknown_and_duplicate_sessions_are_only_reported(self):
+        order = self.create_order()
+        Payment.objects.filter(pk=self.create_payment(amount="18.00", order=order).pk).update(transaction_id="cs_1")
+        ghost = Order(order_id="ORD-MISSING", customer=self.customer, vendor=self.vendor)
+        report = Report()
+        reconcile_sessions([paid_session("cs_2", order, 1800), paid_session("cs_3", ghost, 1800)], report)
+
+        self.assertEqual(report.counts["duplicate_session"], 1)
+        self.assertEqual(report.counts["unknown_order"], 1)
+        self.assertEqual(Payment.objects.get(order=order).transaction_id, "cs_1")
+
+    def test_dry_run_changes_nothing(self):
+        order = self.create_order()
+        report = Report()
+        reconcile_sessions([paid_session("cs_1", order, 1800)], report, dry_run=True)
+
+        self.assertEqual(report.counts["missing_payment"], 1)
+        self.assertFalse(Payment.objects.exists())
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, OrderStatus.PENDING.value)
+
+    def test_missing_events_are_recorded_as_processed(self):
+        webhooks.record_event(stripe_event("evt_1", "cs_1", 100, event_type="checkout.session.completed"))
+        report = Report()
+        record_missing_events([
+            stripe_event("evt_1", "cs_1", 100, event_type="checkout.session.completed"),
+            stripe_event("evt_2", "cs_2", 100, event_type="checkout.session.completed"),
+        ], report)
+
+        self.assertEqual(report.counts["missing_event"], 1)
+        recorded = StripeWebhookEvent.objects.get(event_id="evt_2")
+        self.assertEqual((recorded.object_id, recorded.status), ("cs_2", WebhookEventStatus.PROCESSED.value))
@@ -1,17 +1,17 @@
 import logging
-from decimal import Decimal
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db import transaction
 import stripe
 
 from orders.models import Order
-from users.models import User
-from orders.enums import OrderStatus
-from payments.models import Payment
+from payments.stripe_utils import get_or_create_order_session
+from payments.tasks import process_webhook_events
+from payments.webhooks import record_event
 
 logger = logging.getLogger(__name__)
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -32,7 +32,10 @@ class CheckoutViewSet(viewsets.ViewSet):
         if not order_id:
             return Response({"error": "order_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        order = get_object_or_404(Order, order_id=order_id, customer=request.user)
+        order = get_object_or_404(
+            Order.objects.select_related("vendor", "customer", "selected_shipping_address"),
+            order_id=order_id, customer=request.user,
+        )
         return self.create_stripe_session(order, request.user)
     
 
@@ -41,24 +44,15 @@ class CheckoutViewSet(viewsets.ViewSet):
             
     def create_stripe_session(self, order, user):
         """Create Stripe checkout session for a given order."""
-        line_items = []
+        items = list(order.items.select_related("product"))  # related_name 'items'
         items_data = []
 
-        for item in order.items.all():  # related_name 'items'
+        for item in items:
             if getattr(item.product, "status", None) != "approved":
                 return Response(
                     {"error": f"Product '{item.product.name}' is not approved."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            # Stripe line item
-            line_items.append({
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {"name": item.product.name},
-                    "unit_amount": int(Decimal(item.price) * 100),
-                },
-                "quantity": item.quantity,
-            })
             # Detailed item info for response
             items_data.append({
                 "id": item.id,
@@ -107,25 +101,13 @@ class CheckoutViewSet(viewsets.ViewSet):
         frontend_success = f"{frontend_success_base}?order_id={order.order_id}"
 
         try:
-            session = stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=line_items,
-                mode="payment",
-                customer_email=user.email,
-                success_url=frontend_success,
-                cancel_url=frontend_cancel,
-                metadata={
-                    "order_id": order.order_id,
-                    "customer_id": str(user.id),
-                    "vendor_id": str(order.vendor.id),
-                },
-            )
+            session = get_or_create_order_session(order, user, items, frontend_success, frontend_cancel)
 
             response_data = {
                 "checkout_url": session.url,
                 "order_id": order.order_id, 
                 "total_amount": str(order.total_amount),
-                "item_count": order.items.count(),
+                "item_count": len(items),
                 "items": items_data,
                 "vendor": {
                     "id": order.vendor.id,
@@ -149,6 +131,7 @@ class CheckoutViewSet(viewsets.ViewSet):
 
 
 class StripeWebhookView(APIView):
+    """Verifies the signature and stores the event in the webhook inbox (payments.webhooks)."""
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, *args, **kwargs):
@@ -164,44 +147,7 @@ class StripeWebhookView(APIView):
             logger.error(f"Stripe webhook error: {e}", exc_info=True)
             return Response({"error": "Webhook error"}, status=500)
 
-        if event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-            metadata = session.get("metadata", {})
-            order_id = metadata.get("order_id")
-            customer_id = metadata.get("customer_id")
-            vendor_id = metadata.get("vendor_id")
-
-            if not order_id:
-                return Response({"error": "No order_id in metadata"}, status=400)
-
-            try:
-                order = Order.objects.get(order_id=order_id)
-                customer = User.objects.get(id=customer_id)
-                vendor = User.objects.get(id=vendor_id)
-                amount = Decimal(session.get("amount_total", 0)) / 100
-
-                Payment.objects.update_or_create(
-                    order=order,
-                    defaults={
-                        "customer": customer,
-                        "vendor": vendor,
-                        "amount": amount,
-                        "payment_method": "stripe",
-                        "transaction_id": session.get("id"),
-                        "status": "completed",
-                    }
-                )
-
-                # Update order status
-                order.payment_status = OrderStatus.PAID.value
-                order.order_status = OrderStatus.PROCESSING.value
-                order.save(update_fields=["payment_status", "order_status"])
-
-                return Response({"status": "payment_processed"}, status=200)
-            except Order.DoesNotExist:
-                return Response({"error": "Order not found"}, status=404)
-            except Exception as e:
-                logger.error(f"Payment processing failed: {e}", exc_info=True)
-                return Response({"error": "Processing error"}, status=500)
-
-        return Response({"status": "event_not_handled"}, status=200)
+        # Record and acknowledge; payments.tasks applies the event out of band.
+        object_id = record_event(event.to_dict())
+        transaction.on_commit(lambda: process_webhook_events.delay(object_id))
+        return Response({"status": "received"}, status=200)
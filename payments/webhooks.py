@@ -0,0 +1,176 @@
+# payments/webhooks.py
+"""
+Stripe webhook inbox.
+
+The webhook view only verifies the signature and records the event; handlers run
+in Celery (payments.tasks) in Stripe `created` order per object. Failures are
+retried with backoff and dead-lettered after STRIPE_WEBHOOK_MAX_ATTEMPTS; dead
+events can be replayed with `manage.py replay_webhook_events`.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.enums import OrderStatus
+from orders.models import Order
+from orders.tasks import render_order_receipt
+from payments.enums import PaymentStatusEnum, WebhookEventStatus
+from payments.models import Payment, StripeWebhookEvent
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = [WebhookEventStatus.PENDING.value, WebhookEventStatus.FAILED.value]
+
+
+class WebhookEventError(Exception):
+    """Permanent failure: the event is dead-lettered without further retries."""
+
+
+def max_attempts():
+    return int(getattr(settings, "STRIPE_WEBHOOK_MAX_ATTEMPTS", 5))
+
+
+def retry_delay(attempts):
+    return min(30 * 2 ** max(attempts - 1, 0), 3600)
+
+
+# -----------------------------
+# Handlers
+# -----------------------------
+def handle_checkout_session_completed(session):
+    metadata = session.get("metadata") or {}
+    order_id = metadata.get("order_id")
+    if not order_id:
+        raise WebhookEventError("No order_id in metadata")
+
+    try:
+        order = Order.objects.get(order_id=order_id)
+    except Order.DoesNotExist:
+        raise WebhookEventError(f"Order {order_id} not found")
+
+    customer = User.objects.get(id=metadata.get("customer_id"))
+    vendor = User.objects.get(id=metadata.get("vendor_id"))
+    amount = Decimal(session.get("amount_total", 0)) / 100
+
+    Payment.objects.update_or_create(
+        order=order,
+        defaults={
+            "customer": customer,
+            "vendor": vendor,
+            "amount": amount,
+            "payment_method": "stripe",
+            "transaction_id": session.get("id"),
+            "status": PaymentStatusEnum.COMPLETED.value,
+        }
+    )
+
+    order.payment_status = OrderStatus.PAID.value
+    order.order_status = OrderStatus.PROCESSING.value
+    order.save(update_fields=["payment_status", "order_status"])
+
+    # Pre-render the PDF receipt so download spikes never render inline
+    transaction.on_commit(lambda: render_order_receipt.delay(order.pk))
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": handle_checkout_session_completed,
+}
+
+
+# -----------------------------
+# Inbox
+# -----------------------------
+def record_event(event):
+    """Store a verified event once (ON CONFLICT DO NOTHING); returns the object id it belongs to."""
+    data_object = (event.get("data") or {}).get("object") or {}
+    object_id = data_object.get("id") or ""
+    StripeWebhookEvent.objects.bulk_create(
+        [StripeWebhookEvent(
+            event_id=event["id"],
+            event_type=event["type"],
+            object_id=object_id,
+            stripe_created=datetime.fromtimestamp(event.get("created") or 0, tz=dt_timezone.utc),
+            payload=event,
+        )],
+        ignore_conflicts=True,
+    )
+    return object_id
+
+
+def _run(event):
+    handler = EVENT_HANDLERS.get(event.event_type)
+    if handler is None:
+        return
+    handler(event.payload["data"]["object"])
+
+
+def process_object_events(object_id):
+    """
+    Process the open events of one object in order. Stops at the first failure so
+    later events never overtake it; returns the delay (seconds) before a retry, or None.
+    """
+    while True:
+        with transaction.atomic():
+            event = (
+                StripeWebhookEvent.objects.select_for_update()
+                .filter(object_id=object_id, status__in=OPEN_STATUSES)
+                .order_by("stripe_created", "id")
+                .first()
+            )
+            if event is None:
+                return None
+            if event.next_attempt_at and event.next_attempt_at > timezone.now():
+                return (event.next_attempt_at - timezone.now()).total_seconds()
+
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    _run(event)
+            except WebhookEventError as exc:
+                event.status = WebhookEventStatus.DEAD.value
+                event.last_error = str(exc)
+                logger.warning(f"Stripe event {event.event_id} dead-lettered: {exc}")
+            except Exception as exc:
+                event.last_error = repr(exc)
+                if event.attempts >= max_attempts():
+                    event.status = WebhookEventStatus.DEAD.value
+                    logger.error(f"Stripe event {event.event_id} dead-lettered after {event.attempts} attempts", exc_info=True)
+                else:
+                    event.status = WebhookEventStatus.FAILED.value
+                    event.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(event.attempts))
+                    logger.warning(f"Stripe event {event.event_id} failed (attempt {event.attempts}): {exc}")
+            else:
+                event.status = WebhookEventStatus.PROCESSED.value
+                event.processed_at = timezone.now()
+                event.last_error = ""
+            event.save(update_fields=["status", "attempts", "last_error", "next_attempt_at", "processed_at"])
+
+        if event.status == WebhookEventStatus.FAILED.value:
+            return retry_delay(event.attempts)
+
+
+def stale_object_ids(older_than=timedelta(minutes=5), limit=500):
+    """Objects with due open events nobody picked up (e.g. the broker was down when they arrived)."""
+    now = timezone.now()
+    return list(
+        StripeWebhookEvent.objects.filter(status__in=OPEN_STATUSES, received_at__lt=now - older_than)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        .order_by()
+        .values_list("object_id", flat=True)
+        .distinct()[:limit]
+    )
+
+
+def replay_events(queryset):
+    """Reopen events (typically dead ones); returns the affected object ids."""
+    object_ids = set(queryset.values_list("object_id", flat=True))
+    queryset.update(
+        status=WebhookEventStatus.PENDING.value, attempts=0, last_error="", next_attempt_at=None, processed_at=None
+    )
+    return object_ids
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0008_category_image'),
+        ('products', '0010_productspecifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_stock', True), ('stock_quantity__lte', 50)), fields=['vendor', 'stock_quantity'], name='product_low_stock_idx'),
+        ),
+    ]
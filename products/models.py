@@ -8,6 +8,7 @@ from decimal import Decimal
 import uuid
 from users.models import BaseModel
 from products.enums import ProductStatus, DiscountType, ReturnStatus
+from products.signals import stock_changed
 from django.db.models import Avg
 from django.utils import timezone
 
@@ -15,6 +16,30 @@ from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
+# Highest low-stock threshold a vendor may set; the partial low-stock index covers stock up to it.
+LOW_STOCK_CEILING = 50
+STOCK_FIELDS = {"stock_quantity", "is_stock"}
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Announces bulk stock writes (products.signals.stock_changed), which bypass post_save.
+    bulk_update() is covered too: Django runs it as one update() per batch.
+    """
+
+    def update(self, **kwargs):
+        if not STOCK_FIELDS & set(kwargs):
+            return super().update(**kwargs)
+        product_ids = list(self.values_list("pk", flat=True))
+        updated = super().update(**kwargs)
+        _stock_changed(product_ids)
+        return updated
+
+
+def _stock_changed(product_ids):
+    if product_ids:
+        stock_changed.send(sender=Product, product_ids=product_ids)
+
 
 
 
@@ -65,7 +90,7 @@ class Product(BaseModel):
     is_active = models.BooleanField(default=True, help_text="General availability toggle")
     is_approve = models.BooleanField(default=False)
 
-
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
@@ -73,6 +98,11 @@ class Product(BaseModel):
             models.Index(fields=["slug"]),
             models.Index(fields=["vendor"]),
             models.Index(fields=["status", "is_active"]),
+            models.Index(
+                fields=["vendor", "stock_quantity"],
+                condition=models.Q(is_stock=True, stock_quantity__lte=LOW_STOCK_CEILING),
+                name="product_low_stock_idx",
+            ),
         ]
 
     def __str__(self):
@@ -0,0 +1,6 @@
+# products/signals.py
+from django.dispatch import Signal
+
+# Sent with `product_ids` after stock_quantity or is_stock changed without Product.save()
+# (queryset update() / bulk_update()); post_save covers single saves.
+stock_changed = Signal()
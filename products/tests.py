@@ -1,3 +1,42 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from products.models import LOW_STOCK_CEILING, Product
+from products.signals import stock_changed
+from users.models import User
+
+
+class ProductQuerySetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vendor = User.objects.create_user(email="vendor@example.com", password="pass", role="vendor")
+        cls.chair = Product.objects.create(vendor=vendor, name="Chair", price1=Decimal("10.00"), stock_quantity=5)
+        cls.table = Product.objects.create(vendor=vendor, name="Table", price1=Decimal("30.00"), stock_quantity=80)
+
+    def setUp(self):
+        self.announced = []
+        stock_changed.connect(self.receive, sender=Product)
+        self.addCleanup(stock_changed.disconnect, self.receive, sender=Product)
+
+    def receive(self, sender, product_ids, **kwargs):
+        self.announced.append(sorted(product_ids))
+
+    def test_bulk_stock_writes_are_announced(self):
+        # The rows are picked before the update moves them out of the filter
+        Product.objects.filter(stock_quantity__lt=10).update(stock_quantity=60)
+        Product.objects.filter(pk=self.table.pk).update(is_stock=False)
+        self.table.stock_quantity = 0
+        Product.objects.bulk_update([self.chair, self.table], ["stock_quantity"])
+        self.assertEqual(self.announced, [[self.chair.pk], [self.table.pk], sorted([self.chair.pk, self.table.pk])])
+
+    def test_other_writes_are_not_announced(self):
+        Product.objects.update(name="Renamed")
+        Product.objects.bulk_update([self.chair], ["name"])
+        Product.objects.filter(pk__in=[]).update(stock_quantity=1)
+        self.assertEqual(self.announced, [])
+
+    def test_low_stock_candidates_use_the_partial_index(self):
+        candidates = Product.objects.filter(is_stock=True, stock_quantity__lte=LOW_STOCK_CEILING)
+        self.assertEqual(list(candidates), [self.chair])
+        self.assertIn("product_low_stock_idx", candidates.explain())
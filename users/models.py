@@ -90,8 +90,11 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
         self.save(update_fields=['otp_code', 'otp_created_at'])
         return otp
 
+    def get_full_name(self):
+        return f"{self.first_name} {self.last_name}".strip()
+
     def __str__(self):
-        full_name = f"{self.first_name} {self.last_name}".strip()
+        full_name = self.get_full_name()
         return full_name if full_name else self.email
 
 
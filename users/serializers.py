@@ -9,6 +9,7 @@ from orders.models import Order
 from products.models import Product
 from django.db.models import Count, Avg
 from common.models import Review
+from common.annotations import latest_related, related_aggregate
 
 # --------------------------
 # USER SERIALIZERS
@@ -244,8 +245,7 @@ class CustomerListSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}".strip()
 
     def get_payment_status(self, obj):
-        last_payment = Payment.objects.filter(customer=obj).order_by("-created_at").first()
-        return last_payment.status if last_payment else "N/A"
+        return obj.last_payment_status or "N/A"
 
     def get_actions(self, obj):
         return {
@@ -253,6 +253,11 @@ class CustomerListSerializer(serializers.ModelSerializer):
             "delete_url": f"/admin/customers/{obj.id}/delete"
         }
 
+    @staticmethod
+    def annotate(queryset):
+        """Latest payment status per customer, computed in the list query (common.annotations)."""
+        return queryset.annotate(last_payment_status=latest_related(Payment, "customer", "status"))
+
 
 
 class VendorListSerializer(serializers.ModelSerializer):
@@ -281,14 +286,22 @@ class VendorListSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}".strip()
 
     def get_products_count(self, obj):
-        return Product.objects.filter(vendor=obj).count()
+        return obj.products_count
 
     def get_orders_count(self, obj):
-        return Order.objects.filter(vendor=obj).count()
+        return obj.orders_count
 
     def get_ratings(self, obj):
-        avg_rating = Review.objects.filter(product__vendor=obj).aggregate(avg=Avg("rating"))["avg"]
-        return round(avg_rating or 0, 2)
+        return round(obj.avg_rating or 0, 2)
+
+    @staticmethod
+    def annotate(queryset):
+        """The per-vendor statistics above, computed in the list query (common.annotations)."""
+        return queryset.select_related("seller_application").annotate(
+            products_count=related_aggregate(Product, "vendor", Count("pk")),
+            orders_count=related_aggregate(Order, "vendor", Count("pk")),
+            avg_rating=related_aggregate(Review, "product__vendor", Avg("rating"), default=None),
+        )
 
     def get_actions(self, obj):
         return {
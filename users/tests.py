@@ -1,3 +1,80 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from common.models import Review
+from orders.models import Order, OrderItem
+from payments.enums import PaymentStatusEnum
+from payments.models import Payment
+from products.models import Product
+from users.models import User
+
+
+class AdminUserListTests(TestCase):
+    """The admin lists carry their per-row statistics in the list query (common.annotations)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email="admin@example.com", password="pass")
+        cls.vendor = User.objects.create_user(email="vendor@example.com", password="pass", role="vendor")
+        cls.customer = User.objects.create_user(email="customer@example.com", password="pass", role="customer")
+        cls.add_vendor_activity(cls.vendor, cls.customer)
+
+    @classmethod
+    def add_vendor_activity(cls, vendor, customer, rating=4):
+        product = Product.objects.create(vendor=vendor, name="Chair", price1=Decimal("10.00"), stock_quantity=5)
+        Product.objects.create(vendor=vendor, name="Table", price1=Decimal("30.00"), stock_quantity=5)
+        order = Order.objects.create(customer=customer, vendor=vendor)
+        OrderItem.objects.create(order=order, product=product, quantity=3, price=Decimal("10.00"), status="completed")
+        Order.objects.create(customer=customer, vendor=vendor)
+        Review.objects.create(product=product, user=customer, rating=rating)
+        for status in (PaymentStatusEnum.FAILED.value, PaymentStatusEnum.COMPLETED.value):
+            Payment.objects.create(
+                order=order, customer=customer, vendor=vendor, amount=Decimal("30.00"),
+                payment_method="stripe", status=status,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, url):
+        # The page count and the page itself, however many rows the page holds
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def add_rows(self, count):
+        for number in range(count):
+            vendor = User.objects.create_user(email=f"vendor{number}@example.com", password="pass", role="vendor")
+            customer = User.objects.create_user(
+                email=f"customer{number}@example.com", password="pass", role="customer"
+            )
+            self.add_vendor_activity(vendor, customer, rating=2)
+
+    def test_vendor_list(self):
+        data = self.get("/api/vendors/")
+        self.assertEqual(len(data["results"]), 1)
+        row = data["results"][0]
+        self.assertEqual((row["products_count"], row["orders_count"], row["ratings"]), (2, 2, 4))
+
+        self.add_rows(3)
+        self.assertEqual(len(self.get("/api/vendors/")["results"]), 4)
+
+    def test_customer_list(self):
+        data = self.get("/api/customers/")
+        # The newest payment wins
+        self.assertEqual(data["results"][0]["payment_status"], PaymentStatusEnum.COMPLETED.value)
+
+        self.add_rows(3)
+        self.assertEqual(len(self.get("/api/customers/")["results"]), 4)
+
+    def test_vendor_performance(self):
+        data = self.get("/api/admin/vendor-performance/")
+        row = data["results"][0]
+        self.assertEqual((row["products_sold"], row["revenue"]), (3, Decimal("30.00")))
 
-# Create your tests here.
+        self.add_rows(3)
+        self.assertEqual(len(self.get("/api/admin/vendor-performance/")["results"]), 3)
@@ -22,6 +22,7 @@ from users.serializers import (
 from users.models import User, SellerApplication
 from users.enums import SellerApplicationStatus
 from users.permissions import IsRoleAdmin
+from orders.cart import CART_TOKEN_HEADER, merge_guest_cart_at_login
 
 
 # ----------------------
@@ -56,12 +57,15 @@ class UserListView(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(page if page else queryset, many=True)
+        serializer = self.get_serializer(page if page is not None else queryset, many=True)
+        if page is None:
+            return Response({
+                "total_users": len(serializer.data),
+                "users": serializer.data
+            })
+        # The paginator has already counted the queryset
         return self.get_paginated_response({
-            "total_users": queryset.count(),
-            "users": serializer.data
-        }) if page else Response({
-            "total_users": queryset.count(),
+            "total_users": self.paginator.page.paginator.count,
             "users": serializer.data
         })
 
@@ -88,6 +92,10 @@ class UserLoginView(generics.GenericAPIView):
         if not user.is_active:
             return Response({"detail": "User account is disabled."}, status=status.HTTP_403_FORBIDDEN)
 
+        cart_token = request.headers.get(CART_TOKEN_HEADER) or request.data.get("cart_token")
+        if cart_token:
+            merge_guest_cart_at_login(cart_token, user)
+
         refresh = RefreshToken.for_user(user)
         return Response(UserLoginResponseSerializer({
             'user': UserSerializer(user).data,
@@ -107,6 +115,9 @@ class CustomerSignupView(generics.CreateAPIView):
         signup_serializer = self.get_serializer(data=request.data)
         signup_serializer.is_valid(raise_exception=True)
         user = signup_serializer.save(role="customer")
+        cart_token = request.headers.get(CART_TOKEN_HEADER) or request.data.get("cart_token")
+        if cart_token:
+            merge_guest_cart_at_login(cart_token, user)
         refresh = RefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
@@ -245,6 +256,9 @@ class CustomerListViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ["role"]
     ordering_fields = ["created_at", "last_login"]
 
+    def get_queryset(self):
+        return CustomerListSerializer.annotate(super().get_queryset())
+
 
 class VendorListViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.filter(role=UserRole.VENDOR.value).order_by("-created_at")
@@ -255,3 +269,6 @@ class VendorListViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ["first_name", "last_name", "email"]
     filterset_fields = ["role"]
     ordering_fields = ["created_at"]
+
+    def get_queryset(self):
+        return VendorListSerializer.annotate(super().get_queryset())